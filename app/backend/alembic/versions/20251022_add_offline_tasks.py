@@ -0,0 +1,47 @@
+"""
+Add offline_tasks table for persistent 115 offline task tracking
+
+Revision ID: 20251022_add_offline_tasks
+Revises: 20251021_add_notification_types_to_rules
+Create Date: 2025-10-22
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251022_add_offline_tasks'
+down_revision = '20251021_add_notification_types_to_rules'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """创建离线任务跟踪表"""
+    op.create_table(
+        'offline_tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.String(length=64), nullable=False, comment='115任务ID（info_hash）'),
+        sa.Column('task_url', sa.Text(), comment='下载链接（磁力/HTTP/ed2k）'),
+        sa.Column('task_name', sa.String(length=500), comment='任务名称'),
+        sa.Column('file_size', sa.Integer(), default=0, comment='文件大小（字节）'),
+        sa.Column('file_id', sa.String(length=64), comment='完成后的115文件ID'),
+        sa.Column('status', sa.String(length=20), default='pending', comment='任务状态'),
+        sa.Column('progress', sa.Float(), default=0.0, comment='进度（0-100）'),
+        sa.Column('download_speed', sa.Integer(), default=0, comment='下载速度（字节/秒）'),
+        sa.Column('error_message', sa.Text(), comment='错误信息'),
+        sa.Column('missing_sweeps', sa.Integer(), default=0, comment='连续未在115离线列表中出现的轮询次数'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+        sa.Column('completed_at', sa.DateTime(), comment='完成时间'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_offline_tasks_task_id', 'offline_tasks', ['task_id'], unique=True)
+    op.create_index('ix_offline_tasks_status', 'offline_tasks', ['status'])
+
+
+def downgrade():
+    """删除离线任务跟踪表"""
+    op.drop_index('ix_offline_tasks_status', table_name='offline_tasks')
+    op.drop_index('ix_offline_tasks_task_id', table_name='offline_tasks')
+    op.drop_table('offline_tasks')
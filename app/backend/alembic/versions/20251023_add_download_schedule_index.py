@@ -0,0 +1,37 @@
+"""
+Add download scheduler index and bandwidth budget setting
+
+Revision ID: 20251023_add_download_schedule_index
+Revises: 20251022_add_offline_tasks
+Create Date: 2025-10-23
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251023_add_download_schedule_index'
+down_revision = '20251022_add_offline_tasks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加下载调度索引和全局带宽预算配置"""
+    op.create_index(
+        'ix_download_tasks_status_priority_created',
+        'download_tasks',
+        ['status', 'priority', 'created_at']
+    )
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.add_column(
+            sa.Column('download_bandwidth_limit_mbps', sa.Float(), server_default='0',
+                      comment='全局下载带宽预算(MB/s)，0表示不限制')
+        )
+
+
+def downgrade():
+    """移除下载调度索引和全局带宽预算配置"""
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.drop_column('download_bandwidth_limit_mbps')
+    op.drop_index('ix_download_tasks_status_priority_created', table_name='download_tasks')
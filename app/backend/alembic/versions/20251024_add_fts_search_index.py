@@ -0,0 +1,109 @@
+"""
+Add FTS5 full-text search index for media files and message logs
+
+Revision ID: 20251024_add_fts_search_index
+Revises: 20251023_add_download_schedule_index
+Create Date: 2025-10-24
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251024_add_fts_search_index'
+down_revision = '20251023_add_download_schedule_index'
+branch_labels = None
+depends_on = None
+
+
+MEDIA_COLUMNS = "file_name, original_name, source_chat, sender_username"
+MEDIA_NEW = "new.id, new.file_name, new.original_name, new.source_chat, new.sender_username"
+MEDIA_OLD = "old.id, old.file_name, old.original_name, old.source_chat, old.sender_username"
+
+UPGRADE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS media_files_fts USING fts5(
+        {MEDIA_COLUMNS},
+        content='media_files', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS media_files_fts_ai AFTER INSERT ON media_files BEGIN
+        INSERT INTO media_files_fts(rowid, {MEDIA_COLUMNS}) VALUES ({MEDIA_NEW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS media_files_fts_ad AFTER DELETE ON media_files BEGIN
+        INSERT INTO media_files_fts(media_files_fts, rowid, {MEDIA_COLUMNS}) VALUES ('delete', {MEDIA_OLD});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS media_files_fts_au
+    AFTER UPDATE OF {MEDIA_COLUMNS} ON media_files BEGIN
+        INSERT INTO media_files_fts(media_files_fts, rowid, {MEDIA_COLUMNS}) VALUES ('delete', {MEDIA_OLD});
+        INSERT INTO media_files_fts(rowid, {MEDIA_COLUMNS}) VALUES ({MEDIA_NEW});
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_logs_fts USING fts5(
+        original_text,
+        content='message_logs', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_logs_fts_ai AFTER INSERT ON message_logs BEGIN
+        INSERT INTO message_logs_fts(rowid, original_text) VALUES (new.id, new.original_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_logs_fts_ad AFTER DELETE ON message_logs BEGIN
+        INSERT INTO message_logs_fts(message_logs_fts, rowid, original_text) VALUES ('delete', old.id, old.original_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_logs_fts_au AFTER UPDATE OF original_text ON message_logs BEGIN
+        INSERT INTO message_logs_fts(message_logs_fts, rowid, original_text) VALUES ('delete', old.id, old.original_text);
+        INSERT INTO message_logs_fts(rowid, original_text) VALUES (new.id, new.original_text);
+    END
+    """,
+    # 为已有数据建立索引
+    "INSERT INTO media_files_fts(media_files_fts) VALUES ('rebuild')",
+    "INSERT INTO message_logs_fts(message_logs_fts) VALUES ('rebuild')",
+]
+
+DOWNGRADE_SQL = [
+    "DROP TRIGGER IF EXISTS media_files_fts_ai",
+    "DROP TRIGGER IF EXISTS media_files_fts_ad",
+    "DROP TRIGGER IF EXISTS media_files_fts_au",
+    "DROP TABLE IF EXISTS media_files_fts",
+    "DROP TRIGGER IF EXISTS message_logs_fts_ai",
+    "DROP TRIGGER IF EXISTS message_logs_fts_ad",
+    "DROP TRIGGER IF EXISTS message_logs_fts_au",
+    "DROP TABLE IF EXISTS message_logs_fts",
+]
+
+
+def upgrade():
+    """创建全文索引（仅 SQLite；其他数据库的搜索回退到 LIKE）"""
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    # 早期迁移创建的 message_logs 没有 original_text（由启动时的兼容修复补齐），
+    # 新数据库执行到这里时需先补列，否则建立索引会失败
+    message_logs_columns = [col['name'] for col in sa.inspect(bind).get_columns('message_logs')]
+    if 'original_text' not in message_logs_columns:
+        with op.batch_alter_table('message_logs', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('original_text', sa.Text(), nullable=True, comment='原始消息文本'))
+
+    for statement in UPGRADE_SQL:
+        op.execute(statement)
+
+
+def downgrade():
+    """删除全文索引"""
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for statement in DOWNGRADE_SQL:
+        op.execute(statement)
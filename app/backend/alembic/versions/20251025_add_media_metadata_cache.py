@@ -0,0 +1,51 @@
+"""
+Add media_metadata table and metadata worker setting
+
+Revision ID: 20251025_add_media_metadata_cache
+Revises: 20251024_add_fts_search_index
+Create Date: 2025-10-25
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251025_add_media_metadata_cache'
+down_revision = '20251024_add_fts_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """创建元数据探测队列/缓存表，添加元数据进程数配置"""
+    op.create_table(
+        'media_metadata',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_hash', sa.String(length=64), nullable=False, comment='文件哈希(SHA-256)'),
+        sa.Column('mode', sa.String(length=20), default='lightweight', comment='提取模式：lightweight/full'),
+        sa.Column('status', sa.String(length=20), default='pending', comment='状态：pending/done/failed'),
+        sa.Column('file_path', sa.String(length=500), comment='探测时的文件路径'),
+        sa.Column('metadata_json', sa.Text(), comment='元数据JSON'),
+        sa.Column('error', sa.Text(), comment='错误信息'),
+        sa.Column('attempts', sa.Integer(), default=0, comment='探测次数'),
+        sa.Column('probe_ms', sa.Integer(), comment='最近一次探测耗时(毫秒)'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_media_metadata_file_hash', 'media_metadata', ['file_hash'], unique=True)
+    op.create_index('ix_media_metadata_status', 'media_metadata', ['status'])
+
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.add_column(
+            sa.Column('metadata_workers', sa.Integer(), server_default='2', comment='元数据提取进程数')
+        )
+
+
+def downgrade():
+    """删除元数据探测队列/缓存表和进程数配置"""
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.drop_column('metadata_workers')
+    op.drop_index('ix_media_metadata_status', table_name='media_metadata')
+    op.drop_index('ix_media_metadata_file_hash', table_name='media_metadata')
+    op.drop_table('media_metadata')
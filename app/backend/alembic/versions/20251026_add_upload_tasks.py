@@ -0,0 +1,71 @@
+"""
+Add upload_tasks table and upload scheduler settings
+
+Revision ID: 20251026_add_upload_tasks
+Revises: 20251025_add_media_metadata_cache
+Create Date: 2025-10-26
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251026_add_upload_tasks'
+down_revision = '20251025_add_media_metadata_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """创建上传任务队列表，添加上传并发与限速配置"""
+    op.create_table(
+        'upload_tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('media_file_id', sa.Integer(), comment='关联的媒体文件ID'),
+        sa.Column('monitor_rule_id', sa.Integer(), comment='关联的监控规则ID（用于规则间公平调度）'),
+        sa.Column('local_path', sa.String(length=500), nullable=False, comment='本地文件路径'),
+        sa.Column('remote_dir', sa.String(length=500), nullable=False, comment='CloudDrive2 目标目录'),
+        sa.Column('file_name', sa.String(length=255), comment='文件名'),
+        sa.Column('file_size', sa.Integer(), default=0, comment='文件大小（字节）'),
+        sa.Column('status', sa.String(length=20), default='pending',
+                  comment='任务状态：pending/uploading/success/failed/cancelled'),
+        sa.Column('priority', sa.Integer(), default=0, comment='优先级：-10到10'),
+        sa.Column('attempts', sa.Integer(), default=0, comment='已尝试次数'),
+        sa.Column('max_attempts', sa.Integer(), default=3, comment='最大尝试次数'),
+        sa.Column('last_error', sa.Text(), comment='最后一次错误信息'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('started_at', sa.DateTime(), comment='开始上传时间'),
+        sa.Column('completed_at', sa.DateTime(), comment='完成时间'),
+        sa.ForeignKeyConstraint(['media_file_id'], ['media_files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_upload_tasks_monitor_rule_id', 'upload_tasks', ['monitor_rule_id'])
+    op.create_index(
+        'ix_upload_tasks_status_priority_created',
+        'upload_tasks',
+        ['status', 'priority', 'created_at']
+    )
+
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.add_column(
+            sa.Column('upload_concurrency', sa.Integer(), server_default='2', comment='并发上传数')
+        )
+        batch_op.add_column(
+            sa.Column('upload_bandwidth_limit_mbps', sa.Float(), server_default='0',
+                      comment='全局上传限速(MB/s)，0表示不限制')
+        )
+        batch_op.add_column(
+            sa.Column('upload_bandwidth_schedule', sa.Text(),
+                      comment='分时段上传限速(JSON：[{start, end, limit_mbps}])')
+        )
+
+
+def downgrade():
+    """删除上传任务队列表和上传配置"""
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.drop_column('upload_bandwidth_schedule')
+        batch_op.drop_column('upload_bandwidth_limit_mbps')
+        batch_op.drop_column('upload_concurrency')
+    op.drop_index('ix_upload_tasks_status_priority_created', table_name='upload_tasks')
+    op.drop_index('ix_upload_tasks_monitor_rule_id', table_name='upload_tasks')
+    op.drop_table('upload_tasks')
@@ -0,0 +1,43 @@
+"""
+Add chunk-level resume columns to download_tasks and parallel part setting
+
+Revision ID: 20251027_add_download_parts
+Revises: 20251026_add_upload_tasks
+Create Date: 2025-10-27
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251027_add_download_parts'
+down_revision = '20251026_add_upload_tasks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加分片下载位图（断点续传）和并行分片数配置"""
+    with op.batch_alter_table('download_tasks') as batch_op:
+        batch_op.add_column(
+            sa.Column('part_size', sa.Integer(), comment='分片下载的分片大小（字节）')
+        )
+        batch_op.add_column(
+            sa.Column('parts_bitmap', sa.LargeBinary(), comment='已完成分片位图（用于断点续传）')
+        )
+
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.add_column(
+            sa.Column('download_part_workers', sa.Integer(), server_default='4',
+                      comment='单个文件并行下载的分片段数，1表示单流下载')
+        )
+
+
+def downgrade():
+    """删除分片下载相关字段"""
+    with op.batch_alter_table('media_settings') as batch_op:
+        batch_op.drop_column('download_part_workers')
+
+    with op.batch_alter_table('download_tasks') as batch_op:
+        batch_op.drop_column('parts_bitmap')
+        batch_op.drop_column('part_size')
@@ -28,6 +28,7 @@ from . import (
     quick_upload,    # 秒传检测 - /api/quick-upload
     smart_rename,    # 智能重命名 - /api/smart-rename
     strm,            # STRM生成 - /api/strm
+    progress,        # 实时进度 - /api/progress
 )
 
 # 导出所有路由器
@@ -51,6 +52,7 @@ __all__ = [
     'quick_upload',
     'smart_rename',
     'strm',
+    'progress',
 ]
 
 # API路由配置信息（用于文档和验证）
@@ -150,6 +152,11 @@ API_ROUTE_CONFIG = {
         'tags': ['STRM生成'],
         'router': strm.router,
     },
+    'progress': {
+        'prefix': '/api/progress',
+        'tags': ['实时进度'],
+        'router': progress.router,
+    },
 }
 
 
@@ -127,6 +127,10 @@ async def update_clouddrive2_config(
         for key, value in config_to_save.items():
             os.environ[key] = value
         
+        # 关闭旧配置的连接，下次使用时按新配置重建
+        from services.clouddrive2_pool import get_clouddrive2_pool
+        await get_clouddrive2_pool().reset()
+        
         logger.info("✅ CloudDrive2配置已保存并生效")
         
         return {
@@ -212,7 +216,7 @@ async def browse_directories(
 ):
     """浏览 CloudDrive2 目录，仅返回文件夹列表"""
     try:
-        from services.clouddrive2_client import CloudDrive2Client, CloudDrive2Config
+        from services.clouddrive2_client import CloudDrive2Config
         # 若未传入，使用环境变量中的当前配置
         host = data.host or os.getenv('CLOUDDRIVE2_HOST', 'localhost')
         port = data.port or int(os.getenv('CLOUDDRIVE2_PORT', '19798'))
@@ -227,10 +231,10 @@ async def browse_directories(
             password=password
         )
 
-        client = CloudDrive2Client(config)
-        await client.connect()
-        items = await client.list_files(data.path or "/")
-        await client.disconnect()
+        # 与当前配置一致时复用连接池，否则使用一次性连接
+        from services.clouddrive2_pool import get_clouddrive2_pool
+        async with get_clouddrive2_pool().client(config) as client:
+            items = await client.list_files(data.path or "/")
 
         # 仅返回目录项
         dirs = [
@@ -164,6 +164,69 @@ async def list_logs(
         }, status_code=500)
 
 
+@router.get("/search")
+async def search_logs(
+    q: str = Query(..., min_length=1, description="搜索关键词（空格分隔多个词）"),
+    page: int = Query(1, ge=1, description="页码"),
+    limit: int = Query(50, ge=1, le=500, description="每页数量")
+):
+    """
+    按相关度全文搜索消息日志原文
+    
+    返回的 snippet 中匹配部分以 <mark> 标记
+    """
+    try:
+        from models import MessageLog
+        from database import get_db
+        from services.search_index import search_message_logs
+        
+        async for db in get_db():
+            hits, total = await search_message_logs(db, q, limit=limit, offset=(page - 1) * limit)
+            
+            logs_by_id = {}
+            if hits:
+                result = await db.execute(
+                    select(MessageLog).where(MessageLog.id.in_([hit["id"] for hit in hits]))
+                )
+                logs_by_id = {log.id: log for log in result.scalars().all()}
+            
+            items = []
+            for hit in hits:
+                log = logs_by_id.get(hit["id"])
+                if not log:
+                    continue
+                items.append({
+                    "id": log.id,
+                    "rule_id": log.rule_id,
+                    "rule_name": log.rule_name,
+                    "message_id": log.source_message_id,
+                    "source_chat_id": log.source_chat_id,
+                    "source_chat_name": log.source_chat_name,
+                    "target_chat_id": log.target_chat_id,
+                    "target_chat_name": log.target_chat_name,
+                    "message_text": log.original_text,
+                    "message_type": log.media_type or 'text',
+                    "status": log.status,
+                    "snippet": hit["snippet"],
+                    "score": hit["score"],
+                    "created_at": log.created_at.isoformat() if log.created_at else None
+                })
+            
+            return JSONResponse(content={
+                "success": True,
+                "items": items,
+                "total": total,
+                "page": page,
+                "limit": limit
+            })
+    except Exception as e:
+        logger.error(f"搜索日志失败: {e}")
+        return JSONResponse(content={
+            "success": False,
+            "message": f"搜索日志失败: {str(e)}"
+        }, status_code=500)
+
+
 @router.get("/stats")
 async def get_log_stats():
     """
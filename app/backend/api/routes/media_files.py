@@ -1,10 +1,10 @@
 """
 媒体文件和下载任务 API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, func, and_, desc
 from typing import Optional, List
 from datetime import datetime, timedelta
 import json
@@ -19,6 +19,9 @@ from timezone_utils import get_user_now
 
 logger = get_logger('api.media_files')
 from services.storage_manager import get_storage_manager
+from services.search_index import media_file_keyword_clause, search_media_files
+from services.media_preview_service import get_media_preview_service
+from utils.media_stream import MediaStreamResponse
 
 router = APIRouter(tags=["media_files"])
 
@@ -52,9 +55,23 @@ async def get_download_tasks(
         result = await db.execute(query)
         tasks = result.scalars().all()
         
+        # 用进度总线中的实时进度覆盖数据库检查点（数据库只在检查点时更新）
+        from services.common.progress_bus import get_progress_bus, KIND_DOWNLOAD
+        progress_bus = get_progress_bus()
+        task_dicts = []
+        for task in tasks:
+            task_dict = task_to_dict(task)
+            live = progress_bus.get_state(KIND_DOWNLOAD, task.id) if task.status == 'downloading' else None
+            if live:
+                task_dict["downloaded_bytes"] = live["current_bytes"]
+                task_dict["total_bytes"] = live["total_bytes"] or task_dict["total_bytes"]
+                task_dict["progress_percent"] = int(live["percent"])
+                task_dict["download_speed_mbps"] = live["speed_mbps"]
+            task_dicts.append(task_dict)
+        
         return {
             "success": True,
-            "tasks": [task_to_dict(task) for task in tasks],
+            "tasks": task_dicts,
             "total": total or 0,
             "page": page,
             "page_size": page_size
@@ -186,86 +203,21 @@ async def retry_download_task(
                 content={"success": False, "message": "没有可用的客户端"}
             )
         
-        # 重新获取消息
-        message = None
+        # 重新获取消息（批量解析缓存；消息已删除或媒体被替换时按文件ID/文件名查找）
         try:
-            import asyncio
+            from services.message_resolver import get_message_resolver, merge_media_json
             
-            # 方法1：尝试通过 message_id 获取消息
-            if task.message_id and task.chat_id:
-                logger.info(f"🔍 方法1：尝试获取消息: chat_id={task.chat_id}, message_id={task.message_id}")
-                try:
-                    future = asyncio.run_coroutine_threadsafe(
-                        client.get_messages(int(task.chat_id), task.message_id),
-                        client_wrapper.loop
-                    )
-                    message = future.result(timeout=10)
-                    
-                    if message and hasattr(message, 'media') and message.media:
-                        logger.info(f"✅ 方法1成功：获取到消息，包含媒体")
-                    else:
-                        logger.warning(f"⚠️ 方法1失败：消息不包含媒体或已被删除")
-                        message = None
-                except Exception as e:
-                    logger.warning(f"⚠️ 方法1失败: {e}")
-                    message = None
-            
-            # 方法2：如果方法1失败，尝试通过文件ID搜索历史消息
-            if not message and task.file_name and task.chat_id:
-                logger.info(f"🔍 方法2：通过文件名搜索历史消息: {task.file_name}")
-                try:
-                    from telethon.tl.types import InputMessagesFilterDocument
-                    
-                    future = asyncio.run_coroutine_threadsafe(
-                        client.iter_messages(
-                            int(task.chat_id),
-                            limit=100,  # 搜索最近100条消息
-                            filter=InputMessagesFilterDocument
-                        ).__anext__(),
-                        client_wrapper.loop
-                    )
-                    
-                    # 搜索匹配的文件
-                    async def search_message():
-                        async for msg in client.iter_messages(
-                            int(task.chat_id),
-                            limit=100,
-                            filter=InputMessagesFilterDocument
-                        ):
-                            if not msg.media or not hasattr(msg.media, 'document'):
-                                continue
-                            
-                            # 检查文件名是否匹配
-                            for attr in msg.media.document.attributes:
-                                if hasattr(attr, 'file_name') and attr.file_name == task.file_name:
-                                    return msg
-                            
-                            # 检查文件ID是否匹配
-                            if task.file_unique_id and str(msg.media.document.id) == task.file_unique_id:
-                                return msg
-                        
-                        return None
-                    
-                    future = asyncio.run_coroutine_threadsafe(
-                        search_message(),
-                        client_wrapper.loop
-                    )
-                    message = future.result(timeout=30)
-                    
-                    if message:
-                        logger.info(f"✅ 方法2成功：通过文件名找到消息")
-                        # 更新 message_id
-                        task.message_id = message.id
-                    else:
-                        logger.warning(f"⚠️ 方法2失败：未找到匹配的消息")
-                except Exception as e:
-                    logger.warning(f"⚠️ 方法2失败: {e}")
-                    import traceback
-                    traceback.print_exc()
+            logger.info(f"🔍 重新获取消息: chat_id={task.chat_id}, message_id={task.message_id}")
+            message = await get_message_resolver().resolve_task_message(
+                client_wrapper,
+                int(task.chat_id),
+                task.message_id,
+                file_name=task.file_name,
+                media_id=task.file_unique_id
+            )
             
-            # 如果所有方法都失败
             if not message:
-                logger.error("❌ 所有方法都失败，无法获取消息")
+                logger.error("❌ 无法获取原始消息")
                 return JSONResponse(
                     status_code=404,
                     content={
@@ -274,6 +226,11 @@ async def retry_download_task(
                     }
                 )
             
+            if message.id != task.message_id:
+                logger.info(f"✅ 通过文件查找到消息: {message.id}")
+                task.message_id = message.id
+            task.media_json = merge_media_json(task.media_json, message)
+            
         except Exception as e:
             logger.error(f"获取消息失败: {e}")
             import traceback
@@ -292,8 +249,8 @@ async def retry_download_task(
         
         await db.commit()
         
-        # 重新加入下载队列
-        await media_monitor.download_queue.put({
+        # 重新提交给下载调度器
+        media_monitor.enqueue_download({
             'task_id': task.id,
             'rule_id': task.monitor_rule_id,
             'message_id': task.message_id,
@@ -303,7 +260,7 @@ async def retry_download_task(
             'client': client,
             'message': message,
             'client_wrapper': client_wrapper
-        })
+        }, priority=task.priority or 0, size_bytes=task.total_bytes or 0)
         
         logger.info(f"✅ 重试下载任务: {task.file_name} (ID: {task_id})")
         
@@ -345,6 +302,10 @@ async def retry_all_failed_tasks(
         
         await db.commit()
         
+        # 调度器从数据库按优先级加载这些任务，执行前再重新获取消息
+        from services.media_monitor_service import get_media_monitor_service
+        await get_media_monitor_service().scheduler.restore(get_db)
+        
         logger.info(f"批量重试失败任务: {count} 个")
         
         return {
@@ -379,6 +340,10 @@ async def delete_download_task(
                 content={"success": False, "message": "任务不存在"}
             )
         
+        # 删除分片下载留下的 .part 文件
+        from services.media_monitor_service import get_media_monitor_service
+        await get_media_monitor_service().discard_partial_download(db, task)
+        
         await db.delete(task)
         await db.commit()
         
@@ -423,9 +388,12 @@ async def batch_delete_download_tasks(
                 content={"success": False, "message": "未找到要删除的任务"}
             )
         
-        # 批量删除
+        # 批量删除（同时删除分片下载留下的 .part 文件）
+        from services.media_monitor_service import get_media_monitor_service
+        media_monitor = get_media_monitor_service()
         deleted_count = 0
         for task in tasks:
+            await media_monitor.discard_partial_download(db, task)
             await db.delete(task)
             deleted_count += 1
         
@@ -470,6 +438,10 @@ async def update_task_priority(
         task.priority = priority
         await db.commit()
         
+        # 同步调整排队中任务的顺序
+        from services.media_monitor_service import get_media_monitor_service
+        get_media_monitor_service().scheduler.reprioritize(task_id, priority)
+        
         return {
             "success": True,
             "message": "优先级已更新"
@@ -505,14 +477,9 @@ async def get_media_files(
     try:
         query = select(MediaFile)
         
-        # 关键词搜索
+        # 关键词搜索（全文索引，不可用时回退到 LIKE）
         if keyword:
-            query = query.where(
-                or_(
-                    MediaFile.file_name.contains(keyword),
-                    MediaFile.original_name.contains(keyword)
-                )
-            )
+            query = query.where(await media_file_keyword_clause(db, keyword))
         
         # 文件类型过滤
         if file_type and file_type != 'all':
@@ -625,6 +592,45 @@ async def get_media_stats(
         )
 
 
+@router.get("/files/search")
+async def search_media_file_list(
+    q: str = Query(..., min_length=1, description="搜索关键词（空格分隔多个词）"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """按相关度搜索媒体文件（文件名、原始文件名、来源频道、发送者）"""
+    try:
+        hits, total = await search_media_files(db, q, limit=page_size, offset=(page - 1) * page_size)
+        
+        files = []
+        if hits:
+            result = await db.execute(
+                select(MediaFile).where(MediaFile.id.in_([file_id for file_id, _ in hits]))
+            )
+            files_by_id = {file.id: file for file in result.scalars().all()}
+            for file_id, score in hits:
+                file = files_by_id.get(file_id)
+                if file:
+                    files.append({**file_to_dict(file), "score": score})
+        
+        return {
+            "success": True,
+            "files": files,
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+        
+    except Exception as e:
+        logger.error(f"搜索媒体文件失败: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"搜索失败: {str(e)}"}
+        )
+
+
 @router.get("/files/{file_id}")
 async def get_media_file_detail(
     file_id: int,
@@ -656,12 +662,21 @@ async def get_media_file_detail(
         )
 
 
+def _local_file_path(file: MediaFile) -> Optional[str]:
+    """媒体文件的本地路径（优先归档文件，否则临时文件），不存在时返回 None"""
+    file_path = file.final_path if file.is_organized and file.final_path else file.temp_path
+    if not file_path or not os.path.exists(file_path):
+        return None
+    return file_path
+
+
 @router.get("/download/{file_id}")
 async def download_media_file(
     file_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    """下载媒体文件"""
+    """下载媒体文件（支持断点续传）"""
     try:
         result = await db.execute(
             select(MediaFile).where(MediaFile.id == file_id)
@@ -674,19 +689,20 @@ async def download_media_file(
                 content={"success": False, "message": "文件不存在"}
             )
         
-        # 优先返回归档文件，否则返回临时文件
-        file_path = file.final_path if file.is_organized and file.final_path else file.temp_path
-        
-        if not file_path or not os.path.exists(file_path):
+        file_path = _local_file_path(file)
+        if not file_path:
             return JSONResponse(
                 status_code=404,
                 content={"success": False, "message": "文件已被删除"}
             )
         
-        return FileResponse(
+        return MediaStreamResponse(
             file_path,
+            request,
             filename=file.file_name,
-            media_type='application/octet-stream'
+            media_type='application/octet-stream',
+            etag=file.file_hash,
+            inline=False
         )
         
     except Exception as e:
@@ -697,6 +713,98 @@ async def download_media_file(
         )
 
 
+@router.get("/stream/{file_id}")
+async def stream_media_file(
+    file_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    在线播放/预览媒体文件
+    
+    支持 Range（视频拖动）与 If-None-Match（浏览器缓存）；
+    <video>/<img> 无法携带请求头，可通过 ?token= 认证
+    """
+    try:
+        result = await db.execute(
+            select(MediaFile).where(MediaFile.id == file_id)
+        )
+        file = result.scalar_one_or_none()
+        
+        if not file:
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": "文件不存在"}
+            )
+        
+        file_path = _local_file_path(file)
+        if not file_path:
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": "文件已被删除"}
+            )
+        
+        return MediaStreamResponse(file_path, request, filename=file.file_name, etag=file.file_hash)
+        
+    except Exception as e:
+        logger.error(f"播放文件失败: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"播放失败: {str(e)}"}
+        )
+
+
+@router.get("/thumbnail/{file_id}")
+async def get_media_thumbnail(
+    file_id: int,
+    request: Request,
+    size: int = Query(320, ge=64, le=1024, description="最长边像素（取最接近的 160/320/640）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取图片/视频缩略图（首次请求时生成并缓存）"""
+    try:
+        result = await db.execute(
+            select(MediaFile).where(MediaFile.id == file_id)
+        )
+        file = result.scalar_one_or_none()
+        
+        if not file:
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": "文件不存在"}
+            )
+        
+        file_path = _local_file_path(file)
+        if not file_path:
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": "文件已被删除"}
+            )
+        
+        thumbnail_path = await get_media_preview_service().get_thumbnail(file_path, file.file_hash, size)
+        if not thumbnail_path:
+            return JSONResponse(
+                status_code=415,
+                content={"success": False, "message": "该文件不支持生成缩略图"}
+            )
+        
+        # 缩略图由文件哈希决定，内容不会变化，可长期缓存
+        return MediaStreamResponse(
+            thumbnail_path,
+            request,
+            media_type='image/jpeg',
+            etag=Path(thumbnail_path).stem,
+            max_age=7 * 24 * 3600
+        )
+        
+    except Exception as e:
+        logger.error(f"获取缩略图失败: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"获取缩略图失败: {str(e)}"}
+        )
+
+
 @router.post("/files/{file_id}/star")
 async def toggle_star(
     file_id: int,
@@ -754,7 +862,9 @@ async def delete_media_file(
         for path in [file.temp_path, file.final_path]:
             if path and os.path.exists(path):
                 try:
+                    file_size = os.path.getsize(path)
                     os.remove(path)
+                    get_storage_manager().record_file_removed(path, file_size)
                     logger.info(f"删除文件: {path}")
                 except Exception as e:
                     logger.warning(f"删除物理文件失败: {e}")
@@ -813,7 +923,9 @@ async def batch_delete_media_files(
             for path in [file.temp_path, file.final_path]:
                 if path and os.path.exists(path):
                     try:
+                        file_size = os.path.getsize(path)
                         os.remove(path)
+                        get_storage_manager().record_file_removed(path, file_size)
                         logger.info(f"删除文件: {path}")
                     except Exception as e:
                         logger.warning(f"删除物理文件失败: {e}")
@@ -932,7 +1044,8 @@ async def manual_cleanup(
     rule_id: int = Query(..., description="规则ID"),
     days: int = Query(7, ge=1, le=365, description="保留天数"),
     only_organized: bool = Query(True, description="是否只清理已归档文件"),
-    delete_db_records: bool = Query(False, description="是否删除数据库记录")
+    delete_db_records: bool = Query(False, description="是否删除数据库记录"),
+    dry_run: bool = Query(False, description="只估算可释放空间，不删除文件")
 ):
     """手动清理存储空间"""
     try:
@@ -941,7 +1054,8 @@ async def manual_cleanup(
             rule_id=rule_id,
             days=days,
             only_organized=only_organized,
-            delete_db_records=delete_db_records
+            delete_db_records=delete_db_records,
+            dry_run=dry_run
         )
         return result
     except Exception as e:
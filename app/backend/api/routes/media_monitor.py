@@ -8,13 +8,12 @@ from sqlalchemy import select, func, and_, or_
 from typing import Optional, List
 from datetime import datetime
 import json
-import asyncio
 
 from database import get_db
 from models import MediaMonitorRule, User
 from auth import get_current_user
 from log_manager import get_logger
-from telegram_client_manager import multi_client_manager
+from services.common.rule_events import publish_rule_change, KIND_MEDIA_MONITOR, OP_CREATED, OP_UPDATED, OP_DELETED
 from timezone_utils import get_user_now
 
 logger = get_logger('api.media_monitor')
@@ -22,23 +21,6 @@ logger = get_logger('api.media_monitor')
 router = APIRouter(tags=["media_monitor"])
 
 
-async def notify_client_reload_chats(client_id: str):
-    """通知客户端重新加载监听的聊天列表"""
-    try:
-        client_wrapper = multi_client_manager.get_client(client_id)
-        if client_wrapper and client_wrapper.loop:
-            # 在客户端的事件循环中执行更新
-            asyncio.run_coroutine_threadsafe(
-                client_wrapper._update_monitored_chats(),
-                client_wrapper.loop
-            )
-            logger.info(f"✅ 已通知客户端 {client_id} 重新加载监听列表")
-        else:
-            logger.warning(f"⚠️ 客户端 {client_id} 未运行或事件循环不可用")
-    except Exception as e:
-        logger.error(f"❌ 通知客户端重新加载失败: {e}")
-
-
 # ==================== 监控规则 API ====================
 
 @router.get("/rules")
@@ -221,16 +203,8 @@ async def create_monitor_rule(
         
         logger.info(f"创建监控规则成功: {rule.name} (ID: {rule.id})")
         
-        # 通知客户端重新加载监听列表
-        if rule.is_active:
-            await notify_client_reload_chats(rule.client_id)
-            
-            # 通知媒体监控服务重新加载规则
-            from services.media_monitor_service import get_media_monitor_service
-            monitor_service = get_media_monitor_service()
-            if monitor_service:
-                await monitor_service.reload_rule(rule.id)
-                logger.info(f"✅ 已通知媒体监控服务加载规则: {rule.name} (ID: {rule.id})")
+        # 发布规则变更（客户端监听列表与媒体监控服务增量刷新）
+        publish_rule_change(KIND_MEDIA_MONITOR, rule.id, OP_CREATED)
         
         return {
             "success": True,
@@ -286,15 +260,8 @@ async def update_monitor_rule(
         
         logger.info(f"更新监控规则成功: {rule.name} (ID: {rule.id})")
         
-        # 通知客户端重新加载监听列表
-        await notify_client_reload_chats(rule.client_id)
-        
-        # 通知媒体监控服务重新加载规则
-        from services.media_monitor_service import get_media_monitor_service
-        monitor_service = get_media_monitor_service()
-        if monitor_service:
-            await monitor_service.reload_rule(rule.id)
-            logger.info(f"✅ 已通知媒体监控服务重新加载规则: {rule.name} (ID: {rule.id})")
+        # 发布规则变更（客户端监听列表与媒体监控服务增量刷新）
+        publish_rule_change(KIND_MEDIA_MONITOR, rule.id, OP_UPDATED)
         
         return {
             "success": True,
@@ -331,15 +298,14 @@ async def delete_monitor_rule(
             )
         
         rule_name = rule.name
-        client_id = rule.client_id
         
         await db.delete(rule)
         await db.commit()
         
         logger.info(f"删除监控规则成功: {rule_name} (ID: {rule_id})")
         
-        # 通知客户端重新加载监听列表
-        await notify_client_reload_chats(client_id)
+        # 发布规则变更（客户端监听列表与媒体监控服务增量刷新）
+        publish_rule_change(KIND_MEDIA_MONITOR, rule_id, OP_DELETED)
         
         return {
             "success": True,
@@ -382,8 +348,8 @@ async def toggle_monitor_rule(
         
         logger.info(f"切换监控规则状态: {rule.name} -> {'启用' if rule.is_active else '禁用'}")
         
-        # 通知客户端重新加载监听列表
-        await notify_client_reload_chats(rule.client_id)
+        # 发布规则变更（客户端监听列表与媒体监控服务增量刷新）
+        publish_rule_change(KIND_MEDIA_MONITOR, rule.id, OP_UPDATED)
         
         return {
             "success": True,
@@ -10,6 +10,7 @@ from database import get_db
 from models import MediaSettings, User
 from auth import get_current_user
 from log_manager import get_logger
+from services.upload_scheduler import parse_bandwidth_schedule
 import httpx
 import os
 from pathlib import Path
@@ -23,6 +24,8 @@ class MediaSettingsSchema(BaseModel):
     # 下载设置
     temp_folder: str = "/app/media/downloads"
     concurrent_downloads: int = 3
+    download_bandwidth_limit_mbps: float = 0
+    download_part_workers: int = 4
     retry_on_failure: bool = True
     max_retries: int = 3
     
@@ -31,6 +34,12 @@ class MediaSettingsSchema(BaseModel):
     metadata_mode: str = "lightweight"
     metadata_timeout: int = 10
     async_metadata_extraction: bool = True
+    metadata_workers: int = 2
+    
+    # 云盘上传
+    upload_concurrency: int = 2
+    upload_bandwidth_limit_mbps: float = 0
+    upload_bandwidth_schedule: Optional[str] = None
     
     # 存储清理
     auto_cleanup_enabled: bool = True
@@ -74,12 +83,18 @@ async def get_media_settings(
             "id": settings.id,
             "temp_folder": settings.temp_folder,
             "concurrent_downloads": settings.concurrent_downloads,
+            "download_bandwidth_limit_mbps": settings.download_bandwidth_limit_mbps or 0,
+            "download_part_workers": settings.download_part_workers or 4,
             "retry_on_failure": settings.retry_on_failure,
             "max_retries": settings.max_retries,
             "extract_metadata": settings.extract_metadata,
             "metadata_mode": settings.metadata_mode,
             "metadata_timeout": settings.metadata_timeout,
             "async_metadata_extraction": settings.async_metadata_extraction,
+            "metadata_workers": settings.metadata_workers or 2,
+            "upload_concurrency": settings.upload_concurrency or 2,
+            "upload_bandwidth_limit_mbps": settings.upload_bandwidth_limit_mbps or 0,
+            "upload_bandwidth_schedule": settings.upload_bandwidth_schedule,
             "auto_cleanup_enabled": settings.auto_cleanup_enabled,
             "auto_cleanup_days": settings.auto_cleanup_days,
             "cleanup_only_organized": settings.cleanup_only_organized,
@@ -99,6 +114,11 @@ async def update_media_settings(
     current_user: User = Depends(get_current_user)
 ):
     """更新媒体管理全局配置"""
+    try:
+        parse_bandwidth_schedule(data.upload_bandwidth_schedule)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         result = await db.execute(select(MediaSettings))
         settings = result.scalars().first()
@@ -111,12 +131,18 @@ async def update_media_settings(
         # 更新所有字段
         settings.temp_folder = data.temp_folder
         settings.concurrent_downloads = data.concurrent_downloads
+        settings.download_bandwidth_limit_mbps = data.download_bandwidth_limit_mbps
+        settings.download_part_workers = data.download_part_workers
         settings.retry_on_failure = data.retry_on_failure
         settings.max_retries = data.max_retries
         settings.extract_metadata = data.extract_metadata
         settings.metadata_mode = data.metadata_mode
         settings.metadata_timeout = data.metadata_timeout
         settings.async_metadata_extraction = data.async_metadata_extraction
+        settings.metadata_workers = data.metadata_workers
+        settings.upload_concurrency = data.upload_concurrency
+        settings.upload_bandwidth_limit_mbps = data.upload_bandwidth_limit_mbps
+        settings.upload_bandwidth_schedule = (data.upload_bandwidth_schedule or '').strip() or None
         settings.auto_cleanup_enabled = data.auto_cleanup_enabled
         settings.auto_cleanup_days = data.auto_cleanup_days
         settings.cleanup_only_organized = data.cleanup_only_organized
@@ -127,6 +153,16 @@ async def update_media_settings(
         
         logger.info(f"✅ 媒体配置已更新 (ID: {settings.id})")
         
+        # 立即应用到下载、上传调度器
+        from services.media_monitor_service import get_media_monitor_service
+        media_monitor = get_media_monitor_service()
+        media_monitor.global_settings = settings
+        media_monitor.apply_download_settings()
+        media_monitor.apply_upload_settings()
+        
+        from services.media_metadata_service import get_metadata_service
+        get_metadata_service().configure(max_workers=data.metadata_workers)
+        
         return {"message": "配置更新成功", "id": settings.id}
     except Exception as e:
         logger.error(f"更新媒体配置失败: {e}")
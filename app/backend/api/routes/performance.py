@@ -26,6 +26,10 @@ async def get_performance_stats(
     - 重试队列统计
     - 批量写入器统计
     - 消息分发器统计
+    - 媒体元数据服务统计
+    - 上传调度器统计
+    - 消息重新解析统计
+    - 认证用户缓存统计
     """
     try:
         from services.common.message_cache import get_message_cache
@@ -33,6 +37,12 @@ async def get_performance_stats(
         from services.common.retry_queue import get_retry_queue
         from services.common.batch_writer import get_batch_writer
         from services.message_dispatcher import get_message_dispatcher
+        from services.media_metadata_service import get_metadata_service
+        from services.upload_scheduler import get_upload_scheduler
+        from services.message_resolver import get_message_resolver
+        from auth import get_user_cache
+        from services.common.rule_events import get_rule_event_bus
+        from services.notification_service import get_notification_rule_index
         
         # 获取各组件统计
         cache_stats = get_message_cache().get_stats()
@@ -40,6 +50,12 @@ async def get_performance_stats(
         retry_stats = get_retry_queue().get_stats()
         batch_stats = get_batch_writer().get_stats()
         dispatcher_stats = get_message_dispatcher().get_stats()
+        metadata_stats = get_metadata_service().get_stats()
+        upload_stats = get_upload_scheduler().get_stats()
+        resolver_stats = get_message_resolver().get_stats()
+        auth_stats = get_user_cache().get_stats()
+        rule_event_stats = get_rule_event_bus().get_stats()
+        rule_event_stats['notification_index'] = get_notification_rule_index().get_stats()
         
         return {
             "success": True,
@@ -48,7 +64,12 @@ async def get_performance_stats(
                 "filter_engine": filter_stats,
                 "retry_queue": retry_stats,
                 "batch_writer": batch_stats,
-                "message_dispatcher": dispatcher_stats
+                "message_dispatcher": dispatcher_stats,
+                "media_metadata": metadata_stats,
+                "upload_scheduler": upload_stats,
+                "message_resolver": resolver_stats,
+                "auth_cache": auth_stats,
+                "rule_events": rule_event_stats
             }
         }
     
@@ -164,6 +185,93 @@ async def flush_batch_writer(
         return {"success": False, "error": str(e)}
 
 
+@router.get("/metadata/stats")
+async def get_metadata_stats(
+    current_user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取媒体元数据服务统计信息（探测耗时、每分钟文件数、缓存命中率）"""
+    try:
+        from services.media_metadata_service import get_metadata_service
+        
+        return {
+            "success": True,
+            "data": get_metadata_service().get_stats()
+        }
+    except Exception as e:
+        logger.error(f"获取元数据服务统计失败: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@router.get("/auth-cache/stats")
+async def get_auth_cache_stats(
+    current_user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取认证用户缓存统计（命中率、省去的令牌解码与用户查询耗时）"""
+    try:
+        from auth import get_user_cache
+        
+        return {
+            "success": True,
+            "data": get_user_cache().get_stats()
+        }
+    except Exception as e:
+        logger.error(f"获取认证缓存统计失败: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@router.get("/upload-scheduler/stats")
+async def get_upload_scheduler_stats(
+    current_user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取上传调度器统计信息（排队、各规则队列、当前限速、暂停状态）"""
+    try:
+        from services.upload_scheduler import get_upload_scheduler
+        
+        return {
+            "success": True,
+            "data": get_upload_scheduler().get_stats()
+        }
+    except Exception as e:
+        logger.error(f"获取上传调度器统计失败: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@router.post("/upload-scheduler/pause")
+async def pause_upload_scheduler(
+    current_user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """暂停上传（进行中的上传在下一个数据块前等待）"""
+    try:
+        from services.upload_scheduler import get_upload_scheduler
+        get_upload_scheduler().pause()
+        
+        return {
+            "success": True,
+            "message": "上传已暂停"
+        }
+    except Exception as e:
+        logger.error(f"暂停上传失败: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@router.post("/upload-scheduler/resume")
+async def resume_upload_scheduler(
+    current_user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """恢复上传"""
+    try:
+        from services.upload_scheduler import get_upload_scheduler
+        get_upload_scheduler().resume()
+        
+        return {
+            "success": True,
+            "message": "上传已恢复"
+        }
+    except Exception as e:
+        logger.error(f"恢复上传失败: {e}")
+        return {"success": False, "error": str(e)}
+
+
 @router.get("/filter-engine/stats")
 async def get_filter_engine_stats(
     current_user: Any = Depends(get_current_user)
@@ -0,0 +1,88 @@
+"""
+实时进度API路由
+
+统一推送下载、上传、离线任务的实时进度（SSE）
+"""
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Set
+import asyncio
+import json
+
+from log_manager import get_logger
+from services.common.progress_bus import get_progress_bus
+
+logger = get_logger('api.progress', 'api.log')
+
+router = APIRouter()
+
+
+def _parse_kinds(kinds: Optional[str]) -> Optional[Set[str]]:
+    return set(k.strip() for k in kinds.split(',') if k.strip()) if kinds else None
+
+
+@router.get("")
+async def get_progress_snapshot(
+    kinds: Optional[str] = Query(default=None, description="以逗号分隔的任务类型过滤: download,upload,offline"),
+):
+    """获取当前所有任务的实时进度"""
+    try:
+        return {
+            "success": True,
+            "tasks": get_progress_bus().snapshot(_parse_kinds(kinds))
+        }
+    except Exception as e:
+        logger.error(f"获取实时进度失败: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"获取实时进度失败: {str(e)}"}
+        )
+
+
+@router.get("/stats")
+async def get_progress_stats():
+    """获取进度总线统计"""
+    return {"success": True, "stats": get_progress_bus().get_stats()}
+
+
+@router.get("/stream")
+async def stream_progress(
+    kinds: Optional[str] = Query(default=None, description="以逗号分隔的任务类型过滤: download,upload,offline"),
+    frame_ms: int = Query(default=500, ge=100, le=5000, description="推送帧间隔（毫秒），帧内的多次更新会被合并"),
+):
+    """
+    实时进度流（SSE）
+
+    连接后先推送一次完整快照，之后只推送发生变化的任务：
+    - {"type": "snapshot", "tasks": [...]}
+    - {"type": "progress", "tasks": [...]}  （已移除的任务为 {"key": ..., "removed": true}）
+    - 空闲时每15秒发送心跳注释
+    """
+    kind_filter = _parse_kinds(kinds)
+    frame_interval = frame_ms / 1000
+
+    async def event_generator():
+        bus = get_progress_bus()
+        subscription = bus.subscribe(kind_filter)
+        try:
+            yield f"data: {json.dumps({'type': 'snapshot', 'tasks': bus.snapshot(kind_filter)}, ensure_ascii=False)}\n\n"
+            while True:
+                changes = await subscription.next_batch(frame_interval, timeout=15)
+                if changes:
+                    yield f"data: {json.dumps({'type': 'progress', 'tasks': changes}, ensure_ascii=False)}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        except asyncio.CancelledError:
+            pass
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
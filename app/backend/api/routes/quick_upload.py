@@ -6,7 +6,7 @@ from pydantic import BaseModel, Field
 from typing import Any
 
 from api.dependencies import get_current_user
-from services.quick_upload_service import get_quick_upload_service, calculate_file_sha1
+from services.quick_upload_service import get_quick_upload_service, calculate_file_sha1_async
 from log_manager import get_logger
 
 logger = get_logger('quick_upload_api', 'enhanced_bot.log')
@@ -31,7 +31,7 @@ async def calculate_sha1(
 ):
     """计算文件SHA1"""
     try:
-        sha1_hash = calculate_file_sha1(request.file_path)
+        sha1_hash = await calculate_file_sha1_async(request.file_path)
         
         if sha1_hash:
             return {
@@ -68,6 +68,7 @@ async def check_quick(
                 "file_path": result.file_path,
                 "file_size": result.file_size,
                 "sha1": result.sha1_hash,
+                "preid": result.preid,
                 "is_quick": result.is_quick,
                 "check_time": result.check_time,
                 "error": result.error
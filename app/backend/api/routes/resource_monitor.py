@@ -11,6 +11,7 @@ import json
 from database import get_db
 from models import ResourceMonitorRule, ResourceRecord
 from log_manager import get_logger
+from services.common.rule_events import publish_rule_change, KIND_RESOURCE_MONITOR, OP_CREATED, OP_UPDATED, OP_DELETED
 from timezone_utils import get_user_now
 
 logger = get_logger("resource_monitor_api", "web_api.log")
@@ -135,6 +136,7 @@ async def create_rule(
         await db.refresh(rule)
         
         logger.info(f"✅ 创建资源监控规则: {rule.name} (使用系统115账号)")
+        publish_rule_change(KIND_RESOURCE_MONITOR, rule.id, OP_CREATED)
         
         return {
             "success": True,
@@ -195,6 +197,7 @@ async def update_rule(
         await db.commit()
         
         logger.info(f"✅ 更新资源监控规则: {rule.name}")
+        publish_rule_change(KIND_RESOURCE_MONITOR, rule_id, OP_UPDATED)
         
         return {"success": True, "message": "规则更新成功"}
     except HTTPException:
@@ -224,6 +227,7 @@ async def delete_rule(
         await db.commit()
         
         logger.info(f"✅ 删除资源监控规则: {rule.name}")
+        publish_rule_change(KIND_RESOURCE_MONITOR, rule_id, OP_DELETED)
         
         return {"success": True, "message": "规则删除成功"}
     except HTTPException:
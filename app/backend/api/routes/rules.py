@@ -13,6 +13,7 @@ from log_manager import get_logger
 from api.dependencies import get_enhanced_bot
 from auth import get_current_user
 from models import User
+from services.common.rule_events import publish_rule_change, KIND_FORWARD, OP_UPDATED, OP_RELOAD
 import json
 from datetime import datetime
 
@@ -449,6 +450,7 @@ async def create_keyword(rule_id: int, request: Request):
             db.add(keyword)
             await db.commit()
             await db.refresh(keyword)
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             
             return JSONResponse({
                 "success": True,
@@ -499,6 +501,7 @@ async def update_keyword(keyword_id: int, request: Request):
             
             await db.commit()
             await db.refresh(keyword)
+            publish_rule_change(KIND_FORWARD, keyword.rule_id, OP_UPDATED)
             
             return JSONResponse({
                 "success": True,
@@ -525,15 +528,19 @@ async def delete_keyword(keyword_id: int):
     try:
         from models import Keyword
         from database import get_db
-        from sqlalchemy import delete
+        from sqlalchemy import delete, select
         
         async for db in get_db():
+            rule_id = (await db.execute(
+                select(Keyword.rule_id).where(Keyword.id == keyword_id)
+            )).scalar_one_or_none()
             result = await db.execute(
                 delete(Keyword).where(Keyword.id == keyword_id)
             )
             await db.commit()
             
             if result.rowcount > 0:
+                publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
                 return JSONResponse({
                     "success": True,
                     "message": "关键词删除成功"
@@ -579,6 +586,7 @@ async def batch_create_keywords(rule_id: int, request: Request):
                 created_keywords.append(keyword)
             
             await db.commit()
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             
             # 刷新所有创建的关键词以获取ID
             for kw in created_keywords:
@@ -675,6 +683,7 @@ async def create_replacement(rule_id: int, request: Request):
             db.add(replacement)
             await db.commit()
             await db.refresh(replacement)
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             
             return JSONResponse({
                 "success": True,
@@ -737,6 +746,7 @@ async def update_replacement(replacement_id: int, request: Request):
             
             await db.commit()
             await db.refresh(replacement)
+            publish_rule_change(KIND_FORWARD, replacement.rule_id, OP_UPDATED)
             
             return JSONResponse({
                 "success": True,
@@ -789,6 +799,7 @@ async def toggle_replacement(replacement_id: int, request: Request):
             
             await db.commit()
             await db.refresh(replacement)
+            publish_rule_change(KIND_FORWARD, replacement.rule_id, OP_UPDATED)
             
             return JSONResponse({
                 "success": True,
@@ -812,15 +823,19 @@ async def delete_replacement(replacement_id: int):
     try:
         from models import ReplaceRule
         from database import get_db
-        from sqlalchemy import delete
+        from sqlalchemy import delete, select
         
         async for db in get_db():
+            rule_id = (await db.execute(
+                select(ReplaceRule.rule_id).where(ReplaceRule.id == replacement_id)
+            )).scalar_one_or_none()
             result = await db.execute(
                 delete(ReplaceRule).where(ReplaceRule.id == replacement_id)
             )
             await db.commit()
             
             if result.rowcount > 0:
+                publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
                 return JSONResponse({
                     "success": True,
                     "message": "替换规则删除成功"
@@ -1109,6 +1124,9 @@ async def import_rules(
             await db.commit()
             
             logger.info(f"导入规则成功: {imported_count}/{len(data)} 条")
+            if imported_count:
+                # 批量导入：通知订阅者重新加载全部转发规则
+                publish_rule_change(KIND_FORWARD, None, OP_RELOAD)
             
             return JSONResponse({
                 "success": True,
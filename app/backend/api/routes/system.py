@@ -6,7 +6,7 @@
 提供系统健康检查、状态等信息
 """
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Body
 from fastapi.responses import JSONResponse
 from log_manager import get_logger
 import json
@@ -511,6 +511,78 @@ async def stream_container_logs(
     )
 
 
+def _resolve_log_files(sources: Optional[str]) -> list:
+    """按来源过滤返回日志目录中的 .log 文件"""
+    logs_dir = Path(getattr(Config, 'LOGS_DIR', '/app/logs'))
+    if not logs_dir.exists():
+        return []
+    wanted = set(s.strip() for s in sources.split(',') if s.strip()) if sources else None
+    return sorted(p for p in logs_dir.glob('*.log') if wanted is None or p.name in wanted)
+
+
+@router.get("/container-logs/stats")
+async def container_log_stats(
+    sources: Optional[str] = Query(default=None, description="以逗号分隔的日志文件名过滤"),
+):
+    """
+    应用日志统计（列式批处理）
+
+    每个文件按分段解析并缓存，只有新增内容会被重新解析
+    """
+    from utils.log_parser import LogAggregator
+
+    try:
+        def compute():
+            return {
+                path.name: LogAggregator.aggregate_columns(LogAggregator.load_file(str(path)))
+                for path in _resolve_log_files(sources)
+            }
+
+        stats = await asyncio.get_running_loop().run_in_executor(None, compute)
+        return JSONResponse(content={"success": True, "stats": stats})
+    except Exception as e:
+        logger.error(f"获取日志统计失败: {e}")
+        return JSONResponse(content={
+            "success": False,
+            "message": f"获取日志统计失败: {str(e)}"
+        }, status_code=500)
+
+
+@router.post("/container-logs/related")
+async def container_log_related(
+    source: str = Body(..., description="日志文件名"),
+    raw: str = Body(..., description="目标日志原始行"),
+    context_size: int = Body(5, ge=0, le=100, description="上下文大小（前后各N条）"),
+):
+    """查找与目标日志相关的日志（时间上下文 + 共享实体）"""
+    from utils.log_parser import LogAggregator
+
+    try:
+        files = _resolve_log_files(source)
+        if not files:
+            return JSONResponse(content={"success": False, "message": "日志文件不存在"}, status_code=404)
+
+        def compute():
+            columns = LogAggregator.load_file(str(files[0]))
+            target = raw.strip()
+            # 从尾部查找，优先匹配最近的一条
+            for row in range(len(columns) - 1, -1, -1):
+                if columns.raw[row] == target:
+                    return LogAggregator.find_related_rows(columns, row, context_size)
+            return None
+
+        related = await asyncio.get_running_loop().run_in_executor(None, compute)
+        if related is None:
+            return JSONResponse(content={"success": False, "message": "未找到目标日志"}, status_code=404)
+        return JSONResponse(content={"success": True, "logs": related})
+    except Exception as e:
+        logger.error(f"查找相关日志失败: {e}")
+        return JSONResponse(content={
+            "success": False,
+            "message": f"查找相关日志失败: {str(e)}"
+        }, status_code=500)
+
+
 @router.get("/enhanced-status")
 async def enhanced_status():
     """
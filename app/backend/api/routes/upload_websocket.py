@@ -4,7 +4,8 @@
 实时推送上传进度到前端
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Set
+from collections import deque
+from typing import Deque, Dict, Optional, Set
 import asyncio
 import json
 from services.upload_progress_manager import get_progress_manager, UploadProgress
@@ -12,69 +13,194 @@ from services.upload_progress_manager import get_progress_manager, UploadProgres
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
 
+class _ConnectionQueue:
+    """
+    单个WebSocket连接的发送队列
+
+    每个连接拥有独立的发送任务，慢客户端只会积压自己的队列。
+    队列满时丢弃最旧的增量消息，并标记为需要重新同步：
+    下一次发送时改发完整快照，保证客户端状态最终一致。
+    """
+    
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: Deque[dict] = deque()
+        self.needs_snapshot = True  # 新连接先发送完整快照
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        self.sender_task: Optional[asyncio.Task] = None
+    
+    def push(self, message: dict):
+        """入队（不阻塞）"""
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.dropped += 1
+            self.needs_snapshot = True
+        self.queue.append(message)
+        self.wakeup.set()
+
+
 class UploadWebSocketManager:
-    """WebSocket连接管理器"""
+    """
+    WebSocket连接管理器
+    
+    由 UploadProgressManager 的进度变化事件驱动：
+    1. 监听器只记录发生变化的文件（脏集合）
+    2. 推送任务在一个帧预算内合并同一文件的多次更新
+    3. 只发送相对上一帧变化的字段（增量），移除的文件单独列出
+    4. 每个连接独立排队发送，互不阻塞
+    """
     
-    def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+    def __init__(self, frame_interval: float = 0.2, max_queue: int = 50):
+        self.frame_interval = frame_interval
+        self.max_queue = max_queue
+        self.active_connections: Dict[WebSocket, _ConnectionQueue] = {}
         self._broadcast_task: asyncio.Task = None
+        self._dirty: Set[str] = set()
+        self._dirty_event = asyncio.Event()
+        # 最近一帧已发送的状态（增量计算基准，也是新连接的快照来源）
+        self._sent_state: Dict[str, dict] = {}
         
     async def connect(self, websocket: WebSocket):
         """接受WebSocket连接"""
         await websocket.accept()
-        self.active_connections.add(websocket)
         
-        # 如果是第一个连接，启动广播任务
-        if len(self.active_connections) == 1 and not self._broadcast_task:
+        # 如果是第一个连接，订阅进度事件并启动推送任务
+        if not self.active_connections and not self._broadcast_task:
+            progress_mgr = get_progress_manager()
+            self._sent_state = {
+                file_path: progress.to_dict()
+                for file_path, progress in progress_mgr.snapshot().items()
+            }
+            self._dirty.clear()
+            self._dirty_event.clear()
+            progress_mgr.add_listener(self._on_progress)
             self._broadcast_task = asyncio.create_task(self._broadcast_loop())
+        
+        conn = _ConnectionQueue(websocket, self.max_queue)
+        conn.sender_task = asyncio.create_task(self._sender_loop(conn))
+        self.active_connections[websocket] = conn
     
     def disconnect(self, websocket: WebSocket):
         """断开WebSocket连接"""
-        self.active_connections.discard(websocket)
+        conn = self.active_connections.pop(websocket, None)
+        if conn and conn.sender_task and conn.sender_task is not asyncio.current_task():
+            conn.sender_task.cancel()
         
-        # 如果没有连接了，停止广播任务
+        # 如果没有连接了，停止推送任务并取消订阅
         if len(self.active_connections) == 0 and self._broadcast_task:
+            get_progress_manager().remove_listener(self._on_progress)
             self._broadcast_task.cancel()
             self._broadcast_task = None
     
     async def broadcast(self, message: dict):
-        """广播消息到所有连接"""
-        disconnected = set()
+        """广播消息到所有连接（仅入队，不等待发送完成）"""
+        for conn in list(self.active_connections.values()):
+            conn.push(message)
+    
+    async def broadcast_to(self, websocket: WebSocket, message: dict):
+        """向单个连接发送消息（经由其发送队列，避免与推送任务并发写入）"""
+        conn = self.active_connections.get(websocket)
+        if conn:
+            conn.push(message)
+    
+    def get_stats(self) -> dict:
+        """连接与队列统计"""
+        return {
+            "connections": len(self.active_connections),
+            "tracked_uploads": len(self._sent_state),
+            "queued_messages": sum(len(c.queue) for c in self.active_connections.values()),
+            "dropped_messages": sum(c.dropped for c in self.active_connections.values()),
+        }
+    
+    def _on_progress(self, file_path: str, progress: Optional[UploadProgress]):
+        """进度变化监听器：只做标记，由推送任务统一处理"""
+        self._dirty.add(file_path)
+        self._dirty_event.set()
+    
+    def _snapshot_message(self) -> dict:
+        return {
+            "type": "upload_progress",
+            "data": {
+                "uploads": list(self._sent_state.values())
+            }
+        }
+    
+    def _build_delta(self, dirty: Set[str]) -> Optional[dict]:
+        """计算脏文件相对上一帧的增量"""
+        progresses = get_progress_manager().snapshot()
+        updated = []
+        removed = []
         
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.add(connection)
+        for file_path in dirty:
+            progress = progresses.get(file_path)
+            previous = self._sent_state.get(file_path)
+            
+            if progress is None:
+                if previous is not None:
+                    del self._sent_state[file_path]
+                    removed.append(file_path)
+                continue
+            
+            current = progress.to_dict()
+            self._sent_state[file_path] = current
+            if previous is None:
+                updated.append(current)
+                continue
+            
+            changed = {key: value for key, value in current.items() if previous.get(key) != value}
+            if changed:
+                changed['file_path'] = file_path
+                updated.append(changed)
         
-        # 移除断开的连接
-        for conn in disconnected:
-            self.disconnect(conn)
+        if not updated and not removed:
+            return None
+        return {
+            "type": "upload_progress_delta",
+            "data": {
+                "updated": updated,
+                "removed": removed
+            }
+        }
     
     async def _broadcast_loop(self):
-        """定期广播上传进度"""
+        """事件驱动的进度推送"""
         try:
             while True:
-                # 每500ms广播一次进度
-                await asyncio.sleep(0.5)
+                await self._dirty_event.wait()
+                # 在帧预算内合并同一文件的多次更新
+                await asyncio.sleep(self.frame_interval)
+                self._dirty_event.clear()
+                dirty, self._dirty = self._dirty, set()
                 
-                # 获取所有上传任务的进度
-                progress_mgr = get_progress_manager()
-                progresses = await progress_mgr.list_progresses()
-                
-                if progresses:
-                    message = {
-                        "type": "upload_progress",
-                        "data": {
-                            "uploads": [
-                                progress.to_dict()
-                                for progress in progresses.values()
-                            ]
-                        }
-                    }
+                message = self._build_delta(dirty)
+                if message:
                     await self.broadcast(message)
         except asyncio.CancelledError:
             pass
+    
+    async def _sender_loop(self, conn: _ConnectionQueue):
+        """单连接发送任务"""
+        try:
+            while True:
+                await conn.wakeup.wait()
+                conn.wakeup.clear()
+                
+                while conn.needs_snapshot or conn.queue:
+                    if conn.needs_snapshot:
+                        # 快照已包含此前所有增量，丢弃积压的消息
+                        conn.needs_snapshot = False
+                        conn.queue.clear()
+                        message = self._snapshot_message()
+                    else:
+                        message = conn.queue.popleft()
+                    await conn.websocket.send_json(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.disconnect(conn.websocket)
 
 
 # 全局WebSocket管理器
@@ -89,11 +215,13 @@ async def upload_progress_websocket(websocket: WebSocket):
     前端连接: ws://localhost:8000/ws/upload/progress
     
     消息格式:
+    连接建立（或发送队列溢出）时推送完整快照:
     {
         "type": "upload_progress",
         "data": {
             "uploads": [
                 {
+                    "file_path": "/app/media/video.mp4",
                     "file_name": "video.mp4",
                     "status": "uploading",
                     "percentage": 45.5,
@@ -103,6 +231,15 @@ async def upload_progress_websocket(websocket: WebSocket):
             ]
         }
     }
+    
+    之后只推送增量（仅包含变化的字段，按 file_path 合并）:
+    {
+        "type": "upload_progress_delta",
+        "data": {
+            "updated": [{"file_path": "/app/media/video.mp4", "percentage": 47.1}],
+            "removed": ["/app/media/old.mp4"]
+        }
+    }
     """
     await ws_manager.connect(websocket)
     
@@ -117,7 +254,7 @@ async def upload_progress_websocket(websocket: WebSocket):
                 message = json.loads(data)
                 
                 if message.get('type') == 'ping':
-                    await websocket.send_json({
+                    await ws_manager.broadcast_to(websocket, {
                         'type': 'pong',
                         'timestamp': message.get('timestamp')
                     })
@@ -3,14 +3,19 @@
 """
 import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, event, inspect as sa_inspect
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import make_transient_to_detached
 
 from database import get_db
 from models import User
@@ -41,8 +46,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('JWT_EXPIRE_MINUTES', 24 * 60))  # 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# HTTP Bearer 认证
-security = HTTPBearer()
+# HTTP Bearer 认证（令牌也可能来自查询参数，由中间件解码后放在 request.state）
+security = HTTPBearer(auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -68,32 +73,160 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """解码并验证访问令牌（记录解码耗时），无效时抛出 JWTError"""
+    started = time.perf_counter()
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    get_user_cache().record('decode', time.perf_counter() - started)
+    return payload
+
+
+class UserCache:
+    """
+    已认证用户的短期缓存
+    
+    按用户名缓存用户行的列值，命中时不再查询数据库，而是在当前请求的会话中
+    重建一个已持久化的 User 实例（路由对 current_user 的修改仍会正常提交）；
+    任何 User 行的更新或删除（修改资料、改密码、停用、删除）都会清空缓存
+    """
+    
+    def __init__(self, ttl: float = 30, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in sa_inspect(User).column_attrs]
+        self._timings = {'decode': [0, 0.0], 'lookup': [0, 0.0]}  # 次数, 累计耗时
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'decodes_skipped': 0,
+        }
+    
+    def get(self, username: str, db: AsyncSession) -> Optional[User]:
+        """命中时返回挂到 db 会话上的 User 实例"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] <= time.monotonic():
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            values = entry[0]
+        
+        user = User(**values)
+        make_transient_to_detached(user)
+        try:
+            db.add(user)
+        except InvalidRequestError:
+            # 会话中已有同一用户的实例
+            return None
+        return user
+    
+    def put(self, user: User):
+        values = {key: getattr(user, key) for key in self._columns}
+        with self._lock:
+            self._entries[user.username] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self.stats['invalidations'] += 1
+    
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            timing = self._timings[kind]
+            timing[0] += 1
+            timing[1] += seconds
+    
+    def _avg(self, kind: str) -> float:
+        count, total = self._timings[kind]
+        return total / count if count else 0.0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """统计信息（节省耗时按平均解码/查询耗时估算）"""
+        avg_decode, avg_lookup = self._avg('decode'), self._avg('lookup')
+        saved = self.stats['decodes_skipped'] * avg_decode + self.stats['hits'] * avg_lookup
+        requests = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'cached_users': len(self._entries),
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(self.stats['hits'] / requests * 100, 2) if requests else 0.0,
+            'avg_decode_ms': round(avg_decode * 1000, 3),
+            'avg_lookup_ms': round(avg_lookup * 1000, 3),
+            'saved_ms_total': round(saved * 1000, 1),
+            'saved_ms_per_request': round(saved * 1000 / requests, 3) if requests else 0.0,
+        }
+
+
+_user_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    """获取用户缓存单例"""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache()
+    return _user_cache
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_cache(mapper, connection, target):
+    get_user_cache().invalidate()
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: AsyncSession = Depends(get_db)
 ) -> User:
-    """获取当前登录用户"""
+    """
+    获取当前登录用户
+    
+    优先使用认证中间件已解码的令牌（request.state.token_payload），
+    用户行来自短期缓存，未命中时查询数据库
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cache = get_user_cache()
     
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    payload = getattr(request.state, 'token_payload', None)
+    if payload is not None:
+        cache.stats['decodes_skipped'] += 1
+    else:
+        if credentials is None:
             raise credentials_exception
-    except JWTError:
+        try:
+            payload = decode_access_token(credentials.credentials)
+        except JWTError:
+            raise credentials_exception
+    
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
     
+    user = cache.get(username, db)
+    if user is not None:
+        return user
+    
+    started = time.perf_counter()
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
+    cache.record('lookup', time.perf_counter() - started)
     
     if user is None:
         raise credentials_exception
     
+    cache.put(user)
     return user
 
 
@@ -13,7 +13,7 @@ import os
 from pathlib import Path
 
 # 导入API路由
-from api.routes import system, rules, logs, chats, clients, settings, dashboard, auth, users, media_monitor, media_files, media_settings, pan115, clouddrive2_settings, resource_monitor, performance, notifications, upload_progress, upload_websocket
+from api.routes import system, rules, logs, chats, clients, settings, dashboard, auth, users, media_monitor, media_files, media_settings, pan115, clouddrive2_settings, resource_monitor, performance, notifications, upload_progress, upload_websocket, progress
 
 # 导入核心业务逻辑
 from enhanced_bot import EnhancedTelegramBot
@@ -63,20 +63,31 @@ async def lifespan(app: FastAPI):
         from services.common.message_cache import init_message_cache
         from services.common.retry_queue import init_retry_queue
         from services.common.batch_writer import init_batch_writer
+        from services.common.progress_bus import init_progress_bus
         from services.resource_monitor_service import register_retry_handlers
         
         await init_message_cache()
         logger.info("✅ 消息缓存管理器已启动")
         
+        # 先注册重试处理器，再启动重试队列（日志中恢复的任务会立即到期）
+        register_retry_handlers()
+        logger.info("✅ 重试处理器已注册")
+        
         await init_retry_queue()
         logger.info("✅ 智能重试队列已启动")
         
         await init_batch_writer()
         logger.info("✅ 批量数据库写入器已启动")
         
-        # 注册重试处理器
-        register_retry_handlers()
-        logger.info("✅ 重试处理器已注册")
+        await init_progress_bus()
+        logger.info("✅ 实时进度总线已启动")
+        
+        from services.notification_service import get_notification_rule_index
+        await get_notification_rule_index().start()
+        
+        from services.offline_task_monitor import get_offline_monitor
+        await get_offline_monitor().start()
+        logger.info("✅ 离线任务监控已启动")
         
         # 初始化EnhancedBot
         enhanced_bot_instance = EnhancedTelegramBot()
@@ -97,6 +108,7 @@ async def lifespan(app: FastAPI):
             from services.common.message_cache import get_message_cache
             from services.common.retry_queue import get_retry_queue
             from services.common.batch_writer import get_batch_writer
+            from services.common.progress_bus import get_progress_bus
             
             cache = get_message_cache()
             await cache.stop()
@@ -109,6 +121,26 @@ async def lifespan(app: FastAPI):
             batch_writer = get_batch_writer()
             await batch_writer.stop()
             logger.info("✅ 批量数据库写入器已停止")
+            
+            progress_bus = get_progress_bus()
+            await progress_bus.stop()
+            logger.info("✅ 实时进度总线已停止")
+            
+            from services.offline_task_monitor import get_offline_monitor
+            await get_offline_monitor().stop()
+            logger.info("✅ 离线任务监控已停止")
+            
+            from services.media_preview_service import get_media_preview_service
+            get_media_preview_service().shutdown()
+            
+            from services.clouddrive2_pool import get_clouddrive2_pool
+            await get_clouddrive2_pool().stop()
+            
+            from services.upload_resume_manager import get_resume_manager
+            await get_resume_manager().close()
+            
+            from services.notification_service import get_notification_rule_index
+            get_notification_rule_index().stop()
         except Exception as e:
             logger.error(f"停止性能优化组件失败: {e}")
         
@@ -262,6 +294,7 @@ app.include_router(resource_monitor.router, prefix="/api/resources", tags=["资
 app.include_router(performance.router, prefix="/api/performance", tags=["性能监控"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["通知系统"])
 app.include_router(upload_progress.router, prefix="/api", tags=["上传进度"])
+app.include_router(progress.router, prefix="/api/progress", tags=["实时进度"])
 app.include_router(upload_websocket.router, tags=["WebSocket"])
 
 
@@ -1,11 +1,11 @@
 """
 中间件 - 全局请求处理
 """
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from jose import JWTError, jwt
-from auth import SECRET_KEY, ALGORITHM
+from jose import JWTError
+from auth import decode_access_token
 from log_manager import get_logger
 
 logger = get_logger('middleware', 'api.log')
@@ -67,17 +67,15 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = decode_access_token(token)
             username = payload.get("sub")
             
             if username is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid authentication credentials"
-                )
+                raise JWTError("Invalid authentication credentials")
             
-            # 将用户信息添加到request state（可选）
+            # 解码结果放入 request state，get_current_user 直接使用，不再重复解码
             request.state.username = username
+            request.state.token_payload = payload
             
         except JWTError as e:
             logger.warning(f"🚫 Token验证失败: {path} - {str(e)}")
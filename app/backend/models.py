@@ -4,7 +4,7 @@
 from datetime import datetime, timezone
 import os
 from typing import List, Optional
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import bcrypt
@@ -453,6 +453,8 @@ class DownloadTask(Base):
     total_bytes = Column(Integer, comment='总字节数')
     progress_percent = Column(Integer, default=0, comment='进度百分比')
     download_speed_mbps = Column(Integer, comment='下载速度(MB/s)')
+    part_size = Column(Integer, comment='分片下载的分片大小（字节）')
+    parts_bitmap = Column(LargeBinary, comment='已完成分片位图（用于断点续传）')
     
     # 重试信息
     retry_count = Column(Integer, default=0, comment='重试次数')
@@ -469,6 +471,11 @@ class DownloadTask(Base):
     monitor_rule = relationship("MediaMonitorRule", back_populates="download_tasks")
     media_file = relationship("MediaFile", back_populates="download_task", uselist=False)
     
+    # 下载调度器按 (status, priority, created_at) 恢复排队任务
+    __table_args__ = (
+        Index('ix_download_tasks_status_priority_created', 'status', 'priority', 'created_at'),
+    )
+    
     def __repr__(self):
         return f"<DownloadTask(id={self.id}, file='{self.file_name}', status='{self.status}')>"
 
@@ -495,6 +502,8 @@ class MediaSettings(Base):
     # 下载设置
     temp_folder = Column(String(500), default='/app/media/downloads', comment='临时下载文件夹')
     concurrent_downloads = Column(Integer, default=3, comment='并发下载数')
+    download_bandwidth_limit_mbps = Column(Float, default=0, comment='全局下载带宽预算(MB/s)，0表示不限制')
+    download_part_workers = Column(Integer, default=4, comment='单个文件并行下载的分片段数，1表示单流下载')
     retry_on_failure = Column(Boolean, default=True, comment='失败时重试')
     max_retries = Column(Integer, default=3, comment='最大重试次数')
     
@@ -503,6 +512,12 @@ class MediaSettings(Base):
     metadata_mode = Column(String(20), default='lightweight', comment='提取模式：disabled/lightweight/full')
     metadata_timeout = Column(Integer, default=10, comment='超时时间(秒)')
     async_metadata_extraction = Column(Boolean, default=True, comment='异步提取元数据')
+    metadata_workers = Column(Integer, default=2, comment='元数据提取进程数')
+    
+    # 云盘上传
+    upload_concurrency = Column(Integer, default=2, comment='并发上传数')
+    upload_bandwidth_limit_mbps = Column(Float, default=0, comment='全局上传限速(MB/s)，0表示不限制')
+    upload_bandwidth_schedule = Column(Text, comment='分时段上传限速(JSON：[{start, end, limit_mbps}])')
     
     # 存储清理
     auto_cleanup_enabled = Column(Boolean, default=True, comment='启用自动清理')
@@ -576,6 +591,41 @@ class MediaFile(Base):
         return f"<MediaFile(id={self.id}, name='{self.file_name}', type='{self.file_type}')>"
 
 
+class UploadTask(Base):
+    """云盘上传任务模型（上传调度器的持久化队列）"""
+    __tablename__ = 'upload_tasks'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    media_file_id = Column(Integer, ForeignKey('media_files.id', ondelete='CASCADE'), comment='关联的媒体文件ID')
+    monitor_rule_id = Column(Integer, index=True, comment='关联的监控规则ID（用于规则间公平调度）')
+    
+    # 文件信息
+    local_path = Column(String(500), nullable=False, comment='本地文件路径')
+    remote_dir = Column(String(500), nullable=False, comment='CloudDrive2 目标目录')
+    file_name = Column(String(255), comment='文件名')
+    file_size = Column(Integer, default=0, comment='文件大小（字节）')
+    
+    # 任务状态
+    status = Column(String(20), default='pending', comment='任务状态：pending/uploading/success/failed/cancelled')
+    priority = Column(Integer, default=0, comment='优先级：-10到10')
+    attempts = Column(Integer, default=0, comment='已尝试次数')
+    max_attempts = Column(Integer, default=3, comment='最大尝试次数')
+    last_error = Column(Text, comment='最后一次错误信息')
+    
+    # 时间戳
+    created_at = Column(DateTime, default=get_local_now, comment='创建时间')
+    started_at = Column(DateTime, comment='开始上传时间')
+    completed_at = Column(DateTime, comment='完成时间')
+    
+    # 上传调度器按 (status, priority, created_at) 恢复排队任务
+    __table_args__ = (
+        Index('ix_upload_tasks_status_priority_created', 'status', 'priority', 'created_at'),
+    )
+    
+    def __repr__(self):
+        return f"<UploadTask(id={self.id}, file='{self.file_name}', status='{self.status}')>"
+
+
 # ==================== 资源监控模型 ====================
 
 class ResourceMonitorRule(Base):
@@ -735,3 +785,52 @@ class NotificationLog(Base):
     
     def __repr__(self):
         return f"<NotificationLog(id={self.id}, type='{self.notification_type}', status='{self.status}')>"
+
+
+class OfflineTaskRecord(Base):
+    """115离线任务跟踪模型（离线任务监控重启后据此恢复）"""
+    __tablename__ = 'offline_tasks'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String(64), nullable=False, unique=True, index=True, comment='115任务ID（info_hash）')
+    task_url = Column(Text, comment='下载链接（磁力/HTTP/ed2k）')
+    task_name = Column(String(500), comment='任务名称')
+    file_size = Column(Integer, default=0, comment='文件大小（字节）')
+    file_id = Column(String(64), comment='完成后的115文件ID')
+    
+    # 任务状态
+    status = Column(String(20), default='pending', index=True, comment='任务状态：pending/downloading/completed/failed/paused')
+    progress = Column(Float, default=0.0, comment='进度（0-100）')
+    download_speed = Column(Integer, default=0, comment='下载速度（字节/秒）')
+    error_message = Column(Text, comment='错误信息')
+    missing_sweeps = Column(Integer, default=0, comment='连续未在115离线列表中出现的轮询次数')
+    
+    # 时间戳
+    created_at = Column(DateTime, default=get_local_now, comment='创建时间')
+    updated_at = Column(DateTime, default=get_local_now, onupdate=get_local_now, comment='更新时间')
+    completed_at = Column(DateTime, comment='完成时间')
+    
+    def __repr__(self):
+        return f"<OfflineTaskRecord(task_id='{self.task_id}', status='{self.status}', progress={self.progress})>"
+
+
+class MediaMetadataRecord(Base):
+    """媒体元数据探测记录（pending 为持久化探测队列，done 为按文件哈希的结果缓存）"""
+    __tablename__ = 'media_metadata'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_hash = Column(String(64), nullable=False, unique=True, index=True, comment='文件哈希(SHA-256)')
+    mode = Column(String(20), default='lightweight', comment='提取模式：lightweight/full')
+    status = Column(String(20), default='pending', index=True, comment='状态：pending/done/failed')
+    file_path = Column(String(500), comment='探测时的文件路径')
+    metadata_json = Column(Text, comment='元数据JSON')
+    error = Column(Text, comment='错误信息')
+    attempts = Column(Integer, default=0, comment='探测次数')
+    probe_ms = Column(Integer, comment='最近一次探测耗时(毫秒)')
+    
+    # 时间戳
+    created_at = Column(DateTime, default=get_local_now, comment='创建时间')
+    updated_at = Column(DateTime, default=get_local_now, onupdate=get_local_now, comment='更新时间')
+    
+    def __repr__(self):
+        return f"<MediaMetadataRecord(file_hash='{self.file_hash}', mode='{self.mode}', status='{self.status}')>"
@@ -17,6 +17,7 @@ from database import get_db
 from models import ForwardRule, Keyword, ReplaceRule, MessageLog, UserSession, BotSettings
 from filters import KeywordFilter, RegexReplacer, MessageProcessor
 from timezone_utils import get_user_now
+from services.common.rule_events import publish_rule_change, KIND_FORWARD, OP_CREATED, OP_UPDATED, OP_DELETED
 
 # 性能优化：缓存装饰器
 def cache_result(ttl: int = 300):
@@ -98,6 +99,7 @@ class ForwardRuleService:
             await db.refresh(rule)
             
             logger.info(f"✅ 创建转发规则成功: {rule.name}, ID: {rule.id}")
+            publish_rule_change(KIND_FORWARD, rule.id, OP_CREATED)
             return rule
     
     @staticmethod
@@ -216,8 +218,9 @@ class ForwardRuleService:
                         logger.info(f"✅ 更新转发规则成功: {rule_id}, 更新字段: {list(kwargs.keys())}, 影响行数: {result.rowcount}")
                         logger.info(f"📊 状态变化: {before_value} -> {after_value}")
                         
-                        # 数据库更新成功，前端将获取实时数据
+                        # 数据库更新成功，前端将获取实时数据，运行中的客户端由规则变更总线增量刷新
                         logger.info("✅ 数据库更新完成，前端将获取实时数据")
+                        publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
                         
                         return True
                     else:
@@ -261,6 +264,7 @@ class ForwardRuleService:
                     
                     if result.rowcount > 0:
                         logger.info(f"✅ 删除转发规则成功: rule_id={rule_id}, 影响行数: {result.rowcount}")
+                        publish_rule_change(KIND_FORWARD, rule_id, OP_DELETED)
                         return True
                     else:
                         logger.warning(f"⚠️ 删除规则失败，无影响行数: rule_id={rule_id}")
@@ -301,6 +305,7 @@ class ForwardRuleService:
                 await ReplaceRuleService.copy_replace_rules(source_rule_id, target_rule_id)
                 
                 await db.commit()
+                publish_rule_change(KIND_FORWARD, target_rule_id, OP_UPDATED)
                 return await ForwardRuleService.get_rule_by_id(target_rule_id)
             else:
                 # 创建新规则
@@ -326,6 +331,7 @@ class ForwardRuleService:
                 await KeywordService.copy_keywords(source_rule_id, new_rule.id)
                 await ReplaceRuleService.copy_replace_rules(source_rule_id, new_rule.id)
                 
+                publish_rule_change(KIND_FORWARD, new_rule.id, OP_CREATED)
                 return new_rule
 
 class KeywordService:
@@ -349,6 +355,7 @@ class KeywordService:
             await db.refresh(kw)
             
             logger.info(f"添加关键词: {keyword} (规则ID: {rule_id})")
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             return kw
     
     @staticmethod
@@ -363,12 +370,14 @@ class KeywordService:
     async def delete_keyword(keyword_id: int) -> bool:
         """删除关键词"""
         async for db in get_db():
+            rule_id = (await db.execute(select(Keyword.rule_id).where(Keyword.id == keyword_id))).scalar_one_or_none()
             stmt = delete(Keyword).where(Keyword.id == keyword_id)
             result = await db.execute(stmt)
             await db.commit()
             
             if result.rowcount > 0:
                 logger.info(f"删除关键词: {keyword_id}")
+                publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
                 return True
             return False
     
@@ -381,6 +390,7 @@ class KeywordService:
             await db.commit()
             
             logger.info(f"删除规则 {rule_id} 的所有关键词")
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             return result.rowcount
     
     @staticmethod
@@ -403,6 +413,7 @@ class KeywordService:
             
             await db.commit()
             logger.info(f"复制 {count} 个关键词从规则 {source_rule_id} 到 {target_rule_id}")
+            publish_rule_change(KIND_FORWARD, target_rule_id, OP_UPDATED)
             return count
 
 class ReplaceRuleService:
@@ -426,6 +437,7 @@ class ReplaceRuleService:
             await db.refresh(replace_rule)
             
             logger.info(f"添加替换规则: {name} (规则ID: {rule_id})")
+            publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
             return replace_rule
     
     @staticmethod
@@ -442,12 +454,14 @@ class ReplaceRuleService:
     async def delete_replace_rule(replace_rule_id: int) -> bool:
         """删除替换规则"""
         async for db in get_db():
+            rule_id = (await db.execute(select(ReplaceRule.rule_id).where(ReplaceRule.id == replace_rule_id))).scalar_one_or_none()
             stmt = delete(ReplaceRule).where(ReplaceRule.id == replace_rule_id)
             result = await db.execute(stmt)
             await db.commit()
             
             if result.rowcount > 0:
                 logger.info(f"删除替换规则: {replace_rule_id}")
+                publish_rule_change(KIND_FORWARD, rule_id, OP_UPDATED)
                 return True
             return False
     
@@ -473,6 +487,7 @@ class ReplaceRuleService:
             
             await db.commit()
             logger.info(f"复制 {count} 个替换规则从规则 {source_rule_id} 到 {target_rule_id}")
+            publish_rule_change(KIND_FORWARD, target_rule_id, OP_UPDATED)
             return count
 
 class MessageLogService:
@@ -25,8 +25,11 @@ CloudDrive2 gRPC API 客户端
 """
 import os
 import asyncio
+import base64
 import hashlib
-from typing import Dict, Any, Optional, List, Callable
+import json
+import time
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from pathlib import Path
 
 try:
@@ -38,6 +41,7 @@ except ImportError:
 
 from log_manager import get_logger
 from services.clouddrive2_stub import create_stub, CloudDrive2Stub
+from services.common.chunked_reader import AdaptiveChunkSizer, ChunkReader, TransferMetrics
 
 logger = get_logger(__name__)
 
@@ -51,7 +55,8 @@ class CloudDrive2Config:
         port: int = 19798,
         username: str = "admin",
         password: str = "",
-        use_ssl: bool = False
+        use_ssl: bool = False,
+        channel_options: Optional[List[tuple]] = None
     ):
         self.host = host
         self.port = port
@@ -59,6 +64,26 @@ class CloudDrive2Config:
         self.password = password
         self.use_ssl = use_ssl
         self.address = f"{host}:{port}"
+        # gRPC 频道参数（keepalive、消息大小上限等），None 表示使用 gRPC 默认值
+        self.channel_options = channel_options
+    
+    @property
+    def key(self) -> tuple:
+        """连接标识（用于连接池判断配置是否变化）"""
+        return (self.host, self.port, self.username, self.password, self.use_ssl)
+
+
+def _jwt_expiry(token: Optional[str]) -> Optional[float]:
+    """读取 JWT 的 exp（Unix 时间戳），非 JWT 或没有 exp 时返回 None"""
+    if not token or token.count('.') != 2:
+        return None
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp else None
+    except Exception:
+        return None
 
 
 class CloudDrive2Client:
@@ -82,6 +107,8 @@ class CloudDrive2Client:
         self.channel: Optional[grpc_aio.Channel] = None
         self.stub: Optional[CloudDrive2Stub] = None
         self.token: Optional[str] = None
+        self.auth_token: Optional[str] = None
+        self.token_expires_at: Optional[float] = None
         self._connected = False
         # Remote upload capability and device id persistence
         self._remote_capability_checked: bool = False
@@ -103,10 +130,14 @@ class CloudDrive2Client:
                 credentials = grpc.ssl_channel_credentials()
                 self.channel = grpc_aio.secure_channel(
                     self.config.address,
-                    credentials
+                    credentials,
+                    options=self.config.channel_options
                 )
             else:
-                self.channel = grpc_aio.insecure_channel(self.config.address)
+                self.channel = grpc_aio.insecure_channel(
+                    self.config.address,
+                    options=self.config.channel_options
+                )
             
             # 验证连接并获取认证 token
             await self._authenticate()
@@ -123,6 +154,37 @@ class CloudDrive2Client:
             logger.error(f"❌ CloudDrive2 连接失败: {e}")
             return False
     
+    def is_healthy(self) -> bool:
+        """频道是否可用（未关闭且不处于连接失败状态）"""
+        if not self._connected or not self.channel:
+            return False
+        try:
+            state = self.channel.get_state(try_to_connect=False)
+        except Exception:
+            return False
+        return state not in (
+            grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+            grpc.ChannelConnectivity.SHUTDOWN
+        )
+    
+    async def refresh_auth(self) -> bool:
+        """
+        重新获取认证 token（复用现有频道）
+        
+        获取失败时保留原 token 和过期时间（原 token 可能仍然有效），由调用方稍后重试
+        
+        Returns:
+            bool: 是否获取到新 token
+        """
+        previous_token, previous_expires_at = self.auth_token, self.token_expires_at
+        await self._authenticate()
+        if self.auth_token is None:
+            self.auth_token, self.token_expires_at = previous_token, previous_expires_at
+            return False
+        if self.stub:
+            self.stub.auth_token = self.auth_token
+        return True
+    
     async def _authenticate(self):
         """
         身份验证
@@ -139,6 +201,7 @@ class CloudDrive2Client:
         # 如果 password 字段看起来像 JWT token，直接使用
         if api_token and (api_token.startswith('eyJ') or len(api_token) > 100):
             self.auth_token = api_token
+            self.token_expires_at = _jwt_expiry(api_token)
             logger.info("✅ 使用 API Token 认证")
             return
         
@@ -167,6 +230,11 @@ class CloudDrive2Client:
             
             if response.success and response.token:
                 self.auth_token = response.token
+                # 优先使用服务端返回的过期时间，否则读取 JWT 中的 exp
+                if response.HasField('expiration') and response.expiration.seconds:
+                    self.token_expires_at = float(response.expiration.seconds)
+                else:
+                    self.token_expires_at = _jwt_expiry(response.token)
                 logger.info("✅ 认证成功，已获取 JWT token")
             else:
                 error_msg = response.errorMessage or "Unknown error"
@@ -357,7 +425,8 @@ class CloudDrive2Client:
         local_path: str,
         remote_path: str,
         mount_point: str = "/115",
-        progress_callback: Optional[Callable[[int, int], None]] = None
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         上传文件到 115 网盘（通过 CloudDrive2）
@@ -367,6 +436,7 @@ class CloudDrive2Client:
             remote_path: 远程路径（相对于挂载点）
             mount_point: CloudDrive2 挂载点路径
             progress_callback: 进度回调 (uploaded_bytes, total_bytes)
+            throttle: 带宽限速回调，每发送一个数据块前以块大小调用并等待（由上传调度器提供）
         
         Returns:
             {
@@ -416,7 +486,7 @@ class CloudDrive2Client:
                 logger.info("🔧 使用方案1: 本地挂载上传")
                 result = await self._upload_via_mount(
                     local_path, actual_remote_path, actual_mount_point, 
-                    file_size, progress_callback
+                    file_size, progress_callback, throttle
                 )
             else:
                 # 优先尝试 Remote Upload 能力（可通过 env 关闭）
@@ -432,7 +502,8 @@ class CloudDrive2Client:
                                 local_path=local_path,
                                 remote_path=actual_remote_path,
                                 file_size=file_size,
-                                progress_callback=progress_callback
+                                progress_callback=progress_callback,
+                                throttle=throttle
                             )
                             # 如果走到这里且非 UNIMPLEMENTED，则标记可用
                             self._remote_capable = True
@@ -445,13 +516,13 @@ class CloudDrive2Client:
                                 logger.info(f"ℹ️ Remote Upload 不可用，回退 gRPC 文件写入: {e}")
                                 result = await self._upload_via_grpc(
                                     local_path, actual_remote_path,
-                                    file_size, progress_callback
+                                    file_size, progress_callback, throttle
                                 )
                             else:
                                 logger.error(f"❌ Remote Upload 错误，回退 gRPC 文件写入: {e}")
                                 result = await self._upload_via_grpc(
                                     local_path, actual_remote_path,
-                                    file_size, progress_callback
+                                    file_size, progress_callback, throttle
                                 )
                     else:
                         if self._remote_capable:
@@ -460,19 +531,20 @@ class CloudDrive2Client:
                                 local_path=local_path,
                                 remote_path=actual_remote_path,
                                 file_size=file_size,
-                                progress_callback=progress_callback
+                                progress_callback=progress_callback,
+                                throttle=throttle
                             )
                         else:
                             logger.info("🔧 使用方案2: gRPC API 上传（CreateFile + WriteToFile + CloseFile）")
                             result = await self._upload_via_grpc(
                                 local_path, actual_remote_path,
-                                file_size, progress_callback
+                                file_size, progress_callback, throttle
                             )
                 else:
                     logger.info("🔧 使用方案2: gRPC API 上传（CreateFile + WriteToFile + CloseFile）")
                     result = await self._upload_via_grpc(
                         local_path, actual_remote_path,
-                        file_size, progress_callback
+                        file_size, progress_callback, throttle
                     )
             
             upload_time = time.time() - start_time
@@ -497,7 +569,8 @@ class CloudDrive2Client:
         remote_path: str,
         mount_point: str,
         file_size: int,
-        progress_callback: Optional[Callable[[int, int], None]] = None
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         通过挂载目录上传文件
@@ -539,6 +612,8 @@ class CloudDrive2Client:
                         if not chunk:
                             break
                         
+                        if throttle:
+                            await throttle(len(chunk))
                         dst.write(chunk)
                         uploaded_bytes += len(chunk)
                         
@@ -613,12 +688,33 @@ class CloudDrive2Client:
         logger.info(f"🧭 路径解析: 全局={root}, 规则={rule_path} -> 最终={final_path}")
         return final_root, final_path
     
+    @staticmethod
+    def _new_chunk_sizer() -> AdaptiveChunkSizer:
+        """
+        gRPC 上传的块大小
+
+        CD2_GRPC_CHUNK_BYTES 指定时固定使用该值；否则在 256KB 与上限之间自适应，
+        上限默认为 4MB 减去 16KB 字段开销（服务端默认最大消息大小），可通过 CD2_GRPC_MAX_CHUNK_BYTES 调整
+        """
+        def env_int(name: str) -> int:
+            try:
+                return int(os.getenv(name, '0'))
+            except ValueError:
+                return 0
+        
+        fixed = env_int('CD2_GRPC_CHUNK_BYTES')
+        if fixed > 0:
+            return AdaptiveChunkSizer.fixed(fixed)
+        max_size = env_int('CD2_GRPC_MAX_CHUNK_BYTES') or (4 * 1024 * 1024 - 16 * 1024)
+        return AdaptiveChunkSizer(initial=min(1024 * 1024, max_size), max_size=max_size)
+    
     async def _upload_via_grpc(
         self,
         local_path: str,
         remote_path: str,
         file_size: int,
-        progress_callback: Optional[Callable[[int, int], None]] = None
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         使用 gRPC API 上传文件
@@ -633,6 +729,7 @@ class CloudDrive2Client:
             remote_path: 远程完整路径（如 /CloudNAS/115/2025/10/19/file.mp4）
             file_size: 文件大小
             progress_callback: 进度回调
+            throttle: 带宽限速回调（按数据块调用）
         
         Returns:
             上传结果字典
@@ -720,32 +817,30 @@ class CloudDrive2Client:
                     raise
             
             # 步骤2: 写入文件（优先使用客户端流 WriteToFileStream，若不支持再回退）
+            # 文件在线程池中预读，块大小按实测吞吐自适应；进度按间隔采样记录
             logger.info(f"📤 步骤2: 写入文件数据...")
-            # 默认最大消息大小 4MB，需预留字段开销，保守减去 16KB（可通过环境变量调整）
-            try:
-                env_chunk = int(os.getenv('CD2_GRPC_CHUNK_BYTES', '0'))
-            except Exception:
-                env_chunk = 0
-            chunk_size = env_chunk if env_chunk > 0 else (4 * 1024 * 1024 - 16 * 1024)
+            sizer = self._new_chunk_sizer()
+            metrics = TransferMetrics(file_name, file_size)
             uploaded_bytes = 0
 
             async def request_iterator():
-                nonlocal uploaded_bytes
-                with open(local_path, 'rb') as f:
-                    pos = 0
-                    prev = f.read(chunk_size)
-                    while prev:
-                        nxt = f.read(chunk_size)
-                        is_last = not nxt
-                        yield clouddrive_pb2.WriteFileRequest(
-                            fileHandle=file_handle,
-                            startPos=pos,
-                            length=len(prev),
-                            buffer=prev,
-                            closeFile=is_last
-                        )
-                        pos += len(prev)
-                        prev = nxt
+                async for pos, data in ChunkReader(local_path, sizer).chunks():
+                    if throttle:
+                        await throttle(len(data))
+                    sent_at = time.monotonic()
+                    yield clouddrive_pb2.WriteFileRequest(
+                        fileHandle=file_handle,
+                        startPos=pos,
+                        length=len(data),
+                        buffer=data,
+                        closeFile=pos + len(data) >= file_size
+                    )
+                    # gRPC 取下一条消息时上一块已写入发送缓冲（受 HTTP/2 流控约束），间隔即发送耗时
+                    elapsed = time.monotonic() - sent_at
+                    sizer.record(len(data), elapsed)
+                    metrics.record(len(data), elapsed, sizer)
+                    if progress_callback:
+                        await progress_callback(pos + len(data), file_size)
 
             # 先尝试客户端流
             use_stream = True
@@ -762,30 +857,30 @@ class CloudDrive2Client:
                 logger.info(f"ℹ️ WriteToFileStream 不可用，回退 WriteToFile: {e}")
 
             if not use_stream:
-                with open(local_path, 'rb') as f:
-                    chunk_index = 0
-                    prev = f.read(chunk_size)
-                    while prev:
-                        nxt = f.read(chunk_size)
-                        is_last = not nxt
-                        write_request = clouddrive_pb2.WriteFileRequest(
-                            fileHandle=file_handle,
-                            startPos=uploaded_bytes,
-                            length=len(prev),
-                            buffer=prev,
-                            closeFile=is_last
-                        )
-                        write_response = await self.stub.official_stub.WriteToFile(
-                            write_request,
-                            metadata=self.stub._get_metadata()
-                        )
-                        uploaded_bytes += write_response.bytesWritten
-                        chunk_index += 1
-                        if progress_callback:
-                            await progress_callback(uploaded_bytes, file_size)
-                        progress_percent = (uploaded_bytes / file_size * 100) if file_size > 0 else 100
-                        logger.info(f"   块 {chunk_index}: {uploaded_bytes}/{file_size} ({progress_percent:.1f}%)")
-                        prev = nxt
+                metrics = TransferMetrics(file_name, file_size)
+                async for pos, data in ChunkReader(local_path, sizer).chunks():
+                    if throttle:
+                        await throttle(len(data))
+                    write_request = clouddrive_pb2.WriteFileRequest(
+                        fileHandle=file_handle,
+                        startPos=pos,
+                        length=len(data),
+                        buffer=data,
+                        closeFile=pos + len(data) >= file_size
+                    )
+                    sent_at = time.monotonic()
+                    write_response = await self.stub.official_stub.WriteToFile(
+                        write_request,
+                        metadata=self.stub._get_metadata()
+                    )
+                    elapsed = time.monotonic() - sent_at
+                    sizer.record(len(data), elapsed)
+                    metrics.record(len(data), elapsed, sizer)
+                    uploaded_bytes += write_response.bytesWritten
+                    if progress_callback:
+                        await progress_callback(uploaded_bytes, file_size)
+            
+            metrics.log_summary(sizer)
             
             # 步骤3: 关闭文件（流式已完成也建议调用一次，确保服务端一致性）
             logger.info("🔒 步骤3: 关闭文件...")
@@ -828,7 +923,8 @@ class CloudDrive2Client:
         remote_path: str,
         mount_point: str,
         file_size: int,
-        progress_callback: Optional[Callable[[int, int], None]] = None
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         通过远程上传协议上传文件
@@ -850,6 +946,7 @@ class CloudDrive2Client:
             mount_point: CloudDrive2 挂载点路径
             file_size: 文件大小
             progress_callback: 进度回调
+            throttle: 带宽限速回调（按数据块调用）
         
         Returns:
             上传结果字典
@@ -889,6 +986,8 @@ class CloudDrive2Client:
                         r = rep.read_data
                         f.seek(r.offset)
                         data = f.read(r.length)
+                        if throttle:
+                            await throttle(len(data))
                         uploaded = max(uploaded, r.offset + len(data))
                         await self.stub.official_stub.RemoteReadData(
                             clouddrive_pb2.RemoteReadDataUpload(
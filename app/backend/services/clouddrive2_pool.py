@@ -0,0 +1,325 @@
+"""
+CloudDrive2 连接池
+
+进程内共享少量长连接的 gRPC 频道，上传、离线任务和目录浏览复用已认证的连接，
+不再每次调用都重新建立 TCP/TLS 连接和认证。
+
+功能：
+1. 按需创建频道（最多 pool_size 个），请求分配给在途调用最少的频道（gRPC 基于 HTTP/2，单频道可并发）
+2. keepalive 与消息大小上限调优
+3. token 过期前自动刷新
+4. 定期健康检查，断开的频道按指数退避重连
+5. 环境变量中的连接配置变化后自动重建
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from log_manager import get_logger
+from services.clouddrive2_client import CloudDrive2Client, CloudDrive2Config
+
+logger = get_logger(__name__)
+
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+DEFAULT_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30_000),
+    ('grpc.keepalive_timeout_ms', 10_000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_send_message_length', MAX_MESSAGE_BYTES),
+    ('grpc.max_receive_message_length', MAX_MESSAGE_BYTES),
+]
+
+
+def config_from_env() -> CloudDrive2Config:
+    """从环境变量读取当前的 CloudDrive2 连接配置"""
+    return CloudDrive2Config(
+        host=os.getenv('CLOUDDRIVE2_HOST', 'localhost'),
+        port=int(os.getenv('CLOUDDRIVE2_PORT', '19798')),
+        username=os.getenv('CLOUDDRIVE2_USERNAME', 'admin'),
+        password=os.getenv('CLOUDDRIVE2_PASSWORD', ''),
+        channel_options=DEFAULT_CHANNEL_OPTIONS
+    )
+
+
+class _PooledChannel:
+    """连接池中的一个频道"""
+    
+    def __init__(self, index: int, config: CloudDrive2Config):
+        self.index = index
+        self.client = CloudDrive2Client(config)
+        self.in_flight = 0
+        self.failures = 0
+        self.next_attempt_at = 0.0
+        self.connected_at: Optional[float] = None
+        self.stale_token_expiry: Optional[float] = None  # 刷新后仍未延期的 token，避免反复刷新
+        self.lock = asyncio.Lock()
+    
+    @property
+    def healthy(self) -> bool:
+        return self.client.is_healthy()
+
+
+class CloudDrive2ConnectionPool:
+    """CloudDrive2 gRPC 连接池"""
+    
+    def __init__(
+        self,
+        pool_size: int = 2,
+        connect_timeout: float = 10,
+        health_check_interval: float = 30,
+        token_refresh_margin: float = 300,
+        base_backoff: float = 1,
+        max_backoff: float = 60
+    ):
+        """
+        Args:
+            pool_size: 最大频道数
+            connect_timeout: 建立连接的超时（秒）
+            health_check_interval: 健康检查间隔（秒）
+            token_refresh_margin: token 过期前多少秒刷新
+            base_backoff: 重连退避起始时间（秒）
+            max_backoff: 重连退避上限（秒）
+        """
+        self.pool_size = max(1, pool_size)
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.token_refresh_margin = token_refresh_margin
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        
+        self._config: Optional[CloudDrive2Config] = None
+        self._channels: List[_PooledChannel] = []
+        self._health_task: Optional[asyncio.Task] = None
+        
+        self.stats = {
+            'connects': 0,
+            'connect_failures': 0,
+            'reconnects': 0,
+            'token_refreshes': 0,
+            'leases': 0,
+            'adhoc_connections': 0,
+        }
+    
+    # ==================== 对外接口 ====================
+    
+    @asynccontextmanager
+    async def client(self, config: Optional[CloudDrive2Config] = None) -> AsyncIterator[CloudDrive2Client]:
+        """
+        租用一个已连接的客户端
+        
+        Args:
+            config: 连接配置；为 None 时使用环境变量中的配置。
+                    与当前配置不同时（如测试其他地址）使用一次性连接，不影响连接池
+        
+        Raises:
+            ConnectionError: 无法连接到 CloudDrive2
+        """
+        env_config = config_from_env()
+        if config is not None and config.key != env_config.key:
+            async with self._adhoc_client(config) as client:
+                yield client
+            return
+        
+        await self._ensure_config(env_config)
+        channel = await self._acquire()
+        channel.in_flight += 1
+        self.stats['leases'] += 1
+        try:
+            yield channel.client
+        finally:
+            channel.in_flight -= 1
+    
+    async def reset(self):
+        """关闭所有频道（配置修改后调用，下次租用时按新配置重建）"""
+        channels, self._channels = self._channels, []
+        self._config = None
+        for channel in channels:
+            await self._close(channel)
+        if channels:
+            logger.info(f"🔌 CloudDrive2 连接池已重置（关闭 {len(channels)} 个频道）")
+    
+    async def stop(self):
+        """停止健康检查并关闭所有频道"""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await self.reset()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        now = time.monotonic()
+        return {
+            **self.stats,
+            'pool_size': self.pool_size,
+            'address': self._config.address if self._config else None,
+            'channels': [
+                {
+                    'index': ch.index,
+                    'healthy': ch.healthy,
+                    'in_flight': ch.in_flight,
+                    'failures': ch.failures,
+                    'retry_in': round(max(0.0, ch.next_attempt_at - now), 1),
+                    'token_expires_in': (
+                        round(ch.client.token_expires_at - time.time())
+                        if ch.client.token_expires_at else None
+                    ),
+                }
+                for ch in self._channels
+            ],
+        }
+    
+    # ==================== 频道管理 ====================
+    
+    async def _ensure_config(self, config: CloudDrive2Config):
+        if self._config is not None and self._config.key == config.key:
+            return
+        if self._config is not None:
+            logger.info(f"🔄 CloudDrive2 配置已变化，重建连接池: {config.address}")
+            await self.reset()
+        self._config = config
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+    
+    async def _acquire(self) -> _PooledChannel:
+        """选择在途调用最少的健康频道；都在忙时新建频道，没有可用频道时按退避重连"""
+        healthy = [ch for ch in self._channels if ch.healthy]
+        if healthy:
+            best = min(healthy, key=lambda ch: ch.in_flight)
+            if best.in_flight == 0 or len(self._channels) >= self.pool_size:
+                return best
+        
+        # 只在服务可用（已有健康频道）或首次使用时扩容，服务不可用时不额外发起连接
+        if len(self._channels) < self.pool_size and (healthy or not self._channels):
+            channel = _PooledChannel(len(self._channels), self._config)
+            self._channels.append(channel)
+            if await self._connect(channel):
+                return channel
+            if healthy:
+                return min(healthy, key=lambda ch: ch.in_flight)
+        
+        # 尝试重连已退避完成的频道
+        now = time.monotonic()
+        for channel in sorted(self._channels, key=lambda ch: ch.next_attempt_at):
+            if channel.healthy:
+                return channel
+            if channel.next_attempt_at <= now and await self._connect(channel):
+                return channel
+        
+        wait = min(ch.next_attempt_at for ch in self._channels) - time.monotonic()
+        raise ConnectionError(f"CloudDrive2 连接失败（{max(0.0, wait):.0f} 秒后重试）")
+    
+    async def _connect(self, channel: _PooledChannel) -> bool:
+        """连接（或重连）单个频道，失败时按指数退避安排下次尝试"""
+        async with channel.lock:
+            if channel.healthy:
+                return True
+            if channel.client.channel is not None:
+                await self._close(channel)
+                channel.client = CloudDrive2Client(self._config)
+                self.stats['reconnects'] += 1
+            
+            ok = False
+            try:
+                ok = await channel.client.connect()
+                if ok:
+                    await asyncio.wait_for(channel.client.channel.channel_ready(), timeout=self.connect_timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ CloudDrive2 频道 #{channel.index} 未就绪: {str(e) or type(e).__name__}")
+                ok = False
+            
+            if ok:
+                channel.failures = 0
+                channel.next_attempt_at = 0.0
+                channel.connected_at = time.monotonic()
+                self.stats['connects'] += 1
+                logger.info(f"✅ CloudDrive2 频道 #{channel.index} 已连接: {self._config.address}")
+                return True
+            
+            channel.failures += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (channel.failures - 1))
+            channel.next_attempt_at = time.monotonic() + backoff
+            self.stats['connect_failures'] += 1
+            await self._close(channel)
+            logger.warning(f"⚠️ CloudDrive2 频道 #{channel.index} 连接失败，{backoff:.0f} 秒后重试")
+            return False
+    
+    async def _close(self, channel: _PooledChannel):
+        try:
+            if channel.client.channel is not None:
+                await channel.client.disconnect()
+        except Exception as e:
+            logger.debug(f"关闭 CloudDrive2 频道失败: {e}")
+    
+    @asynccontextmanager
+    async def _adhoc_client(self, config: CloudDrive2Config) -> AsyncIterator[CloudDrive2Client]:
+        """一次性连接（用于非当前配置的请求）"""
+        self.stats['adhoc_connections'] += 1
+        client = CloudDrive2Client(config)
+        try:
+            # 连接失败时也要关闭已创建的 gRPC 通道
+            if not await client.connect():
+                raise ConnectionError("CloudDrive2 连接失败")
+            yield client
+        finally:
+            await client.disconnect()
+    
+    # ==================== 健康检查 ====================
+    
+    async def _health_loop(self):
+        """定期检查频道状态、刷新即将过期的 token、重连断开的频道"""
+        while True:
+            try:
+                await asyncio.sleep(self.health_check_interval)
+                await self._check_channels()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"CloudDrive2 连接池健康检查失败: {e}", exc_info=True)
+    
+    async def _check_channels(self):
+        now = time.monotonic()
+        for channel in list(self._channels):
+            if not channel.healthy:
+                if channel.connected_at is not None and channel.next_attempt_at <= now:
+                    logger.warning(f"⚠️ CloudDrive2 频道 #{channel.index} 已断开，尝试重连")
+                    await self._connect(channel)
+                continue
+            
+            expires_at = channel.client.token_expires_at
+            if (
+                expires_at
+                and expires_at != channel.stale_token_expiry
+                and expires_at - time.time() < self.token_refresh_margin
+            ):
+                refreshed = await channel.client.refresh_auth()
+                new_expires_at = channel.client.token_expires_at
+                if not refreshed:
+                    # 获取失败（可能是暂时性错误）：继续使用原 token，下次健康检查再试
+                    logger.warning(f"⚠️ CloudDrive2 频道 #{channel.index} token 刷新失败，下次健康检查重试")
+                elif new_expires_at is None or new_expires_at > expires_at:
+                    self.stats['token_refreshes'] += 1
+                    logger.info(f"🔐 CloudDrive2 频道 #{channel.index} token 已刷新")
+                else:
+                    # 取回的仍是同一个 token（API Token 无法续期），不再反复刷新
+                    channel.stale_token_expiry = new_expires_at
+                    logger.warning(f"⚠️ CloudDrive2 频道 #{channel.index} token 无法续期（API Token 需在 CloudDrive2 中重新生成）")
+
+
+# 全局单例
+_pool: Optional[CloudDrive2ConnectionPool] = None
+
+
+def get_clouddrive2_pool() -> CloudDrive2ConnectionPool:
+    """获取 CloudDrive2 连接池单例"""
+    global _pool
+    if _pool is None:
+        _pool = CloudDrive2ConnectionPool()
+    return _pool
@@ -5,14 +5,16 @@ CloudDrive2 上传器（集成进度和断点续传）
 """
 import os
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Awaitable
 from pathlib import Path
 
 from log_manager import get_logger
-from services.clouddrive2_client import CloudDrive2Client, CloudDrive2Config, create_clouddrive2_client
+from services.clouddrive2_client import CloudDrive2Client, CloudDrive2Config
+from services.clouddrive2_pool import get_clouddrive2_pool, config_from_env
 from services.upload_progress_manager import get_progress_manager, UploadStatus
 from services.upload_resume_manager import get_resume_manager
-from services.quick_upload_service import QuickUploadService
+from services.quick_upload_service import get_quick_upload_service
+from services.upload_scheduler import get_upload_scheduler
 
 logger = get_logger(__name__)
 
@@ -49,16 +51,23 @@ class CloudDrive2Uploader:
         # 初始化管理器
         self.progress_mgr = get_progress_manager()
         self.resume_mgr = get_resume_manager()
-        self.quick_service = QuickUploadService()
-        
-        self.client: Optional[CloudDrive2Client] = None
+        self.quick_service = get_quick_upload_service()
+    
+    def _pool_config(self) -> CloudDrive2Config:
+        """连接池配置：认证信息取自环境变量，地址使用上传器自身的设置"""
+        config = config_from_env()
+        config.host = self.clouddrive2_host
+        config.port = self.clouddrive2_port
+        config.address = f"{config.host}:{config.port}"
+        return config
     
     async def upload_file(
         self,
         file_path: str,
         target_dir: str = "",
         enable_quick_upload: bool = True,
-        enable_resume: bool = True
+        enable_resume: bool = True,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         上传文件
@@ -68,6 +77,7 @@ class CloudDrive2Uploader:
             target_dir: 目标目录（相对于挂载点）
             enable_quick_upload: 是否启用秒传检测
             enable_resume: 是否启用断点续传
+            throttle: 数据块限速回调；为 None 时使用上传调度器的全局限速
         
         Returns:
             上传结果字典
@@ -95,95 +105,56 @@ class CloudDrive2Uploader:
                 target_dir_id=target_dir
             )
             
-            try:
-                # 步骤1: 秒传检测
-                if enable_quick_upload:
-                    await self.progress_mgr.update_status(file_path, UploadStatus.CHECKING)
-                    
-                    logger.info("🔍 检查秒传...")
-                    quick_result = self.quick_service.calculate_sha1(file_path)
-                    
-                    if quick_result:
-                        logger.info(f"✅ SHA1: {quick_result}")
-                        # TODO: 调用115秒传API检查
-                        # 如果秒传成功，直接返回
-                
-                # 步骤2: 检查断点续传
-                session = None
-                if enable_resume:
-                    session = await self.resume_mgr.get_session(file_path, target_dir)
-                    if session:
-                        logger.info(f"📋 发现未完成的上传会话: {session.session_id}")
-                        logger.info(f"   进度: {session.get_progress():.2f}%")
-                
-                # 步骤3: 连接 CloudDrive2
-                logger.info("🔌 连接 CloudDrive2...")
-                self.client = create_clouddrive2_client(
-                    host=self.clouddrive2_host,
-                    port=self.clouddrive2_port
-                )
-                
-                connected = await self.client.connect()
-                if not connected:
-                    return {
-                        'success': False,
-                        'message': 'CloudDrive2 连接失败'
-                    }
-                
-                # 步骤4: 检查挂载点
-                logger.info(f"🗂️ 检查挂载点: {self.mount_point}")
-                mount_status = await self.client.check_mount_status(self.mount_point)
-                
-                if not mount_status.get('available'):
-                    return {
-                        'success': False,
-                        'message': f"挂载点不可用: {mount_status.get('message', '未知错误')}"
-                    }
-                
-                logger.info("✅ 挂载点可用")
+            # 步骤1: 秒传检测
+            if enable_quick_upload:
+                await self.progress_mgr.update_status(file_path, UploadStatus.CHECKING)
                 
-                # 步骤5: 执行上传
-                await self.progress_mgr.update_status(file_path, UploadStatus.UPLOADING)
-                
-                # 构建远程路径（确保使用正斜杠，兼容所有平台）
-                # target_dir 已经是完整路径（如 /Telegram媒体/2025/10/19）
-                remote_path = os.path.join(target_dir, file_name).replace('\\', '/')
+                logger.info("🔍 检查秒传...")
+                # preid 与完整SHA1在线程池中一次读取计算（文件未变化时直接命中缓存）
+                preid, quick_result = await self.quick_service.calculate_hashes(file_path)
+                if quick_result:
+                    logger.info(f"🔑 preid: {preid}")
+                    logger.info(f"✅ SHA1: {quick_result}")
+                    # TODO: 调用115秒传API检查
+                    # 如果秒传成功，直接返回
+            
+            # 步骤2: 检查断点续传
+            session = None
+            if enable_resume:
+                session = await self.resume_mgr.get_session(file_path, target_dir)
+                if session:
+                    logger.info(f"📋 发现未完成的上传会话: {session.session_id}")
+                    logger.info(f"   进度: {session.get_progress():.2f}%")
+            
+            # 步骤3: 从连接池租用已认证的 CloudDrive2 连接，检查挂载点并上传
+            try:
+                async with get_clouddrive2_pool().client(self._pool_config()) as client:
+                    result = await self._upload_with_client(client, file_path, target_dir, throttle)
+            except ConnectionError as e:
+                result = {
+                    'success': False,
+                    'message': str(e)
+                }
+            
+            # 步骤4: 更新状态
+            if result['success']:
+                await self.progress_mgr.update_status(file_path, UploadStatus.SUCCESS)
+                await self.progress_mgr.update_progress(file_path, file_size)
                 
-                # 进度回调
-                async def progress_callback(uploaded: int, total: int):
-                    await self.progress_mgr.update_progress(file_path, uploaded)
+                # 清理断点续传会话
+                if session:
+                    await self.resume_mgr.delete_session(session.session_id)
                 
-                result = await self.client.upload_file(
-                    local_path=file_path,
-                    remote_path=remote_path,
-                    mount_point=self.mount_point,
-                    progress_callback=progress_callback
+                logger.info(f"✅ 上传成功: {file_name}")
+            else:
+                await self.progress_mgr.update_status(
+                    file_path, 
+                    UploadStatus.FAILED,
+                    error_message=result.get('message')
                 )
-                
-                # 步骤6: 更新状态
-                if result['success']:
-                    await self.progress_mgr.update_status(file_path, UploadStatus.SUCCESS)
-                    await self.progress_mgr.update_progress(file_path, file_size)
-                    
-                    # 清理断点续传会话
-                    if session:
-                        await self.resume_mgr.delete_session(session.session_id)
-                    
-                    logger.info(f"✅ 上传成功: {file_name}")
-                else:
-                    await self.progress_mgr.update_status(
-                        file_path, 
-                        UploadStatus.FAILED,
-                        error_message=result.get('message')
-                    )
-                    logger.error(f"❌ 上传失败: {result.get('message')}")
-                
-                return result
+                logger.error(f"❌ 上传失败: {result.get('message')}")
             
-            finally:
-                # 断开连接
-                if self.client:
-                    await self.client.disconnect()
+            return result
         
         except Exception as e:
             logger.error(f"❌ 上传异常: {e}", exc_info=True)
@@ -204,6 +175,45 @@ class CloudDrive2Uploader:
                 'message': str(e)
             }
     
+    async def _upload_with_client(
+        self,
+        client: CloudDrive2Client,
+        file_path: str,
+        target_dir: str,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """使用已连接的客户端检查挂载点并上传"""
+        # 检查挂载点
+        logger.info(f"🗂️ 检查挂载点: {self.mount_point}")
+        mount_status = await client.check_mount_status(self.mount_point)
+        
+        if not mount_status.get('available'):
+            return {
+                'success': False,
+                'message': f"挂载点不可用: {mount_status.get('message', '未知错误')}"
+            }
+        
+        logger.info("✅ 挂载点可用")
+        
+        # 执行上传
+        await self.progress_mgr.update_status(file_path, UploadStatus.UPLOADING)
+        
+        # 构建远程路径（确保使用正斜杠，兼容所有平台）
+        # target_dir 已经是完整路径（如 /Telegram媒体/2025/10/19）
+        remote_path = os.path.join(target_dir, os.path.basename(file_path)).replace('\\', '/')
+        
+        # 进度回调
+        async def progress_callback(uploaded: int, total: int):
+            await self.progress_mgr.update_progress(file_path, uploaded)
+        
+        return await client.upload_file(
+            local_path=file_path,
+            remote_path=remote_path,
+            mount_point=self.mount_point,
+            progress_callback=progress_callback,
+            throttle=throttle or get_upload_scheduler().limit_bandwidth
+        )
+    
     async def batch_upload(
         self,
         file_paths: list,
@@ -211,7 +221,7 @@ class CloudDrive2Uploader:
         max_concurrent: int = 3
     ) -> Dict[str, Any]:
         """
-        批量上传文件
+        批量上传文件（不经过持久化队列，带宽计入上传调度器的全局限速）
         
         Args:
             file_paths: 文件路径列表
@@ -267,12 +277,21 @@ def get_clouddrive2_uploader(
     """
     global _uploader
     
-    # 每次都从环境变量重新读取配置（支持动态更新）
-    _uploader = CloudDrive2Uploader(
-        clouddrive2_host=host or os.getenv('CLOUDDRIVE2_HOST', 'localhost'),
-        clouddrive2_port=port or int(os.getenv('CLOUDDRIVE2_PORT', '19798')),
-        mount_point=mount_point or os.getenv('CLOUDDRIVE2_MOUNT_POINT', '/CloudNAS/115')
-    )
+    # 每次都从环境变量重新读取配置（支持动态更新），配置未变化时复用实例
+    clouddrive2_host = host or os.getenv('CLOUDDRIVE2_HOST', 'localhost')
+    clouddrive2_port = port or int(os.getenv('CLOUDDRIVE2_PORT', '19798'))
+    mount_point = mount_point or os.getenv('CLOUDDRIVE2_MOUNT_POINT', '/CloudNAS/115')
+    
+    if (
+        _uploader is None
+        or _uploader.clouddrive2_host != clouddrive2_host
+        or _uploader.clouddrive2_port != clouddrive2_port
+        or _uploader.mount_point != mount_point
+    ):
+        _uploader = CloudDrive2Uploader(
+            clouddrive2_host=clouddrive2_host,
+            clouddrive2_port=clouddrive2_port,
+            mount_point=mount_point
+        )
     
     return _uploader
-
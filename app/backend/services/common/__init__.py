@@ -1,13 +1,16 @@
 """
 共享基础设施组件
 
-提供缓存、过滤、重试、批量写入等通用功能
+提供缓存、过滤、重试、批量写入、规则变更通知等通用功能
 """
 
 from .message_cache import MessageCacheManager, get_message_cache
 from .filter_engine import SharedFilterEngine, get_filter_engine
 from .retry_queue import SmartRetryQueue, get_retry_queue
 from .batch_writer import BatchDatabaseWriter, get_batch_writer
+from .progress_bus import ProgressBus, get_progress_bus
+from .chunked_reader import AdaptiveChunkSizer, ChunkReader, TransferMetrics
+from .rule_events import RuleEventBus, RuleChangeEvent, get_rule_event_bus, publish_rule_change
 
 __all__ = [
     'MessageCacheManager',
@@ -18,5 +21,14 @@ __all__ = [
     'get_retry_queue',
     'BatchDatabaseWriter',
     'get_batch_writer',
+    'ProgressBus',
+    'get_progress_bus',
+    'AdaptiveChunkSizer',
+    'ChunkReader',
+    'TransferMetrics',
+    'RuleEventBus',
+    'RuleChangeEvent',
+    'get_rule_event_bus',
+    'publish_rule_change',
 ]
 
@@ -3,16 +3,21 @@
 
 功能：
 1. 批量写入数据库，减少IO次数
-2. 自动刷新机制（时间/数量触发）
+2. 自动刷新机制（时间/数量触发，可按模型单独配置）
 3. 支持多种数据模型
 4. 错误处理和重试
+5. 同一主键的更新在刷新前合并（字段后写覆盖先写，计数累加）
+   刷新时按 插入 → upsert → 更新 的顺序执行，会打乱同一行先后顺序的操作入队前先写出已有队列
+6. INSERT ... ON CONFLICT 批量 upsert（SQLite / PostgreSQL）
 """
-from typing import Dict, List, Any, Type, Optional
+from typing import Dict, List, Any, Type, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
+from collections import deque
 import asyncio
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import insert, update
+from sqlalchemy import insert, update, bindparam, func
 from log_manager import get_logger
 from database import get_db
 
@@ -22,10 +27,40 @@ logger = get_logger("batch_writer", "enhanced_bot.log")
 @dataclass
 class BatchOperation:
     """批量操作"""
-    operation_type: str  # 'insert' or 'update'
+    operation_type: str  # 'insert' / 'update' / 'upsert'
     model: Type
     data: Dict[str, Any]
     created_at: datetime = field(default_factory=datetime.now)
+    deltas: Dict[str, Any] = field(default_factory=dict)  # update 的累加字段
+
+
+@dataclass
+class PendingUpdate:
+    """合并后的单条记录更新"""
+    values: Dict[str, Any] = field(default_factory=dict)  # 直接赋值（后写覆盖）
+    deltas: Dict[str, Any] = field(default_factory=dict)  # 累加（col = col + delta）
+
+
+@dataclass
+class FlushPolicy:
+    """模型刷新策略"""
+    batch_size: int
+    flush_interval: float
+
+
+@dataclass
+class ModelQueue:
+    """单个模型的待写入操作"""
+    model: Type
+    inserts: List[Dict[str, Any]] = field(default_factory=list)
+    updates: Dict[Any, PendingUpdate] = field(default_factory=dict)
+    upserts: Dict[Tuple, Dict[str, Any]] = field(default_factory=dict)
+    upsert_keys: Tuple[str, ...] = ()
+    upsert_update_columns: Optional[Tuple[str, ...]] = None
+    oldest_at: Optional[float] = None
+    
+    def __len__(self) -> int:
+        return len(self.inserts) + len(self.updates) + len(self.upserts)
 
 
 class BatchDatabaseWriter:
@@ -33,9 +68,9 @@ class BatchDatabaseWriter:
     批量数据库写入器
     
     特性：
-    1. 批量插入/更新
+    1. 批量插入/更新/upsert
     2. 自动刷新（时间/数量触发）
-    3. 按模型分组
+    3. 按模型分组，同一主键的操作合并
     4. 性能统计
     """
     
@@ -50,19 +85,26 @@ class BatchDatabaseWriter:
         self.max_queue_size = max_queue_size
         
         # 操作队列（按模型分组）
-        self._queues: Dict[str, List[BatchOperation]] = {}
+        self._queues: Dict[str, ModelQueue] = {}
+        self._policies: Dict[str, FlushPolicy] = {}
         self._lock = asyncio.Lock()
         
         # 运行状态
         self._is_running = False
         self._flush_task: Optional[asyncio.Task] = None
         
+        # 最近的提交时间（用于计算每秒提交数）
+        self._commit_times: deque = deque(maxlen=10000)
+        
         # 统计信息
         self.stats = {
             'total_operations': 0,
             'total_inserts': 0,
             'total_updates': 0,
+            'total_upserts': 0,
+            'total_coalesced': 0,
             'total_flushes': 0,
+            'total_commits': 0,
             'total_errors': 0,
             'current_queue_size': 0
         }
@@ -93,50 +135,212 @@ class BatchDatabaseWriter:
         
         logger.info("✅ 批量数据库写入器已停止")
     
+    def set_flush_policy(self, model: Type, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        """
+        设置模型的刷新策略（未设置的模型使用全局 batch_size / flush_interval）
+        
+        Args:
+            model: 数据模型
+            batch_size: 队列达到该数量时立即刷新
+            flush_interval: 最早的待写入操作等待超过该时间（秒）时刷新
+        """
+        self._policies[model.__tablename__] = FlushPolicy(
+            batch_size=batch_size or self.batch_size,
+            flush_interval=flush_interval if flush_interval is not None else self.flush_interval
+        )
+    
+    def _policy(self, model_name: str) -> FlushPolicy:
+        return self._policies.get(model_name) or FlushPolicy(self.batch_size, self.flush_interval)
+    
+    # ==================== 写入接口 ====================
+    
     async def add_insert(self, model: Type, data: Dict[str, Any]):
         """添加插入操作"""
-        await self._add_operation('insert', model, data)
+        async with self._lock:
+            queue = self._get_queue(model)
+            if self._reorders(queue, 'insert', data):
+                await self._flush_model_locked(model.__tablename__)
+                queue = self._get_queue(model)
+            queue.inserts.append(data)
+            await self._after_add(queue)
     
     async def add_update(self, model: Type, data: Dict[str, Any]):
-        """添加更新操作"""
-        await self._add_operation('update', model, data)
+        """
+        添加更新操作（data 需包含 id）
+        
+        同一 id 在刷新前的多次更新合并为一次，相同字段后写覆盖先写
+        """
+        if 'id' not in data:
+            logger.warning(f"更新操作缺少id字段: {model.__tablename__}")
+            return
+        values = dict(data)
+        record_id = values.pop('id')
+        await self._merge_update(model, record_id, values, {})
     
-    async def _add_operation(self, operation_type: str, model: Type, data: Dict[str, Any]):
-        """添加操作到队列"""
+    async def add_increment(
+        self,
+        model: Type,
+        record_id: Any,
+        deltas: Dict[str, Any],
+        values: Optional[Dict[str, Any]] = None
+    ):
+        """
+        添加累加更新（UPDATE ... SET col = col + delta）
+        
+        Args:
+            model: 数据模型
+            record_id: 主键
+            deltas: 字段 -> 增量，同一记录的增量在刷新前累加
+            values: 同时直接赋值的字段
+        """
+        await self._merge_update(model, record_id, values or {}, deltas)
+    
+    async def add_upsert(
+        self,
+        model: Type,
+        data: Dict[str, Any],
+        index_elements: Tuple[str, ...] = ('id',),
+        update_columns: Optional[Tuple[str, ...]] = None
+    ):
+        """
+        添加 upsert 操作（INSERT ... ON CONFLICT DO UPDATE）
+        
+        Args:
+            model: 数据模型
+            data: 完整的行数据（需包含 index_elements 中的字段）
+            index_elements: 冲突判定的唯一键（同一模型需保持一致）
+            update_columns: 冲突时更新的字段（默认 data 中除唯一键以外的全部字段）
+        """
+        key = tuple(data[column] for column in index_elements)
         async with self._lock:
-            model_name = model.__tablename__
-            
-            # 初始化队列
-            if model_name not in self._queues:
-                self._queues[model_name] = []
-            
-            # 检查队列大小
-            if len(self._queues[model_name]) >= self.max_queue_size:
-                logger.warning(f"队列已满，立即刷新: {model_name}")
-                await self._flush_model(model_name)
-            
-            # 添加操作
-            operation = BatchOperation(
-                operation_type=operation_type,
-                model=model,
-                data=data
-            )
-            self._queues[model_name].append(operation)
-            
-            self.stats['total_operations'] += 1
+            queue = self._get_queue(model)
+            if (queue.upserts and queue.upsert_keys != tuple(index_elements)) or \
+                    self._reorders(queue, 'upsert', data, tuple(index_elements)):
+                # 唯一键变化、或同一行已有待写入的更新时，先写出已有队列
+                await self._flush_model_locked(queue.model.__tablename__)
+                queue = self._get_queue(model)
+            queue.upsert_keys = tuple(index_elements)
+            queue.upsert_update_columns = tuple(update_columns) if update_columns else None
+            if key in queue.upserts:
+                queue.upserts[key].update(data)
+                self.stats['total_coalesced'] += 1
+            else:
+                queue.upserts[key] = dict(data)
+            await self._after_add(queue)
+    
+    def discard(self, model: Type, record_id: Any):
+        """丢弃记录尚未写入的合并更新（记录已由其他路径写入最终状态时调用，避免旧值覆盖）"""
+        queue = self._queues.get(model.__tablename__)
+        if queue and queue.updates.pop(record_id, None) is not None:
             self.stats['current_queue_size'] = sum(len(q) for q in self._queues.values())
+    
+    def pending_value(self, model: Type, record_id: Any, column: str, current: Any) -> Any:
+        """
+        返回字段在待写入更新生效后的值
+        
+        Args:
+            current: 从数据库读取到的当前值
+        """
+        queue = self._queues.get(model.__tablename__)
+        pending = queue.updates.get(record_id) if queue else None
+        if not pending:
+            return current
+        if column in pending.values:
+            return pending.values[column]
+        if column in pending.deltas:
+            return (current or 0) + pending.deltas[column]
+        return current
+    
+    @staticmethod
+    def _reorders(
+        queue: ModelQueue,
+        operation_type: str,
+        data: Dict[str, Any],
+        index_elements: Tuple[str, ...] = ()
+    ) -> bool:
+        """
+        新操作排在队列中同一行的操作之后，但刷新时会先于它们执行时返回 True
+        
+        刷新顺序为 插入 → upsert → 更新：
+        - upsert 晚于同一行的更新（非 id 唯一键无法对应到行，有待写入的更新即视为冲突）
+        - 插入晚于同一行的更新或 upsert
+        """
+        if operation_type == 'upsert':
+            if not queue.updates:
+                return False
+            if index_elements == ('id',):
+                return data['id'] in queue.updates
+            return True
+        if operation_type == 'insert':
+            if 'id' in data and data['id'] in queue.updates:
+                return True
+            if queue.upserts and all(key in data for key in queue.upsert_keys):
+                return tuple(data[key] for key in queue.upsert_keys) in queue.upserts
+        return False
+    
+    def _get_queue(self, model: Type) -> ModelQueue:
+        model_name = model.__tablename__
+        queue = self._queues.get(model_name)
+        if queue is None:
+            queue = self._queues[model_name] = ModelQueue(model=model)
+        return queue
+    
+    async def _merge_update(self, model: Type, record_id: Any, values: Dict[str, Any], deltas: Dict[str, Any]):
+        async with self._lock:
+            queue = self._get_queue(model)
+            pending = queue.updates.get(record_id)
+            if pending is None:
+                pending = queue.updates[record_id] = PendingUpdate()
+            else:
+                self.stats['total_coalesced'] += 1
             
-            # 检查是否需要刷新
-            if len(self._queues[model_name]) >= self.batch_size:
-                logger.debug(f"达到批量大小，刷新队列: {model_name}")
-                await self._flush_model(model_name)
+            for column, value in values.items():
+                # 直接赋值覆盖之前的增量
+                pending.values[column] = value
+                pending.deltas.pop(column, None)
+            for column, delta in deltas.items():
+                if column in pending.values:
+                    pending.values[column] = (pending.values[column] or 0) + delta
+                else:
+                    pending.deltas[column] = pending.deltas.get(column, 0) + delta
+            
+            await self._after_add(queue)
+    
+    async def _after_add(self, queue: ModelQueue):
+        """记录统计，检查是否需要立即刷新（调用方持有锁）"""
+        model_name = queue.model.__tablename__
+        if queue.oldest_at is None:
+            queue.oldest_at = time.monotonic()
+        
+        self.stats['total_operations'] += 1
+        self.stats['current_queue_size'] = sum(len(q) for q in self._queues.values())
+        
+        if not self._is_running:
+            # 未启动（或已停止）时直接写入，避免数据滞留
+            await self._flush_model_locked(model_name)
+        elif len(queue) >= min(self._policy(model_name).batch_size, self.max_queue_size):
+            logger.debug(f"达到批量大小，刷新队列: {model_name}")
+            await self._flush_model_locked(model_name)
+    
+    # ==================== 刷新 ====================
     
     async def _flush_loop(self):
-        """定期刷新循环"""
+        """定期刷新循环（按各模型的刷新间隔）"""
         while self._is_running:
             try:
-                await asyncio.sleep(self.flush_interval)
-                await self.flush_all()
+                intervals = [self.flush_interval] + [p.flush_interval for p in self._policies.values()]
+                await asyncio.sleep(max(0.5, min(intervals) / 2))
+                
+                now = time.monotonic()
+                due = [
+                    name for name, queue in list(self._queues.items())
+                    if queue.oldest_at is not None and now - queue.oldest_at >= self._policy(name).flush_interval
+                ]
+                for model_name in due:
+                    try:
+                        await self._flush_model(model_name)
+                    except Exception as e:
+                        logger.error(f"刷新模型 {model_name} 失败: {e}", exc_info=True)
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -156,43 +360,45 @@ class BatchDatabaseWriter:
     async def _flush_model(self, model_name: str):
         """刷新指定模型的队列"""
         async with self._lock:
-            if model_name not in self._queues or not self._queues[model_name]:
-                return
-            
-            operations = self._queues[model_name]
-            self._queues[model_name] = []
-            self.stats['current_queue_size'] = sum(len(q) for q in self._queues.values())
-        
-        if not operations:
+            await self._flush_model_locked(model_name)
+    
+    async def _flush_model_locked(self, model_name: str):
+        """刷新指定模型的队列（调用方持有锁，保证同一模型的写入顺序）"""
+        queue = self._queues.pop(model_name, None)
+        self.stats['current_queue_size'] = sum(len(q) for q in self._queues.values())
+        if not queue or not len(queue):
             return
         
-        logger.info(f"刷新队列: {model_name}, 操作数: {len(operations)}")
-        
-        # 按操作类型分组
-        inserts = [op for op in operations if op.operation_type == 'insert']
-        updates = [op for op in operations if op.operation_type == 'update']
+        logger.debug(f"刷新队列: {model_name}, 操作数: {len(queue)}")
         
         # 执行批量操作
         try:
             async for db in get_db():
                 # 批量插入
-                if inserts:
-                    await self._batch_insert(db, inserts)
+                if queue.inserts:
+                    await self._batch_insert(db, queue.model, queue.inserts)
+                
+                # 批量 upsert
+                if queue.upserts:
+                    await self._batch_upsert(db, queue)
                 
                 # 批量更新
-                if updates:
-                    await self._batch_update(db, updates)
+                if queue.updates:
+                    await self._batch_update(db, queue.model, queue.updates)
                 
                 # 提交
                 await db.commit()
+                self._commit_times.append(time.monotonic())
                 
                 self.stats['total_flushes'] += 1
-                self.stats['total_inserts'] += len(inserts)
-                self.stats['total_updates'] += len(updates)
+                self.stats['total_commits'] += 1
+                self.stats['total_inserts'] += len(queue.inserts)
+                self.stats['total_upserts'] += len(queue.upserts)
+                self.stats['total_updates'] += len(queue.updates)
                 
-                logger.info(
+                logger.debug(
                     f"✅ 批量写入完成: {model_name}, "
-                    f"插入={len(inserts)}, 更新={len(updates)}"
+                    f"插入={len(queue.inserts)}, upsert={len(queue.upserts)}, 更新={len(queue.updates)}"
                 )
                 break
         
@@ -201,16 +407,10 @@ class BatchDatabaseWriter:
             self.stats['total_errors'] += 1
             
             # 失败时，尝试逐条写入
-            await self._fallback_write(operations)
+            await self._fallback_write(self._to_operations(queue))
     
-    async def _batch_insert(self, db: AsyncSession, operations: List[BatchOperation]):
+    async def _batch_insert(self, db: AsyncSession, model: Type, data_list: List[Dict[str, Any]]):
         """批量插入"""
-        if not operations:
-            return
-        
-        model = operations[0].model
-        data_list = [op.data for op in operations]
-        
         try:
             stmt = insert(model).values(data_list)
             await db.execute(stmt)
@@ -218,60 +418,92 @@ class BatchDatabaseWriter:
             logger.error(f"批量插入失败: {model.__tablename__}, 错误: {e}")
             raise
     
-    async def _batch_update(self, db: AsyncSession, operations: List[BatchOperation]):
+    async def _batch_upsert(self, db: AsyncSession, queue: ModelQueue):
         """
-        批量更新（优化版）
+        批量 upsert
         
-        策略：
-        1. 按更新字段分组
-        2. 使用bulk_update_mappings进行真正的批量更新
-        3. 回退到逐条更新（如果批量失败）
+        SQLite / PostgreSQL 使用 INSERT ... ON CONFLICT DO UPDATE；
+        其他数据库逐条先 UPDATE，未命中再 INSERT
         """
-        if not operations:
-            return
+        model = queue.model
+        table = model.__table__
+        keys = queue.upsert_keys
+        dialect = db.bind.dialect.name
         
-        model = operations[0].model
+        # 多行 VALUES 需要相同的列，按列集合分组
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in queue.upserts.values():
+            groups.setdefault(tuple(sorted(row)), []).append(row)
         
-        # 准备批量更新数据
-        update_mappings = []
-        for operation in operations:
-            data = operation.data.copy()
-            
-            # 检查是否有id字段
-            if 'id' not in data:
-                logger.warning(f"更新操作缺少id字段: {model.__tablename__}")
-                continue
+        for columns, rows in groups.items():
+            update_columns = queue.upsert_update_columns or tuple(c for c in columns if c not in keys)
             
-            update_mappings.append(data)
+            if dialect in ('sqlite', 'postgresql'):
+                if dialect == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert as dialect_insert
+                
+                stmt = dialect_insert(table).values(rows)
+                if update_columns:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=list(keys),
+                        set_={column: stmt.excluded[column] for column in update_columns}
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+                await db.execute(stmt)
+            else:
+                for row in rows:
+                    condition = [table.c[key] == row[key] for key in keys]
+                    values = {column: row[column] for column in update_columns if column in row}
+                    result = await db.execute(update(table).where(*condition).values(**values)) if values else None
+                    if result is None or result.rowcount == 0:
+                        await db.execute(insert(table).values(**row))
+    
+    async def _batch_update(self, db: AsyncSession, model: Type, updates: Dict[Any, PendingUpdate]):
+        """
+        批量更新
         
-        if not update_mappings:
-            return
+        按 (赋值字段, 累加字段) 分组，每组一条 executemany 语句：
+        UPDATE t SET a = :v_a, b = coalesce(b, 0) + :d_b WHERE id = :b_id
+        """
+        table = model.__table__
         
-        try:
-            # 使用bulk_update_mappings进行批量更新
-            await db.run_sync(
-                lambda session: session.bulk_update_mappings(model, update_mappings)
-            )
-            logger.debug(f"批量更新成功: {model.__tablename__}, 数量={len(update_mappings)}")
-            
-        except Exception as e:
-            logger.warning(f"批量更新失败，回退到逐条更新: {e}")
-            
-            # 回退到逐条更新
-            for operation in operations:
-                try:
-                    data = operation.data.copy()
-                    
-                    if 'id' not in data:
-                        continue
-                    
-                    record_id = data.pop('id')
-                    stmt = update(model).where(model.id == record_id).values(**data)
-                    await db.execute(stmt)
-                
-                except Exception as update_error:
-                    logger.error(f"逐条更新失败: {update_error}")
-                    continue
+        groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for record_id, pending in updates.items():
+            signature = (tuple(sorted(pending.values)), tuple(sorted(pending.deltas)))
+            params = {'b_id': record_id}
+            params.update({f'v_{column}': value for column, value in pending.values.items()})
+            params.update({f'd_{column}': delta for column, delta in pending.deltas.items()})
+            groups.setdefault(signature, []).append(params)
+        
+        for (value_columns, delta_columns), params_list in groups.items():
+            assignments = {column: bindparam(f'v_{column}') for column in value_columns}
+            assignments.update({
+                column: func.coalesce(table.c[column], 0) + bindparam(f'd_{column}')
+                for column in delta_columns
+            })
+            if not assignments:
+                continue
+            stmt = update(table).where(table.c.id == bindparam('b_id')).values(assignments)
+            await db.execute(stmt, params_list)
+        
+        logger.debug(f"批量更新成功: {model.__tablename__}, 数量={len(updates)}")
+    
+    @staticmethod
+    def _to_operations(queue: ModelQueue) -> List[BatchOperation]:
+        """把合并后的队列展开为逐条操作（用于回退写入）"""
+        operations = [BatchOperation('insert', queue.model, data) for data in queue.inserts]
+        operations += [
+            BatchOperation('upsert', queue.model, data, deltas={'_keys': queue.upsert_keys})
+            for data in queue.upserts.values()
+        ]
+        operations += [
+            BatchOperation('update', queue.model, {'id': record_id, **pending.values}, deltas=pending.deltas)
+            for record_id, pending in queue.updates.items()
+        ]
+        return operations
     
     async def _fallback_write(self, operations: List[BatchOperation]):
         """回退：逐条写入"""
@@ -283,19 +515,29 @@ class BatchDatabaseWriter:
         for operation in operations:
             try:
                 async for db in get_db():
+                    model = operation.model
                     if operation.operation_type == 'insert':
-                        record = operation.model(**operation.data)
+                        record = model(**operation.data)
                         db.add(record)
+                    elif operation.operation_type == 'upsert':
+                        keys = operation.deltas['_keys']
+                        condition = [getattr(model, key) == operation.data[key] for key in keys]
+                        values = {k: v for k, v in operation.data.items() if k not in keys}
+                        result = await db.execute(update(model).where(*condition).values(**values)) if values else None
+                        if result is None or result.rowcount == 0:
+                            db.add(model(**operation.data))
                     elif operation.operation_type == 'update':
                         data = operation.data.copy()
-                        if 'id' in data:
-                            record_id = data.pop('id')
-                            stmt = update(operation.model).where(
-                                operation.model.id == record_id
-                            ).values(**data)
+                        record_id = data.pop('id')
+                        for column, delta in operation.deltas.items():
+                            data[column] = func.coalesce(getattr(model, column), 0) + delta
+                        if data:
+                            stmt = update(model).where(model.id == record_id).values(**data)
                             await db.execute(stmt)
                     
                     await db.commit()
+                    self._commit_times.append(time.monotonic())
+                    self.stats['total_commits'] += 1
                     success_count += 1
                     break
             
@@ -305,6 +547,12 @@ class BatchDatabaseWriter:
         
         logger.info(f"回退写入完成: 成功={success_count}, 失败={fail_count}")
     
+    def get_commits_per_second(self, window: float = 60.0) -> float:
+        """最近 window 秒内的平均每秒提交数"""
+        now = time.monotonic()
+        recent = sum(1 for t in self._commit_times if now - t <= window)
+        return round(recent / window, 3)
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         return {
@@ -312,10 +560,18 @@ class BatchDatabaseWriter:
             'total_operations': self.stats['total_operations'],
             'total_inserts': self.stats['total_inserts'],
             'total_updates': self.stats['total_updates'],
+            'total_upserts': self.stats['total_upserts'],
+            'total_coalesced': self.stats['total_coalesced'],
             'total_flushes': self.stats['total_flushes'],
+            'total_commits': self.stats['total_commits'],
+            'commits_per_second': self.get_commits_per_second(),
             'total_errors': self.stats['total_errors'],
             'batch_size': self.batch_size,
-            'flush_interval': self.flush_interval
+            'flush_interval': self.flush_interval,
+            'flush_policies': {
+                name: {'batch_size': policy.batch_size, 'flush_interval': policy.flush_interval}
+                for name, policy in self._policies.items()
+            }
         }
     
     async def get_queue_status(self) -> Dict[str, int]:
@@ -345,4 +601,3 @@ async def init_batch_writer():
     writer = get_batch_writer()
     await writer.start()
     return writer
-
@@ -0,0 +1,189 @@
+"""
+自适应分块读取
+
+上传数据通路的公共部分：
+1. 在线程池中按偏移读取文件（os.pread），不阻塞事件循环，并预读下一块与网络发送重叠
+2. 按实测吞吐和单块往返时间调整块大小：链路快时增大块以摊薄每条消息的开销，
+   变慢时减小块以降低单块延迟
+3. 采样式传输统计：按时间间隔输出进度，结束时输出汇总，取代逐块日志
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from log_manager import get_logger
+
+logger = get_logger(__name__)
+
+KB = 1024
+MB = 1024 * 1024
+
+
+class AdaptiveChunkSizer:
+    """
+    根据吞吐自适应的块大小
+
+    目标是每块的发送耗时约为 target_seconds：块大小 = 平滑吞吐 × target_seconds，
+    每次最多放大/缩小一倍，并按 alignment 对齐、限制在 [min_size, max_size]
+    """
+
+    def __init__(
+        self,
+        initial: int = 1 * MB,
+        min_size: int = 256 * KB,
+        max_size: int = 4 * MB,
+        target_seconds: float = 0.25,
+        alignment: int = 64 * KB,
+        smoothing: float = 0.3
+    ):
+        """
+        Args:
+            initial: 初始块大小（字节）
+            min_size: 最小块大小
+            max_size: 最大块大小（不能超过服务端允许的单条消息大小）
+            target_seconds: 单块目标发送耗时（秒）
+            alignment: 块大小对齐粒度
+            smoothing: 吞吐/往返时间的指数平滑系数
+        """
+        self.min_size = max(1, min(min_size, max_size))
+        self.max_size = max(self.min_size, max_size)
+        self.target_seconds = target_seconds
+        self.alignment = max(1, alignment)
+        self.smoothing = smoothing
+        self.size = self._clamp(initial)
+        self.throughput: Optional[float] = None  # 字节/秒
+        self.rtt: Optional[float] = None  # 秒/块
+
+    @classmethod
+    def fixed(cls, size: int) -> 'AdaptiveChunkSizer':
+        """固定块大小（手动指定时使用）"""
+        return cls(initial=size, min_size=size, max_size=size, alignment=1)
+
+    def _clamp(self, size: float) -> int:
+        size = int(size) // self.alignment * self.alignment
+        return max(self.min_size, min(self.max_size, size))
+
+    def record(self, nbytes: int, seconds: float):
+        """记录一个数据块的发送量和耗时，更新下一块的大小"""
+        if nbytes <= 0 or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        if self.throughput is None:
+            self.throughput, self.rtt = rate, seconds
+        else:
+            self.throughput += self.smoothing * (rate - self.throughput)
+            self.rtt += self.smoothing * (seconds - self.rtt)
+
+        desired = self.throughput * self.target_seconds
+        desired = min(max(desired, self.size / 2), self.size * 2)
+        self.size = self._clamp(desired)
+
+
+def _read_at(f, size: int, offset: int) -> bytes:
+    if hasattr(os, 'pread'):
+        return os.pread(f.fileno(), size, offset)
+    f.seek(offset)
+    return f.read(size)
+
+
+class ChunkReader:
+    """
+    按偏移分块读取文件
+
+    读取在线程池中执行，当前块交给调用方发送时下一块已在读取；
+    每块大小在发起读取时从 sizer 获取，因此调整会在下一次预读生效
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sizer: AdaptiveChunkSizer,
+        start: int = 0,
+        executor: Optional[Executor] = None
+    ):
+        self.path = path
+        self.sizer = sizer
+        self.start = start
+        self._executor = executor
+
+    async def chunks(self) -> AsyncIterator[Tuple[int, bytes]]:
+        """依次产出 (偏移, 数据)"""
+        loop = asyncio.get_running_loop()
+        f = open(self.path, 'rb', buffering=0)
+        pending: Optional[asyncio.Future] = None
+        try:
+            offset = self.start
+            pending = loop.run_in_executor(self._executor, _read_at, f, self.sizer.size, offset)
+            while True:
+                data = await pending
+                if not data:
+                    pending = None
+                    break
+                next_offset = offset + len(data)
+                pending = loop.run_in_executor(self._executor, _read_at, f, self.sizer.size, next_offset)
+                yield offset, data
+                offset = next_offset
+        finally:
+            # 提前结束时预读可能仍在线程中执行，完成后再关闭文件
+            if pending is not None and not pending.done():
+                pending.add_done_callback(lambda _: f.close())
+            else:
+                f.close()
+
+
+class TransferMetrics:
+    """采样式传输统计（按间隔记录进度日志，结束时记录汇总）"""
+
+    def __init__(self, label: str, total_bytes: int, log_interval: float = 10.0):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.log_interval = log_interval
+        self.bytes = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.monotonic()
+        self._last_log = self.started_at
+
+    def record(self, nbytes: int, seconds: float, sizer: Optional[AdaptiveChunkSizer] = None):
+        """记录一个已发送的数据块"""
+        self.bytes += nbytes
+        self.chunks += 1
+        self.busy_seconds += seconds
+
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            percent = self.bytes / self.total_bytes * 100 if self.total_bytes else 100
+            chunk_kb = (sizer.size if sizer else nbytes) / KB
+            logger.info(
+                f"📤 {self.label}: {self.bytes}/{self.total_bytes} ({percent:.1f}%)，"
+                f"{self.rate_mbps():.2f}MB/s，块 {chunk_kb:.0f}KB"
+            )
+
+    def rate_mbps(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.bytes / MB / elapsed if elapsed > 0 else 0.0
+
+    def summary(self, sizer: Optional[AdaptiveChunkSizer] = None) -> Dict[str, Any]:
+        """汇总统计"""
+        result = {
+            'bytes': self.bytes,
+            'chunks': self.chunks,
+            'seconds': round(time.monotonic() - self.started_at, 3),
+            'rate_mbps': round(self.rate_mbps(), 2),
+            'avg_chunk_kb': round(self.bytes / self.chunks / KB, 1) if self.chunks else 0,
+        }
+        if sizer is not None:
+            result['final_chunk_kb'] = round(sizer.size / KB, 1)
+            result['rtt_ms'] = round(sizer.rtt * 1000, 1) if sizer.rtt is not None else None
+        return result
+
+    def log_summary(self, sizer: Optional[AdaptiveChunkSizer] = None):
+        s = self.summary(sizer)
+        logger.info(
+            f"📊 {self.label}: {s['bytes']} bytes / {s['chunks']} 块，{s['seconds']}s，"
+            f"{s['rate_mbps']}MB/s，平均块 {s['avg_chunk_kb']}KB"
+            + (f"，往返 {s['rtt_ms']}ms" if s.get('rtt_ms') is not None else "")
+        )
@@ -5,38 +5,177 @@
 1. 缓存消息处理结果，避免重复计算
 2. 缓存链接提取结果
 3. 缓存关键词匹配结果
-4. 自动过期管理
-5. 内存限制控制
+4. 自动过期管理（单调时钟 TTL，不受系统时间/时区影响）
+5. 内存限制控制（条目数 + 近似字节数双上限）
+
+实现说明：
+- 按键哈希分片，每个分片是独立的分段 LRU（试用段 + 保护段），
+  新键先进入试用段，再次命中才晋升到保护段，一次性的逐条消息键不会冲掉热点数据
+- 事件循环单线程执行，get/set 中没有 await 点，不需要锁
+- 定期清理每次只扫描一个分片，避免长时间占用事件循环
 """
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from dataclasses import dataclass
 import asyncio
 import hashlib
+import sys
+import time
 from collections import OrderedDict
 from log_manager import get_logger
-from timezone_utils import get_user_now
 
 logger = get_logger("message_cache", "enhanced_bot.log")
 
+# 保护段占分片容量的比例
+PROTECTED_RATIO = 0.8
+
+# 键命名空间（与 _make_message_key 的后缀对应）
+NAMESPACE_LINKS = "links"
+NAMESPACE_KEYWORDS = "keywords"
+NAMESPACE_RULE_MATCH = "rule_match"
+NAMESPACE_OTHER = "other"
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    估算对象占用的字节数（近似值，只向下展开三层容器）
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+def key_namespace(key: str) -> str:
+    """从缓存键推断命名空间：msg:{chat_id}:{message_id}:{suffix}"""
+    parts = key.split(":", 4)
+    if len(parts) >= 4 and parts[0] == "msg":
+        suffix = parts[3]
+        if suffix == "links":
+            return NAMESPACE_LINKS
+        if suffix == "keywords":
+            return NAMESPACE_KEYWORDS
+        if suffix == "rule":
+            return NAMESPACE_RULE_MATCH
+    return NAMESPACE_OTHER
+
 
 @dataclass
 class CacheEntry:
     """缓存条目"""
     key: str
     value: Any
-    created_at: datetime = field(default_factory=get_user_now)
-    last_accessed: datetime = field(default_factory=get_user_now)
+    size: int
+    expires_at: float
+    protected: bool = False
     access_count: int = 0
     
-    def is_expired(self, ttl: int) -> bool:
+    def is_expired(self, now: float) -> bool:
         """检查是否过期"""
-        return (get_user_now() - self.created_at).total_seconds() > ttl
+        return now >= self.expires_at
+
+
+class CacheShard:
+    """
+    单个分片：分段 LRU
+    
+    - probation: 新写入的条目，淘汰优先从这里开始
+    - protected: 至少命中过一次的条目，超出配额时降级回试用段
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.protected_max_bytes = int(self.max_bytes * PROTECTED_RATIO)
+        
+        self.probation: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.protected: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        self.protected_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self.probation) + len(self.protected)
+    
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self.protected.get(key)
+        if entry is not None:
+            return entry
+        return self.probation.get(key)
+    
+    def touch(self, entry: CacheEntry):
+        """命中：试用段晋升到保护段，保护段移到末尾"""
+        entry.access_count += 1
+        if entry.protected:
+            self.protected.move_to_end(entry.key)
+            return
+        
+        del self.probation[entry.key]
+        entry.protected = True
+        self.protected[entry.key] = entry
+        self.protected_bytes += entry.size
+        self._demote_overflow()
+    
+    def insert(self, entry: CacheEntry) -> int:
+        """写入新条目，返回被淘汰的条目数"""
+        self.probation[entry.key] = entry
+        self.bytes += entry.size
+        return self._evict()
+    
+    def remove(self, entry: CacheEntry):
+        if entry.protected:
+            del self.protected[entry.key]
+            self.protected_bytes -= entry.size
+        else:
+            del self.probation[entry.key]
+        self.bytes -= entry.size
     
-    def access(self):
-        """记录访问"""
-        self.last_accessed = get_user_now()
-        self.access_count += 1
+    def resize(self, entry: CacheEntry, new_size: int) -> int:
+        """更新条目大小（覆盖写入），返回被淘汰的条目数"""
+        delta = new_size - entry.size
+        entry.size = new_size
+        self.bytes += delta
+        if entry.protected:
+            self.protected_bytes += delta
+            self.protected.move_to_end(entry.key)
+            self._demote_overflow()
+        else:
+            self.probation.move_to_end(entry.key)
+        return self._evict()
+    
+    def expired_keys(self, now: float) -> List[str]:
+        return [
+            key for segment in (self.probation, self.protected)
+            for key, entry in segment.items() if entry.is_expired(now)
+        ]
+    
+    def clear(self):
+        self.probation.clear()
+        self.protected.clear()
+        self.bytes = 0
+        self.protected_bytes = 0
+    
+    def _demote_overflow(self):
+        while self.protected_bytes > self.protected_max_bytes and len(self.protected) > 1:
+            _, victim = self.protected.popitem(last=False)
+            victim.protected = False
+            self.protected_bytes -= victim.size
+            self.probation[victim.key] = victim
+    
+    def _evict(self) -> int:
+        evicted = 0
+        while len(self) > 1 and (len(self) > self.max_entries or self.bytes > self.max_bytes):
+            segment = self.probation if self.probation else self.protected
+            _, victim = segment.popitem(last=False)
+            if victim.protected:
+                self.protected_bytes -= victim.size
+            self.bytes -= victim.size
+            evicted += 1
+        return evicted
 
 
 class MessageCacheManager:
@@ -44,34 +183,40 @@ class MessageCacheManager:
     消息缓存管理器
     
     特性：
-    1. LRU缓存策略
-    2. TTL自动过期
-    3. 内存限制
-    4. 统计信息
+    1. 分片 + 分段LRU缓存策略
+    2. TTL自动过期（单调时钟）
+    3. 条目数与近似内存双重限制
+    4. 按命名空间（links / keywords / rule_match）统计命中率
     """
     
     def __init__(
         self,
         max_size: int = 1000,
         default_ttl: int = 3600,  # 默认1小时
-        cleanup_interval: int = 300  # 5分钟清理一次
+        cleanup_interval: int = 300,  # 5分钟清理一轮
+        max_memory_mb: float = 32,
+        num_shards: int = 8
     ):
         self.max_size = max_size
         self.default_ttl = default_ttl
         self.cleanup_interval = cleanup_interval
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.num_shards = max(1, num_shards)
         
-        # 使用OrderedDict实现LRU
-        self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
-        self._lock = asyncio.Lock()
+        per_shard_entries = -(-max_size // self.num_shards)
+        per_shard_bytes = self.max_bytes // self.num_shards
+        self._shards: List[CacheShard] = [
+            CacheShard(per_shard_entries, per_shard_bytes) for _ in range(self.num_shards)
+        ]
         
         # 统计信息
         self.stats = {
             'hits': 0,
             'misses': 0,
             'evictions': 0,
-            'expirations': 0,
-            'total_size': 0
+            'expirations': 0
         }
+        self._namespace_stats: Dict[str, Dict[str, int]] = {}
         
         # 启动清理任务
         self._cleanup_task = None
@@ -84,7 +229,10 @@ class MessageCacheManager:
         
         self._is_running = True
         self._cleanup_task = asyncio.create_task(self._cleanup_loop())
-        logger.info(f"✅ 消息缓存管理器已启动 (max_size={self.max_size}, ttl={self.default_ttl}s)")
+        logger.info(
+            f"✅ 消息缓存管理器已启动 (max_size={self.max_size}, "
+            f"max_memory={self.max_bytes / 1024 / 1024:.0f}MB, shards={self.num_shards}, ttl={self.default_ttl}s)"
+        )
     
     async def stop(self):
         """停止缓存管理器"""
@@ -97,110 +245,143 @@ class MessageCacheManager:
                 pass
         logger.info("✅ 消息缓存管理器已停止")
     
-    async def get(self, key: str, default: Any = None) -> Optional[Any]:
-        """获取缓存值"""
-        async with self._lock:
-            entry = self._cache.get(key)
-            
-            if entry is None:
-                self.stats['misses'] += 1
-                return default
-            
-            # 检查是否过期
-            if entry.is_expired(self.default_ttl):
-                del self._cache[key]
-                self.stats['expirations'] += 1
-                self.stats['misses'] += 1
-                return default
-            
-            # 记录访问并移到末尾（LRU）
-            entry.access()
-            self._cache.move_to_end(key)
+    def _shard_for(self, key: str) -> CacheShard:
+        return self._shards[hash(key) % self.num_shards]
+    
+    def _record(self, namespace: Optional[str], key: str, hit: bool):
+        ns = namespace or key_namespace(key)
+        counters = self._namespace_stats.get(ns)
+        if counters is None:
+            counters = self._namespace_stats[ns] = {'hits': 0, 'misses': 0}
+        if hit:
             self.stats['hits'] += 1
-            
-            return entry.value
+            counters['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            counters['misses'] += 1
+    
+    async def get(self, key: str, default: Any = None, namespace: Optional[str] = None) -> Optional[Any]:
+        """获取缓存值"""
+        shard = self._shard_for(key)
+        entry = shard.lookup(key)
+        
+        if entry is None:
+            self._record(namespace, key, False)
+            return default
+        
+        # 检查是否过期
+        if entry.is_expired(time.monotonic()):
+            shard.remove(entry)
+            self.stats['expirations'] += 1
+            self._record(namespace, key, False)
+            return default
+        
+        shard.touch(entry)
+        self._record(namespace, key, True)
+        return entry.value
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None):
         """设置缓存值"""
-        async with self._lock:
-            # 如果已存在，更新
-            if key in self._cache:
-                entry = self._cache[key]
-                entry.value = value
-                entry.created_at = get_user_now()
-                entry.last_accessed = get_user_now()
-                self._cache.move_to_end(key)
-                return
-            
-            # 检查容量限制
-            if len(self._cache) >= self.max_size:
-                # 移除最旧的条目（LRU）
-                oldest_key, _ = self._cache.popitem(last=False)
-                self.stats['evictions'] += 1
-                logger.debug(f"缓存已满，移除最旧条目: {oldest_key}")
-            
-            # 添加新条目
-            entry = CacheEntry(key=key, value=value)
-            self._cache[key] = entry
-            self.stats['total_size'] = len(self._cache)
+        shard = self._shard_for(key)
+        size = estimate_size(key) + estimate_size(value)
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        
+        # 如果已存在，更新
+        entry = shard.lookup(key)
+        if entry is not None:
+            entry.value = value
+            entry.expires_at = expires_at
+            self.stats['evictions'] += shard.resize(entry, size)
+            return
+        
+        entry = CacheEntry(key=key, value=value, size=size, expires_at=expires_at)
+        self.stats['evictions'] += shard.insert(entry)
     
     async def delete(self, key: str):
         """删除缓存值"""
-        async with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                self.stats['total_size'] = len(self._cache)
+        shard = self._shard_for(key)
+        entry = shard.lookup(key)
+        if entry is not None:
+            shard.remove(entry)
     
     async def clear(self):
         """清空缓存"""
-        async with self._lock:
-            self._cache.clear()
-            self.stats['total_size'] = 0
-            logger.info("缓存已清空")
+        for shard in self._shards:
+            shard.clear()
+        logger.info("缓存已清空")
     
     async def _cleanup_loop(self):
-        """定期清理过期缓存"""
+        """定期清理过期缓存（每个周期内逐个分片扫描）"""
+        interval = self.cleanup_interval / self.num_shards
+        index = 0
         while self._is_running:
             try:
-                await asyncio.sleep(self.cleanup_interval)
-                await self._cleanup_expired()
+                await asyncio.sleep(interval)
+                self._cleanup_shard(self._shards[index])
+                index = (index + 1) % self.num_shards
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"清理缓存失败: {e}", exc_info=True)
     
-    async def _cleanup_expired(self):
-        """清理过期缓存"""
-        async with self._lock:
-            expired_keys = []
-            
-            for key, entry in self._cache.items():
-                if entry.is_expired(self.default_ttl):
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self._cache[key]
-                self.stats['expirations'] += 1
-            
-            self.stats['total_size'] = len(self._cache)
-            
-            if expired_keys:
-                logger.info(f"清理过期缓存: {len(expired_keys)} 条")
+    def _cleanup_shard(self, shard: CacheShard) -> int:
+        """清理单个分片中的过期条目"""
+        expired_keys = shard.expired_keys(time.monotonic())
+        for key in expired_keys:
+            shard.remove(shard.lookup(key))
+        self.stats['expirations'] += len(expired_keys)
+        
+        if expired_keys:
+            logger.debug(f"清理过期缓存: {len(expired_keys)} 条")
+        return len(expired_keys)
+    
+    async def _cleanup_expired(self) -> int:
+        """清理所有分片的过期缓存"""
+        removed = sum(self._cleanup_shard(shard) for shard in self._shards)
+        if removed:
+            logger.info(f"清理过期缓存: {removed} 条")
+        return removed
+    
+    @staticmethod
+    def _hit_rate(hits: int, misses: int) -> float:
+        total = hits + misses
+        return (hits / total * 100) if total > 0 else 0
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
-        total_requests = self.stats['hits'] + self.stats['misses']
-        hit_rate = (self.stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+        total_size = sum(len(shard) for shard in self._shards)
+        total_bytes = sum(shard.bytes for shard in self._shards)
+        protected = sum(len(shard.protected) for shard in self._shards)
+        
+        entry_usage = (total_size / self.max_size * 100) if self.max_size > 0 else 0
+        memory_usage = (total_bytes / self.max_bytes * 100) if self.max_bytes > 0 else 0
+        
+        namespaces = {
+            ns: {
+                'hits': counters['hits'],
+                'misses': counters['misses'],
+                'hit_rate': f"{self._hit_rate(counters['hits'], counters['misses']):.2f}%"
+            }
+            for ns, counters in sorted(self._namespace_stats.items())
+        }
         
         return {
-            'total_size': self.stats['total_size'],
+            'total_size': total_size,
             'max_size': self.max_size,
-            'usage_percent': (self.stats['total_size'] / self.max_size * 100) if self.max_size > 0 else 0,
+            'usage_percent': max(entry_usage, memory_usage),
+            'memory_mb': round(total_bytes / 1024 / 1024, 2),
+            'max_memory_mb': round(self.max_bytes / 1024 / 1024, 2),
             'hits': self.stats['hits'],
             'misses': self.stats['misses'],
-            'hit_rate': f"{hit_rate:.2f}%",
+            'hit_rate': f"{self._hit_rate(self.stats['hits'], self.stats['misses']):.2f}%",
             'evictions': self.stats['evictions'],
-            'expirations': self.stats['expirations']
+            'expirations': self.stats['expirations'],
+            'shards': self.num_shards,
+            'segments': {
+                'probation': total_size - protected,
+                'protected': protected
+            },
+            'namespaces': namespaces
         }
     
     # ===== 便捷方法：消息相关缓存 =====
@@ -218,7 +399,7 @@ class MessageCacheManager:
     async def get_extracted_links(self, chat_id: int, message_id: int) -> Optional[Dict[str, List[str]]]:
         """获取缓存的链接"""
         key = self._make_message_key(chat_id, message_id, "links")
-        return await self.get(key)
+        return await self.get(key, namespace=NAMESPACE_LINKS)
     
     async def cache_matched_keywords(self, chat_id: int, message_id: int, keywords_hash: str, matched: List[str]):
         """缓存匹配的关键词"""
@@ -228,7 +409,7 @@ class MessageCacheManager:
     async def get_matched_keywords(self, chat_id: int, message_id: int, keywords_hash: str) -> Optional[List[str]]:
         """获取缓存的关键词匹配结果"""
         key = self._make_message_key(chat_id, message_id, f"keywords:{keywords_hash}")
-        return await self.get(key)
+        return await self.get(key, namespace=NAMESPACE_KEYWORDS)
     
     async def cache_rule_match(self, chat_id: int, message_id: int, rule_id: int, matched: bool):
         """缓存规则匹配结果"""
@@ -238,7 +419,7 @@ class MessageCacheManager:
     async def get_rule_match(self, chat_id: int, message_id: int, rule_id: int) -> Optional[bool]:
         """获取缓存的规则匹配结果"""
         key = self._make_message_key(chat_id, message_id, f"rule:{rule_id}")
-        return await self.get(key)
+        return await self.get(key, namespace=NAMESPACE_RULE_MATCH)
     
     @staticmethod
     def hash_keywords(keywords: List[str]) -> str:
@@ -265,4 +446,3 @@ async def init_message_cache():
     cache = get_message_cache()
     await cache.start()
     return cache
-
@@ -0,0 +1,425 @@
+"""
+统一实时进度总线
+
+功能：
+1. 以任务键（kind:task_id）聚合下载、上传、离线任务的实时进度
+2. 线程安全发布（Telethon 进度回调运行在客户端自己的事件循环线程中）
+3. 订阅者按帧合并变化，供 WebSocket/SSE 推送
+4. 只在终态和周期性检查点时写数据库（由各业务注册检查点处理器）
+"""
+from typing import Dict, List, Any, Optional, Set, Callable, Awaitable, Iterable
+from dataclasses import dataclass, field
+import asyncio
+import threading
+import time
+from log_manager import get_logger
+
+logger = get_logger("progress_bus", "enhanced_bot.log")
+
+# 任务类型
+KIND_DOWNLOAD = "download"
+KIND_UPLOAD = "upload"
+KIND_OFFLINE = "offline"
+
+# 终态（进入终态后保留一段时间供前端展示，然后从内存移除）
+TERMINAL_STATUSES = {"success", "failed", "completed", "cancelled", "quick_success"}
+
+
+@dataclass
+class ProgressState:
+    """单个任务的实时进度"""
+    kind: str
+    task_id: str
+    status: str = "pending"
+    name: Optional[str] = None
+    current_bytes: int = 0
+    total_bytes: int = 0
+    percent: float = 0.0
+    speed_bytes_per_sec: float = 0.0
+    error: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+    version: int = 0
+    updated_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.task_id}"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "kind": self.kind,
+            "task_id": self.task_id,
+            "status": self.status,
+            "name": self.name,
+            "current_bytes": self.current_bytes,
+            "total_bytes": self.total_bytes,
+            "percent": round(self.percent, 2),
+            "speed_mbps": round(self.speed_bytes_per_sec / 1024 / 1024, 2),
+            "error": self.error,
+            "extra": self.extra,
+            "version": self.version,
+            "updated_at": self.updated_at,
+        }
+
+
+class ProgressSubscription:
+    """
+    进度订阅
+
+    只记录发生变化的任务键，消费时读取最新状态，
+    因此同一任务在一帧内的多次更新自然合并，内存占用以任务数为上限。
+    """
+
+    def __init__(self, bus: 'ProgressBus', kinds: Optional[Set[str]] = None):
+        self._bus = bus
+        self.kinds = kinds
+        self._pending: Set[str] = set()
+        self._event = asyncio.Event()
+
+    def _mark(self, key: str, kind: str):
+        if self.kinds and kind not in self.kinds:
+            return
+        self._pending.add(key)
+        self._event.set()
+
+    async def next_batch(self, frame_interval: float = 0.5, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        等待下一批变化
+
+        Returns:
+            变化的任务状态列表；已移除的任务以 {"key": ..., "removed": True} 表示；
+            超时返回空列表
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        # 在帧预算内合并更新
+        await asyncio.sleep(frame_interval)
+        self._event.clear()
+        keys, self._pending = self._pending, set()
+        return self._bus.get_states(keys)
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class ProgressBus:
+    """
+    统一实时进度总线
+
+    特性：
+    1. publish() 可在任意线程调用
+    2. 订阅者按帧合并推送
+    3. 检查点处理器按类型批量持久化（终态立即触发一次检查点）
+    4. 终态任务保留 retain_seconds 后移除
+    """
+
+    def __init__(
+        self,
+        checkpoint_interval: float = 15.0,  # 秒
+        retain_seconds: float = 60.0
+    ):
+        self.checkpoint_interval = checkpoint_interval
+        self.retain_seconds = retain_seconds
+
+        self._states: Dict[str, ProgressState] = {}
+        self._lock = threading.Lock()
+
+        # 待持久化的任务键（按类型分组）
+        self._checkpoint_dirty: Dict[str, Set[str]] = {}
+        self._checkpoint_handlers: Dict[str, Callable[[List[ProgressState]], Awaitable[None]]] = {}
+        self._checkpoint_wakeup: Optional[asyncio.Event] = None
+
+        self._subscribers: Set[ProgressSubscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 运行状态
+        self._is_running = False
+        self._checkpoint_task: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.stats = {
+            'total_published': 0,
+            'total_checkpoints': 0,
+            'total_checkpoint_rows': 0,
+            'total_errors': 0,
+        }
+
+    async def start(self):
+        """启动进度总线（绑定当前事件循环）"""
+        if self._is_running:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._checkpoint_wakeup = asyncio.Event()
+        self._is_running = True
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        logger.info(f"✅ 进度总线已启动 (checkpoint_interval={self.checkpoint_interval}s)")
+
+    async def stop(self):
+        """停止进度总线（写入最后一次检查点）"""
+        self._is_running = False
+
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+
+        await self.checkpoint()
+        logger.info("✅ 进度总线已停止")
+
+    # ==================== 发布 ====================
+
+    def publish(
+        self,
+        kind: str,
+        task_id: Any,
+        status: Optional[str] = None,
+        current_bytes: Optional[int] = None,
+        total_bytes: Optional[int] = None,
+        percent: Optional[float] = None,
+        name: Optional[str] = None,
+        error: Optional[str] = None,
+        **extra
+    ) -> ProgressState:
+        """
+        发布任务进度（线程安全，未传入的字段保持不变）
+
+        percent 未传入时根据字节数计算；速度按字节增量做指数平滑
+        """
+        task_id = str(task_id)
+        key = f"{kind}:{task_id}"
+        now = time.time()
+
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = ProgressState(kind=kind, task_id=task_id, updated_at=now)
+                self._states[key] = state
+
+            if total_bytes is not None:
+                state.total_bytes = total_bytes
+            if current_bytes is not None:
+                elapsed = now - state.updated_at
+                delta = current_bytes - state.current_bytes
+                if elapsed > 0 and delta >= 0 and state.current_bytes:
+                    instant = delta / elapsed
+                    state.speed_bytes_per_sec = (
+                        instant if not state.speed_bytes_per_sec
+                        else state.speed_bytes_per_sec * 0.7 + instant * 0.3
+                    )
+                state.current_bytes = current_bytes
+            if percent is not None:
+                state.percent = percent
+            elif current_bytes is not None and state.total_bytes:
+                state.percent = current_bytes / state.total_bytes * 100
+            if status is not None:
+                state.status = status
+                if status not in TERMINAL_STATUSES:
+                    # 重试的任务回到进行中：不再按结束时间移除，清除上一次的错误
+                    state.finished_at = None
+                    state.error = None
+            if name is not None:
+                state.name = name
+            if error is not None:
+                state.error = error
+            if extra:
+                state.extra.update(extra)
+
+            state.version += 1
+            state.updated_at = now
+            if state.is_terminal:
+                state.finished_at = now
+                state.speed_bytes_per_sec = 0.0
+
+            self._checkpoint_dirty.setdefault(kind, set()).add(key)
+            terminal = state.is_terminal
+            self.stats['total_published'] += 1
+
+        self._dispatch(key, kind, flush=terminal)
+        return state
+
+    def remove(self, kind: str, task_id: Any):
+        """从总线移除任务（不触发持久化）"""
+        key = f"{kind}:{task_id}"
+        with self._lock:
+            removed = self._states.pop(key, None)
+            dirty = self._checkpoint_dirty.get(kind)
+            if dirty:
+                dirty.discard(key)
+        if removed is not None:
+            self._dispatch(key, kind)
+
+    def _dispatch(self, key: str, kind: str, flush: bool = False):
+        """通知订阅者（切换到总线所在的事件循环）"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._notify(key, kind, flush)
+        else:
+            loop.call_soon_threadsafe(self._notify, key, kind, flush)
+
+    def _notify(self, key: str, kind: str, flush: bool):
+        for subscription in list(self._subscribers):
+            subscription._mark(key, kind)
+        if flush and self._checkpoint_wakeup:
+            self._checkpoint_wakeup.set()
+
+    # ==================== 查询与订阅 ====================
+
+    def get_state(self, kind: str, task_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(f"{kind}:{task_id}")
+            return state.to_dict() if state else None
+
+    def get_states(self, keys: Iterable[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            result = []
+            for key in keys:
+                state = self._states.get(key)
+                result.append(state.to_dict() if state else {"key": key, "removed": True})
+            return result
+
+    def snapshot(self, kinds: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """获取所有任务的当前状态"""
+        with self._lock:
+            return [
+                state.to_dict() for state in self._states.values()
+                if not kinds or state.kind in kinds
+            ]
+
+    def subscribe(self, kinds: Optional[Set[str]] = None) -> ProgressSubscription:
+        """订阅进度变化（必须在总线所在的事件循环中调用）"""
+        subscription = ProgressSubscription(self, kinds)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription):
+        self._subscribers.discard(subscription)
+
+    # ==================== 持久化 ====================
+
+    def register_checkpoint_handler(
+        self,
+        kind: str,
+        handler: Callable[[List[ProgressState]], Awaitable[None]]
+    ):
+        """
+        注册检查点处理器
+
+        处理器在总线事件循环中被调用，一次接收该类型自上次检查点以来
+        发生变化的全部任务状态（副本），应在一个事务中批量写入
+        """
+        self._checkpoint_handlers[kind] = handler
+        logger.info(f"✅ 注册进度检查点处理器: {kind}")
+
+    async def _checkpoint_loop(self):
+        """周期性检查点循环（终态会提前唤醒）"""
+        while self._is_running:
+            try:
+                try:
+                    await asyncio.wait_for(self._checkpoint_wakeup.wait(), timeout=self.checkpoint_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._checkpoint_wakeup.clear()
+                await self.checkpoint()
+                self._evict_finished()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"进度检查点循环错误: {e}", exc_info=True)
+
+    async def checkpoint(self):
+        """将变化的任务状态交给各类型的处理器持久化"""
+        with self._lock:
+            batches: Dict[str, List[ProgressState]] = {}
+            for kind, keys in self._checkpoint_dirty.items():
+                if kind not in self._checkpoint_handlers or not keys:
+                    continue
+                batches[kind] = [
+                    ProgressState(**{**vars(self._states[key]), 'extra': dict(self._states[key].extra)})
+                    for key in keys if key in self._states
+                ]
+                keys.clear()
+            # 没有处理器的类型不需要记录脏键
+            for kind in list(self._checkpoint_dirty):
+                if kind not in self._checkpoint_handlers:
+                    self._checkpoint_dirty[kind].clear()
+
+        for kind, states in batches.items():
+            if not states:
+                continue
+            try:
+                await self._checkpoint_handlers[kind](states)
+                self.stats['total_checkpoints'] += 1
+                self.stats['total_checkpoint_rows'] += len(states)
+            except Exception as e:
+                self.stats['total_errors'] += 1
+                logger.error(f"进度检查点写入失败: {kind}, 错误: {e}", exc_info=True)
+                # 重新标记为待写入，下一次检查点重试（期间的新进度会合并到同一键）
+                with self._lock:
+                    self._checkpoint_dirty.setdefault(kind, set()).update(state.key for state in states)
+
+    def _evict_finished(self):
+        """移除已结束且超过保留时间的任务"""
+        deadline = time.time() - self.retain_seconds
+        with self._lock:
+            expired = [
+                (state.kind, key) for key, state in self._states.items()
+                if state.finished_at is not None and state.finished_at < deadline
+            ]
+            for _, key in expired:
+                del self._states[key]
+        for kind, key in expired:
+            self._notify(key, kind, False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            by_kind: Dict[str, int] = {}
+            for state in self._states.values():
+                by_kind[state.kind] = by_kind.get(state.kind, 0) + 1
+        return {
+            **self.stats,
+            'tracked_tasks': sum(by_kind.values()),
+            'tracked_by_kind': by_kind,
+            'subscribers': len(self._subscribers),
+            'checkpoint_interval': self.checkpoint_interval,
+        }
+
+
+# 全局进度总线实例
+_progress_bus: Optional[ProgressBus] = None
+
+
+def get_progress_bus() -> ProgressBus:
+    """获取全局进度总线实例"""
+    global _progress_bus
+    if _progress_bus is None:
+        _progress_bus = ProgressBus()
+        logger.info("✅ 创建全局进度总线")
+    return _progress_bus
+
+
+async def init_progress_bus():
+    """初始化进度总线"""
+    bus = get_progress_bus()
+    await bus.start()
+    return bus
@@ -6,16 +6,19 @@
 2. 指数退避策略
 3. 最大重试次数限制
 4. 优先级支持
-5. 磁盘持久化（防止数据丢失）
+5. 磁盘持久化（SQLite 日志表，每次添加/完成/失败增量写入，重启后按原状态恢复）
 """
-from typing import Dict, Any, Optional, Callable, Awaitable, List
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Deque
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timedelta
 from enum import Enum
 import asyncio
 import heapq
+from collections import deque
 import json
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from log_manager import get_logger
 from timezone_utils import get_user_now
@@ -59,6 +62,9 @@ class RetryTask:
     created_at: datetime = field(compare=False, default_factory=datetime.now)
     last_retry_at: Optional[datetime] = field(compare=False, default=None)
     
+    # 持久化日志中的行号
+    journal_id: Optional[int] = field(compare=False, default=None)
+    
     def calculate_next_delay(self) -> int:
         """计算下次重试延迟（秒）"""
         if self.strategy == RetryStrategy.IMMEDIATE:
@@ -130,6 +136,108 @@ class RetryTask:
         )
 
 
+class RetryJournal:
+    """
+    重试队列持久化日志（独立的 SQLite 文件）
+    
+    队列中的每个任务对应一行：添加时插入、失败重排时更新、完成或放弃时删除，
+    处理中的任务保留在表中，进程崩溃后重启会重新执行。
+    所有读写在单线程执行器中顺序执行，不阻塞事件循环。
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retry-journal')
+    
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _open(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS retry_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                next_retry_time TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.commit()
+        self._conn = conn
+    
+    def _load(self) -> List[tuple]:
+        return self._conn.execute("SELECT id, payload FROM retry_tasks ORDER BY id").fetchall()
+    
+    def _put(self, journal_id: Optional[int], task_id: str, task_type: str, next_retry_time: str, payload: str) -> int:
+        now = get_user_now().isoformat()
+        if journal_id is None:
+            cursor = self._conn.execute(
+                "INSERT INTO retry_tasks (task_id, task_type, next_retry_time, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (task_id, task_type, next_retry_time, payload, now)
+            )
+            journal_id = cursor.lastrowid
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retry_tasks (id, task_id, task_type, next_retry_time, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (journal_id, task_id, task_type, next_retry_time, payload, now)
+            )
+        self._conn.commit()
+        return journal_id
+    
+    def _delete(self, journal_id: int):
+        self._conn.execute("DELETE FROM retry_tasks WHERE id = ?", (journal_id,))
+        self._conn.commit()
+    
+    def _compact(self) -> Dict[str, int]:
+        """合并 WAL 并在空闲页较多时回收空间"""
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages > 256:
+            self._conn.execute("VACUUM")
+        rows = self._conn.execute("SELECT count(*) FROM retry_tasks").fetchone()[0]
+        return {'rows': rows, 'free_pages': free_pages}
+    
+    def _close(self):
+        if self._conn:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+    
+    async def open(self):
+        await self._run(self._open)
+    
+    async def load(self) -> List[tuple]:
+        """读取全部任务 [(行号, JSON)]"""
+        return await self._run(self._load)
+    
+    async def put(self, task: RetryTask) -> int:
+        """写入任务（新任务插入并返回行号，已有任务整行替换）"""
+        payload = json.dumps(task.to_dict(), ensure_ascii=False)
+        return await self._run(
+            self._put, task.journal_id, task.task_id, task.task_type,
+            task.next_retry_time.isoformat(), payload
+        )
+    
+    async def delete(self, journal_id: int):
+        await self._run(self._delete, journal_id)
+    
+    async def compact(self) -> Dict[str, int]:
+        return await self._run(self._compact)
+    
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+
 class SmartRetryQueue:
     """
     智能重试队列
@@ -137,30 +245,43 @@ class SmartRetryQueue:
     特性：
     1. 优先级队列
     2. 多种重试策略
-    3. 自动调度
-    4. 统计监控
+    3. 事件驱动调度：定时器只在最早的重试时间到达时唤醒，工作协程通过条件变量等待就绪任务
+    4. 按任务类型限制并发（某类任务堆积时不占满全部工作协程）
+    5. 统计监控
     """
     
     def __init__(
         self,
         max_concurrent: int = 5,
-        check_interval: int = 10,  # 检查间隔（秒）
+        default_type_limit: Optional[int] = None,
         persistence_enabled: bool = True,
-        persistence_path: str = "data/retry_queue.json",
-        persistence_interval: int = 60  # 持久化间隔（秒）
+        persistence_path: str = "data/retry_queue.db",
+        compaction_interval: int = 600  # 日志压缩间隔（秒）
     ):
         self.max_concurrent = max_concurrent
-        self.check_interval = check_interval
+        # 每种任务类型默认的最大并发（默认为工作协程数的一半，至少1）
+        self.default_type_limit = default_type_limit or max(1, max_concurrent // 2)
         self.persistence_enabled = persistence_enabled
         self.persistence_path = persistence_path
-        self.persistence_interval = persistence_interval
+        self.compaction_interval = compaction_interval
+        self._journal: Optional[RetryJournal] = None
         
-        # 优先级队列（最小堆）
+        # 等待中的任务（按下次重试时间的最小堆）
         self._queue: List[RetryTask] = []
         self._lock = asyncio.Lock()
         
+        # 已到期的任务（按任务类型分组，FIFO）
+        self._ready: Dict[str, Deque[RetryTask]] = {}
+        self._ready_cond = asyncio.Condition(self._lock)
+        self._running: Dict[str, int] = {}
+        self._timer_wakeup = asyncio.Event()
+        
+        # 处理器尚未注册的任务（按任务类型暂存，注册处理器时放回等待堆；日志记录保留）
+        self._unhandled: Dict[str, List[RetryTask]] = {}
+        
         # 任务处理器注册表
         self._handlers: Dict[str, Callable[[RetryTask], Awaitable[bool]]] = {}
+        self._type_limits: Dict[str, int] = {}
         
         # 运行状态
         self._is_running = False
@@ -177,21 +298,41 @@ class SmartRetryQueue:
             'total_abandoned': 0,
             'current_queue_size': 0,
             'last_persistence': None,
+            'last_compaction': None,
+            'journal_writes': 0,
             'persistence_errors': 0
         }
     
     def register_handler(
         self,
         task_type: str,
-        handler: Callable[[RetryTask], Awaitable[bool]]
+        handler: Callable[[RetryTask], Awaitable[bool]],
+        max_concurrent: Optional[int] = None
     ):
         """
         注册任务处理器
         
         handler 应该返回 True（成功）或 False（失败）
+        
+        Args:
+            max_concurrent: 该类型同时执行的最大任务数（默认 default_type_limit）
         """
         self._handlers[task_type] = handler
+        if max_concurrent:
+            self._type_limits[task_type] = max_concurrent
         logger.info(f"✅ 注册重试处理器: {task_type}")
+        
+        # 放回处理器注册前到期的任务（同步执行，期间不会有其他协程修改等待堆）
+        parked = self._unhandled.pop(task_type, None)
+        if parked:
+            for task in parked:
+                heapq.heappush(self._queue, task)
+            self._update_queue_size()
+            self._timer_wakeup.set()
+            logger.info(f"🔄 恢复 {len(parked)} 个等待处理器的重试任务: {task_type}")
+    
+    def _type_limit(self, task_type: str) -> int:
+        return self._type_limits.get(task_type, self.default_type_limit)
     
     async def start(self):
         """启动重试队列"""
@@ -200,9 +341,9 @@ class SmartRetryQueue:
         
         self._is_running = True
         
-        # 从磁盘加载队列
+        # 从持久化日志恢复队列
         if self.persistence_enabled:
-            await self._load_from_disk()
+            await self._load_from_journal()
         
         # 启动调度器
         self._scheduler_task = asyncio.create_task(self._scheduler_loop())
@@ -212,8 +353,8 @@ class SmartRetryQueue:
             task = asyncio.create_task(self._worker_loop(i))
             self._worker_tasks.append(task)
         
-        # 启动持久化任务
-        if self.persistence_enabled:
+        # 启动日志压缩任务
+        if self._journal:
             self._persistence_task = asyncio.create_task(self._persistence_loop())
         
         logger.info(
@@ -225,10 +366,6 @@ class SmartRetryQueue:
         """停止重试队列"""
         self._is_running = False
         
-        # 保存队列到磁盘
-        if self.persistence_enabled:
-            await self._save_to_disk()
-        
         # 停止持久化任务
         if self._persistence_task:
             self._persistence_task.cancel()
@@ -252,6 +389,11 @@ class SmartRetryQueue:
         await asyncio.gather(*self._worker_tasks, return_exceptions=True)
         self._worker_tasks.clear()
         
+        # 每次变更已即时写入日志，这里只需关闭
+        if self._journal:
+            await self._journal.close()
+            self._journal = None
+        
         logger.info("✅ 智能重试队列已停止")
     
     async def add_task(
@@ -265,84 +407,116 @@ class SmartRetryQueue:
         base_delay: int = 60
     ):
         """添加重试任务"""
+        task = RetryTask(
+            task_id=task_id,
+            task_type=task_type,
+            task_data=task_data,
+            priority=priority,
+            max_retries=max_retries,
+            strategy=strategy,
+            base_delay=base_delay,
+            next_retry_time=get_user_now()  # 立即可重试
+        )
+        
+        await self._journal_put(task)
         async with self._lock:
-            task = RetryTask(
-                task_id=task_id,
-                task_type=task_type,
-                task_data=task_data,
-                priority=priority,
-                max_retries=max_retries,
-                strategy=strategy,
-                base_delay=base_delay,
-                next_retry_time=get_user_now()  # 立即可重试
-            )
-            
-            heapq.heappush(self._queue, task)
+            self._schedule(task)
             self.stats['total_added'] += 1
-            self.stats['current_queue_size'] = len(self._queue)
-            
-            logger.info(f"添加重试任务: {task_id} (type={task_type}, priority={priority})")
+        
+        logger.info(f"添加重试任务: {task_id} (type={task_type}, priority={priority})")
+    
+    def _schedule(self, task: RetryTask):
+        """放入等待堆；成为最早的任务时唤醒定时器（调用方持有锁）"""
+        heapq.heappush(self._queue, task)
+        if self._queue[0] is task:
+            self._timer_wakeup.set()
+        self._update_queue_size()
+    
+    def _update_queue_size(self):
+        self.stats['current_queue_size'] = (
+            len(self._queue)
+            + sum(len(q) for q in self._ready.values())
+            + sum(len(q) for q in self._unhandled.values())
+        )
     
     async def _scheduler_loop(self):
-        """调度器循环"""
+        """定时器：睡眠到最早的重试时间，把到期任务移入就绪队列并唤醒工作协程"""
         while self._is_running:
             try:
-                await asyncio.sleep(self.check_interval)
-                await self._check_ready_tasks()
+                # 先清除事件，之后新加入的更早任务会重新置位
+                self._timer_wakeup.clear()
+                
+                async with self._lock:
+                    now = get_user_now()
+                    moved = 0
+                    while self._queue and self._queue[0].next_retry_time <= now:
+                        task = heapq.heappop(self._queue)
+                        self._ready.setdefault(task.task_type, deque()).append(task)
+                        moved += 1
+                    if moved:
+                        self._ready_cond.notify_all()
+                        logger.debug(f"⏰ {moved} 个重试任务到期")
+                    
+                    delay = (self._queue[0].next_retry_time - now).total_seconds() if self._queue else None
+                
+                try:
+                    await asyncio.wait_for(self._timer_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"调度器错误: {e}", exc_info=True)
+                await asyncio.sleep(1)
     
-    async def _check_ready_tasks(self):
-        """检查准备好的任务"""
-        async with self._lock:
-            now = get_user_now()
-            ready_count = 0
-            
-            # 统计准备好的任务数量
-            for task in self._queue:
-                if task.next_retry_time <= now:
-                    ready_count += 1
-            
-            if ready_count > 0:
-                logger.debug(f"发现 {ready_count} 个准备好的重试任务")
+    def _take_ready(self) -> Optional[RetryTask]:
+        """
+        取出一个可执行的就绪任务（调用方持有锁）
+        
+        按任务类型轮转，跳过已达到并发上限的类型
+        """
+        for task_type in list(self._ready):
+            queue = self._ready[task_type]
+            if not queue:
+                del self._ready[task_type]
+                continue
+            if self._running.get(task_type, 0) >= self._type_limit(task_type):
+                continue
+            task = queue.popleft()
+            # 移到末尾，下次优先考虑其他类型
+            del self._ready[task_type]
+            if queue:
+                self._ready[task_type] = queue
+            self._running[task_type] = self._running.get(task_type, 0) + 1
+            self._update_queue_size()
+            return task
+        return None
     
     async def _worker_loop(self, worker_id: int):
-        """工作线程循环"""
+        """工作协程循环（没有可执行任务时在条件变量上等待，不轮询）"""
         logger.info(f"👷 重试工作线程 #{worker_id+1} 已启动")
         
         while self._is_running:
             try:
-                # 获取下一个准备好的任务
-                task = await self._get_next_ready_task()
+                async with self._ready_cond:
+                    task = self._take_ready()
+                    while task is None:
+                        await self._ready_cond.wait()
+                        task = self._take_ready()
                 
-                if task is None:
-                    # 没有准备好的任务，等待
-                    await asyncio.sleep(1)
-                    continue
-                
-                # 处理任务
-                await self._process_task(task, worker_id)
+                try:
+                    await self._process_task(task, worker_id)
+                finally:
+                    async with self._ready_cond:
+                        self._running[task.task_type] -= 1
+                        # 释放了该类型的并发名额
+                        self._ready_cond.notify_all()
                 
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"[Worker #{worker_id+1}] 处理任务失败: {e}", exc_info=True)
     
-    async def _get_next_ready_task(self) -> Optional[RetryTask]:
-        """获取下一个准备好的任务"""
-        async with self._lock:
-            now = get_user_now()
-            
-            # 查找第一个准备好的任务
-            if self._queue and self._queue[0].next_retry_time <= now:
-                task = heapq.heappop(self._queue)
-                self.stats['current_queue_size'] = len(self._queue)
-                return task
-            
-            return None
-    
     async def _process_task(self, task: RetryTask, worker_id: int):
         """处理任务"""
         logger.info(f"[Worker #{worker_id+1}] 重试任务: {task.task_id} (第 {task.retry_count + 1} 次)")
@@ -350,8 +524,11 @@ class SmartRetryQueue:
         # 获取处理器
         handler = self._handlers.get(task.task_type)
         if handler is None:
-            logger.error(f"未找到任务类型 {task.task_type} 的处理器")
-            self.stats['total_failed'] += 1
+            # 启动时日志中的任务可能早于处理器注册到期：暂存并保留日志记录，注册后再执行
+            logger.warning(f"⚠️ 任务类型 {task.task_type} 的处理器尚未注册，暂存任务: {task.task_id}")
+            async with self._lock:
+                self._unhandled.setdefault(task.task_type, []).append(task)
+                self._update_queue_size()
             return
         
         # 执行处理器
@@ -363,6 +540,7 @@ class SmartRetryQueue:
                 logger.info(f"[Worker #{worker_id+1}] 任务成功: {task.task_id}")
                 self.stats['total_success'] += 1
                 self.stats['total_retried'] += 1
+                await self._journal_delete(task)
             else:
                 # 失败，重新加入队列
                 await self._handle_task_failure(task, "处理器返回失败")
@@ -385,9 +563,9 @@ class SmartRetryQueue:
             task.next_retry_time = get_user_now() + timedelta(seconds=delay)
             
             # 重新加入队列
+            await self._journal_put(task)
             async with self._lock:
-                heapq.heappush(self._queue, task)
-                self.stats['current_queue_size'] = len(self._queue)
+                self._schedule(task)
             
             logger.warning(
                 f"任务失败，将在 {delay}秒 后重试: {task.task_id} "
@@ -401,6 +579,7 @@ class SmartRetryQueue:
             )
             self.stats['total_abandoned'] += 1
             self.stats['total_failed'] += 1
+            await self._journal_delete(task)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
@@ -414,7 +593,16 @@ class SmartRetryQueue:
             'success_rate': (
                 f"{(self.stats['total_success'] / self.stats['total_retried'] * 100):.2f}%"
                 if self.stats['total_retried'] > 0 else "0.00%"
-            )
+            ),
+            'last_persistence': self.stats['last_persistence'],
+            'last_compaction': self.stats['last_compaction'],
+            'journal_writes': self.stats['journal_writes'],
+            'persistence_errors': self.stats['persistence_errors'],
+            'waiting': len(self._queue),
+            'ready': sum(len(q) for q in self._ready.values()),
+            'unhandled': sum(len(q) for q in self._unhandled.values()),
+            'running_by_type': {t: n for t, n in self._running.items() if n},
+            'type_limits': {t: self._type_limit(t) for t in self._handlers}
         }
     
     async def get_queue_status(self) -> Dict[str, int]:
@@ -424,95 +612,106 @@ class SmartRetryQueue:
             for task in self._queue:
                 task_type = task.task_type
                 task_types[task_type] = task_types.get(task_type, 0) + 1
+            for task_type, queue in self._ready.items():
+                task_types[task_type] = task_types.get(task_type, 0) + len(queue)
+            for task_type, queue in self._unhandled.items():
+                task_types[task_type] = task_types.get(task_type, 0) + len(queue)
             return task_types
     
     # ===== 持久化相关方法 =====
     
+    async def _journal_put(self, task: RetryTask):
+        """把任务的当前状态写入日志（失败只记录，不影响队列运行）"""
+        if not self._journal:
+            return
+        try:
+            task.journal_id = await self._journal.put(task)
+            self.stats['journal_writes'] += 1
+            self.stats['last_persistence'] = get_user_now().isoformat()
+        except Exception as e:
+            logger.error(f"写入重试日志失败: {e}")
+            self.stats['persistence_errors'] += 1
+    
+    async def _journal_delete(self, task: RetryTask):
+        """从日志删除已完成或放弃的任务"""
+        if not self._journal or task.journal_id is None:
+            return
+        try:
+            await self._journal.delete(task.journal_id)
+            self.stats['journal_writes'] += 1
+            self.stats['last_persistence'] = get_user_now().isoformat()
+        except Exception as e:
+            logger.error(f"删除重试日志失败: {e}")
+            self.stats['persistence_errors'] += 1
+    
     async def _persistence_loop(self):
-        """定期持久化循环"""
+        """定期压缩日志"""
         while self._is_running:
             try:
-                await asyncio.sleep(self.persistence_interval)
-                await self._save_to_disk()
+                await asyncio.sleep(self.compaction_interval)
+                result = await self._journal.compact()
+                self.stats['last_compaction'] = get_user_now().isoformat()
+                logger.debug(f"重试日志已压缩: {result['rows']} 个任务, 回收 {result['free_pages']} 页")
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                logger.error(f"持久化循环错误: {e}", exc_info=True)
+                logger.error(f"日志压缩错误: {e}", exc_info=True)
                 self.stats['persistence_errors'] += 1
     
-    async def _save_to_disk(self):
-        """保存队列到磁盘"""
+    async def _load_from_journal(self):
+        """打开持久化日志并恢复队列（首次启动时导入旧版 JSON 文件）"""
         try:
-            async with self._lock:
-                # 序列化队列
-                queue_data = {
-                    'version': '1.0',
-                    'saved_at': get_user_now().isoformat(),
-                    'tasks': [task.to_dict() for task in self._queue],
-                    'stats': self.stats.copy()
-                }
-            
-            # 确保目录存在
-            path = Path(self.persistence_path)
-            path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 写入临时文件
-            temp_path = f"{self.persistence_path}.tmp"
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(queue_data, f, indent=2, ensure_ascii=False)
-            
-            # 原子性替换
-            os.replace(temp_path, self.persistence_path)
-            
-            self.stats['last_persistence'] = get_user_now().isoformat()
-            logger.debug(f"队列已保存到磁盘: {len(queue_data['tasks'])} 个任务")
-        
-        except Exception as e:
-            logger.error(f"保存队列到磁盘失败: {e}", exc_info=True)
-            self.stats['persistence_errors'] += 1
-    
-    async def _load_from_disk(self):
-        """从磁盘加载队列"""
-        try:
-            path = Path(self.persistence_path)
-            if not path.exists():
-                logger.info("未找到持久化文件，从空队列开始")
-                return
-            
-            # 读取文件
-            with open(path, 'r', encoding='utf-8') as f:
-                queue_data = json.load(f)
+            self._journal = RetryJournal(self.persistence_path)
+            await self._journal.open()
             
-            # 验证版本
-            version = queue_data.get('version', '1.0')
-            if version != '1.0':
-                logger.warning(f"持久化文件版本不匹配: {version}, 跳过加载")
-                return
+            rows = await self._journal.load()
+            if not rows:
+                await self._import_legacy_json()
+                rows = await self._journal.load()
             
-            # 恢复任务
-            tasks = queue_data.get('tasks', [])
             loaded_count = 0
-            
             async with self._lock:
-                for task_data in tasks:
+                for journal_id, payload in rows:
                     try:
-                        task = RetryTask.from_dict(task_data)
-                        heapq.heappush(self._queue, task)
+                        task = RetryTask.from_dict(json.loads(payload))
+                        task.journal_id = journal_id
+                        self._schedule(task)
                         loaded_count += 1
                     except Exception as e:
                         logger.error(f"恢复任务失败: {e}")
                         continue
-                
-                self.stats['current_queue_size'] = len(self._queue)
             
-            logger.info(
-                f"✅ 从磁盘加载队列: {loaded_count}/{len(tasks)} 个任务, "
-                f"保存时间: {queue_data.get('saved_at', 'unknown')}"
-            )
+            if rows:
+                logger.info(f"✅ 从持久化日志恢复队列: {loaded_count}/{len(rows)} 个任务")
+            else:
+                logger.info("持久化日志为空，从空队列开始")
         
         except Exception as e:
-            logger.error(f"从磁盘加载队列失败: {e}", exc_info=True)
-            # 不抛出异常，允许从空队列开始
+            logger.error(f"打开重试日志失败，本次运行不持久化: {e}", exc_info=True)
+            self._journal = None
+            self.stats['persistence_errors'] += 1
+    
+    async def _import_legacy_json(self):
+        """导入旧版整队列 JSON 快照（导入后重命名为 .migrated）"""
+        legacy_path = Path(self.persistence_path).with_suffix('.json')
+        if not legacy_path.exists():
+            return
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                queue_data = json.load(f)
+            
+            imported = 0
+            for task_data in queue_data.get('tasks', []):
+                try:
+                    await self._journal.put(RetryTask.from_dict(task_data))
+                    imported += 1
+                except Exception as e:
+                    logger.error(f"导入旧版重试任务失败: {e}")
+            
+            os.replace(legacy_path, f"{legacy_path}.migrated")
+            logger.info(f"📦 已导入旧版重试队列文件: {imported} 个任务")
+        except Exception as e:
+            logger.error(f"导入旧版重试队列文件失败: {e}", exc_info=True)
 
 
 # 全局重试队列实例
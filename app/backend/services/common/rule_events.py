@@ -0,0 +1,274 @@
+"""
+规则变更事件总线
+
+功能：
+1. 规则（转发、媒体监控、资源监控、通知）增删改后发布带版本号的变更事件
+2. 线程安全发布，事件投递到订阅者自己的事件循环（每个 Telegram 客户端运行在独立线程的事件循环中）
+3. 每个订阅按版本顺序处理事件，积压的事件合并（同一规则只处理最后一次，全量重载只做一次）
+4. 订阅者据此增量维护内存索引，不再每次全量重新查询所有规则表
+"""
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import threading
+import time
+from log_manager import get_logger
+
+logger = get_logger("rule_events", "enhanced_bot.log")
+
+# 规则类型
+KIND_FORWARD = "forward"
+KIND_MEDIA_MONITOR = "media_monitor"
+KIND_RESOURCE_MONITOR = "resource_monitor"
+KIND_NOTIFICATION = "notification"
+
+# 变更类型（reload 表示批量变更，rule_id 为 None，订阅者应重新加载该类型的全部规则）
+OP_CREATED = "created"
+OP_UPDATED = "updated"
+OP_DELETED = "deleted"
+OP_RELOAD = "reload"
+
+
+@dataclass(frozen=True)
+class RuleChangeEvent:
+    """规则变更事件"""
+    version: int
+    kind: str
+    op: str
+    rule_id: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def is_reload(self) -> bool:
+        return self.rule_id is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "kind": self.kind,
+            "op": self.op,
+            "rule_id": self.rule_id,
+            "created_at": self.created_at,
+        }
+
+
+RuleEventHandler = Callable[[RuleChangeEvent], Awaitable[None]]
+
+
+def coalesce_events(events: List[RuleChangeEvent]) -> List[RuleChangeEvent]:
+    """
+    合并一批事件（按版本顺序）
+
+    同一规则只保留最后一次变更；某类型出现全量重载时，该类型只保留一次重载
+    """
+    reloads: Dict[str, RuleChangeEvent] = {}
+    latest: Dict[tuple, RuleChangeEvent] = {}
+    for event in events:
+        if event.is_reload:
+            reloads[event.kind] = event
+        else:
+            latest[(event.kind, event.rule_id)] = event
+
+    merged = list(reloads.values())
+    merged.extend(event for (kind, _), event in latest.items() if kind not in reloads)
+    merged.sort(key=lambda event: event.version)
+    return merged
+
+
+class RuleSubscription:
+    """
+    规则变更订阅
+
+    在创建它的事件循环中运行一个消费任务，按版本顺序调用处理器；
+    处理器应以数据库中的当前状态为准（幂等），因此重复或合并的事件不影响结果
+    """
+
+    def __init__(
+        self,
+        bus: 'RuleEventBus',
+        name: str,
+        handler: RuleEventHandler,
+        kinds: Optional[Set[str]] = None
+    ):
+        self._bus = bus
+        self.name = name
+        self.kinds = kinds
+        self._handler = handler
+        self.loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = self.loop.create_task(self._consume())
+
+        # 最后处理的相关事件版本（订阅前的变更由订阅者的首次全量加载覆盖）
+        self.version = bus.version
+        self.stats = {
+            'delivered': 0,
+            'handled': 0,
+            'coalesced': 0,
+            'errors': 0,
+        }
+
+    def _deliver(self, event: RuleChangeEvent) -> bool:
+        """投递事件（可在任意线程调用），事件循环已关闭时返回 False"""
+        if self.kinds and event.kind not in self.kinds:
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, event)
+        except RuntimeError:
+            return False
+        self.stats['delivered'] += 1
+        return True
+
+    async def _consume(self):
+        while True:
+            events = [await self._queue.get()]
+            while not self._queue.empty():
+                events.append(self._queue.get_nowait())
+
+            merged = coalesce_events(events)
+            self.stats['coalesced'] += len(events) - len(merged)
+            for event in merged:
+                try:
+                    await self._handler(event)
+                    self.stats['handled'] += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f"规则变更处理失败: {self.name}, 事件: {event.to_dict()}, 错误: {e}", exc_info=True)
+            self.version = max(self.version, events[-1].version)
+
+    def close(self):
+        """取消订阅（可在任意线程调用）"""
+        self._bus.unsubscribe(self)
+        if self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._task.cancel)
+        except RuntimeError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'name': self.name,
+            'kinds': sorted(self.kinds) if self.kinds else None,
+            'version': self.version,
+            'pending': self._queue.qsize(),
+        }
+
+
+class RuleEventBus:
+    """
+    规则变更事件总线
+
+    特性：
+    1. publish() 可在任意线程调用，版本号全局单调递增
+    2. 订阅者在各自的事件循环中按顺序处理
+    3. 保留最近的事件供排查
+    """
+
+    def __init__(self, history_size: int = 200):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._subscriptions: List[RuleSubscription] = []
+        self._history: Deque[RuleChangeEvent] = deque(maxlen=history_size)
+
+        # 统计信息
+        self.stats = {
+            'total_published': 0,
+            'published_by_kind': {},
+        }
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def publish(self, kind: str, rule_id: Optional[int], op: str) -> RuleChangeEvent:
+        """
+        发布规则变更（应在数据库事务提交之后调用）
+
+        Args:
+            kind: 规则类型（KIND_*）
+            rule_id: 规则ID；批量变更传 None 并使用 OP_RELOAD
+            op: 变更类型（OP_*）
+        """
+        with self._lock:
+            self._version += 1
+            event = RuleChangeEvent(
+                version=self._version,
+                kind=kind,
+                op=OP_RELOAD if rule_id is None else op,
+                rule_id=int(rule_id) if rule_id is not None else None
+            )
+            self._history.append(event)
+            self.stats['total_published'] += 1
+            by_kind = self.stats['published_by_kind']
+            by_kind[kind] = by_kind.get(kind, 0) + 1
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            if not subscription._deliver(event):
+                logger.warning(f"⚠️ 订阅者事件循环已关闭，移除订阅: {subscription.name}")
+                self.unsubscribe(subscription)
+
+        logger.debug(f"📣 规则变更 v{event.version}: {kind} #{event.rule_id} {event.op}")
+        return event
+
+    def subscribe(
+        self,
+        name: str,
+        handler: RuleEventHandler,
+        kinds: Optional[Set[str]] = None
+    ) -> RuleSubscription:
+        """
+        订阅规则变更（必须在处理器所在的事件循环中调用）
+
+        应先订阅再全量加载：加载期间发布的事件会在加载完成后再处理一次
+        """
+        subscription = RuleSubscription(self, name, handler, kinds)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        logger.info(f"✅ 订阅规则变更: {name} ({', '.join(sorted(kinds)) if kinds else '全部'})")
+        return subscription
+
+    def unsubscribe(self, subscription: RuleSubscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def recent_events(self, since_version: int = 0) -> List[Dict[str, Any]]:
+        """获取最近的变更事件"""
+        with self._lock:
+            return [event.to_dict() for event in self._history if event.version > since_version]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            stats = {**self.stats, 'published_by_kind': dict(self.stats['published_by_kind'])}
+        return {
+            **stats,
+            'version': self._version,
+            'subscriptions': [subscription.get_stats() for subscription in subscriptions],
+        }
+
+
+# 全局规则变更总线实例
+_rule_event_bus: Optional[RuleEventBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_rule_event_bus() -> RuleEventBus:
+    """获取全局规则变更总线实例"""
+    global _rule_event_bus
+    if _rule_event_bus is None:
+        with _bus_lock:
+            if _rule_event_bus is None:
+                _rule_event_bus = RuleEventBus()
+    return _rule_event_bus
+
+
+def publish_rule_change(kind: str, rule_id: Optional[int], op: str) -> RuleChangeEvent:
+    """发布规则变更（便捷函数）"""
+    return get_rule_event_bus().publish(kind, rule_id, op)
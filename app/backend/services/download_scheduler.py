@@ -0,0 +1,507 @@
+"""
+媒体下载调度器
+
+功能：
+1. 按优先级 + 文件大小分道排队（大文件不会饿死小文件）
+2. 每个监控规则、每个Telegram客户端的并发上限
+3. 全局带宽预算（按进度总线测得的实时速度做准入控制）
+4. 并发数在 min_workers 与 max_workers 之间动态伸缩
+5. 状态以数据库为准：重启后按 download_tasks(status, priority, created_at) 索引恢复排队
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, desc
+
+from log_manager import get_logger
+from services.common.progress_bus import get_progress_bus, KIND_DOWNLOAD
+
+logger = get_logger("download_scheduler", "enhanced_bot.log")
+
+LANE_SMALL = "small"
+LANE_LARGE = "large"
+
+
+@dataclass
+class ScheduledDownload:
+    """排队中的下载任务"""
+    task_id: int
+    rule_id: Optional[int] = None
+    client_id: Optional[str] = None
+    priority: int = 0
+    size_bytes: int = 0
+    payload: Optional[Dict[str, Any]] = None  # 为空表示从数据库恢复，执行前需重新解析消息
+    seq: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class DownloadScheduler:
+    """
+    优先级 + 大小感知的下载调度器
+
+    每个任务在一个独立协程中执行，调度循环在以下条件都满足时才启动新任务：
+    当前并发 < 目标并发、规则/客户端未达上限、大文件通道未占满、带宽预算未用尽
+    """
+
+    def __init__(
+        self,
+        executor: Callable[[Dict[str, Any]], Awaitable[None]],
+        resolver: Optional[Callable[[int], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        min_workers: int = 1,
+        max_workers: int = 5,
+        per_rule_limit: int = 3,
+        per_client_limit: int = 3,
+        large_file_threshold: int = 100 * 1024 * 1024,
+        bandwidth_limit: int = 0,
+        scale_interval: float = 5.0
+    ):
+        """
+        初始化调度器
+
+        Args:
+            executor: 执行单个下载任务的协程函数（接收任务数据字典）
+            resolver: 为从数据库恢复的任务重新构建任务数据（返回 None 表示无法执行）
+            min_workers: 最小并发数
+            max_workers: 最大并发数
+            per_rule_limit: 单个监控规则默认并发上限（可被 set_rule_limit 覆盖）
+            per_client_limit: 单个Telegram客户端并发上限
+            large_file_threshold: 大文件阈值（字节）
+            bandwidth_limit: 全局带宽预算（字节/秒），0 表示不限制
+            scale_interval: 动态伸缩的评估间隔（秒）
+        """
+        self._executor = executor
+        self._resolver = resolver
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.per_rule_limit = per_rule_limit
+        self.per_client_limit = per_client_limit
+        self.large_file_threshold = large_file_threshold
+        self.bandwidth_limit = bandwidth_limit
+        self.scale_interval = scale_interval
+
+        # 两个通道各一个堆：(-priority, seq, task_id)，通过 seq 惰性删除过期条目
+        self._lanes: Dict[str, List[tuple]] = {LANE_SMALL: [], LANE_LARGE: []}
+        # 因并发上限暂缓的条目，按阻塞原因分堆：("rule"/"client"/"task", id) -> 堆；
+        # 对应的规则/客户端/任务释放名额时才放回通道，避免每次调度重新扫描
+        self._parked: Dict[tuple, List[tuple]] = {}
+        self._entries: Dict[int, ScheduledDownload] = {}
+        self._seq = itertools.count()
+
+        self._active: Dict[int, ScheduledDownload] = {}
+        self._active_tasks: Dict[int, asyncio.Task] = {}
+        self._rule_limits: Dict[int, int] = {}
+
+        self.target_workers = self.max_workers if not bandwidth_limit else self.min_workers
+        self._last_scale = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+        self.stats = {
+            "submitted": 0,
+            "started": 0,
+            "finished": 0,
+            "restored": 0,
+            "unresolved": 0,
+            "scale_ups": 0,
+            "scale_downs": 0,
+        }
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """启动调度循环"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # 启动前提交的任务立即调度
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        logger.info(
+            f"✅ 下载调度器已启动（并发 {self.min_workers}-{self.max_workers}，"
+            f"带宽预算 {self._format_bandwidth()}）"
+        )
+
+    async def stop(self):
+        """停止调度循环并取消正在执行的下载"""
+        if not self.is_running:
+            return
+        self.is_running = False
+
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try:
+                await self._dispatch_task
+            except asyncio.CancelledError:
+                pass
+
+        for task in list(self._active_tasks.values()):
+            task.cancel()
+        self._active_tasks.clear()
+        self._active.clear()
+        logger.info("✅ 下载调度器已停止")
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        bandwidth_limit: Optional[int] = None
+    ):
+        """更新全局并发与带宽预算（配置变更后调用）"""
+        if max_workers is not None:
+            self.max_workers = max(self.min_workers, max_workers)
+        if bandwidth_limit is not None:
+            self.bandwidth_limit = max(0, bandwidth_limit)
+        self._unpark_all()
+        if not self.bandwidth_limit:
+            self.target_workers = self.max_workers
+        self.target_workers = min(max(self.target_workers, self.min_workers), self.max_workers)
+        self._wake()
+
+    def set_rule_limit(self, rule_id: int, limit: Optional[int]):
+        """设置单个规则的并发上限（None 表示使用默认值）"""
+        if limit:
+            self._rule_limits[rule_id] = limit
+        else:
+            self._rule_limits.pop(rule_id, None)
+        self._unpark(('rule', rule_id))
+        self._wake()
+
+    # ==================== 排队 ====================
+
+    def submit(
+        self,
+        task_data: Optional[Dict[str, Any]],
+        task_id: Optional[int] = None,
+        priority: int = 0,
+        size_bytes: int = 0,
+        rule_id: Optional[int] = None
+    ) -> bool:
+        """
+        提交下载任务
+
+        Args:
+            task_data: 任务数据（包含 task_id/rule_id/client/message/client_wrapper）；
+                为 None 时执行前通过 resolver 重新构建
+            task_id: 任务ID（task_data 为空时必填）
+            priority: 优先级（-10 到 10，越大越先执行）
+            size_bytes: 文件大小，决定进入大文件还是小文件通道
+            rule_id: 监控规则ID
+
+        Returns:
+            bool: 是否加入队列（已在队列中的同一任务会被替换）
+        """
+        if task_data is not None:
+            task_id = task_data['task_id']
+            rule_id = task_data.get('rule_id', rule_id)
+        if task_id is None:
+            return False
+
+        client_wrapper = task_data.get('client_wrapper') if task_data else None
+        entry = ScheduledDownload(
+            task_id=task_id,
+            rule_id=rule_id,
+            client_id=getattr(client_wrapper, 'client_id', None),
+            priority=priority or 0,
+            size_bytes=size_bytes or 0,
+            payload=task_data,
+            seq=next(self._seq)
+        )
+        self._push(entry)
+        self.stats["submitted"] += 1
+        self._wake()
+        return True
+
+    def reprioritize(self, task_id: int, priority: int) -> bool:
+        """调整排队中任务的优先级"""
+        entry = self._entries.get(task_id)
+        if not entry:
+            return False
+        entry.priority = priority
+        entry.seq = next(self._seq)
+        self._push(entry)
+        self._wake()
+        return True
+
+    def cancel(self, task_id: int) -> bool:
+        """从队列中移除任务（不影响已经开始的下载）"""
+        return self._entries.pop(task_id, None) is not None
+
+    def is_queued(self, task_id: int) -> bool:
+        return task_id in self._entries or task_id in self._active
+
+    async def restore(self, session_factory) -> int:
+        """
+        从数据库恢复排队中的任务
+
+        只读取调度所需的列，按 (status, priority, created_at) 索引顺序加载，
+        消息对象在真正执行前才由 resolver 重新获取
+
+        Args:
+            session_factory: 异步会话生成器（如 database.get_db）
+
+        Returns:
+            int: 恢复的任务数
+        """
+        from models import DownloadTask
+
+        restored = 0
+        async for db in session_factory():
+            result = await db.execute(
+                select(
+                    DownloadTask.id,
+                    DownloadTask.monitor_rule_id,
+                    DownloadTask.priority,
+                    DownloadTask.total_bytes
+                )
+                .where(DownloadTask.status == 'pending')
+                .order_by(desc(DownloadTask.priority), DownloadTask.created_at)
+            )
+            for task_id, rule_id, priority, total_bytes in result.all():
+                if self.is_queued(task_id):
+                    continue
+                self._push(ScheduledDownload(
+                    task_id=task_id,
+                    rule_id=rule_id,
+                    priority=priority or 0,
+                    size_bytes=total_bytes or 0,
+                    seq=next(self._seq)
+                ))
+                restored += 1
+            break
+
+        self.stats["restored"] += restored
+        if restored:
+            logger.info(f"🔄 已从数据库恢复 {restored} 个排队中的下载任务")
+            self._wake()
+        return restored
+
+    def _push(self, entry: ScheduledDownload):
+        self._entries[entry.task_id] = entry
+        heapq.heappush(self._lanes[self._lane_of(entry)], (-entry.priority, entry.seq, entry.task_id))
+
+    def _lane_of(self, entry: ScheduledDownload) -> str:
+        return LANE_LARGE if entry.size_bytes >= self.large_file_threshold else LANE_SMALL
+
+    # ==================== 调度 ====================
+
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _dispatch_loop(self):
+        """调度循环：有事件时立即调度，否则定期重新评估带宽与并发"""
+        while self.is_running:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.scale_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+                self._rescale()
+                self._dispatch()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ 下载调度失败: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    def _dispatch(self):
+        while len(self._active) < self.target_workers and self._entries:
+            if self._active and self._bandwidth_exhausted():
+                break
+            entry = self._pick_next()
+            if entry is None:
+                break
+            self._launch(entry)
+
+    def _pick_next(self) -> Optional[ScheduledDownload]:
+        """
+        选出下一个可执行的任务
+
+        两个通道各取第一个满足规则/客户端上限的候选，按优先级比较；
+        优先级相同时小文件优先，大文件最多占用一半并发
+        """
+        large_active = sum(1 for e in self._active.values() if self._lane_of(e) == LANE_LARGE)
+        large_allowed = large_active < max(1, self.target_workers // 2)
+
+        candidates = []
+        for lane in (LANE_SMALL, LANE_LARGE):
+            if lane == LANE_LARGE and not large_allowed:
+                continue
+            item = self._peek_eligible(lane)
+            if item:
+                candidates.append((item[0], lane == LANE_LARGE, item[1], lane, item))
+
+        if not candidates:
+            return None
+
+        _, _, _, lane, item = min(candidates)
+        heapq.heappop(self._lanes[lane])
+        return self._entries.pop(item[2])
+
+    def _peek_eligible(self, lane: str) -> Optional[tuple]:
+        """
+        使通道堆顶成为第一个未超出并发上限的有效条目并返回
+
+        过期条目直接丢弃，超出上限的条目移入对应的暂缓堆
+        """
+        heap = self._lanes[lane]
+        while heap:
+            item = heap[0]
+            entry = self._entries.get(item[2])
+            if entry is None or entry.seq != item[1]:
+                heapq.heappop(heap)
+                continue
+            blocker = self._blocker_of(entry)
+            if blocker is None:
+                return item
+            heapq.heappush(self._parked.setdefault(blocker, []), heapq.heappop(heap))
+        return None
+
+    def _blocker_of(self, entry: ScheduledDownload) -> Optional[tuple]:
+        """返回阻止任务启动的并发上限（None 表示可以启动）"""
+        if entry.task_id in self._active:
+            return ('task', entry.task_id)
+        if entry.rule_id is not None:
+            limit = self._rule_limits.get(entry.rule_id, self.per_rule_limit)
+            running = sum(1 for e in self._active.values() if e.rule_id == entry.rule_id)
+            if running >= limit:
+                return ('rule', entry.rule_id)
+        if entry.client_id is not None:
+            running = sum(1 for e in self._active.values() if e.client_id == entry.client_id)
+            if running >= self.per_client_limit:
+                return ('client', entry.client_id)
+        return None
+
+    def _unpark(self, key: tuple, count: Optional[int] = None):
+        """把暂缓的条目放回通道（count 为空表示全部）"""
+        parked = self._parked.get(key)
+        moved = 0
+        while parked and (count is None or moved < count):
+            item = heapq.heappop(parked)
+            entry = self._entries.get(item[2])
+            if entry is None or entry.seq != item[1]:
+                continue
+            heapq.heappush(self._lanes[self._lane_of(entry)], item)
+            moved += 1
+        if parked is not None and not parked:
+            del self._parked[key]
+
+    def _unpark_all(self):
+        for key in list(self._parked):
+            self._unpark(key)
+
+    def _launch(self, entry: ScheduledDownload):
+        self._active[entry.task_id] = entry
+        self._active_tasks[entry.task_id] = asyncio.create_task(self._run(entry))
+        self.stats["started"] += 1
+
+    async def _run(self, entry: ScheduledDownload):
+        try:
+            payload = entry.payload
+            if payload is None and self._resolver:
+                payload = await self._resolver(entry.task_id)
+                if payload is None:
+                    self.stats["unresolved"] += 1
+                    return
+                client_wrapper = payload.get('client_wrapper')
+                entry.client_id = getattr(client_wrapper, 'client_id', None)
+
+            if payload is not None:
+                logger.info(f"⬇️ 调度下载: {payload.get('file_name')} (ID: {entry.task_id}, 优先级: {entry.priority})")
+                await self._executor(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ 下载任务执行异常 (ID: {entry.task_id}): {e}")
+        finally:
+            if self._active.get(entry.task_id) is entry:
+                self._active.pop(entry.task_id, None)
+                self._active_tasks.pop(entry.task_id, None)
+            # 释放的名额交给暂缓的同规则/同客户端任务
+            self._unpark(('task', entry.task_id))
+            if entry.rule_id is not None:
+                self._unpark(('rule', entry.rule_id), 1)
+            if entry.client_id is not None:
+                self._unpark(('client', entry.client_id), 1)
+            self.stats["finished"] += 1
+            self._wake()
+
+    # ==================== 带宽与伸缩 ====================
+
+    def _current_bandwidth(self) -> float:
+        """当前正在执行的下载的总速度（字节/秒）"""
+        bus = get_progress_bus()
+        total = 0.0
+        for task_id in list(self._active):
+            state = bus.get_state(KIND_DOWNLOAD, task_id)
+            if state:
+                total += state.get("speed_mbps", 0) * 1024 * 1024
+        return total
+
+    def _bandwidth_exhausted(self) -> bool:
+        return bool(self.bandwidth_limit) and self._current_bandwidth() >= self.bandwidth_limit * 0.9
+
+    def _rescale(self):
+        """
+        根据带宽利用率调整目标并发
+
+        未设置带宽预算时固定为 max_workers；设置后超出预算减少并发，
+        利用率偏低且有排队任务时增加并发
+        """
+        if not self.bandwidth_limit:
+            self.target_workers = self.max_workers
+            return
+
+        now = time.time()
+        if now - self._last_scale < self.scale_interval:
+            return
+        self._last_scale = now
+
+        used = self._current_bandwidth()
+        if used > self.bandwidth_limit and self.target_workers > self.min_workers:
+            self.target_workers -= 1
+            self.stats["scale_downs"] += 1
+            logger.debug(f"📉 带宽超出预算，并发降至 {self.target_workers}")
+        elif (
+            used < self.bandwidth_limit * 0.7
+            and self._entries
+            and len(self._active) >= self.target_workers
+            and self.target_workers < self.max_workers
+        ):
+            self.target_workers += 1
+            self.stats["scale_ups"] += 1
+            logger.debug(f"📈 带宽有余量，并发升至 {self.target_workers}")
+
+    def _format_bandwidth(self) -> str:
+        if not self.bandwidth_limit:
+            return "不限"
+        return f"{self.bandwidth_limit / 1024 / 1024:.1f}MB/s"
+
+    # ==================== 统计 ====================
+
+    def get_queue_status(self) -> Dict[str, int]:
+        """获取各通道排队数量"""
+        status = {LANE_SMALL: 0, LANE_LARGE: 0}
+        for entry in self._entries.values():
+            status[self._lane_of(entry)] += 1
+        return status
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            "queued": len(self._entries),
+            "lanes": self.get_queue_status(),
+            "active": len(self._active),
+            "target_workers": self.target_workers,
+            "max_workers": self.max_workers,
+            "bandwidth_limit_mbps": round(self.bandwidth_limit / 1024 / 1024, 2),
+            "bandwidth_used_mbps": round(self._current_bandwidth() / 1024 / 1024, 2),
+            "is_running": self.is_running,
+        }
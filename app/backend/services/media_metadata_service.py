@@ -0,0 +1,488 @@
+"""
+媒体元数据提取服务
+
+功能：
+1. 在可配置大小的进程池中执行 mediainfo/ffprobe/Pillow，不再受两个线程槽位限制
+2. 探测任务先写入 media_metadata 表（持久化队列），重启后继续处理未完成的任务
+3. 调度循环把排队任务按批分发给子进程，减少跨进程调度开销
+4. 结果按文件哈希缓存（内存 LRU + 数据库），重新整理/重新上传等流程不会重复探测
+5. 等待超时不再产生错误记录：任务继续在后台完成，结果写回对应的 MediaFile
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from log_manager import get_logger
+from timezone_utils import get_user_now
+from utils.media_metadata import MediaMetadataExtractor
+
+logger = get_logger("media_metadata_service")
+
+MODE_RANK = {'disabled': 0, 'lightweight': 1, 'full': 2}
+
+
+def _probe_batch(items: List[Tuple[str, str]]) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    在子进程中依次探测一批文件
+
+    Returns:
+        [(元数据, 耗时毫秒)]
+    """
+    results = []
+    for file_path, mode in items:
+        start = time.perf_counter()
+        if not os.path.exists(file_path):
+            metadata = {'error': 'file not found', 'missing': True}
+        else:
+            metadata = MediaMetadataExtractor._extract_metadata_sync(file_path, mode)
+        results.append((metadata, (time.perf_counter() - start) * 1000))
+    return results
+
+
+@dataclass
+class ProbeJob:
+    """排队中的探测任务"""
+    file_path: str
+    mode: str
+    file_hash: Optional[str] = None
+    attempts: int = 0
+    future: asyncio.Future = field(default=None, repr=False)
+
+
+class MediaMetadataService:
+    """
+    元数据提取服务
+
+    使用方式：
+        metadata = await get_metadata_service().extract(path, file_hash, mode='lightweight', timeout=10)
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        batch_size: int = 8,
+        batch_window: float = 0.05,
+        memory_cache_size: int = 2048,
+        max_attempts: int = 2
+    ):
+        """
+        Args:
+            max_workers: 进程池大小（默认 CPU 核数，最多 4）
+            batch_size: 每批最多探测的文件数
+            batch_window: 收集一批任务的等待时间（秒）
+            memory_cache_size: 内存缓存条目数
+            max_attempts: 文件被移动后按新路径重试的次数
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.memory_cache_size = memory_cache_size
+        self.max_attempts = max_attempts
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Deque[ProbeJob] = deque()
+        self._inflight: Dict[Tuple[str, str], ProbeJob] = {}
+        self._cache: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._active_batches = 0  # 正在进程池中执行的批次数，不超过 max_workers
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._recent: Deque[float] = deque(maxlen=1000)  # 最近完成时间，用于计算吞吐量
+        self.is_running = False
+
+        self.stats = {
+            "requests": 0,
+            "memory_hits": 0,
+            "db_hits": 0,
+            "probed": 0,
+            "failed": 0,
+            "batches": 0,
+            "wait_timeouts": 0,
+            "restored": 0,
+            "total_probe_ms": 0.0,
+        }
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """启动调度循环并恢复未完成的探测任务"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        await self._restore_pending()
+        logger.info(f"✅ 元数据服务已启动（进程数: {self.max_workers}，批大小: {self.batch_size}）")
+
+    async def stop(self):
+        """停止调度循环并关闭进程池"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try:
+                await self._dispatch_task
+            except asyncio.CancelledError:
+                pass
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("✅ 元数据服务已停止")
+
+    def configure(self, max_workers: Optional[int] = None):
+        """调整进程池大小（下一批任务生效）"""
+        if not max_workers or max_workers == self.max_workers:
+            return
+        # 调度循环按计数判断并发：扩容立即生效，缩容在正在执行的批次完成后生效
+        self.max_workers = max_workers
+        if self._wakeup:
+            self._wakeup.set()
+        if self._executor:
+            old_executor = self._executor
+            self._executor = None
+            old_executor.shutdown(wait=False)
+        logger.info(f"🔧 元数据进程池调整为 {max_workers}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    # ==================== 对外接口 ====================
+
+    async def extract(
+        self,
+        file_path: str,
+        file_hash: Optional[str] = None,
+        mode: str = 'lightweight',
+        timeout: Optional[float] = 10
+    ) -> Dict[str, Any]:
+        """
+        获取文件元数据（优先读取缓存）
+
+        Args:
+            file_path: 文件路径
+            file_hash: 文件哈希（用于缓存；为空时不缓存）
+            mode: 提取模式 (disabled/lightweight/full)
+            timeout: 最长等待时间（秒），None 表示等待探测完成；超时后任务继续在后台执行
+
+        Returns:
+            元数据字典；超时时返回基础信息并带 'pending': True
+        """
+        if mode == 'disabled':
+            return MediaMetadataExtractor._extract_basic_metadata(file_path)
+
+        if not self.is_running:
+            await self.start()
+
+        self.stats["requests"] += 1
+        cached = await self.get_cached(file_hash, mode)
+        if cached is not None:
+            return cached
+
+        job = await self._submit(file_path, file_hash, mode)
+        try:
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats["wait_timeouts"] += 1
+            logger.info(f"⏳ 元数据提取未在 {timeout}s 内完成，转为后台处理: {file_path}")
+            metadata = MediaMetadataExtractor._extract_basic_metadata(file_path)
+            metadata['pending'] = True
+            return metadata
+
+    async def get_cached(self, file_hash: Optional[str], mode: str = 'lightweight') -> Optional[Dict[str, Any]]:
+        """读取缓存结果（完整模式的结果也可满足轻量模式请求）"""
+        if not file_hash:
+            return None
+
+        entry = self._cache.get(file_hash)
+        if entry and MODE_RANK.get(entry[0], 0) >= MODE_RANK.get(mode, 1):
+            self._cache.move_to_end(file_hash)
+            self.stats["memory_hits"] += 1
+            return entry[1]
+
+        try:
+            from database import get_db
+            from models import MediaMetadataRecord
+
+            async for db in get_db():
+                result = await db.execute(
+                    select(MediaMetadataRecord.mode, MediaMetadataRecord.metadata_json).where(
+                        MediaMetadataRecord.file_hash == file_hash,
+                        MediaMetadataRecord.status == 'done'
+                    )
+                )
+                row = result.first()
+                if row and row.metadata_json and MODE_RANK.get(row.mode, 0) >= MODE_RANK.get(mode, 1):
+                    metadata = json.loads(row.metadata_json)
+                    self._remember(file_hash, row.mode, metadata)
+                    self.stats["db_hits"] += 1
+                    return metadata
+                break
+        except Exception as e:
+            logger.debug(f"读取元数据缓存失败: {e}")
+        return None
+
+    # ==================== 排队与调度 ====================
+
+    async def _submit(self, file_path: str, file_hash: Optional[str], mode: str, persist: bool = True) -> ProbeJob:
+        key = (file_hash or file_path, mode)
+        job = self._inflight.get(key)
+        if job:
+            return job
+
+        job = ProbeJob(file_path=file_path, mode=mode, file_hash=file_hash)
+        job.future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = job
+        if persist and file_hash:
+            await self._save_record(file_hash, mode, file_path, status='pending')
+        self._queue.append(job)
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    async def _dispatch_loop(self):
+        while self.is_running:
+            try:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                # 稍等片刻，让同时完成的下载合并成一批
+                await asyncio.sleep(self.batch_window)
+
+                # 进程都在忙时等待批次完成后再次唤醒
+                while self._queue and self._active_batches < self.max_workers:
+                    # 批大小按队列长度均分到各进程，保证并行度
+                    per_worker = -(-len(self._queue) // self.max_workers)
+                    size = max(1, min(self.batch_size, per_worker))
+                    batch = [self._queue.popleft() for _ in range(min(size, len(self._queue)))]
+                    self._active_batches += 1
+                    asyncio.create_task(self._run_batch(batch))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ 元数据调度失败: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def _run_batch(self, batch: List[ProbeJob]):
+        self.stats["batches"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._get_executor(), _probe_batch, [(job.file_path, job.mode) for job in batch]
+            )
+        except Exception as e:
+            logger.warning(f"元数据批量探测失败: {e}")
+            results = [({'error': str(e)}, 0.0)] * len(batch)
+        finally:
+            self._active_batches -= 1
+            if self._wakeup:
+                self._wakeup.set()
+
+        for job, (metadata, elapsed_ms) in zip(batch, results):
+            await self._complete(job, metadata, elapsed_ms)
+
+    async def _complete(self, job: ProbeJob, metadata: Dict[str, Any], elapsed_ms: float):
+        # 文件在排队期间被归档移动：按媒体记录的新路径重试
+        if metadata.get('missing') and job.file_hash and job.attempts + 1 < self.max_attempts:
+            new_path = await self._current_path(job.file_hash)
+            if new_path and new_path != job.file_path:
+                job.file_path = new_path
+                job.attempts += 1
+                self._queue.append(job)
+                self._wakeup.set()
+                return
+
+        key = (job.file_hash or job.file_path, job.mode)
+        self._inflight.pop(key, None)
+        self.stats["probed"] += 1
+        self.stats["total_probe_ms"] += elapsed_ms
+        self._recent.append(time.time())
+
+        failed = 'error' in metadata
+        if failed:
+            self.stats["failed"] += 1
+
+        if job.file_hash:
+            if not failed:
+                self._remember(job.file_hash, job.mode, metadata)
+            await self._save_record(
+                job.file_hash, job.mode, job.file_path,
+                status='failed' if failed else 'done',
+                metadata=metadata, probe_ms=elapsed_ms
+            )
+            if not failed:
+                await self.apply_to_media_file(job.file_hash, metadata)
+
+        if not job.future.done():
+            job.future.set_result(metadata)
+
+    def _remember(self, file_hash: str, mode: str, metadata: Dict[str, Any]):
+        self._cache[file_hash] = (mode, metadata)
+        self._cache.move_to_end(file_hash)
+        while len(self._cache) > self.memory_cache_size:
+            self._cache.popitem(last=False)
+
+    # ==================== 持久化 ====================
+
+    async def _save_record(
+        self,
+        file_hash: str,
+        mode: str,
+        file_path: str,
+        status: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        probe_ms: Optional[float] = None
+    ):
+        """写入探测记录（pending 为队列，done 为缓存）"""
+        try:
+            from database import get_db
+            from models import MediaMetadataRecord
+
+            async for db in get_db():
+                result = await db.execute(
+                    select(MediaMetadataRecord).where(MediaMetadataRecord.file_hash == file_hash)
+                )
+                record = result.scalar_one_or_none()
+                if record is None:
+                    record = MediaMetadataRecord(file_hash=file_hash)
+                    db.add(record)
+                elif record.status == 'done' and status == 'pending' and \
+                        MODE_RANK.get(record.mode, 0) >= MODE_RANK.get(mode, 1):
+                    break
+
+                record.mode = mode
+                record.file_path = file_path
+                record.status = status
+                if metadata is not None:
+                    record.metadata_json = json.dumps(metadata, ensure_ascii=False)
+                    record.error = metadata.get('error')
+                if probe_ms is not None:
+                    record.probe_ms = int(probe_ms)
+                    record.attempts = (record.attempts or 0) + 1
+                record.updated_at = get_user_now()
+                await db.commit()
+                break
+        except Exception as e:
+            logger.debug(f"保存元数据记录失败: {e}")
+
+    async def _restore_pending(self):
+        """重启后重新排队未完成的探测任务"""
+        try:
+            from database import get_db
+            from models import MediaMetadataRecord
+
+            async for db in get_db():
+                result = await db.execute(
+                    select(MediaMetadataRecord.file_hash, MediaMetadataRecord.file_path, MediaMetadataRecord.mode)
+                    .where(MediaMetadataRecord.status == 'pending')
+                )
+                rows = result.all()
+                break
+            else:
+                rows = []
+
+            for file_hash, file_path, mode in rows:
+                await self._submit(file_path, file_hash, mode or 'lightweight', persist=False)
+            self.stats["restored"] += len(rows)
+            if rows:
+                logger.info(f"🔄 恢复 {len(rows)} 个未完成的元数据探测任务")
+        except Exception as e:
+            logger.warning(f"恢复元数据探测任务失败: {e}")
+
+    async def _current_path(self, file_hash: str) -> Optional[str]:
+        """媒体记录中文件的当前本地路径"""
+        try:
+            from database import get_db
+            from models import MediaFile
+
+            async for db in get_db():
+                result = await db.execute(
+                    select(MediaFile.final_path, MediaFile.temp_path).where(MediaFile.file_hash == file_hash)
+                )
+                row = result.first()
+                if row:
+                    for path in row:
+                        if path and os.path.exists(path):
+                            return path
+                break
+        except Exception as e:
+            logger.debug(f"查询文件路径失败: {e}")
+        return None
+
+    async def apply_to_media_file(self, file_hash: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        把元数据写入尚无完整元数据的媒体记录（后台探测完成或记录创建晚于探测完成时调用）
+
+        Returns:
+            bool: 是否有记录被更新
+        """
+        if metadata is None:
+            entry = self._cache.get(file_hash)
+            if not entry:
+                return False
+            metadata = entry[1]
+
+        try:
+            from database import get_db
+            from models import MediaFile
+
+            async for db in get_db():
+                duration = metadata.get('duration_seconds')
+                result = await db.execute(
+                    update(MediaFile)
+                    .where(MediaFile.file_hash == file_hash)
+                    .where((MediaFile.file_metadata.is_(None)) | (MediaFile.file_metadata.contains('"pending": true')))
+                    .values(
+                        file_metadata=json.dumps(metadata),
+                        width=metadata.get('width'),
+                        height=metadata.get('height'),
+                        duration_seconds=int(duration) if duration else None,
+                        resolution=metadata.get('resolution'),
+                        codec=metadata.get('codec'),
+                        bitrate_kbps=metadata.get('bitrate_kbps')
+                    )
+                )
+                await db.commit()
+                return result.rowcount > 0
+        except Exception as e:
+            logger.debug(f"写回媒体元数据失败: {e}")
+        return False
+
+    # ==================== 统计 ====================
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        now = time.time()
+        last_minute = sum(1 for t in self._recent if now - t <= 60)
+        cache_hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_probe_ms"},
+            "max_workers": self.max_workers,
+            "active_batches": self._active_batches,
+            "queued": len(self._queue),
+            "inflight": len(self._inflight),
+            "memory_cache_size": len(self._cache),
+            "avg_probe_ms": round(self.stats["total_probe_ms"] / self.stats["probed"], 1) if self.stats["probed"] else 0,
+            "files_per_minute": last_minute,
+            "cache_hit_rate": round(cache_hits / self.stats["requests"], 3) if self.stats["requests"] else 0,
+            "is_running": self.is_running,
+        }
+
+
+# 全局单例
+_metadata_service: Optional[MediaMetadataService] = None
+
+
+def get_metadata_service() -> MediaMetadataService:
+    """获取元数据服务单例"""
+    global _metadata_service
+    if _metadata_service is None:
+        _metadata_service = MediaMetadataService()
+    return _metadata_service
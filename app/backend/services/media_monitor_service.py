@@ -16,11 +16,20 @@ from log_manager import get_logger
 
 logger = get_logger('media_monitor')
 from database import get_db
-from models import MediaMonitorRule, DownloadTask, MediaFile, MediaSettings
+from models import MediaMonitorRule, DownloadTask, MediaFile, MediaSettings, UploadTask
 from utils.media_filters import MediaFilter
 from utils.message_deduplicator import SenderFilter
-from utils.media_metadata import MediaMetadataExtractor
+from services.message_context import MessageContext
+from services.media_metadata_service import get_metadata_service
+from services.storage_manager import get_storage_manager
 from timezone_utils import get_user_now
+from services.common.progress_bus import get_progress_bus, KIND_DOWNLOAD, ProgressState
+from services.common.batch_writer import get_batch_writer
+from services.common.rule_events import get_rule_event_bus, RuleChangeEvent, KIND_MEDIA_MONITOR
+from services.download_scheduler import DownloadScheduler
+from services.upload_scheduler import get_upload_scheduler, parse_bandwidth_schedule
+from services.telegram_downloader import ParallelDownload, parallel_download_size, part_file_path, PART_SIZE
+from services.message_resolver import get_message_resolver, merge_media_json
 
 # 导入 115网盘 Open API 客户端
 try:
@@ -196,16 +205,21 @@ class FileOrganizer:
                 counter += 1
             
             # 执行归档
+            storage_manager = get_storage_manager()
+            file_size = os.path.getsize(temp_path)
             if rule.organize_mode == 'move':
                 shutil.move(temp_path, target_path)
+                storage_manager.record_file_moved(temp_path, target_path, file_size)
                 logger.info(f"📦 移动文件: {temp_path} -> {target_path}")
             else:  # copy
                 shutil.copy2(temp_path, target_path)
+                storage_manager.record_file_added(target_path, file_size)
                 logger.info(f"📋 复制文件: {temp_path} -> {target_path}")
                 
                 # 如果不保留临时文件，删除它
                 if not rule.keep_temp_file:
                     os.remove(temp_path)
+                    storage_manager.record_file_removed(temp_path, file_size)
                     logger.info(f"🗑️ 删除临时文件: {temp_path}")
             
             return str(target_path)
@@ -240,10 +254,16 @@ class MediaMonitorService:
     
     def __init__(self):
         self.active_monitors: Dict[int, bool] = {}  # rule_id -> is_active
-        self.download_queue = asyncio.Queue()
-        self.download_workers: List[asyncio.Task] = []
+        self.scheduler = DownloadScheduler(
+            executor=self._execute_download,
+            resolver=self._resolve_download_task
+        )
         self.is_running = False
         self.global_settings: Optional[MediaSettings] = None
+        # 进行中的分片下载（task_id -> 下载对象），检查点时持久化已完成分片位图
+        self._parallel_downloads: Dict[int, ParallelDownload] = {}
+        # 规则变更订阅（规则增删改后增量刷新 active_monitors 与规则并发限制）
+        self._rule_subscription = None
         
     def _get_config_value(self, key: str, default: Any = None) -> Any:
         """获取配置值（优先使用全局配置）"""
@@ -298,17 +318,65 @@ class MediaMonitorService:
         self.is_running = True
         logger.info("🎬 启动媒体监控服务")
         
+        # 下载进度只保存在进度总线中，由检查点批量写回数据库
+        get_progress_bus().register_checkpoint_handler(KIND_DOWNLOAD, self._checkpoint_download_progress)
+        
+        # 进度与规则统计经批量写入器合并提交
+        writer = get_batch_writer()
+        writer.set_flush_policy(DownloadTask, batch_size=200, flush_interval=5)
+        writer.set_flush_policy(MediaMonitorRule, batch_size=50, flush_interval=5)
+        
         # 重置所有"下载中"的任务状态（容器重启后这些任务已中断）
         await self._reset_downloading_tasks()
         
         # 加载全局配置
         await self._load_global_settings()
         
-        # 启动下载工作线程
-        await self._start_download_workers()
+        # 启动下载调度器
+        self.apply_download_settings()
+        await self.scheduler.start()
+        
+        # 启动上传调度器（恢复上次未完成的上传任务）
+        upload_scheduler = get_upload_scheduler()
+        self.apply_upload_settings()
+        await upload_scheduler.start()
+        await upload_scheduler.restore(get_db)
+        
+        # 启动元数据提取服务（恢复上次未完成的探测任务）
+        metadata_service = get_metadata_service()
+        metadata_service.configure(max_workers=self._get_config_value('metadata_workers', 2) or 2)
+        await metadata_service.start()
         
-        # 加载并启动所有活跃的监控规则
+        # 先订阅规则变更，再加载并启动所有活跃的监控规则
+        self._rule_subscription = get_rule_event_bus().subscribe(
+            "media_monitor", self._on_rule_change, kinds={KIND_MEDIA_MONITOR}
+        )
         await self._load_active_rules()
+        
+        # 延迟恢复数据库中排队的任务（等待Telegram客户端就绪）
+        asyncio.create_task(self._restore_pending_tasks())
+    
+    def apply_download_settings(self):
+        """将全局下载配置（并发数、带宽预算）应用到调度器"""
+        bandwidth_mbps = self._get_config_value('download_bandwidth_limit_mbps', 0) or 0
+        self.scheduler.configure(
+            max_workers=self._get_config_value('concurrent_downloads', 5) or 5,
+            bandwidth_limit=int(bandwidth_mbps * 1024 * 1024)
+        )
+    
+    def apply_upload_settings(self):
+        """将全局上传配置（并发数、限速、分时段限速）应用到上传调度器"""
+        bandwidth_mbps = self._get_config_value('upload_bandwidth_limit_mbps', 0) or 0
+        try:
+            schedule = parse_bandwidth_schedule(self._get_config_value('upload_bandwidth_schedule'))
+        except ValueError as e:
+            logger.warning(f"⚠️ 分时段上传限速配置无效，已忽略: {e}")
+            schedule = []
+        get_upload_scheduler().configure(
+            max_concurrent=self._get_config_value('upload_concurrency', 2) or 2,
+            bandwidth_limit=int(bandwidth_mbps * 1024 * 1024),
+            schedule=schedule
+        )
     
     async def _reset_downloading_tasks(self):
         """重置所有"下载中"状态的任务（容器重启后需要调用）"""
@@ -353,6 +421,7 @@ class MediaMonitorService:
                                 task.status = 'failed'
                                 task.failed_at = get_user_now()
                                 task.last_error = "关联的监控规则已删除"
+                                await self.discard_partial_download(db, task)
                                 failed_count += 1
                             continue
                         
@@ -366,6 +435,7 @@ class MediaMonitorService:
                                 logger.warning(f"   - 跳过任务（已达最大重试次数 {max_auto_retry}）: {task.file_name} (ID: {task.id})")
                                 task.status = 'failed'
                                 task.last_error = f"已达最大重试次数（{max_auto_retry}次），请手动重试"
+                                await self.discard_partial_download(db, task)
                                 failed_count += 1
                                 continue
                             
@@ -381,11 +451,7 @@ class MediaMonitorService:
                     await db.commit()
                     
                     logger.info(f"✅ 任务重置完成: {resumed_count}个待续传, {failed_count}个失败")
-                    logger.info(f"💡 提示: 系统将在5秒后自动尝试续传这些任务")
-                    
-                    # 延迟5秒后启动自动续传
-                    import asyncio
-                    asyncio.create_task(self._auto_resume_tasks(db))
+                    logger.info(f"💡 提示: 系统将在5秒后由下载调度器按优先级续传这些任务")
                 else:
                     logger.info("✅ 没有需要重置的下载任务")
                 
@@ -395,93 +461,133 @@ class MediaMonitorService:
             import traceback
             traceback.print_exc()
     
-    async def _auto_resume_tasks(self, db: AsyncSession):
-        """自动续传中断的任务"""
+    async def _restore_pending_tasks(self):
+        """从数据库恢复排队中的任务到调度器"""
         try:
             # 等待5秒，确保所有服务都已启动
             await asyncio.sleep(5)
-            
-            logger.info("🚀 开始自动续传中断的下载任务...")
-            
-            # 查找所有pending状态的任务
+            await self._prefetch_pending_messages()
+            await self.scheduler.restore(get_db)
+        except Exception as e:
+            logger.error(f"恢复排队下载任务失败: {e}")
+    
+    @staticmethod
+    def _pick_client():
+        """查找可用的 Telegram 客户端包装器"""
+        from main import get_enhanced_bot
+        enhanced_bot = get_enhanced_bot()
+        if not enhanced_bot:
+            raise Exception("无法获取enhanced_bot实例")
+        
+        for client_manager in enhanced_bot.multi_client_manager.clients.values():
+            if client_manager.is_authorized and client_manager.loop and client_manager.client:
+                return client_manager
+        raise Exception("没有可用的Telegram客户端")
+    
+    async def _prefetch_pending_messages(self):
+        """
+        批量预取所有排队任务的原始消息
+        
+        按聊天分组一次获取，结果进入解析缓存，调度器逐个执行任务时不再单独请求；
+        同时把最新的媒体描述写回 media_json
+        """
+        try:
+            client_wrapper = self._pick_client()
+        except Exception as e:
+            logger.warning(f"⚠️ 跳过消息预取: {e}")
+            return
+        
+        async for db in get_db():
             result = await db.execute(
-                select(DownloadTask).where(DownloadTask.status == 'pending')
+                select(DownloadTask).where(
+                    DownloadTask.status == 'pending',
+                    DownloadTask.chat_id.isnot(None),
+                    DownloadTask.message_id.isnot(None)
+                )
             )
-            pending_tasks = result.scalars().all()
-            
-            if not pending_tasks:
-                logger.info("没有待续传的任务")
+            tasks = result.scalars().all()
+            if not tasks:
                 return
             
-            # 获取enhanced_bot实例
-            from main import get_enhanced_bot
-            enhanced_bot = get_enhanced_bot()
-            if not enhanced_bot:
-                logger.error("无法获取enhanced_bot实例，续传失败")
+            try:
+                messages = await get_message_resolver().resolve_many(
+                    client_wrapper,
+                    [(int(task.chat_id), task.message_id) for task in tasks]
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 批量预取消息失败，将在执行时逐个获取: {e}")
                 return
             
-            # 为每个任务重新获取消息并加入队列
-            resumed = 0
-            failed = 0
-            
-            for task in pending_tasks:
-                try:
-                    # 查找可用的客户端
-                    client_wrapper = None
-                    client = None
-                    
-                    for client_manager in enhanced_bot.multi_client_manager.clients.values():
-                        if client_manager.is_authorized and client_manager.loop and client_manager.client:
-                            client_wrapper = client_manager
-                            client = client_manager.client
-                            break
-                    
-                    if not client or not client_wrapper:
-                        raise Exception("没有可用的Telegram客户端")
-                    
-                    # 重新获取消息
-                    if not task.chat_id or not task.message_id:
-                        raise Exception("任务缺少chat_id或message_id")
-                    
-                    future = asyncio.run_coroutine_threadsafe(
-                        client.get_messages(int(task.chat_id), message_ids=task.message_id),
-                        client_wrapper.loop
-                    )
-                    message = future.result(timeout=10)
-                    
-                    if not message:
-                        raise Exception("无法获取原始消息")
-                    
-                    # 加入下载队列
-                    await self.download_queue.put({
-                        'task_id': task.id,
-                        'rule_id': task.monitor_rule_id,
-                        'message_id': task.message_id,
-                        'chat_id': int(task.chat_id),
-                        'file_name': task.file_name,
-                        'file_type': task.file_type,
-                        'client': client,
-                        'message': message,
-                        'client_wrapper': client_wrapper
-                    })
-                    
-                    logger.info(f"✅ 续传任务已加入队列: {task.file_name}")
-                    resumed += 1
-                    
-                except Exception as e:
-                    logger.error(f"❌ 续传任务失败 {task.file_name}: {e}")
-                    task.status = 'failed'
-                    task.failed_at = get_user_now()
-                    task.last_error = f"自动续传失败: {str(e)}"
-                    failed += 1
-            
+            for task in tasks:
+                message = messages.get((int(task.chat_id), task.message_id))
+                if message is not None:
+                    task.media_json = merge_media_json(task.media_json, message)
             await db.commit()
-            logger.info(f"🎉 自动续传完成: {resumed}个成功, {failed}个失败")
             
-        except Exception as e:
-            logger.error(f"自动续传任务异常: {e}")
-            import traceback
-            traceback.print_exc()
+            chats = len({task.chat_id for task in tasks})
+            found = sum(1 for message in messages.values() if message is not None)
+            logger.info(f"📨 已预取 {found}/{len(tasks)} 个排队任务的消息（{chats} 个聊天）")
+            break
+    
+    async def _resolve_download_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """为从数据库恢复的任务重新获取消息，构建下载任务数据（失败时标记任务失败）"""
+        async for db in get_db():
+            result = await db.execute(
+                select(DownloadTask).where(DownloadTask.id == task_id)
+            )
+            task = result.scalar_one_or_none()
+            if not task or task.status != 'pending':
+                return None
+            
+            try:
+                client_wrapper = self._pick_client()
+                client = client_wrapper.client
+                
+                # 重新获取消息（批量解析缓存，消息被替换时按文件查找）
+                if not task.chat_id:
+                    raise Exception("任务缺少chat_id")
+                
+                message = await get_message_resolver().resolve_task_message(
+                    client_wrapper,
+                    int(task.chat_id),
+                    task.message_id,
+                    file_name=task.file_name,
+                    media_id=task.file_unique_id
+                )
+                
+                if not message:
+                    raise Exception("无法获取原始消息")
+                
+                if message.id != task.message_id:
+                    task.message_id = message.id
+                task.media_json = merge_media_json(task.media_json, message)
+                await db.commit()
+                
+                return {
+                    'task_id': task.id,
+                    'rule_id': task.monitor_rule_id,
+                    'message_id': task.message_id,
+                    'chat_id': int(task.chat_id),
+                    'file_name': task.file_name,
+                    'file_type': task.file_type,
+                    'client': client,
+                    'message': message,
+                    'client_wrapper': client_wrapper
+                }
+                
+            except Exception as e:
+                logger.error(f"❌ 续传任务失败 {task.file_name}: {e}")
+                task.status = 'failed'
+                task.failed_at = get_user_now()
+                task.last_error = f"自动续传失败: {str(e)}"
+                await db.commit()
+                get_progress_bus().publish(KIND_DOWNLOAD, task.id, status='failed', error=task.last_error)
+                return None
+        return None
+    
+    def enqueue_download(self, task_data: Dict[str, Any], priority: int = 0, size_bytes: int = 0):
+        """将下载任务提交给调度器"""
+        self.scheduler.submit(task_data, priority=priority, size_bytes=size_bytes)
     
     async def stop(self):
         """停止监控服务"""
@@ -491,11 +597,14 @@ class MediaMonitorService:
         self.is_running = False
         logger.info("🛑 停止媒体监控服务")
         
-        # 停止所有下载工作线程
-        for worker in self.download_workers:
-            worker.cancel()
+        # 停止下载、上传调度器（取消正在执行的任务，上传任务下次启动时从数据库恢复）
+        await self.scheduler.stop()
+        await get_upload_scheduler().stop()
+        await get_metadata_service().stop()
         
-        self.download_workers.clear()
+        if self._rule_subscription:
+            self._rule_subscription.close()
+            self._rule_subscription = None
         self.active_monitors.clear()
     
     async def _load_active_rules(self):
@@ -507,8 +616,10 @@ class MediaMonitorService:
                 )
                 active_rules = result.scalars().all()
                 
+                self.active_monitors = {}
                 for rule in active_rules:
                     self.active_monitors[rule.id] = True
+                    self.scheduler.set_rule_limit(rule.id, rule.concurrent_downloads)
                     logger.info(f"✅ 加载监控规则: {rule.name} (ID: {rule.id})")
                 
                 logger.info(f"📊 已加载 {len(active_rules)} 个活跃监控规则")
@@ -517,40 +628,7 @@ class MediaMonitorService:
         except Exception as e:
             logger.error(f"加载监控规则失败: {e}")
     
-    async def _start_download_workers(self, worker_count: int = 5):
-        """启动下载工作线程（增加并发提升速度）"""
-        for i in range(worker_count):
-            worker = asyncio.create_task(self._download_worker(i))
-            self.download_workers.append(worker)
-            logger.info(f"🔧 启动下载工作线程 #{i+1}")
-    
-    async def _download_worker(self, worker_id: int):
-        """下载工作线程"""
-        logger.info(f"👷 下载工作线程 #{worker_id+1} 已启动")
-        
-        while self.is_running:
-            try:
-                # 从队列获取下载任务
-                task = await asyncio.wait_for(
-                    self.download_queue.get(),
-                    timeout=1.0
-                )
-                
-                logger.info(f"[Worker #{worker_id+1}] 开始下载: {task['file_name']}")
-                
-                # 执行下载
-                await self._execute_download(task)
-                
-                # 标记任务完成
-                self.download_queue.task_done()
-                
-            except asyncio.TimeoutError:
-                # 队列为空，继续等待
-                continue
-            except Exception as e:
-                logger.error(f"[Worker #{worker_id+1}] 下载任务失败: {e}")
-    
-    async def process_message(self, client, message, rule_id: int, client_wrapper=None):
+    async def process_message(self, client, message, rule_id: int, client_wrapper=None, context=None):
         """
         处理接收到的消息
         
@@ -559,6 +637,7 @@ class MediaMonitorService:
             message: 消息对象
             rule_id: 监控规则ID
             client_wrapper: 客户端包装器（用于访问事件循环）
+            context: 消息上下文（复用已计算的发送者、媒体信息）
         """
         try:
             logger.info(f"🔍 处理媒体消息: rule_id={rule_id}, message_id={message.id}")
@@ -588,14 +667,14 @@ class MediaMonitorService:
                 logger.info(f"✅ 消息 {message.id} 包含媒体，应用过滤器")
                 
                 # 应用过滤器
-                if not await self._apply_filters(message, rule):
+                if not await self._apply_filters(message, rule, context):
                     logger.info(f"⏭️ 消息 {message.id} 未通过过滤器")
                     return
                 
                 logger.info(f"✅ 消息 {message.id} 通过所有过滤器，创建下载任务")
                 
                 # 创建下载任务（传递client_wrapper）
-                await self._create_download_task(db, message, rule, client, client_wrapper)
+                await self._create_download_task(db, message, rule, client, client_wrapper, context)
                 
                 break
                 
@@ -614,7 +693,7 @@ class MediaMonitorService:
             message.document
         )
     
-    async def _apply_filters(self, message, rule: MediaMonitorRule) -> bool:
+    async def _apply_filters(self, message, rule: MediaMonitorRule, context: Optional[MessageContext] = None) -> bool:
         """
         应用所有过滤器
         
@@ -666,7 +745,7 @@ class MediaMonitorService:
             
             # 5. 发送者过滤
             if rule.enable_sender_filter:
-                sender_info = SenderFilter.get_sender_info(message)
+                sender_info = context.sender_info if context else SenderFilter.get_sender_info(message)
                 is_allowed = SenderFilter.is_sender_allowed(
                     sender_info['id'],
                     sender_info['username'],
@@ -693,12 +772,13 @@ class MediaMonitorService:
         message,
         rule: MediaMonitorRule,
         client,
-        client_wrapper=None
+        client_wrapper=None,
+        context: Optional[MessageContext] = None
     ):
         """创建下载任务"""
         try:
             # 获取媒体信息
-            media_info = MediaFilter.get_media_info(message)
+            media_info = context.media_info if context else MediaFilter.get_media_info(message)
             
             # 生成文件名（确保有扩展名）
             if media_info['filename']:
@@ -790,8 +870,8 @@ class MediaMonitorService:
             
             logger.info(f"📥 创建下载任务: {filename} (ID: {task.id})")
             
-            # 添加到下载队列（包含client_wrapper）
-            await self.download_queue.put({
+            # 提交给下载调度器（包含client_wrapper）
+            self.enqueue_download({
                 'task_id': task.id,
                 'rule_id': rule.id,
                 'message_id': message.id,
@@ -800,8 +880,9 @@ class MediaMonitorService:
                 'file_type': media_info['type'],
                 'client': client,
                 'message': message,
+                'context': context,
                 'client_wrapper': client_wrapper  # 传递客户端包装器
-            })
+            }, priority=task.priority or 0, size_bytes=media_info['size'] or 0)
             
         except Exception as e:
             logger.error(f"创建下载任务失败: {e}")
@@ -839,6 +920,16 @@ class MediaMonitorService:
                 task.started_at = get_user_now()
                 await db.commit()
                 
+                progress_bus = get_progress_bus()
+                progress_bus.publish(
+                    KIND_DOWNLOAD, task.id,
+                    status='downloading',
+                    current_bytes=task.downloaded_bytes or 0,
+                    total_bytes=task.total_bytes or 0,
+                    name=task.file_name,
+                    rule_id=task.monitor_rule_id
+                )
+                
                 # 确保下载目录存在
                 download_dir = Path(rule.temp_folder or '/app/media/downloads')
                 download_dir.mkdir(parents=True, exist_ok=True)
@@ -851,7 +942,11 @@ class MediaMonitorService:
                 message = task_data.get('message')
                 client_wrapper = task_data.get('client_wrapper')
                 
-                # 检查是否存在不完整的文件，如果存在则删除（Pyrogram不支持真正的断点续传）
+                # 大文件使用分片并行下载（.part 文件 + 分片位图，可断点续传），其他文件使用 download_media 单流下载
+                part_workers = self._get_config_value('download_part_workers', 4) or 4
+                parallel_size = parallel_download_size(message) if message and part_workers > 1 else 0
+                
+                # 检查是否存在不完整的文件（单流下载写入的），如果存在则删除重新下载
                 skip_download = False
                 if file_path.exists():
                     file_size = file_path.stat().st_size
@@ -888,9 +983,8 @@ class MediaMonitorService:
                         import asyncio
                         from concurrent.futures import TimeoutError as FutureTimeoutError
                         
-                        # 定义进度回调函数
+                        # 定义进度回调函数（运行在客户端事件循环线程中）
                         last_progress_log = [0]  # 使用列表以便在闭包中修改
-                        last_db_update = [0]  # 上次更新数据库的时间
                         
                         def progress_callback(current, total):
                             percent = (current / total * 100) if total > 0 else 0
@@ -903,38 +997,54 @@ class MediaMonitorService:
                                 last_progress_log[0] = progress_step
                                 logger.info(f"📥 下载进度: {task.file_name} - {percent:.1f}% ({current_mb:.1f}MB/{total_mb:.1f}MB)")
                             
-                            # 每2秒更新一次数据库（给前端实时进度）
-                            import time
-                            current_time = time.time()
-                            if current_time - last_db_update[0] >= 2.0:
-                                last_db_update[0] = current_time
-                                # 异步更新数据库
-                                asyncio.create_task(self._update_task_progress(task.id, percent, current, total))
+                            # 发布到进度总线（线程安全），数据库由周期性检查点写入
+                            progress_bus.publish(
+                                KIND_DOWNLOAD, task.id,
+                                current_bytes=current,
+                                total_bytes=total,
+                                percent=percent
+                            )
+                        
+                        # 上次中断时保存的分片位图（分片大小和文件大小一致时才可续传）
+                        parts_bitmap = None
+                        if parallel_size and task.part_size == PART_SIZE and (task.total_bytes or parallel_size) == parallel_size:
+                            parts_bitmap = task.parts_bitmap
                         
                         # 下载重试逻辑（处理代理连接失败）
                         download_max_retries = 3
                         download_success = False
                         
                         for download_retry in range(download_max_retries):
+                            future = None
                             try:
                                 if download_retry > 0:
                                     logger.warning(f"🔄 下载重试 {download_retry}/{download_max_retries-1}: {task.file_name}")
-                                    # 删除不完整的文件
-                                    if file_path.exists():
+                                    # 单流下载不支持续传，删除不完整的文件；分片下载从已完成的分片继续
+                                    if not parallel_size and file_path.exists():
                                         os.remove(file_path)
                                     # 等待5秒让代理恢复（使用异步sleep）
                                     await asyncio.sleep(5)
                                 
-                                # 使用异步Future，避免阻塞
-                                # Telethon API: download_media(message, file=path, progress_callback=callback)
-                                future = asyncio.run_coroutine_threadsafe(
-                                    client.download_media(
+                                if parallel_size:
+                                    previous = self._parallel_downloads.get(task.id)
+                                    parallel = ParallelDownload(
+                                        client, message, file_path, parallel_size,
+                                        workers=part_workers,
+                                        bitmap=previous.bitmap.to_bytes() if previous else parts_bitmap,
+                                        progress_callback=progress_callback
+                                    )
+                                    self._parallel_downloads[task.id] = parallel
+                                    download_coro = parallel.run()
+                                else:
+                                    # Telethon API: download_media(message, file=path, progress_callback=callback)
+                                    download_coro = client.download_media(
                                         message, 
                                         file=str(file_path),
                                         progress_callback=progress_callback
-                                    ),
-                                    client_wrapper.loop
-                                )
+                                    )
+                                
+                                # 在客户端事件循环中执行，使用异步Future，避免阻塞
+                                future = asyncio.run_coroutine_threadsafe(download_coro, client_wrapper.loop)
                                 
                                 # 异步等待，不阻塞事件循环（超时2小时，适合GB级大视频）
                                 loop = asyncio.get_event_loop()
@@ -947,6 +1057,9 @@ class MediaMonitorService:
                                 break
                                 
                             except (asyncio.TimeoutError, Exception) as download_error:
+                                if future is not None:
+                                    # 超时后停止客户端循环中仍在进行的下载
+                                    future.cancel()
                                 error_msg = str(download_error)
                                 if download_retry < download_max_retries - 1:
                                     logger.warning(f"⚠️ 下载失败: {error_msg[:100]}, 准备重试...")
@@ -961,6 +1074,11 @@ class MediaMonitorService:
                         await client.download_media(message, file=str(file_path))
                     
                     logger.info(f"✅ 下载完成: {task.file_name}")
+                    if self._parallel_downloads.pop(task.id, None):
+                        task.parts_bitmap = None
+                        task.part_size = None
+                    if file_path.exists():
+                        get_storage_manager().record_file_added(file_path)
                 
                 # 验证文件是否成功下载
                 if not file_path.exists():
@@ -978,7 +1096,9 @@ class MediaMonitorService:
                 if existing_file:
                     logger.info(f"⏭️ 文件已存在（哈希相同），跳过: {task.file_name}")
                     # 删除刚下载的重复文件
+                    duplicate_size = file_path.stat().st_size
                     os.remove(file_path)
+                    get_storage_manager().record_file_removed(file_path, duplicate_size)
                     
                     # 更新任务状态为成功但跳过
                     task.status = 'success'
@@ -986,6 +1106,7 @@ class MediaMonitorService:
                     task.progress_percent = 100
                     task.last_error = "文件已存在（重复）"
                     await db.commit()
+                    progress_bus.publish(KIND_DOWNLOAD, task.id, status='success', percent=100)
                     
                     break
                 
@@ -999,20 +1120,13 @@ class MediaMonitorService:
                         async_extraction = self._get_config_value('async_metadata_extraction', True)
                         timeout = self._get_config_value('metadata_timeout', 10)
                         
-                        if async_extraction:
-                            # 异步提取，不阻塞
-                            metadata_dict = await MediaMetadataExtractor.extract_metadata_async(
-                                str(file_path),
-                                mode=metadata_mode,
-                                timeout=timeout
-                            )
-                        else:
-                            # 同步提取
-                            metadata_dict = await MediaMetadataExtractor.extract_metadata_async(
-                                str(file_path),
-                                mode=metadata_mode,
-                                timeout=timeout
-                            )
+                        # 进程池探测，结果按文件哈希缓存；异步模式超时后转为后台完成并回填
+                        metadata_dict = await get_metadata_service().extract(
+                            str(file_path),
+                            file_hash,
+                            mode=metadata_mode,
+                            timeout=timeout if async_extraction else None
+                        )
                         
                         logger.info(f"📊 元数据提取完成: {metadata_dict.get('type', 'unknown')}")
                     except Exception as meta_error:
@@ -1020,7 +1134,8 @@ class MediaMonitorService:
                         metadata_dict = {'error': str(meta_error)}
                 
                 # 获取发送者和来源信息
-                sender_info = SenderFilter.get_sender_info(message)
+                context = task_data.get('context')
+                sender_info = context.sender_info if context else SenderFilter.get_sender_info(message)
                 
                 # 获取聊天名称（优先从message对象）
                 chat_name = 'unknown'
@@ -1069,6 +1184,7 @@ class MediaMonitorService:
                 is_uploaded = False
                 organize_failed = False
                 organize_error = None
+                pending_upload = None
                 
                 # 检查归档目标类型
                 should_upload_to_115 = rule.organize_enabled and rule.organize_target_type == 'pan115'
@@ -1128,34 +1244,15 @@ class MediaMonitorService:
                             logger.info(f"   本地文件: {source_file}")
                             logger.info(f"   目标路径: {pan115_path}")
                             
-                            # 使用 CloudDrive2 上传
-                            try:
-                                from services.clouddrive2_uploader import get_clouddrive2_uploader
-                                
-                                uploader = get_clouddrive2_uploader()
-                                
-                                upload_result = await uploader.upload_file(
-                                    file_path=source_file,
-                                    target_dir=remote_target_dir,  # 传递目录路径
-                                    enable_quick_upload=True,
-                                    enable_resume=True
-                                )
-                                
-                                if upload_result.get('success'):
-                                    is_uploaded = True
-                                    pan115_path = pan115_path  # 记录115网盘路径
-                                    logger.info(f"✅ 文件已通过CloudDrive2上传: {pan115_path}")
-                                else:
-                                    error_msg = upload_result.get('message', '未知错误')
-                                    logger.warning(f"⚠️ CloudDrive2上传失败: {error_msg}")
-                                    organize_failed = True
-                                    organize_error = f"CloudDrive2上传失败: {error_msg}"
-                            
-                            except ImportError:
-                                error_msg = "CloudDrive2模块未安装，请先安装 grpcio"
-                                logger.error(f"❌ {error_msg}")
-                                organize_failed = True
-                                organize_error = error_msg
+                            # 写入上传队列，由上传调度器统一控制并发、带宽和规则间公平，
+                            # 下载工作协程不再等待上传完成；上传结果由调度器回写媒体文件记录
+                            pending_upload = {
+                                'local_path': source_file,
+                                'remote_dir': remote_target_dir,
+                                'file_name': remote_filename,
+                                'file_size': os.path.getsize(source_file),
+                            }
+                            logger.info(f"📥 已加入上传队列: {remote_filename}")
                     
                     except Exception as clouddrive2_error:
                         error_msg = str(clouddrive2_error)
@@ -1199,23 +1296,52 @@ class MediaMonitorService:
                 
                 db.add(media_file)
                 
+                upload_task = None
+                if pending_upload:
+                    await db.flush()
+                    upload_task = UploadTask(
+                        media_file_id=media_file.id,
+                        monitor_rule_id=rule.id,
+                        priority=task.priority or 0,
+                        **pending_upload
+                    )
+                    db.add(upload_task)
+                
                 # 更新任务状态
                 # 下载成功就标记为success，归档失败只影响媒体文件记录，不影响下载任务状态
                 task.status = 'success'
                 task.completed_at = get_user_now()
                 task.progress_percent = 100
                 
-                # 更新规则统计
-                rule.total_downloaded = (rule.total_downloaded or 0) + 1
-                rule.total_size_mb = (rule.total_size_mb or 0) + task.file_size_mb
-                rule.last_download_at = get_user_now()
+                # 更新规则统计（批量累加写入，并发下载时不再争用同一行）
+                await get_batch_writer().add_increment(
+                    MediaMonitorRule, rule.id,
+                    {'total_downloaded': 1, 'total_size_mb': task.file_size_mb or 0},
+                    values={'last_download_at': get_user_now()}
+                )
                 
                 if organize_failed:
                     logger.warning(f"⚠️ 下载成功但归档失败: {task.file_name} - {organize_error}")
                 else:
                     logger.info(f"🎉 下载任务完成: {task.file_name}")
                 
+                # 丢弃尚未写入的进度检查点，避免覆盖最终状态
+                get_batch_writer().discard(DownloadTask, task.id)
                 await db.commit()
+                progress_bus.publish(KIND_DOWNLOAD, task.id, status='success', percent=100)
+                
+                if upload_task:
+                    get_upload_scheduler().submit(
+                        upload_task.id,
+                        rule_id=rule.id,
+                        remote_dir=upload_task.remote_dir,
+                        priority=upload_task.priority,
+                        size_bytes=upload_task.file_size
+                    )
+                
+                if metadata_dict.get('pending'):
+                    # 探测在记录写入前未完成时，由此处回填（之后完成的由元数据服务自行回填）
+                    await get_metadata_service().apply_to_media_file(file_hash)
                 
                 break
                 
@@ -1233,6 +1359,13 @@ class MediaMonitorService:
                     task = result.scalar_one_or_none()
                     
                     if task:
+                        # 保存已完成的分片，重试时从中断处继续
+                        parallel = self._parallel_downloads.pop(task.id, None)
+                        if parallel:
+                            task.part_size = parallel.part_size
+                            task.parts_bitmap = parallel.bitmap.to_bytes()
+                            task.downloaded_bytes = parallel.downloaded_bytes
+                        
                         task.status = 'failed'
                         task.failed_at = get_user_now()
                         task.last_error = str(e)
@@ -1241,23 +1374,45 @@ class MediaMonitorService:
                         # 如果还可以重试，重新加入队列
                         if task.retry_count < task.max_retries:
                             task.status = 'pending'
-                            await self.download_queue.put(task_data)
+                            get_progress_bus().publish(KIND_DOWNLOAD, task.id, status='pending', error=str(e))
+                            self.enqueue_download(task_data, priority=task.priority or 0, size_bytes=task.total_bytes or 0)
                             logger.info(f"🔄 重试下载任务: {task.file_name} ({task.retry_count}/{task.max_retries})")
                         else:
+                            # 不再重试：删除 .part 文件和分片位图
+                            await self.discard_partial_download(db, task)
                             # 更新规则失败统计
-                            result = await db.execute(
-                                select(MediaMonitorRule).where(MediaMonitorRule.id == task.monitor_rule_id)
+                            await get_batch_writer().add_increment(
+                                MediaMonitorRule, task.monitor_rule_id, {'failed_downloads': 1}
                             )
-                            rule = result.scalar_one_or_none()
-                            if rule:
-                                rule.failed_downloads = (rule.failed_downloads or 0) + 1
+                            get_progress_bus().publish(KIND_DOWNLOAD, task.id, status='failed', error=str(e))
                         
+                        get_batch_writer().discard(DownloadTask, task.id)
                         await db.commit()
                     
                     break
             except Exception as update_error:
                 logger.error(f"更新任务状态失败: {update_error}")
     
+    async def discard_partial_download(self, db: AsyncSession, task: DownloadTask):
+        """
+        放弃任务的分片下载：删除预分配的 .part 文件并清除分片位图
+        
+        任务最终失败（不再重试）或被删除时调用，调用方负责提交
+        """
+        self._parallel_downloads.pop(task.id, None)
+        task.parts_bitmap = None
+        task.part_size = None
+        if not task.file_name:
+            return
+        
+        rule = await db.get(MediaMonitorRule, task.monitor_rule_id)
+        download_dir = Path(rule.temp_folder if rule and rule.temp_folder else '/app/media/downloads')
+        part_path = part_file_path(download_dir / task.file_name)
+        try:
+            await asyncio.to_thread(part_path.unlink, missing_ok=True)
+        except OSError as e:
+            logger.warning(f"⚠️ 删除分片下载临时文件失败: {part_path}, 错误: {e}")
+    
     async def _calculate_file_hash(self, file_path: str) -> str:
         """计算文件的 SHA-256 哈希值"""
         try:
@@ -1272,25 +1427,32 @@ class MediaMonitorService:
             logger.error(f"计算文件哈希失败: {e}")
             return ""
     
-    async def _update_task_progress(self, task_id: int, percent: float, current_bytes: int, total_bytes: int):
-        """更新任务下载进度到数据库（给前端实时显示）"""
-        try:
-            async for db in get_db():
-                result = await db.execute(
-                    select(DownloadTask).where(DownloadTask.id == task_id)
-                )
-                task = result.scalar_one_or_none()
-                
-                if task:
-                    task.progress_percent = int(percent)
-                    task.downloaded_bytes = current_bytes
-                    task.total_bytes = total_bytes
-                    await db.commit()
-                
-                break
-        except Exception as e:
-            # 进度更新失败不影响下载，只记录警告
-            logger.debug(f"更新任务进度失败: {e}")
+    async def _checkpoint_download_progress(self, states: List[ProgressState]):
+        """
+        进度总线检查点：经批量写入器合并写回下载进度（只写进度字段，不改状态）
+        
+        单个状态无法转换时跳过并记录警告；写入器的异常向上抛出，由进度总线计数并在下次检查点重试
+        """
+        writer = get_batch_writer()
+        for state in states:
+            try:
+                task_id = int(state.task_id)
+                values = {
+                    'id': task_id,
+                    'progress_percent': int(state.percent),
+                    'downloaded_bytes': state.current_bytes,
+                    'download_speed_mbps': int(state.speed_bytes_per_sec / 1024 / 1024),
+                }
+                if state.total_bytes:
+                    values['total_bytes'] = state.total_bytes
+                parallel = self._parallel_downloads.get(task_id)
+                if parallel:
+                    values['part_size'] = parallel.part_size
+                    values['parts_bitmap'] = parallel.bitmap.to_bytes()
+            except Exception as e:
+                logger.warning(f"⚠️ 跳过无法写入的下载进度 {state.key}: {e}")
+                continue
+            await writer.add_update(DownloadTask, values)
     
     async def reload_rule(self, rule_id: int):
         """重新加载单个监控规则"""
@@ -1303,6 +1465,7 @@ class MediaMonitorService:
                 
                 if rule and rule.is_active:
                     self.active_monitors[rule_id] = True
+                    self.scheduler.set_rule_limit(rule_id, rule.concurrent_downloads)
                     logger.info(f"✅ 重新加载监控规则: {rule.name} (ID: {rule.id})")
                 elif rule_id in self.active_monitors:
                     del self.active_monitors[rule_id]
@@ -1312,6 +1475,13 @@ class MediaMonitorService:
                 
         except Exception as e:
             logger.error(f"重新加载监控规则失败: {e}")
+    
+    async def _on_rule_change(self, event: RuleChangeEvent):
+        """规则变更事件：单条规则只重新加载该规则，批量变更时重新加载全部"""
+        if event.is_reload:
+            await self._load_active_rules()
+        else:
+            await self.reload_rule(event.rule_id)
 
 
 # 全局媒体监控服务实例
@@ -0,0 +1,250 @@
+"""
+媒体缩略图/海报服务
+
+功能：
+1. 首次请求时在进程池中生成缩略图（图片用 Pillow，视频用 ffmpeg 截取一帧），不占用事件循环和 GIL
+2. 结果以 MediaFile.file_hash + 尺寸为键缓存在磁盘上，按最近访问顺序淘汰（LRU，总大小有上限）
+3. 同一文件的并发请求共享一次生成任务
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from log_manager import get_logger
+from config import Config
+
+logger = get_logger("media_preview")
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.heic'}
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm', '.m4v', '.ts'}
+
+THUMBNAIL_SIZES = (160, 320, 640)
+
+
+def _render_thumbnail(source: str, target: str, size: int, is_video: bool) -> bool:
+    """
+    生成 JPEG 缩略图（在子进程中执行）
+
+    Returns:
+        bool: 是否生成成功
+    """
+    from PIL import Image, ImageOps
+
+    frame_path = None
+    try:
+        if is_video:
+            if not shutil.which('ffmpeg'):
+                return False
+            fd, frame_path = tempfile.mkstemp(suffix='.jpg', dir=os.path.dirname(target))
+            os.close(fd)
+            # 先尝试第3秒的画面（跳过片头黑屏），过短的视频退回第一帧
+            for seek in ('3', '0'):
+                result = subprocess.run(
+                    ['ffmpeg', '-v', 'error', '-y', '-ss', seek, '-i', source,
+                     '-frames:v', '1', '-vf', f'scale={size}:-2', frame_path],
+                    capture_output=True, timeout=30, check=False
+                )
+                if result.returncode == 0 and os.path.getsize(frame_path) > 0:
+                    break
+            else:
+                return False
+            source = frame_path
+
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            tmp_target = f"{target}.{os.getpid()}.tmp"
+            image.save(tmp_target, 'JPEG', quality=80, optimize=True)
+            os.replace(tmp_target, target)
+        return True
+    except Exception:
+        return False
+    finally:
+        if frame_path and os.path.exists(frame_path):
+            os.unlink(frame_path)
+
+
+class MediaPreviewService:
+    """缩略图生成与磁盘 LRU 缓存"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_cache_mb: int = 512,
+        max_workers: int = 2
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录（默认 DATA_DIR/thumbnails）
+            max_cache_mb: 缓存总大小上限（MB）
+            max_workers: 生成缩略图的进程数
+        """
+        self.cache_dir = Path(cache_dir or os.path.join(Config.DATA_DIR, 'thumbnails'))
+        self.max_cache_bytes = max_cache_mb * 1024 * 1024
+        self.max_workers = max_workers
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # 文件名 -> 大小，按访问时间排序
+        self._cache_bytes = 0
+        self._loaded = False
+        self._pending: Dict[str, asyncio.Future] = {}
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "generated": 0,
+            "failed": 0,
+            "evicted": 0,
+        }
+
+    # ==================== 缓存索引 ====================
+
+    def _load_index(self):
+        """扫描缓存目录，按最后访问时间重建 LRU 顺序"""
+        if self._loaded:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.cache_dir.glob('*.jpg'):
+            try:
+                st = path.stat()
+                entries.append((max(st.st_atime, st.st_mtime), path.name, st.st_size))
+            except OSError:
+                continue
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._cache_bytes += size
+        self._loaded = True
+        logger.info(f"📂 缩略图缓存: {len(self._index)} 个文件, {self._cache_bytes / 1024 / 1024:.1f}MB")
+
+    def _touch(self, name: str):
+        self._index.move_to_end(name)
+        try:
+            os.utime(self.cache_dir / name)
+        except OSError:
+            pass
+
+    def _add(self, name: str):
+        try:
+            size = (self.cache_dir / name).stat().st_size
+        except OSError:
+            return
+        self._cache_bytes += size - self._index.get(name, 0)
+        self._index[name] = size
+        self._index.move_to_end(name)
+        self._evict()
+
+    def _evict(self):
+        while self._cache_bytes > self.max_cache_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._cache_bytes -= size
+            try:
+                (self.cache_dir / name).unlink()
+            except OSError:
+                pass
+            self.stats["evicted"] += 1
+
+    # ==================== 缩略图 ====================
+
+    @staticmethod
+    def cache_key(file_hash: Optional[str], file_path: str, size: int) -> str:
+        """缓存文件名：优先使用文件哈希，没有哈希时使用路径+修改时间"""
+        if not file_hash:
+            st = os.stat(file_path)
+            file_hash = hashlib.sha1(f"{file_path}:{st.st_mtime_ns}:{st.st_size}".encode()).hexdigest()
+        return f"{file_hash}_{size}.jpg"
+
+    @staticmethod
+    def is_previewable(file_path: str) -> bool:
+        ext = Path(file_path).suffix.lower()
+        return ext in IMAGE_EXTENSIONS or ext in VIDEO_EXTENSIONS
+
+    async def get_thumbnail(self, file_path: str, file_hash: Optional[str], size: int = 320) -> Optional[str]:
+        """
+        获取缩略图路径（不存在时生成）
+
+        Args:
+            file_path: 原文件路径
+            file_hash: 文件哈希（MediaFile.file_hash）
+            size: 最长边像素（取最接近的预设尺寸）
+
+        Returns:
+            str: 缩略图路径；不支持的类型或生成失败返回 None
+        """
+        if not self.is_previewable(file_path):
+            return None
+        size = min(THUMBNAIL_SIZES, key=lambda s: abs(s - size))
+
+        self._load_index()
+        name = self.cache_key(file_hash, file_path, size)
+        target = self.cache_dir / name
+
+        if name in self._index and target.exists():
+            self.stats["hits"] += 1
+            self._touch(name)
+            return str(target)
+
+        self.stats["misses"] += 1
+        future = self._pending.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(file_path, str(target), size))
+            self._pending[name] = future
+            future.add_done_callback(lambda _: self._pending.pop(name, None))
+
+        ok = await asyncio.shield(future)
+        if not ok:
+            return None
+        self._add(name)
+        return str(target)
+
+    async def _generate(self, file_path: str, target: str, size: int) -> bool:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        is_video = Path(file_path).suffix.lower() in VIDEO_EXTENSIONS
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(self._executor, _render_thumbnail, file_path, target, size, is_video)
+        except Exception as e:
+            logger.warning(f"生成缩略图失败 {file_path}: {e}")
+            ok = False
+
+        self.stats["generated" if ok else "failed"] += 1
+        return ok
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            "cached_files": len(self._index),
+            "cache_mb": round(self._cache_bytes / 1024 / 1024, 2),
+            "max_cache_mb": round(self.max_cache_bytes / 1024 / 1024, 2),
+            "pending": len(self._pending),
+        }
+
+
+# 全局单例
+_preview_service: Optional[MediaPreviewService] = None
+
+
+def get_media_preview_service() -> MediaPreviewService:
+    """获取缩略图服务单例"""
+    global _preview_service
+    if _preview_service is None:
+        _preview_service = MediaPreviewService()
+    return _preview_service
@@ -2,11 +2,33 @@
 消息处理上下文
 
 提供安全的消息处理上下文，封装客户端操作，处理事件循环问题
+
+每条消息在接收时只创建一个上下文，转发、去重、日志、资源监控和媒体监控共用，
+文本、聊天ID、内容/媒体哈希、发送者、媒体信息和链接等派生值首次访问时计算并缓存
 """
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Any, Optional, Dict, List
 import asyncio
 
+
+def peer_to_chat_id(peer_id: Any) -> int:
+    """
+    将 Telethon peer 转换为聊天ID
+    
+    - 超级群组/频道：-100xxxxxxxxx
+    - 普通群组：负数
+    - 私聊用户：正数
+    """
+    from telethon.tl.types import PeerChannel, PeerChat
+    
+    if isinstance(peer_id, PeerChannel):
+        return -1000000000000 - peer_id.channel_id
+    if isinstance(peer_id, PeerChat):
+        return -peer_id.chat_id
+    return peer_id.user_id
+
+
 @dataclass
 class MessageContext:
     """
@@ -29,6 +51,79 @@ class MessageContext:
     _extracted_links: Optional[Dict[str, List[str]]] = field(default=None, repr=False)
     _matched_keywords: Optional[Dict] = field(default_factory=dict, repr=False)
     
+    @classmethod
+    def from_message(cls, message: Any, client_manager: Any = None, is_edited: bool = False) -> "MessageContext":
+        """根据消息创建上下文（聊天ID由 peer_id 换算）"""
+        return cls(
+            message=message,
+            client_manager=client_manager,
+            chat_id=peer_to_chat_id(message.peer_id),
+            is_edited=is_edited
+        )
+    
+    @classmethod
+    def ensure(cls, message_or_context: Any, client_manager: Any = None) -> "MessageContext":
+        """兼容旧调用：传入的是原始消息时包装为上下文"""
+        if isinstance(message_or_context, cls):
+            return message_or_context
+        return cls.from_message(message_or_context, client_manager)
+    
+    # ===== 惰性计算的派生值 =====
+    
+    @cached_property
+    def text(self) -> str:
+        """消息文本（媒体消息为 caption）"""
+        return self.message.text or self.message.message or ""
+    
+    @cached_property
+    def text_lower(self) -> str:
+        return self.text.lower()
+    
+    @cached_property
+    def source_chat_id(self) -> str:
+        return str(self.chat_id)
+    
+    @cached_property
+    def content_hash(self) -> str:
+        """内容哈希（去重与日志共用）"""
+        from utils.message_deduplicator import MessageDeduplicator
+        return MessageDeduplicator.calculate_content_hash(self.text)
+    
+    @cached_property
+    def media_hash(self) -> Optional[str]:
+        """媒体哈希（无媒体时为 None）"""
+        from utils.message_deduplicator import MessageDeduplicator
+        media = self.message.media
+        if media and hasattr(media, 'id'):
+            return MessageDeduplicator.calculate_media_hash(str(media.id), type(media).__name__)
+        return None
+    
+    @cached_property
+    def sender_info(self) -> Dict[str, Any]:
+        """发送者信息"""
+        from utils.message_deduplicator import SenderFilter
+        return SenderFilter.get_sender_info(self.message)
+    
+    @cached_property
+    def has_media(self) -> bool:
+        """是否包含媒体（网页预览不算）"""
+        media = getattr(self.message, 'media', None)
+        return media is not None and type(media).__name__ != 'MessageMediaWebPage'
+    
+    @cached_property
+    def media_info(self) -> Dict[str, Any]:
+        """媒体描述（类型、大小、文件名等）"""
+        from utils.media_filters import MediaFilter
+        return MediaFilter.get_media_info(self.message)
+    
+    @property
+    def links(self) -> Dict[str, List[str]]:
+        """提取的资源链接（同步版本，不查询全局缓存）"""
+        if self._extracted_links is None:
+            from services.resource_monitor_service import LinkExtractor
+            self._extracted_links = LinkExtractor.extract_all(self.text)
+        return self._extracted_links
+    
     async def send_message(self, chat_id: int, text: str, **kwargs):
         """
         安全地发送消息
@@ -73,21 +168,18 @@ class MessageContext:
             pass  # 缓存失败不影响功能
         
         # 提取链接
-        from services.resource_monitor_service import LinkExtractor
-        self._extracted_links = LinkExtractor.extract_all(
-            self.message.text or ""
-        )
+        links = self.links
         
         # 保存到全局缓存
         try:
             from services.common.message_cache import get_message_cache
             cache = get_message_cache()
             message_id = self.message.id if self.message else 0
-            await cache.cache_extracted_links(self.chat_id, message_id, self._extracted_links)
+            await cache.cache_extracted_links(self.chat_id, message_id, links)
         except Exception:
             pass
         
-        return self._extracted_links
+        return links
     
     async def get_matched_keywords(self, keywords: List[str]) -> List[str]:
         """获取匹配的关键词（带全局缓存和共享过滤引擎）"""
@@ -119,14 +211,12 @@ class MessageContext:
             from services.common.filter_engine import get_filter_engine
             filter_engine = get_filter_engine()
             
-            message_text = self.message.text or ""
-            matched = filter_engine.match_keywords(message_text, keywords)
+            matched = filter_engine.match_keywords(self.text, keywords)
         except Exception:
             # 回退到简单匹配
             matched = []
-            message_text = (self.message.text or "").lower()
             for keyword in keywords:
-                if keyword.lower() in message_text:
+                if keyword.lower() in self.text_lower:
                     matched.append(keyword)
         
         # 保存到缓存
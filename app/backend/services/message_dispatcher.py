@@ -1,18 +1,104 @@
 """
 消息分发器
 
-统一管理所有消息处理器，并发执行，收集处理结果
+统一管理所有消息处理器，并发执行，收集处理结果：
+1. 并发判断各处理器是否需要处理（should_process），判断超时视为不处理
+2. 每个处理器在自己的超时和并发上限内执行，慢处理器不会拖住其他处理器和调用方
+3. 耗时较长的副作用（115转存、离线任务）可放入后台队列，不占用消息处理时间
+4. 按处理器记录耗时分布（p50/p95/p99）
+
+分发器全局共享，而每个 Telegram 客户端运行在独立线程的事件循环中，
+因此信号量和后台队列按事件循环分别创建
 """
-from typing import List, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from bisect import bisect_left
 import asyncio
+import threading
 import time
+import weakref
 from log_manager import get_logger
 
 logger = get_logger("message_dispatcher", "enhanced_bot.log")
 
+# 耗时分桶上界（毫秒），超出最后一个上界的样本计入溢出桶
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 30000, 60000, 120000, 300000
+)
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图，分位数按桶内线性插值估算"""
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value_ms: float):
+        with self._lock:
+            self._counts[bisect_left(self.bounds, value_ms)] += 1
+            self.count += 1
+            self.total += value_ms
+            self.max = max(self.max, value_ms)
+    
+    def percentile(self, q: float) -> float:
+        """估算分位数（q 取 0~1）"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            cumulative = 0
+            for index, count in enumerate(self._counts):
+                if not count:
+                    continue
+                if cumulative + count >= rank:
+                    lower = self.bounds[index - 1] if index > 0 else 0.0
+                    upper = self.bounds[index] if index < len(self.bounds) else self.max
+                    value = lower + (upper - lower) * (rank - cumulative) / count
+                    return min(value, self.max)
+                cumulative += count
+            return self.max
+    
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["le_inf"]
+        return {
+            'count': self.count,
+            'avg': round(self.avg, 2),
+            'p50': round(self.percentile(0.50), 2),
+            'p95': round(self.percentile(0.95), 2),
+            'p99': round(self.percentile(0.99), 2),
+            'max': round(self.max, 2),
+            'buckets': {label: count for label, count in zip(labels, counts) if count},
+        }
+
 
 class MessageProcessor:
-    """消息处理器基类"""
+    """
+    消息处理器基类
+    
+    子类可覆盖以下类属性，或在注册时通过 register() 的参数指定
+    """
+    
+    # 单条消息的处理超时（秒），超时后取消处理并记为失败
+    timeout: float = 30.0
+    # 同一事件循环中同时处理的消息数上限
+    max_concurrency: int = 4
+    # should_process 的超时（秒），超时视为不处理
+    predicate_timeout: float = 5.0
+    
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
     
     async def should_process(self, context: 'MessageContext') -> bool:
         """判断是否应该处理这条消息"""
@@ -23,36 +109,135 @@ class MessageProcessor:
         raise NotImplementedError
 
 
+class _PerLoop:
+    """按事件循环分别创建的对象（事件循环被回收后自动释放）"""
+    
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._items: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        item = self._items.get(loop)
+        if item is None:
+            with self._lock:
+                item = self._items.get(loop)
+                if item is None:
+                    item = self._items[loop] = self._factory()
+        return item
+    
+    def values(self) -> List[Any]:
+        with self._lock:
+            return list(self._items.values())
+
+
+class _RegisteredProcessor:
+    """已注册的处理器及其限制、统计"""
+    
+    def __init__(self, processor: MessageProcessor, timeout: float, max_concurrency: int):
+        self.processor = processor
+        self.name = processor.name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.predicate_timeout = processor.predicate_timeout
+        self.semaphores = _PerLoop(lambda: asyncio.Semaphore(self.max_concurrency))
+        self.latency = LatencyHistogram()
+        self.in_flight = 0
+        self.stats = {
+            'processed': 0,
+            'success': 0,
+            'failed': 0,
+            'timeouts': 0,
+            'predicate_timeouts': 0,
+            'predicate_errors': 0,
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'avg_time': self.latency.avg,
+            'in_flight': self.in_flight,
+            'timeout': self.timeout,
+            'max_concurrency': self.max_concurrency,
+            'latency': self.latency.to_dict(),
+        }
+
+
+class _BackgroundJobs:
+    """某个事件循环中的后台任务：同时执行数受限，积压已满时调用方等待空位（反压，不丢任务）"""
+    
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.tasks: set = set()
+        self.slot_freed = asyncio.Event()
+    
+    def _on_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        self.slot_freed.set()
+
+
 class MessageDispatcher:
     """
     消息分发器
     
     作用：
     1. 统一管理所有处理器
-    2. 并发执行处理器
-    3. 收集处理结果
-    4. 性能监控
+    2. 并发判断、并发执行处理器，每个处理器有独立的超时和并发上限
+    3. 后台执行耗时较长的副作用
+    4. 性能监控（耗时分位数）
     """
     
-    def __init__(self):
+    def __init__(self, background_workers: int = 4, background_max_pending: int = 100):
+        """
+        Args:
+            background_workers: 每个事件循环同时执行的后台任务数
+            background_max_pending: 每个事件循环最多积压的后台任务数
+        """
         self.processors: List[MessageProcessor] = []
+        self._entries: Dict[str, _RegisteredProcessor] = {}
+        self.dispatch_latency = LatencyHistogram()
         self.stats = {
             'total_messages': 0,
             'total_processing_time': 0,
             'processor_stats': {}
         }
+        
+        self._background = _PerLoop(lambda: _BackgroundJobs(background_workers, background_max_pending))
+        self._job_latency: Dict[str, LatencyHistogram] = {}
+        self.background_stats: Dict[str, Dict[str, int]] = {}
     
-    def register(self, processor: MessageProcessor):
-        """注册处理器"""
+    def register(
+        self,
+        processor: MessageProcessor,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        """
+        注册处理器（同名处理器只注册一次，多个客户端共享同一个分发器）
+        
+        Args:
+            processor: 处理器
+            timeout: 处理超时（秒），默认使用处理器的 timeout
+            max_concurrency: 每个事件循环的并发上限，默认使用处理器的 max_concurrency
+        """
+        processor_name = processor.name
+        if processor_name in self._entries:
+            logger.debug(f"处理器已注册，跳过: {processor_name}")
+            return
+        
+        entry = _RegisteredProcessor(
+            processor,
+            timeout=timeout if timeout is not None else processor.timeout,
+            max_concurrency=max(1, max_concurrency if max_concurrency is not None else processor.max_concurrency)
+        )
+        self._entries[processor_name] = entry
         self.processors.append(processor)
-        processor_name = processor.__class__.__name__
-        self.stats['processor_stats'][processor_name] = {
-            'processed': 0,
-            'success': 0,
-            'failed': 0,
-            'avg_time': 0
-        }
-        logger.info(f"✅ 注册处理器: {processor_name}")
+        self.stats['processor_stats'][processor_name] = entry.stats
+        logger.info(
+            f"✅ 注册处理器: {processor_name} (超时={entry.timeout}s, 并发={entry.max_concurrency})"
+        )
     
     async def dispatch(self, context: 'MessageContext') -> Dict[str, bool]:
         """
@@ -60,80 +245,187 @@ class MessageDispatcher:
         
         返回：{processor_name: success}
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         self.stats['total_messages'] += 1
+        entries = list(self._entries.values())
         
-        # 1. 筛选需要处理的处理器
-        active_processors = []
-        for processor in self.processors:
-            try:
-                if await processor.should_process(context):
-                    active_processors.append(processor)
-            except Exception as e:
-                logger.error(f"处理器 {processor.__class__.__name__} 判断失败: {e}")
+        # 1. 并发筛选需要处理的处理器
+        checks = await asyncio.gather(*(self._should_process(entry, context) for entry in entries))
+        active = [entry for entry, matched in zip(entries, checks) if matched]
         
-        if not active_processors:
+        if not active:
             logger.debug(f"没有处理器需要处理此消息: chat_id={context.chat_id}")
             return {}
         
-        logger.info(f"📨 分发消息: chat_id={context.chat_id}, 激活处理器={len(active_processors)}")
+        logger.info(f"📨 分发消息: chat_id={context.chat_id}, 激活处理器={len(active)}")
         
-        # 2. 并发执行所有处理器
-        tasks = []
-        for processor in active_processors:
-            task = asyncio.create_task(
-                self._process_with_stats(processor, context)
-            )
-            tasks.append((processor.__class__.__name__, task))
+        # 2. 并发执行所有处理器（各自受超时限制，异常已在内部处理）
+        outcomes = await asyncio.gather(*(self._process_with_stats(entry, context) for entry in active))
+        results = {entry.name: success for entry, success in zip(active, outcomes)}
         
-        # 3. 等待所有处理器完成
-        results = {}
-        for processor_name, task in tasks:
-            try:
-                success = await task
-                results[processor_name] = success
-            except Exception as e:
-                logger.error(f"处理器 {processor_name} 执行失败: {e}")
-                results[processor_name] = False
-        
-        # 4. 更新统计
-        processing_time = (time.time() - start_time) * 1000
+        # 3. 更新统计
+        processing_time = (time.perf_counter() - start_time) * 1000
         self.stats['total_processing_time'] += processing_time
+        self.dispatch_latency.observe(processing_time)
         
         if processing_time > 500:  # 超过500ms记录警告
             logger.warning(f"消息处理耗时过长: {processing_time:.2f}ms")
         
         return results
     
-    async def _process_with_stats(self, processor: MessageProcessor, context: 'MessageContext') -> bool:
-        """执行处理器并记录统计"""
-        processor_name = processor.__class__.__name__
-        stats = self.stats['processor_stats'][processor_name]
-        
-        start_time = time.time()
+    async def _should_process(self, entry: _RegisteredProcessor, context: 'MessageContext') -> bool:
+        """带超时的 should_process，超时或异常视为不处理"""
+        try:
+            return bool(await asyncio.wait_for(
+                entry.processor.should_process(context), entry.predicate_timeout
+            ))
+        except asyncio.TimeoutError:
+            entry.stats['predicate_timeouts'] += 1
+            logger.warning(f"⏱️ 处理器 {entry.name} 判断超时（{entry.predicate_timeout}s），跳过此消息")
+        except Exception as e:
+            entry.stats['predicate_errors'] += 1
+            logger.error(f"处理器 {entry.name} 判断失败: {e}")
+        return False
+    
+    async def _process_with_stats(self, entry: _RegisteredProcessor, context: 'MessageContext') -> bool:
+        """在超时和并发上限内执行处理器并记录统计"""
+        stats = entry.stats
+        start_time = time.perf_counter()
         stats['processed'] += 1
         
         try:
-            success = await processor.process(context)
-            if success:
-                stats['success'] += 1
-            else:
-                stats['failed'] += 1
-            
-            # 更新平均处理时间
-            processing_time = (time.time() - start_time) * 1000
-            stats['avg_time'] = (
-                (stats['avg_time'] * (stats['processed'] - 1) + processing_time) 
-                / stats['processed']
-            )
-            
-            logger.debug(f"处理器 {processor_name} 完成: success={success}, 耗时={processing_time:.2f}ms")
-            return success
-            
+            success = await asyncio.wait_for(self._run_limited(entry, context), entry.timeout)
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            logger.warning(f"⏱️ 处理器 {entry.name} 超时（{entry.timeout}s），已取消")
+            success = False
+        except Exception as e:
+            logger.error(f"处理器 {entry.name} 执行异常: {e}", exc_info=True)
+            success = False
+        
+        if success:
+            stats['success'] += 1
+        else:
+            stats['failed'] += 1
+        
+        processing_time = (time.perf_counter() - start_time) * 1000
+        entry.latency.observe(processing_time)
+        logger.debug(f"处理器 {entry.name} 完成: success={success}, 耗时={processing_time:.2f}ms")
+        return bool(success)
+    
+    async def _run_limited(self, entry: _RegisteredProcessor, context: 'MessageContext') -> bool:
+        async with entry.semaphores.get():
+            entry.in_flight += 1
+            try:
+                return await entry.processor.process(context)
+            finally:
+                entry.in_flight -= 1
+    
+    # ==================== 后台任务 ====================
+    
+    async def run_in_background(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[Any]],
+        timeout: float = 600
+    ) -> bool:
+        """
+        把耗时较长的副作用放入当前事件循环的后台队列
+        
+        job 是返回协程的函数（放入队列后才创建协程）；任务应自行打开数据库会话，
+        不能使用调用方的会话（调用方处理结束后会话即关闭）
+        
+        Args:
+            name: 任务类型（用于统计）
+            job: 返回协程的函数
+            timeout: 任务超时（秒）
+        
+        积压已满时等待空位后再放入，任务本身始终在后台执行，不受调用方（处理器）超时影响；
+        调用方在等待期间被取消时任务不会执行，计入 cancelled
+        
+        Returns:
+            True 表示立即放入后台队列；积压已满、等待空位后才放入时返回 False
+        """
+        jobs: _BackgroundJobs = self._background.get()
+        stats = self._job_stats(name)
+        stats['submitted'] += 1
+        
+        waited = len(jobs.tasks) >= jobs.max_pending
+        if waited:
+            stats['waited'] += 1
+            logger.warning(f"⚠️ 后台队列已满（{len(jobs.tasks)}），等待空位: {name}")
+            try:
+                while len(jobs.tasks) >= jobs.max_pending:
+                    jobs.slot_freed.clear()
+                    await jobs.slot_freed.wait()
+            except asyncio.CancelledError:
+                stats['cancelled'] += 1
+                logger.warning(f"⚠️ 等待后台队列空位时被取消，任务未执行: {name}")
+                raise
+        
+        task = asyncio.create_task(self._run_queued_job(jobs, name, job, timeout))
+        jobs.tasks.add(task)
+        task.add_done_callback(jobs._on_done)
+        return not waited
+    
+    async def _run_queued_job(self, jobs: _BackgroundJobs, name: str, job: Callable[[], Awaitable[Any]], timeout: float):
+        try:
+            async with jobs.semaphore:
+                await self._run_job(name, job, timeout)
+        except asyncio.CancelledError:
+            # drain_background 超时取消（排队中或执行中）
+            self._job_stats(name)['cancelled'] += 1
+            logger.warning(f"⚠️ 后台任务被取消: {name}")
+            raise
+    
+    async def _run_job(self, name: str, job: Callable[[], Awaitable[Any]], timeout: float):
+        stats = self._job_stats(name)
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(job(), timeout)
+            stats['completed'] += 1
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            logger.error(f"⏱️ 后台任务超时（{timeout}s）: {name}")
         except Exception as e:
             stats['failed'] += 1
-            logger.error(f"处理器 {processor_name} 执行异常: {e}", exc_info=True)
-            return False
+            logger.error(f"后台任务失败: {name}, 错误: {e}", exc_info=True)
+        finally:
+            self._job_latency[name].observe((time.perf_counter() - start_time) * 1000)
+    
+    def _job_stats(self, name: str) -> Dict[str, int]:
+        stats = self.background_stats.get(name)
+        if stats is None:
+            self._job_latency.setdefault(name, LatencyHistogram())
+            stats = self.background_stats.setdefault(name, {
+                'submitted': 0,
+                'waited': 0,
+                'completed': 0,
+                'failed': 0,
+                'timeouts': 0,
+                'cancelled': 0,
+            })
+        return stats
+    
+    async def drain_background(self, timeout: float = 30) -> int:
+        """
+        等待当前事件循环中的后台任务完成（客户端停止前调用），超时后取消剩余任务
+        
+        Returns:
+            被取消的任务数
+        """
+        jobs: _BackgroundJobs = self._background.get()
+        pending = list(jobs.tasks)
+        if not pending:
+            return 0
+        logger.info(f"⏳ 等待 {len(pending)} 个后台任务完成...")
+        _, not_done = await asyncio.wait(pending, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            await asyncio.gather(*not_done, return_exceptions=True)
+            logger.warning(f"⚠️ 已取消 {len(not_done)} 个未完成的后台任务")
+        return len(not_done)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计数据"""
@@ -143,7 +435,15 @@ class MessageDispatcher:
                 self.stats['total_processing_time'] / self.stats['total_messages']
                 if self.stats['total_messages'] > 0 else 0
             ),
-            'processors': self.stats['processor_stats']
+            'latency': self.dispatch_latency.to_dict(),
+            'processors': {name: entry.get_stats() for name, entry in self._entries.items()},
+            'background': {
+                'pending': sum(len(jobs.tasks) for jobs in self._background.values()),
+                'jobs': {
+                    name: {**stats, 'latency': self._job_latency[name].to_dict()}
+                    for name, stats in list(self.background_stats.items())
+                },
+            },
         }
 
 
@@ -157,4 +457,3 @@ def get_message_dispatcher() -> MessageDispatcher:
         _dispatcher = MessageDispatcher()
         logger.info("✅ 创建全局消息分发器")
     return _dispatcher
-
@@ -0,0 +1,310 @@
+"""
+消息重新解析服务
+
+恢复或重试下载任务时需要重新获取原始 Telegram 消息（消息对象带有新的文件引用）：
+1. 按聊天分组，用消息ID列表批量获取（Telethon 每 100 条一次请求），不再逐条 get_messages
+2. 短时间内的单条请求合并到同一批次，同一消息的并发请求只获取一次
+3. 解析结果按 TTL 缓存（文件引用有时效，过期后重新获取）
+4. 消息已删除或媒体被替换时，按文档ID/文件名在最近的文档消息中查找
+5. 提取媒体描述（文档ID、access_hash、DC、文件引用），由调用方写入 DownloadTask.media_json
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from log_manager import get_logger
+
+logger = get_logger('media_monitor')
+
+# Telethon 的 GetMessages 每次最多 100 个ID
+MAX_IDS_PER_REQUEST = 100
+
+MessageKey = Tuple[int, int]  # (chat_id, message_id)
+
+
+def media_descriptor(message) -> Dict[str, Any]:
+    """提取消息媒体的描述信息（用于校验重新获取的消息是否仍是同一文件）"""
+    media = getattr(message, 'media', None)
+    document = getattr(media, 'document', None)
+    photo = getattr(media, 'photo', None)
+    target = document or photo
+    if target is None:
+        return {}
+    descriptor = {
+        'media_kind': 'document' if document is not None else 'photo',
+        'media_id': str(target.id),
+        'access_hash': str(getattr(target, 'access_hash', '') or ''),
+        'dc_id': getattr(target, 'dc_id', None),
+        'file_reference': (getattr(target, 'file_reference', b'') or b'').hex(),
+        'resolved_at': int(time.time()),
+    }
+    if document is not None:
+        descriptor['size'] = document.size
+        descriptor['mime_type'] = document.mime_type
+    return descriptor
+
+
+def merge_media_json(media_json: Optional[str], message) -> Optional[str]:
+    """把最新的媒体描述合并进 DownloadTask.media_json"""
+    descriptor = media_descriptor(message)
+    if not descriptor:
+        return media_json
+    try:
+        data = json.loads(media_json) if media_json else {}
+    except (TypeError, ValueError):
+        data = {}
+    data.update(descriptor)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _document_name(message) -> Optional[str]:
+    document = getattr(getattr(message, 'media', None), 'document', None)
+    for attr in getattr(document, 'attributes', None) or []:
+        if getattr(attr, 'file_name', None):
+            return attr.file_name
+    return None
+
+
+class _Batch:
+    """某个客户端待发起的批量请求"""
+
+    def __init__(self, client_wrapper):
+        self.client_wrapper = client_wrapper
+        self.futures: Dict[MessageKey, asyncio.Future] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class MessageResolver:
+    """批量、带缓存的消息重新解析"""
+
+    def __init__(
+        self,
+        ttl: float = 1800,
+        max_entries: int = 5000,
+        batch_window: float = 0.05,
+        timeout: float = 30
+    ):
+        """
+        Args:
+            ttl: 解析结果缓存时间（秒），应小于文件引用的有效期
+            max_entries: 最多缓存的消息数
+            batch_window: 单条请求等待合并的时间（秒）
+            timeout: 单次批量请求超时（秒）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.batch_window = batch_window
+        self.timeout = timeout
+
+        # (客户端, chat_id, message_id) -> (消息或 None, 过期时间)
+        self._cache: "OrderedDict[Tuple[int, int, int], Tuple[Any, float]]" = OrderedDict()
+        self._batches: Dict[int, _Batch] = {}
+        self._inflight: Dict[Tuple[int, int, int], asyncio.Future] = {}
+
+        self.stats = {
+            'lookups': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'requests': 0,
+            'messages_fetched': 0,
+            'missing': 0,
+            'searches': 0,
+            'errors': 0,
+        }
+
+    # ==================== 对外接口 ====================
+
+    async def resolve(self, client_wrapper, chat_id: int, message_id: int) -> Optional[Any]:
+        """获取单条消息（在 batch_window 内与其他请求合并），不存在时返回 None"""
+        results = await self._lookup(client_wrapper, [(int(chat_id), int(message_id))], immediate=False)
+        return results.get((int(chat_id), int(message_id)))
+
+    async def resolve_many(
+        self,
+        client_wrapper,
+        refs: Iterable[MessageKey]
+    ) -> Dict[MessageKey, Optional[Any]]:
+        """批量获取消息，立即按聊天分组发起请求；返回 (chat_id, message_id) -> 消息或 None"""
+        keys = list(dict.fromkeys((int(c), int(m)) for c, m in refs))
+        return await self._lookup(client_wrapper, keys, immediate=True)
+
+    async def resolve_task_message(
+        self,
+        client_wrapper,
+        chat_id: int,
+        message_id: Optional[int],
+        file_name: Optional[str] = None,
+        media_id: Optional[str] = None
+    ) -> Optional[Any]:
+        """
+        解析下载任务的原始消息
+
+        按ID获取的消息不含媒体，或媒体ID与任务记录不一致（消息被编辑）时，
+        在聊天最近的文档消息中按媒体ID/文件名查找
+        """
+        message = None
+        if message_id:
+            try:
+                message = await self.resolve(client_wrapper, chat_id, message_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 按ID获取消息失败 {chat_id}/{message_id}: {e}")
+            descriptor = media_descriptor(message) if message is not None else {}
+            if not descriptor or (media_id and descriptor['media_id'] != str(media_id)):
+                if message is not None:
+                    logger.warning(f"⚠️ 消息 {chat_id}/{message_id} 不含原媒体，尝试按文件查找")
+                message = None
+
+        if message is None and (file_name or media_id):
+            message = await self.search_by_media(client_wrapper, chat_id, file_name, media_id)
+        return message
+
+    async def search_by_media(
+        self,
+        client_wrapper,
+        chat_id: int,
+        file_name: Optional[str],
+        media_id: Optional[str],
+        limit: int = 100
+    ) -> Optional[Any]:
+        """在聊天最近的文档消息中按媒体ID或文件名查找"""
+        from telethon.tl.types import InputMessagesFilterDocument
+
+        client = client_wrapper.client
+        self.stats['searches'] += 1
+
+        async def search():
+            async for msg in client.iter_messages(int(chat_id), limit=limit, filter=InputMessagesFilterDocument):
+                document = getattr(getattr(msg, 'media', None), 'document', None)
+                if document is None:
+                    continue
+                if media_id and str(document.id) == str(media_id):
+                    return msg
+                if file_name and _document_name(msg) == file_name:
+                    return msg
+            return None
+
+        future = asyncio.run_coroutine_threadsafe(search(), client_wrapper.loop)
+        message = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        if message is not None:
+            self._store(id(client), int(chat_id), message.id, message)
+        return message
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            'cached': len(self._cache),
+            'pending': sum(len(b.futures) for b in self._batches.values()),
+        }
+
+    # ==================== 批量与缓存 ====================
+
+    async def _lookup(self, client_wrapper, keys: List[MessageKey], immediate: bool) -> Dict[MessageKey, Optional[Any]]:
+        client_key = id(client_wrapper.client)
+        now = time.monotonic()
+        results: Dict[MessageKey, Optional[Any]] = {}
+        waiting: Dict[MessageKey, asyncio.Future] = {}
+
+        for key in keys:
+            self.stats['lookups'] += 1
+            cache_key = (client_key, *key)
+            cached = self._cache.get(cache_key)
+            if cached is not None and cached[1] > now:
+                self._cache.move_to_end(cache_key)
+                self.stats['cache_hits'] += 1
+                results[key] = cached[0]
+                continue
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[cache_key] = future
+                self._enqueue(client_wrapper, key, future)
+            waiting[key] = future
+
+        if waiting:
+            batch = self._batches.get(client_key)
+            if batch is not None:
+                if immediate:
+                    self._flush(client_key)
+                elif batch.handle is None:
+                    batch.handle = asyncio.get_running_loop().call_later(
+                        self.batch_window, self._flush, client_key
+                    )
+            done = await asyncio.gather(*waiting.values())
+            results.update(zip(waiting.keys(), done))
+        return results
+
+    def _enqueue(self, client_wrapper, key: MessageKey, future: asyncio.Future):
+        client_key = id(client_wrapper.client)
+        batch = self._batches.get(client_key)
+        if batch is None:
+            batch = self._batches[client_key] = _Batch(client_wrapper)
+        batch.futures[key] = future
+
+    def _flush(self, client_key: int):
+        batch = self._batches.pop(client_key, None)
+        if batch is None:
+            return
+        if batch.handle is not None:
+            batch.handle.cancel()
+
+        by_chat: Dict[int, Dict[int, asyncio.Future]] = {}
+        for (chat_id, message_id), future in batch.futures.items():
+            by_chat.setdefault(chat_id, {})[message_id] = future
+        for chat_id, futures in by_chat.items():
+            asyncio.create_task(self._fetch_chat(batch.client_wrapper, chat_id, futures))
+
+    async def _fetch_chat(self, client_wrapper, chat_id: int, futures: Dict[int, asyncio.Future]):
+        """一个聊天的一批消息：一次 get_messages（Telethon 内部按 100 条分批）"""
+        client = client_wrapper.client
+        client_key = id(client)
+        ids = sorted(futures)
+        try:
+            self.stats['requests'] += (len(ids) + MAX_IDS_PER_REQUEST - 1) // MAX_IDS_PER_REQUEST
+            future = asyncio.run_coroutine_threadsafe(
+                client.get_messages(chat_id, ids=ids),
+                client_wrapper.loop
+            )
+            messages = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            found = {msg.id: msg for msg in messages or [] if msg is not None}
+            self.stats['messages_fetched'] += len(found)
+            self.stats['missing'] += len(ids) - len(found)
+            for message_id, waiter in futures.items():
+                message = found.get(message_id)
+                self._store(client_key, chat_id, message_id, message)
+                if not waiter.done():
+                    waiter.set_result(message)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ 批量获取消息失败 (chat={chat_id}, {len(ids)} 条): {e}")
+            for waiter in futures.values():
+                if not waiter.done():
+                    waiter.set_exception(e)
+                    # 调用方可能已不再等待，避免未取回异常的警告
+                    waiter.exception()
+        finally:
+            for message_id in ids:
+                self._inflight.pop((client_key, chat_id, message_id), None)
+
+    def _store(self, client_key: int, chat_id: int, message_id: int, message):
+        cache_key = (client_key, chat_id, message_id)
+        self._cache[cache_key] = (message, time.monotonic() + self.ttl)
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+
+# 全局单例
+_resolver: Optional[MessageResolver] = None
+
+
+def get_message_resolver() -> MessageResolver:
+    """获取消息重新解析服务单例"""
+    global _resolver
+    if _resolver is None:
+        _resolver = MessageResolver()
+    return _resolver
@@ -8,7 +8,7 @@
 4. 通知历史记录
 5. 频率控制
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, FrozenSet, Tuple
 from enum import Enum
 from datetime import timedelta
 import asyncio
@@ -19,6 +19,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from log_manager import get_logger
 from database import get_db
+from services.common.batch_writer import get_batch_writer
+from services.common.rule_events import (
+    get_rule_event_bus, publish_rule_change, RuleChangeEvent,
+    KIND_NOTIFICATION, OP_CREATED, OP_UPDATED, OP_DELETED
+)
 from models import NotificationRule, NotificationLog, get_local_now
 from telegram_client_manager import multi_client_manager
 
@@ -175,7 +180,22 @@ class NotificationService:
     ) -> List[NotificationRule]:
         """获取适用的通知规则（支持单类型与多类型规则）"""
         try:
-            # 先取所有激活规则，后在内存中过滤（规则量通常很小）
+            index = get_notification_rule_index()
+            if index.is_ready:
+                # 先在规则索引中匹配，没有匹配的规则时不访问数据库；
+                # 匹配到的规则按ID读取，发送统计等字段始终是数据库中的最新值
+                rule_ids = index.match(notification_type.value, user_id)
+                if not rule_ids:
+                    return []
+                result = await self.db.execute(
+                    select(NotificationRule).where(
+                        NotificationRule.id.in_(rule_ids),
+                        NotificationRule.is_active == True
+                    ).order_by(NotificationRule.id)
+                )
+                return list(result.scalars().all())
+            
+            # 索引未启动时（非 Web 模式）取所有激活规则，后在内存中过滤（规则量通常很小）
             query = select(NotificationRule).where(NotificationRule.is_active == True)
             if user_id is not None:
                 query = query.where((NotificationRule.user_id == user_id) | (NotificationRule.user_id == None))
@@ -204,26 +224,33 @@ class NotificationService:
             return []
     
     async def _check_rate_limit(self, rule: NotificationRule) -> bool:
-        """检查频率限制"""
+        """检查频率限制（发送统计经批量写入器写回，这里叠加尚未写入的值）"""
         try:
             now = get_local_now()
+            writer = get_batch_writer()
+            last_sent_at = writer.pending_value(NotificationRule, rule.id, 'last_sent_at', rule.last_sent_at)
+            sent_count_hour = writer.pending_value(NotificationRule, rule.id, 'sent_count_hour', rule.sent_count_hour)
+            hour_reset_at = writer.pending_value(NotificationRule, rule.id, 'hour_reset_at', rule.hour_reset_at)
             
             # 检查最小间隔
-            if rule.min_interval > 0 and rule.last_sent_at:
-                time_since_last = (now - rule.last_sent_at).total_seconds()
+            if rule.min_interval > 0 and last_sent_at:
+                time_since_last = (now - last_sent_at).total_seconds()
                 if time_since_last < rule.min_interval:
                     return False
             
             # 检查每小时最大数量
             if rule.max_per_hour > 0:
                 # 检查是否需要重置小时计数器
-                if rule.hour_reset_at is None or now >= rule.hour_reset_at:
-                    rule.sent_count_hour = 0
-                    rule.hour_reset_at = now + timedelta(hours=1)
-                    await self.db.commit()
+                if hour_reset_at is None or now >= hour_reset_at:
+                    sent_count_hour = 0
+                    await writer.add_update(NotificationRule, {
+                        'id': rule.id,
+                        'sent_count_hour': 0,
+                        'hour_reset_at': now + timedelta(hours=1)
+                    })
                 
                 # 检查是否超过限制
-                if rule.sent_count_hour >= rule.max_per_hour:
+                if (sent_count_hour or 0) >= rule.max_per_hour:
                     return False
             
             return True
@@ -408,13 +435,15 @@ class NotificationService:
     async def _update_rule_stats(self, rule: NotificationRule):
         """更新规则的发送统计"""
         try:
-            rule.last_sent_at = get_local_now()
-            rule.sent_count_hour += 1
-            await self.db.commit()
+            # 高频通知时合并为批量累加写入
+            await get_batch_writer().add_increment(
+                NotificationRule, rule.id,
+                {'sent_count_hour': 1},
+                values={'last_sent_at': get_local_now()}
+            )
             
         except Exception as e:
             logger.error(f"更新规则统计失败: {e}", exc_info=True)
-            await self.db.rollback()
     
     async def _log_notification(
         self,
@@ -502,6 +531,7 @@ class NotificationService:
             await self.db.refresh(rule)
             
             logger.info(f"✅ 创建通知规则成功: {rule.id}")
+            publish_rule_change(KIND_NOTIFICATION, rule.id, OP_CREATED)
             return rule
             
         except Exception as e:
@@ -541,6 +571,7 @@ class NotificationService:
             await self.db.refresh(rule)
             
             logger.info(f"✅ 更新通知规则成功: {rule_id}")
+            publish_rule_change(KIND_NOTIFICATION, rule_id, OP_UPDATED)
             return rule
             
         except Exception as e:
@@ -559,6 +590,7 @@ class NotificationService:
             await self.db.commit()
             
             logger.info(f"✅ 删除通知规则成功: {rule_id}")
+            publish_rule_change(KIND_NOTIFICATION, rule_id, OP_DELETED)
             return True
             
         except Exception as e:
@@ -593,6 +625,110 @@ class NotificationService:
             return []
 
 
+class NotificationRuleIndex:
+    """
+    活跃通知规则索引（规则ID -> 所属用户、通知类型集合）
+    
+    在主事件循环中订阅规则变更总线增量维护；匹配可在任意线程调用
+    （更新时整体替换字典，读取方总是看到完整的索引）
+    """
+    
+    def __init__(self):
+        self._rules: Dict[int, Tuple[Optional[int], FrozenSet[str]]] = {}
+        self._subscription = None
+        self.stats = {
+            'lookups': 0,
+            'skipped_queries': 0,
+        }
+    
+    @property
+    def is_ready(self) -> bool:
+        return self._subscription is not None
+    
+    async def start(self):
+        """订阅规则变更并加载全部活跃规则"""
+        if self._subscription:
+            return
+        self._subscription = get_rule_event_bus().subscribe(
+            "notification", self._on_rule_change, kinds={KIND_NOTIFICATION}
+        )
+        await self._reload()
+        logger.info(f"✅ 通知规则索引已加载: {len(self._rules)} 条活跃规则")
+    
+    def stop(self):
+        if self._subscription:
+            self._subscription.close()
+            self._subscription = None
+    
+    @staticmethod
+    def _rule_types(rule: NotificationRule) -> FrozenSet[str]:
+        types = {rule.notification_type}
+        try:
+            if rule.notification_types:
+                extra = json.loads(rule.notification_types) if isinstance(rule.notification_types, str) else rule.notification_types
+                types.update(extra or [])
+        except (TypeError, ValueError):
+            # 解析失败时忽略该规则的多类型字段
+            pass
+        return frozenset(t for t in types if t)
+    
+    async def _reload(self):
+        async for db in get_db():
+            result = await db.execute(select(NotificationRule).where(NotificationRule.is_active == True))
+            self._rules = {
+                rule.id: (rule.user_id, self._rule_types(rule))
+                for rule in result.scalars().all()
+            }
+            break
+    
+    async def _on_rule_change(self, event: RuleChangeEvent):
+        """规则变更：只重新查询变更的规则"""
+        if event.is_reload:
+            await self._reload()
+            return
+        
+        rule = None
+        async for db in get_db():
+            result = await db.execute(select(NotificationRule).where(NotificationRule.id == event.rule_id))
+            rule = result.scalar_one_or_none()
+            break
+        
+        rules = dict(self._rules)
+        rules.pop(event.rule_id, None)
+        if rule is not None and rule.is_active:
+            rules[rule.id] = (rule.user_id, self._rule_types(rule))
+        self._rules = rules
+    
+    def match(self, notification_type: str, user_id: Optional[int] = None) -> List[int]:
+        """匹配规则ID（用户规则只匹配该用户，user_id 为空的规则对所有用户生效）"""
+        self.stats['lookups'] += 1
+        matched = sorted(
+            rule_id for rule_id, (owner, types) in self._rules.items()
+            if notification_type in types and (owner is None or (user_id is not None and owner == user_id))
+        )
+        if not matched:
+            self.stats['skipped_queries'] += 1
+        return matched
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'ready': self.is_ready,
+            'active_rules': len(self._rules),
+        }
+
+
+_notification_rule_index: Optional[NotificationRuleIndex] = None
+
+
+def get_notification_rule_index() -> NotificationRuleIndex:
+    """获取通知规则索引单例"""
+    global _notification_rule_index
+    if _notification_rule_index is None:
+        _notification_rule_index = NotificationRuleIndex()
+    return _notification_rule_index
+
+
 # 全局单例（可选）
 _notification_service_instance = None
 
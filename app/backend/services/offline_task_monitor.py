@@ -3,17 +3,22 @@
 
 功能：
 1. 监控115离线下载任务
-2. 任务状态轮询
-3. 完成后自动处理
-4. 失败任务重试
+2. 批量状态轮询（每个周期一次分页扫描离线列表，与本地任务表比对）
+3. 根据活跃任务数量自适应轮询间隔
+4. 任务持久化到数据库，重启后恢复跟踪
+5. 完成后自动处理、失败回调
 """
 import asyncio
-from typing import List, Dict, Optional
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Callable, Awaitable
 from dataclasses import dataclass
 from enum import Enum
 
+from sqlalchemy import select
+
 from log_manager import get_logger
 from timezone_utils import get_user_now
+from services.common.progress_bus import get_progress_bus, KIND_OFFLINE
 
 logger = get_logger("offline_monitor", "enhanced_bot.log")
 
@@ -27,6 +32,16 @@ class TaskStatus(Enum):
     PAUSED = "paused"          # 暂停
 
 
+# 115离线列表状态码 -> 任务状态
+REMOTE_STATUS_MAP = {
+    -1: TaskStatus.PENDING,
+    0: TaskStatus.DOWNLOADING,
+    1: TaskStatus.COMPLETED,
+    2: TaskStatus.FAILED,
+    4: TaskStatus.FAILED,  # 已删除
+}
+
+
 @dataclass
 class OfflineTask:
     """离线任务"""
@@ -40,6 +55,8 @@ class OfflineTask:
     error_message: Optional[str] = None  # 错误信息
     created_at: Optional[datetime] = None  # 创建时间
     completed_at: Optional[datetime] = None  # 完成时间
+    file_id: Optional[str] = None   # 完成后的115文件ID
+    missing_sweeps: int = 0         # 连续未在离线列表中出现的轮询次数
 
 
 class OfflineTaskMonitor:
@@ -48,22 +65,43 @@ class OfflineTaskMonitor:
     
     功能：
     1. 监控离线任务列表
-    2. 定时轮询任务状态
-    3. 完成后触发回调
-    4. 失败任务重试
+    2. 每个周期一次分页扫描（get_offline_tasks），只扫描到所有活跃任务都已出现为止
+    3. 轮询间隔随活跃任务数和状态变化自适应
+    4. 完成后触发回调
     """
     
-    def __init__(self, check_interval: int = 60):
+    def __init__(
+        self,
+        check_interval: int = 60,
+        min_interval: int = 15,
+        idle_interval: int = 300,
+        max_pages: int = 20,
+        missing_sweeps_limit: int = 5,
+        client_factory: Optional[Callable[[], Awaitable[Any]]] = None
+    ):
         """
         初始化监控服务
         
         Args:
-            check_interval: 检查间隔（秒）
+            check_interval: 最大检查间隔（秒），无状态变化时逐步退避到此值
+            min_interval: 最小检查间隔（秒），有状态变化时使用
+            idle_interval: 无活跃任务时的间隔（秒），添加任务会立即唤醒
+            max_pages: 单次扫描的最大页数
+            missing_sweeps_limit: 任务连续多少次未出现在离线列表中判定为失败
+            client_factory: 返回 Pan115Client 的异步工厂（默认读取全局115配置）
         """
         self.check_interval = check_interval
+        self.min_interval = min(min_interval, check_interval)
+        self.idle_interval = idle_interval
+        self.max_pages = max_pages
+        self.missing_sweeps_limit = missing_sweeps_limit
+        self._client_factory = client_factory or self._default_client_factory
+        
         self.tasks: Dict[str, OfflineTask] = {}
         self.is_running = False
         self._monitor_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._current_interval = float(self.min_interval)
         self.callbacks = {
             "on_completed": [],
             "on_failed": [],
@@ -74,7 +112,11 @@ class OfflineTaskMonitor:
             "total_tasks": 0,
             "completed_tasks": 0,
             "failed_tasks": 0,
-            "active_tasks": 0
+            "active_tasks": 0,
+            "total_sweeps": 0,
+            "total_api_calls": 0,
+            "last_sweep_pages": 0,
+            "last_sweep_changes": 0,
         }
     
     def register_callback(self, event: str, callback):
@@ -90,14 +132,19 @@ class OfflineTaskMonitor:
             logger.info(f"✅ 注册回调: {event}")
     
     async def start(self):
-        """启动监控"""
+        """启动监控（先从数据库恢复未结束的任务）"""
         if self.is_running:
             logger.warning("⚠️ 监控已在运行")
             return
         
+        await self._load_tasks()
+        
         self.is_running = True
         self._monitor_task = asyncio.create_task(self._monitor_loop())
-        logger.info(f"✅ 离线任务监控已启动（间隔：{self.check_interval}秒）")
+        logger.info(
+            f"✅ 离线任务监控已启动（间隔：{self.min_interval}-{self.check_interval}秒，"
+            f"恢复 {len(self.get_active_tasks())} 个活跃任务）"
+        )
     
     async def stop(self):
         """停止监控"""
@@ -119,84 +166,268 @@ class OfflineTaskMonitor:
         while self.is_running:
             try:
                 await self._check_tasks()
-                await asyncio.sleep(self.check_interval)
+                interval = self._current_interval if self.get_active_tasks() else self.idle_interval
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"❌ 监控循环错误: {e}", exc_info=True)
-                await asyncio.sleep(self.check_interval)
+                interval = self.check_interval
+            
+            try:
+                # 添加新任务时会被提前唤醒
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                break
+            self._wakeup.clear()
     
     async def _check_tasks(self):
-        """检查所有任务"""
-        if not self.tasks:
+        """一次分页扫描，批量比对所有活跃任务"""
+        active = {t.task_id: t for t in self.get_active_tasks()}
+        if not active:
             return
         
-        logger.debug(f"🔍 检查 {len(self.tasks)} 个离线任务")
+        logger.debug(f"🔍 检查 {len(active)} 个离线任务")
         
-        for task_id, task in list(self.tasks.items()):
+        remote, pages, complete = await self._fetch_remote_tasks(set(active))
+        if remote is None:
+            return
+        if not complete:
+            logger.debug(f"⚠️ 离线列表未完整扫描（{pages} 页），本次不计缺失")
+        
+        changed: List[OfflineTask] = []
+        for task_id, task in active.items():
             try:
-                # 跳过已完成或失败的任务
-                if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
+                remote_task = remote.get(task_id)
+                if remote_task is None:
+                    # 只有完整扫描过离线列表才能确认任务缺失
+                    if not complete:
+                        continue
+                    task.missing_sweeps += 1
+                    if task.missing_sweeps >= self.missing_sweeps_limit:
+                        task.status = TaskStatus.FAILED
+                        task.error_message = "任务已不在115离线列表中"
+                        await self._on_task_failed(task)
+                    changed.append(task)
                     continue
                 
-                # 更新任务状态（这里需要调用115 API）
-                updated_task = await self._fetch_task_status(task_id)
-                
-                if updated_task:
-                    # 检查状态变化
-                    old_status = task.status
-                    new_status = updated_task.status
-                    
-                    # 更新任务
-                    self.tasks[task_id] = updated_task
-                    
-                    # 触发回调
-                    if old_status != new_status:
-                        if new_status == TaskStatus.COMPLETED:
-                            await self._on_task_completed(updated_task)
-                        elif new_status == TaskStatus.FAILED:
-                            await self._on_task_failed(updated_task)
-                    
-                    # 进度回调
-                    if new_status == TaskStatus.DOWNLOADING:
-                        await self._on_task_progress(updated_task)
-                
+                if await self._apply_remote(task, remote_task):
+                    changed.append(task)
             except Exception as e:
                 logger.error(f"❌ 检查任务失败: {task_id}, 错误: {e}")
+        
+        if changed:
+            await self._persist_tasks(changed)
+        
+        # 自适应间隔：有变化时快速轮询（按扫描页数放大），否则逐步退避
+        if any(t.status != TaskStatus.PENDING or t.missing_sweeps for t in changed):
+            self._current_interval = self.min_interval * max(1, pages)
+        else:
+            self._current_interval = self._current_interval * 1.5
+        self._current_interval = min(max(self._current_interval, self.min_interval), self.check_interval)
+        
+        self.stats["total_sweeps"] += 1
+        self.stats["last_sweep_pages"] = pages
+        self.stats["last_sweep_changes"] = len(changed)
+        self.stats["active_tasks"] = len(self.get_active_tasks())
     
-    async def _fetch_task_status(self, task_id: str) -> Optional[OfflineTask]:
+    async def _fetch_remote_tasks(self, wanted: set) -> tuple:
         """
-        获取任务状态（需要调用115 API）
+        分页获取115离线任务列表
         
-        Args:
-            task_id: 任务ID
+        在所有需要的任务都已出现、遇到空页或最后一页时停止
         
         Returns:
-            OfflineTask: 更新后的任务
+            (task_id -> 远端任务字典, 扫描页数, 是否完整扫描)；
+            所有需要的任务都已出现或已读到最后一页才算完整，中途失败或达到 max_pages 时为 False；
+            第一页就获取失败时远端任务为 None
         """
-        # TODO: 调用115 API获取真实状态
-        # 这里是模拟实现
-        task = self.tasks.get(task_id)
-        if not task:
-            return None
+        client = await self._client_factory()
+        if client is None:
+            return None, 0, False
+        
+        remote: Dict[str, Dict[str, Any]] = {}
+        first_page_size = None
+        pages = 0
+        
+        for page in range(1, self.max_pages + 1):
+            result = await client.get_offline_tasks(page)
+            pages += 1
+            self.stats["total_api_calls"] += 1
+            
+            if not result.get('success'):
+                logger.warning(f"⚠️ 获取离线任务列表失败: {result.get('message')}")
+                return (remote, pages, False) if remote else (None, pages, False)
+            
+            page_tasks = result.get('tasks', [])
+            for item in page_tasks:
+                if item.get('task_id'):
+                    remote[item['task_id']] = item
+            
+            if first_page_size is None:
+                first_page_size = len(page_tasks)
+            if not page_tasks or len(page_tasks) < first_page_size or wanted.issubset(remote):
+                return remote, pages, True
         
-        # 模拟进度更新
-        if task.status == TaskStatus.DOWNLOADING:
-            task.progress = min(task.progress + 10, 100)
-            if task.progress >= 100:
-                task.status = TaskStatus.COMPLETED
+        logger.warning(f"⚠️ 已扫描 {pages} 页（max_pages）仍未找到全部活跃任务")
+        return remote, pages, False
+    
+    async def _apply_remote(self, task: OfflineTask, remote_task: Dict[str, Any]) -> bool:
+        """将远端状态合并到本地任务，返回是否有变化（会等待相应回调完成）"""
+        new_status = REMOTE_STATUS_MAP.get(remote_task.get('status'), task.status)
+        new_progress = float(remote_task.get('percentDone', task.progress) or 0)
+        old_status = task.status
+        
+        changed = (
+            new_status != old_status
+            or abs(new_progress - task.progress) >= 0.01
+            or task.missing_sweeps
+        )
+        
+        task.missing_sweeps = 0
+        task.status = new_status
+        task.progress = new_progress
+        task.file_size = int(remote_task.get('size') or task.file_size or 0)
+        task.file_id = remote_task.get('file_id') or task.file_id
+        if remote_task.get('name'):
+            task.task_name = remote_task['name']
+        if new_status == TaskStatus.FAILED and remote_task.get('status') == 4:
+            task.error_message = "任务已在115中被删除"
+        
+        if old_status != new_status:
+            if new_status == TaskStatus.COMPLETED:
+                task.progress = 100.0
                 task.completed_at = get_user_now()
+                await self._on_task_completed(task)
+            elif new_status == TaskStatus.FAILED:
+                await self._on_task_failed(task)
+        
+        if new_status == TaskStatus.DOWNLOADING and changed:
+            await self._on_task_progress(task)
+        
+        return changed
+    
+    @staticmethod
+    async def _default_client_factory():
+        """使用全局115配置创建客户端（仅使用Web API）"""
+        from database import get_db
+        from models import MediaSettings
+        from services.pan115_client import Pan115Client
         
-        return task
+        async for db in get_db():
+            settings_result = await db.execute(select(MediaSettings))
+            settings = settings_result.scalars().first()
+            
+            user_id = getattr(settings, 'pan115_user_id', None) if settings else None
+            user_key = getattr(settings, 'pan115_user_key', None) if settings else None
+            if not user_id or not user_key:
+                logger.warning("⚠️ 未登录115网盘，跳过离线任务检查")
+                return None
+            
+            return Pan115Client(
+                app_id="",
+                app_key="",
+                user_id=user_id,
+                user_key=user_key,
+                use_proxy=getattr(settings, 'pan115_use_proxy', False)
+            )
+        return None
+    
+    # ==================== 持久化 ====================
+    
+    async def _load_tasks(self):
+        """从数据库恢复未结束的任务"""
+        try:
+            from database import get_db
+            from models import OfflineTaskRecord
+            
+            async for db in get_db():
+                result = await db.execute(
+                    select(OfflineTaskRecord).where(
+                        OfflineTaskRecord.status.in_([
+                            TaskStatus.PENDING.value,
+                            TaskStatus.DOWNLOADING.value,
+                            TaskStatus.PAUSED.value
+                        ])
+                    )
+                )
+                for record in result.scalars().all():
+                    self.tasks[record.task_id] = OfflineTask(
+                        task_id=record.task_id,
+                        task_url=record.task_url or "",
+                        task_name=record.task_name or record.task_id,
+                        file_size=record.file_size or 0,
+                        status=TaskStatus(record.status),
+                        progress=record.progress or 0.0,
+                        download_speed=record.download_speed or 0,
+                        error_message=record.error_message,
+                        created_at=record.created_at,
+                        completed_at=record.completed_at,
+                        file_id=record.file_id,
+                        missing_sweeps=record.missing_sweeps or 0,
+                    )
+                break
+        except Exception as e:
+            logger.error(f"❌ 恢复离线任务失败: {e}")
+    
+    async def _persist_tasks(self, tasks: List[OfflineTask]):
+        """在一个事务中写入任务状态（不存在则插入）"""
+        try:
+            from database import get_db
+            from models import OfflineTaskRecord
+            
+            async for db in get_db():
+                result = await db.execute(
+                    select(OfflineTaskRecord).where(
+                        OfflineTaskRecord.task_id.in_([t.task_id for t in tasks])
+                    )
+                )
+                records = {r.task_id: r for r in result.scalars().all()}
+                
+                for task in tasks:
+                    record = records.get(task.task_id)
+                    if record is None:
+                        record = OfflineTaskRecord(task_id=task.task_id, created_at=task.created_at)
+                        db.add(record)
+                    record.task_url = task.task_url
+                    record.task_name = task.task_name
+                    record.file_size = task.file_size
+                    record.file_id = task.file_id
+                    record.status = task.status.value
+                    record.progress = task.progress
+                    record.download_speed = task.download_speed
+                    record.error_message = task.error_message
+                    record.missing_sweeps = task.missing_sweeps
+                    record.completed_at = task.completed_at
+                
+                await db.commit()
+                break
+        except Exception as e:
+            logger.error(f"❌ 保存离线任务失败: {e}")
+    
+    # ==================== 回调 ====================
+    
+    def _publish_progress(self, task: OfflineTask):
+        """发布任务进度到统一进度总线"""
+        get_progress_bus().publish(
+            KIND_OFFLINE, task.task_id,
+            status=task.status.value,
+            total_bytes=task.file_size,
+            current_bytes=int(task.file_size * task.progress / 100) if task.file_size else None,
+            percent=task.progress,
+            name=task.task_name,
+            error=task.error_message
+        )
     
     async def _on_task_completed(self, task: OfflineTask):
         """任务完成回调"""
         logger.info(f"✅ 离线任务完成: {task.task_name}")
+        self._publish_progress(task)
         
         # 更新统计
         self.stats["completed_tasks"] += 1
-        self.stats["active_tasks"] = len([t for t in self.tasks.values() 
-                                          if t.status == TaskStatus.DOWNLOADING])
+        self.stats["active_tasks"] = len(self.get_active_tasks())
         
         # 触发回调
         for callback in self.callbacks["on_completed"]:
@@ -208,11 +439,11 @@ class OfflineTaskMonitor:
     async def _on_task_failed(self, task: OfflineTask):
         """任务失败回调"""
         logger.error(f"❌ 离线任务失败: {task.task_name}, 错误: {task.error_message}")
+        self._publish_progress(task)
         
         # 更新统计
         self.stats["failed_tasks"] += 1
-        self.stats["active_tasks"] = len([t for t in self.tasks.values() 
-                                          if t.status == TaskStatus.DOWNLOADING])
+        self.stats["active_tasks"] = len(self.get_active_tasks())
         
         # 触发回调
         for callback in self.callbacks["on_failed"]:
@@ -223,6 +454,8 @@ class OfflineTaskMonitor:
     
     async def _on_task_progress(self, task: OfflineTask):
         """任务进度回调"""
+        self._publish_progress(task)
+        
         # 触发回调
         for callback in self.callbacks["on_progress"]:
             try:
@@ -230,21 +463,44 @@ class OfflineTaskMonitor:
             except Exception as e:
                 logger.error(f"❌ 进度回调失败: {e}")
     
-    async def add_task(self, task_url: str, task_name: str = "") -> str:
+    # ==================== 任务管理 ====================
+    
+    async def add_task(self, task_url: str, task_name: str = "", target_dir_id: str = "0") -> Optional[str]:
         """
-        添加离线任务
+        添加离线任务（提交到115并开始跟踪）
         
         Args:
             task_url: 下载URL（磁力链接或HTTP链接）
             task_name: 任务名称
+            target_dir_id: 115目标目录ID
         
         Returns:
-            str: 任务ID
+            str: 任务ID，提交失败返回 None
         """
-        # TODO: 调用115 API添加离线任务
-        # 这里是模拟实现
-        task_id = f"task_{len(self.tasks) + 1}"
+        client = await self._client_factory()
+        if client is None:
+            return None
+        
+        result = await client.add_offline_task(task_url, target_dir_id)
+        self.stats["total_api_calls"] += 1
+        if not result.get('success') or not result.get('task_id'):
+            logger.error(f"❌ 添加离线任务失败: {result.get('message')}")
+            return None
+        
+        return await self.track_task(result['task_id'], task_url, task_name)
+    
+    async def track_task(self, task_id: str, task_url: str = "", task_name: str = "") -> str:
+        """
+        跟踪一个已在115中创建的离线任务
+        
+        Args:
+            task_id: 115任务ID（info_hash）
+            task_url: 下载URL
+            task_name: 任务名称
         
+        Returns:
+            str: 任务ID
+        """
         task = OfflineTask(
             task_id=task_id,
             task_url=task_url,
@@ -256,8 +512,15 @@ class OfflineTaskMonitor:
         
         self.tasks[task_id] = task
         self.stats["total_tasks"] += 1
+        self.stats["active_tasks"] = len(self.get_active_tasks())
+        self._publish_progress(task)
+        await self._persist_tasks([task])
+        
+        # 新任务需要尽快开始轮询
+        self._current_interval = self.min_interval
+        self._wakeup.set()
         
-        logger.info(f"✅ 添加离线任务: {task_name} ({task_id})")
+        logger.info(f"✅ 添加离线任务: {task.task_name} ({task_id})")
         return task_id
     
     def get_task(self, task_id: str) -> Optional[OfflineTask]:
@@ -270,7 +533,7 @@ class OfflineTaskMonitor:
     
     def get_active_tasks(self) -> List[OfflineTask]:
         """获取活跃任务"""
-        return [t for t in self.tasks.values() 
+        return [t for t in self.tasks.values()
                 if t.status in [TaskStatus.PENDING, TaskStatus.DOWNLOADING]]
     
     def get_stats(self) -> Dict:
@@ -278,6 +541,7 @@ class OfflineTaskMonitor:
         return {
             **self.stats,
             "check_interval": self.check_interval,
+            "current_interval": round(self._current_interval, 1),
             "is_running": self.is_running
         }
 
@@ -295,19 +559,20 @@ def get_offline_monitor(check_interval: int = 60) -> OfflineTaskMonitor:
 
 
 # 便捷函数
-async def add_offline_task(task_url: str, task_name: str = "") -> str:
+async def add_offline_task(task_url: str, task_name: str = "", target_dir_id: str = "0") -> Optional[str]:
     """
     添加离线任务
     
     Args:
         task_url: 下载URL
         task_name: 任务名称
+        target_dir_id: 115目标目录ID
     
     Returns:
         str: 任务ID
     """
     monitor = get_offline_monitor()
-    return await monitor.add_task(task_url, task_name)
+    return await monitor.add_task(task_url, task_name, target_dir_id)
 
 
 def get_offline_task(task_id: str) -> Optional[OfflineTask]:
@@ -322,4 +587,3 @@ def get_offline_task(task_id: str) -> Optional[OfflineTask]:
     """
     monitor = get_offline_monitor()
     return monitor.get_task(task_id)
-
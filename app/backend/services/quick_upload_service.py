@@ -2,20 +2,84 @@
 115秒传检测服务
 
 功能：
-1. 计算文件SHA1哈希
-2. 检查115秒传
-3. 秒传统计
-4. 性能优化
+1. 计算文件SHA1哈希（线程池中大块读取，不阻塞事件循环）
+2. 计算115秒传的 preid（文件前 128KB 的 SHA1），与完整SHA1在同一次读取中得出
+3. 哈希结果按 (设备, inode, 大小, 修改时间) 缓存在本地 SQLite 文件中，文件未变化时不再重复计算
+4. 检查115秒传
+5. 秒传统计
 """
+import asyncio
 import hashlib
 import os
-from typing import Optional, Tuple
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
+from config import Config
 from log_manager import get_logger
 from timezone_utils import get_user_now
 
 logger = get_logger("quick_upload", "enhanced_bot.log")
 
+PREID_BYTES = 128 * 1024
+READ_BUFFER_BYTES = 1024 * 1024
+
+FileKey = Tuple[int, int, int, int]
+
+
+def file_key(st: os.stat_result) -> FileKey:
+    """文件身份：(设备, inode, 大小, 修改时间纳秒)，任一变化即视为新文件"""
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def sha1_of_file(file_path: str, limit: Optional[int] = None, buffer_size: int = READ_BUFFER_BYTES) -> str:
+    """
+    计算文件（或前 limit 字节）的 SHA1（同步，应在线程中调用）
+
+    复用同一个缓冲区读取，hashlib 处理大块数据时会释放 GIL
+    """
+    sha1 = hashlib.sha1()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    remaining = limit
+    with open(file_path, 'rb', buffering=0) as f:
+        while remaining is None or remaining > 0:
+            want = buffer_size if remaining is None else min(buffer_size, remaining)
+            n = f.readinto(view[:want])
+            if not n:
+                break
+            sha1.update(view[:n])
+            if remaining is not None:
+                remaining -= n
+    return sha1.hexdigest()
+
+
+def hashes_of_file(file_path: str, buffer_size: int = READ_BUFFER_BYTES) -> Tuple[str, str]:
+    """
+    一次读取同时计算 (preid, 完整SHA1)（同步，应在线程中调用）
+
+    读满前 128KB 时取一次摘要作为 preid，之后继续计算完整SHA1
+    """
+    sha1 = hashlib.sha1()
+    preid = None
+    hashed = 0
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            want = buffer_size if preid is not None else min(buffer_size, PREID_BYTES - hashed)
+            n = f.readinto(view[:want])
+            if not n:
+                break
+            sha1.update(view[:n])
+            hashed += n
+            if preid is None and hashed >= PREID_BYTES:
+                preid = sha1.hexdigest()
+    digest = sha1.hexdigest()
+    return preid or digest, digest
+
 
 @dataclass
 class QuickUploadResult:
@@ -26,6 +90,105 @@ class QuickUploadResult:
     is_quick: bool
     check_time: float
     error: Optional[str] = None
+    preid: str = ""
+
+
+class HashCache:
+    """
+    文件哈希缓存（独立的 SQLite 文件）
+
+    所有读写在单线程执行器中顺序执行，不阻塞事件循环；
+    超过 max_entries 时删除最久未使用的记录
+    """
+    
+    def __init__(self, path: str, max_entries: int = 20000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hash-cache')
+        self._writes = 0
+    
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _open(self):
+        if self._conn is not None:
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                dev INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                path TEXT,
+                preid TEXT,
+                sha1 TEXT,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (dev, inode, size, mtime_ns)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_file_hashes_used_at ON file_hashes (used_at)")
+        conn.commit()
+        self._conn = conn
+    
+    def _get(self, key: FileKey) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        self._open()
+        row = self._conn.execute(
+            "SELECT preid, sha1 FROM file_hashes WHERE dev = ? AND inode = ? AND size = ? AND mtime_ns = ?", key
+        ).fetchone()
+        if row:
+            self._conn.execute(
+                "UPDATE file_hashes SET used_at = ? WHERE dev = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                (time.time(), *key)
+            )
+            self._conn.commit()
+        return row
+    
+    def _put(self, key: FileKey, path: str, preid: Optional[str], sha1: Optional[str]):
+        self._open()
+        self._conn.execute(
+            """
+            INSERT INTO file_hashes (dev, inode, size, mtime_ns, path, preid, sha1, used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dev, inode, size, mtime_ns) DO UPDATE SET
+                path = excluded.path,
+                preid = COALESCE(excluded.preid, file_hashes.preid),
+                sha1 = COALESCE(excluded.sha1, file_hashes.sha1),
+                used_at = excluded.used_at
+            """,
+            (*key, path, preid, sha1, time.time())
+        )
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self._conn.execute(
+                "DELETE FROM file_hashes WHERE rowid IN ("
+                "SELECT rowid FROM file_hashes ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        self._conn.commit()
+    
+    def _close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+    
+    async def get(self, key: FileKey) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """读取缓存的 (preid, sha1)，未缓存返回 None"""
+        return await self._run(self._get, key)
+    
+    async def put(self, key: FileKey, path: str, preid: Optional[str] = None, sha1: Optional[str] = None):
+        """写入缓存（为 None 的字段保留原值）"""
+        await self._run(self._put, key, path, preid, sha1)
+    
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
 
 
 class QuickUploadService:
@@ -33,24 +196,37 @@ class QuickUploadService:
     115秒传检测服务
     
     功能：
-    1. 计算文件SHA1（支持大文件分块）
+    1. 计算文件SHA1与 preid（线程池中执行，结果按文件身份缓存，同一文件的并发请求只计算一次）
     2. 检查115秒传API
     3. 统计秒传成功率
     """
     
-    def __init__(self):
-        """初始化秒传服务"""
+    def __init__(self, cache_path: Optional[str] = None, hash_workers: int = 2):
+        """
+        初始化秒传服务
+        
+        Args:
+            cache_path: 哈希缓存文件路径（默认 DATA_DIR/hash_cache.db）
+            hash_workers: 并行计算哈希的线程数
+        """
         self.stats = {
             "total_checks": 0,
             "quick_success": 0,
             "quick_failed": 0,
             "total_time_saved": 0.0,  # 节省的上传时间（秒）
             "total_bandwidth_saved": 0,  # 节省的带宽（字节）
+            "hash_cache_hits": 0,
+            "hash_cache_misses": 0,
+            "bytes_hashed": 0,
+            "hash_seconds": 0.0,
         }
+        self.cache = HashCache(cache_path or os.path.join(Config.DATA_DIR, 'hash_cache.db'))
+        self._hash_executor = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix='quick-hash')
+        self._inflight: Dict[FileKey, asyncio.Future] = {}
     
-    def calculate_sha1(self, file_path: str, chunk_size: int = 8192) -> Optional[str]:
+    def calculate_sha1(self, file_path: str, chunk_size: int = READ_BUFFER_BYTES) -> Optional[str]:
         """
-        计算文件SHA1哈希
+        计算文件SHA1哈希（同步、不使用缓存；异步代码中请使用 calculate_sha1_async）
         
         Args:
             file_path: 文件路径
@@ -60,16 +236,7 @@ class QuickUploadService:
             str: SHA1哈希值（40位十六进制）
         """
         try:
-            sha1 = hashlib.sha1()
-            
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    sha1.update(chunk)
-            
-            hash_value = sha1.hexdigest()
+            hash_value = sha1_of_file(file_path, buffer_size=chunk_size)
             logger.debug(f"✅ SHA1计算成功: {file_path} -> {hash_value}")
             return hash_value
             
@@ -77,6 +244,89 @@ class QuickUploadService:
             logger.error(f"❌ SHA1计算失败: {file_path}, 错误: {e}")
             return None
     
+    async def calculate_preid(self, file_path: str) -> Optional[str]:
+        """
+        计算115秒传的 preid（文件前 128KB 的 SHA1）
+        
+        只读取 128KB；已计算过完整SHA1的文件直接返回缓存结果
+        """
+        try:
+            st = await asyncio.to_thread(os.stat, file_path)
+            key = file_key(st)
+            cached = await self._cache_get(key)
+            if cached and cached[0]:
+                return cached[0]
+            
+            loop = asyncio.get_running_loop()
+            preid = await loop.run_in_executor(self._hash_executor, sha1_of_file, file_path, PREID_BYTES)
+            await self._cache_put(key, file_path, preid=preid)
+            return preid
+        except Exception as e:
+            logger.error(f"❌ preid计算失败: {file_path}, 错误: {e}")
+            return None
+    
+    async def calculate_sha1_async(self, file_path: str) -> Optional[str]:
+        """
+        计算文件SHA1（线程池中执行，文件未变化时直接返回缓存结果）
+        
+        Returns:
+            str: SHA1哈希值；失败返回 None
+        """
+        _, sha1 = await self.calculate_hashes(file_path)
+        return sha1
+    
+    async def calculate_hashes(self, file_path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        计算秒传所需的 (preid, 完整SHA1)，一次读取文件同时得出两者
+        
+        Returns:
+            (preid, SHA1)；失败返回 (None, None)
+        """
+        try:
+            st = await asyncio.to_thread(os.stat, file_path)
+            key = file_key(st)
+            cached = await self._cache_get(key)
+            if cached and cached[0] and cached[1]:
+                self.stats["hash_cache_hits"] += 1
+                return cached
+            self.stats["hash_cache_misses"] += 1
+            
+            # 同一文件的并发请求共享一次计算
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._hash_and_store(key, file_path, st.st_size))
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return await asyncio.shield(future)
+        except Exception as e:
+            logger.error(f"❌ SHA1计算失败: {file_path}, 错误: {e}")
+            return None, None
+    
+    async def _hash_and_store(self, key: FileKey, file_path: str, size: int) -> Tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        preid, sha1 = await loop.run_in_executor(self._hash_executor, hashes_of_file, file_path)
+        elapsed = time.monotonic() - started
+        self.stats["bytes_hashed"] += size
+        self.stats["hash_seconds"] += elapsed
+        logger.debug(f"✅ SHA1计算成功: {file_path} -> {sha1} ({elapsed:.2f}s)")
+        
+        await self._cache_put(key, file_path, preid=preid, sha1=sha1)
+        return preid, sha1
+    
+    async def _cache_get(self, key: FileKey) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        try:
+            return await self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取哈希缓存失败: {e}")
+            return None
+    
+    async def _cache_put(self, key: FileKey, file_path: str, preid: Optional[str] = None, sha1: Optional[str] = None):
+        try:
+            await self.cache.put(key, file_path, preid=preid, sha1=sha1)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入哈希缓存失败: {e}")
+    
     async def check_quick_upload(
         self,
         file_path: str,
@@ -98,8 +348,8 @@ class QuickUploadService:
             # 1. 获取文件大小
             file_size = os.path.getsize(file_path)
             
-            # 2. 计算SHA1
-            sha1_hash = self.calculate_sha1(file_path)
+            # 2. 计算 preid 与完整SHA1（线程池中一次读取，文件未变化时直接命中缓存）
+            preid, sha1_hash = await self.calculate_hashes(file_path)
             if not sha1_hash:
                 return QuickUploadResult(
                     file_path=file_path,
@@ -107,7 +357,8 @@ class QuickUploadService:
                     sha1_hash="",
                     is_quick=False,
                     check_time=0,
-                    error="SHA1计算失败"
+                    error="SHA1计算失败",
+                    preid=preid or ""
                 )
             
             # 3. 检查115秒传（如果有客户端）
@@ -147,7 +398,8 @@ class QuickUploadService:
                 file_size=file_size,
                 sha1_hash=sha1_hash,
                 is_quick=is_quick,
-                check_time=check_time
+                check_time=check_time,
+                preid=preid or ""
             )
             
         except Exception as e:
@@ -173,7 +425,13 @@ class QuickUploadService:
             "success_rate": f"{(success / total * 100):.2f}%" if total > 0 else "0%",
             "total_time_saved": f"{self.stats['total_time_saved']:.2f}秒",
             "total_bandwidth_saved": self._format_size(self.stats["total_bandwidth_saved"]),
-            "avg_check_time": "< 5秒"
+            "avg_check_time": "< 5秒",
+            "hash_cache_hits": self.stats["hash_cache_hits"],
+            "hash_cache_misses": self.stats["hash_cache_misses"],
+            "hash_throughput": (
+                f"{self.stats['bytes_hashed'] / 1024 / 1024 / self.stats['hash_seconds']:.1f}MB/s"
+                if self.stats["hash_seconds"] > 0 else "-"
+            )
         }
     
     def _format_size(self, size_bytes: int) -> str:
@@ -200,7 +458,7 @@ def get_quick_upload_service() -> QuickUploadService:
 # 便捷函数
 def calculate_file_sha1(file_path: str) -> Optional[str]:
     """
-    计算文件SHA1
+    计算文件SHA1（同步；异步代码中请使用 calculate_file_sha1_async）
     
     Args:
         file_path: 文件路径
@@ -212,6 +470,20 @@ def calculate_file_sha1(file_path: str) -> Optional[str]:
     return service.calculate_sha1(file_path)
 
 
+async def calculate_file_sha1_async(file_path: str) -> Optional[str]:
+    """
+    计算文件SHA1（线程池中执行，带缓存）
+    
+    Args:
+        file_path: 文件路径
+    
+    Returns:
+        str: SHA1哈希值
+    """
+    service = get_quick_upload_service()
+    return await service.calculate_sha1_async(file_path)
+
+
 async def check_quick_upload(file_path: str, pan115_client=None) -> QuickUploadResult:
     """
     检查文件秒传
@@ -140,7 +140,7 @@ class ResourceMonitorService:
                 exclude_keywords = [k.get('keyword', '') for k in keywords if k.get('is_exclude', False)]
                 
                 # 检查排除关键词
-                message_text = (context.message.text or "").lower()
+                message_text = context.text_lower
                 for exclude_keyword in exclude_keywords:
                     if exclude_keyword.lower() in message_text:
                         logger.info(f"规则 {rule.name} 命中排除关键词: {exclude_keyword}")
@@ -185,14 +185,39 @@ class ResourceMonitorService:
             # 3. 自动处理（统一路由 + 变量渲染 + 类型专属路径覆盖）
             # 规则可选字段：target_path_pan115 / target_path_magnet / target_path_ed2k
             override_path = getattr(rule, f"target_path_{link_type}", None) if hasattr(rule, f"target_path_{link_type}") else None
+            # 转存/离线任务耗时较长，放入后台队列，不占用消息处理时间
             if rule.auto_save_to_115 and link_type == 'pan115':
-                await self._auto_save_to_115(record, rule, context, override_path)
+                await self._run_in_background('resource_115_save', ResourceMonitorService._auto_save_to_115,
+                                              record, rule, context, override_path)
             if link_type in ('magnet', 'ed2k'):
-                await self._auto_offline_via_clouddrive2(record, rule, context, override_path)
+                await self._run_in_background('resource_cd2_offline', ResourceMonitorService._auto_offline_via_clouddrive2,
+                                              record, rule, context, override_path)
                 
         except Exception as e:
             logger.error(f"处理链接失败: {e}", exc_info=True)
     
+    async def _run_in_background(self, job_name: str, action, record: ResourceRecord, rule: ResourceMonitorRule,
+                                 context: 'MessageContext', override_path: str | None):
+        """
+        在后台队列中执行自动处理
+        
+        消息处理使用的会话在处理结束后关闭，后台任务打开新的会话并按ID重新读取记录和规则
+        """
+        from services.message_dispatcher import get_message_dispatcher
+        record_id, rule_id = record.id, rule.id
+        
+        async def job():
+            async for db in get_db():
+                fresh_record = await db.get(ResourceRecord, record_id)
+                fresh_rule = await db.get(ResourceMonitorRule, rule_id)
+                if fresh_record is None or fresh_rule is None:
+                    logger.warning(f"⚠️ 资源记录或规则已删除，跳过自动处理: record_id={record_id}, rule_id={rule_id}")
+                    break
+                await action(ResourceMonitorService(db), fresh_record, fresh_rule, context, override_path)
+                break
+        
+        await get_message_dispatcher().run_in_background(job_name, job)
+    
     async def _is_duplicate(self, link_hash: str, time_window: int) -> bool:
         """检查链接是否重复"""
         cutoff_time = get_user_now() - timedelta(seconds=time_window)
@@ -223,7 +248,7 @@ class ResourceMonitorService:
         message_snapshot = {
             'id': context.message.id,
             'date': user_time.isoformat() if user_time else None,
-            'text': context.message.text or "",
+            'text': context.text,
             'chat_id': context.chat_id
         }
         
@@ -232,7 +257,7 @@ class ResourceMonitorService:
             rule_name=rule.name,
             source_chat_id=str(context.chat_id),
             message_id=context.message.id,
-            message_text=context.message.text or "",
+            message_text=context.text,
             message_date=user_time,
             link_type=link_type,
             link_url=link_url,
@@ -480,21 +505,17 @@ class ResourceMonitorService:
         """磁力/ed2k 通过 CloudDrive2 添加离线任务"""
         try:
             # 目标目录：规则 target_path 作为相对路径拼到 CloudDrive2 默认根
-            from services.clouddrive2_client import create_clouddrive2_client
-            import os
-
-            client = create_clouddrive2_client()
-            await client.connect()
+            from services.clouddrive2_pool import get_clouddrive2_pool
 
             # 统一路由（绝对CD2目录）- 支持类型专属覆盖
             raw_path = override_path if (override_path and str(override_path).strip() != '') else (rule.target_path or '/')
             routed = self._compute_final_paths(raw_path, context, rule)
             to_folder = routed['cd2_folder']
 
-            # 提交离线任务
+            # 提交离线任务（复用连接池中的已认证连接）
             logger.info(f"⚡ 提交离线任务: url={record.link_url[:60]}..., folder={to_folder}")
-            res = await client.add_offline_file(record.link_url, to_folder)
-            await client.disconnect()
+            async with get_clouddrive2_pool().client() as client:
+                res = await client.add_offline_file(record.link_url, to_folder)
 
             if res.get('success'):
                 record.save_status = 'queued'
@@ -518,7 +539,10 @@ class ResourceMonitorService:
 from services.message_dispatcher import MessageProcessor
 
 class ResourceMonitorProcessor(MessageProcessor):
-    """资源监控消息处理器"""
+    """资源监控消息处理器（转存/离线任务在后台队列中执行，处理本身只做去重和建记录）"""
+    
+    timeout = 30.0
+    max_concurrency = 4
     
     def __init__(self):
         """不需要传入数据库会话，每次处理时动态获取"""
@@ -672,6 +696,7 @@ def register_retry_handlers():
     from services.common.retry_queue import get_retry_queue
     
     retry_queue = get_retry_queue()
-    retry_queue.register_handler("resource_115_save", handle_115_save_retry)
+    # 115 转存受接口频率限制，限制并发，避免占满全部重试工作协程
+    retry_queue.register_handler("resource_115_save", handle_115_save_retry, max_concurrent=2)
     logger.info("✅ 注册资源监控重试处理器")
 
@@ -0,0 +1,188 @@
+"""
+全文搜索索引（SQLite FTS5）
+
+功能：
+1. media_files（文件名、原始文件名、来源频道、发送者）与 message_logs.original_text 的外部内容 FTS5 索引
+2. 使用 trigram 分词器，中日韩文本无需分词即可子串匹配
+3. 索引表与维护触发器由 alembic 迁移 20251024_add_fts_search_index 创建，所有写入路径自动同步
+4. bm25 相关度排序搜索；非 SQLite 数据库、索引不存在或关键词过短（trigram 至少3个字符）时回退到 LIKE
+"""
+import html
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, or_, text, func, column, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from log_manager import get_logger
+
+logger = get_logger("search_index")
+
+MEDIA_FILES_FTS = "media_files_fts"
+MESSAGE_LOGS_FTS = "message_logs_fts"
+
+# trigram 分词器只能匹配长度 >= 3 的词
+MIN_TERM_LENGTH = 3
+
+# bm25 列权重：file_name, original_name, source_chat, sender_username
+MEDIA_FILES_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# snippet() 中标记匹配位置的占位符（私有区字符），转义 HTML 后再替换为 <mark>
+SNIPPET_START = "\ue000"
+SNIPPET_END = "\ue001"
+
+
+def build_match_expression(keyword: Optional[str]) -> Optional[str]:
+    """
+    将用户输入转换为 FTS5 MATCH 表达式
+
+    按空白拆分为多个词，每个词作为短语（双引号转义）并以 AND 连接；
+    任一词短于 trigram 最小长度时返回 None，由调用方回退到 LIKE
+    """
+    if not keyword:
+        return None
+    terms = keyword.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def render_snippet(raw: Optional[str]) -> str:
+    """转义消息原文中的 HTML，再把匹配位置的占位符替换为 <mark> 标记"""
+    return (
+        html.escape(raw or "")
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+_availability: Dict[str, bool] = {}
+
+
+async def is_search_index_available(db: AsyncSession, table: str) -> bool:
+    """检查全文索引表是否存在（仅 SQLite，结果按进程缓存）"""
+    if table in _availability:
+        return _availability[table]
+
+    available = False
+    try:
+        if db.bind.dialect.name == "sqlite":
+            result = await db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": table}
+            )
+            available = result.scalar() is not None
+    except Exception as e:
+        logger.warning(f"检查全文索引失败: {e}")
+
+    if not available:
+        logger.info(f"全文索引 {table} 不可用，搜索将回退到 LIKE")
+    _availability[table] = available
+    return available
+
+
+async def media_file_keyword_clause(db: AsyncSession, keyword: str):
+    """
+    媒体文件关键词过滤条件（可与其他过滤条件组合）
+
+    索引可用时为 id IN (FTS 匹配结果)，否则为多列 LIKE
+    """
+    from models import MediaFile
+
+    expression = build_match_expression(keyword)
+    if expression and await is_search_index_available(db, MEDIA_FILES_FTS):
+        fts_ids = text(
+            f"SELECT rowid FROM {MEDIA_FILES_FTS} WHERE {MEDIA_FILES_FTS} MATCH :fts_query"
+        ).bindparams(fts_query=expression).columns(column("rowid", Integer))
+        return MediaFile.id.in_(fts_ids)
+
+    return or_(
+        MediaFile.file_name.contains(keyword),
+        MediaFile.original_name.contains(keyword),
+        MediaFile.source_chat.contains(keyword),
+        MediaFile.sender_username.contains(keyword)
+    )
+
+
+async def search_media_files(
+    db: AsyncSession,
+    keyword: str,
+    limit: int = 50,
+    offset: int = 0
+) -> Tuple[List[Tuple[int, float]], int]:
+    """
+    按相关度搜索媒体文件
+
+    Returns:
+        ([(媒体文件ID, 相关度分数)], 总匹配数)；分数越小越相关，LIKE 回退时为 0
+    """
+    from models import MediaFile
+
+    expression = build_match_expression(keyword)
+    if expression and await is_search_index_available(db, MEDIA_FILES_FTS):
+        weights = ", ".join(str(w) for w in MEDIA_FILES_WEIGHTS)
+        result = await db.execute(
+            text(
+                f"SELECT rowid, bm25({MEDIA_FILES_FTS}, {weights}) AS score FROM {MEDIA_FILES_FTS} "
+                f"WHERE {MEDIA_FILES_FTS} MATCH :q ORDER BY score LIMIT :limit OFFSET :offset"
+            ),
+            {"q": expression, "limit": limit, "offset": offset}
+        )
+        hits = [(row[0], row[1]) for row in result.all()]
+        total = await db.scalar(
+            text(f"SELECT count(*) FROM {MEDIA_FILES_FTS} WHERE {MEDIA_FILES_FTS} MATCH :q"),
+            {"q": expression}
+        )
+        return hits, total or 0
+
+    condition = await media_file_keyword_clause(db, keyword)
+    result = await db.execute(
+        select(MediaFile.id).where(condition).order_by(MediaFile.id.desc()).limit(limit).offset(offset)
+    )
+    hits = [(row[0], 0.0) for row in result.all()]
+    total = await db.scalar(select(func.count(MediaFile.id)).where(condition))
+    return hits, total or 0
+
+
+async def search_message_logs(
+    db: AsyncSession,
+    keyword: str,
+    limit: int = 50,
+    offset: int = 0
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    按相关度搜索消息日志原文
+
+    Returns:
+        ([{"id", "score", "snippet"}], 总匹配数)；snippet 已转义 HTML，匹配部分以 <mark> 标记
+    """
+    from models import MessageLog
+
+    expression = build_match_expression(keyword)
+    if expression and await is_search_index_available(db, MESSAGE_LOGS_FTS):
+        result = await db.execute(
+            text(
+                f"SELECT rowid, bm25({MESSAGE_LOGS_FTS}) AS score, "
+                f"snippet({MESSAGE_LOGS_FTS}, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) "
+                f"FROM {MESSAGE_LOGS_FTS} WHERE {MESSAGE_LOGS_FTS} MATCH :q "
+                f"ORDER BY score LIMIT :limit OFFSET :offset"
+            ),
+            {"q": expression, "limit": limit, "offset": offset}
+        )
+        hits = [{"id": row[0], "score": row[1], "snippet": render_snippet(row[2])} for row in result.all()]
+        total = await db.scalar(
+            text(f"SELECT count(*) FROM {MESSAGE_LOGS_FTS} WHERE {MESSAGE_LOGS_FTS} MATCH :q"),
+            {"q": expression}
+        )
+        return hits, total or 0
+
+    condition = MessageLog.original_text.contains(keyword)
+    result = await db.execute(
+        select(MessageLog.id, MessageLog.original_text)
+        .where(condition)
+        .order_by(MessageLog.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    hits = [{"id": row[0], "score": 0.0, "snippet": render_snippet((row[1] or "")[:200])} for row in result.all()]
+    total = await db.scalar(select(func.count(MessageLog.id)).where(condition))
+    return hits, total or 0
@@ -1,12 +1,16 @@
 """
 存储空间管理和自动清理服务
+
+存储用量按目录维护字节计数：下载、归档、清理、删除时增量更新，
+启动时及定期在线程池中用 os.scandir 重新统计以校正偏差，查询用量时不再遍历目录。
 """
 import os
+import time
 import asyncio
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Dict, Any, List, Optional
-from sqlalchemy import select, and_
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select, and_, or_, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from log_manager import get_logger
@@ -17,12 +21,74 @@ from database import get_db
 from models import MediaFile, MediaMonitorRule
 
 
+def _scan_tree(root: str) -> Tuple[int, int]:
+    """
+    统计目录下所有文件的总大小（在线程池中执行）
+    
+    Returns:
+        (字节数, 文件数)
+    """
+    total_bytes = 0
+    total_files = 0
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total_bytes += entry.stat(follow_symlinks=False).st_size
+                            total_files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total_bytes, total_files
+
+
 class StorageManager:
     """存储空间管理器"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        reconcile_interval: int = 6 * 3600,
+        cleanup_batch_size: int = 200,
+        cleanup_io_workers: int = 4,
+        cleanup_throttle_delay: float = 0.2
+    ):
+        """
+        Args:
+            reconcile_interval: 重新统计目录大小的间隔（秒）
+            cleanup_batch_size: 清理时每批处理的记录数
+            cleanup_io_workers: 删除文件的线程数
+            cleanup_throttle_delay: 有下载进行时，每个活跃下载在批次间增加的等待（秒）
+        """
         self.cleanup_task = None
+        self.reconcile_task = None
         self.is_running = False
+        self.reconcile_interval = reconcile_interval
+        self.cleanup_batch_size = cleanup_batch_size
+        self.cleanup_io_workers = cleanup_io_workers
+        self.cleanup_throttle_delay = cleanup_throttle_delay
+        self.cleanup_report_limit = 200
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        
+        # 目录 -> [字节数, 文件数]
+        self._usage: Dict[str, List[int]] = {}
+        # 正在重新统计的目录 -> 统计期间的增量
+        self._scan_deltas: Dict[str, List[int]] = {}
+        self._scans: Dict[str, asyncio.Future] = {}
+        
+        self.stats = {
+            "incremental_updates": 0,
+            "reconcile_scans": 0,
+            "last_scan_ms": 0,
+            "last_drift_bytes": 0,
+            "last_reconciled_at": None,
+        }
     
     async def start(self, check_interval: int = 3600):
         """
@@ -40,6 +106,8 @@ class StorageManager:
         
         # 启动定时清理任务
         self.cleanup_task = asyncio.create_task(self._cleanup_loop(check_interval))
+        # 启动目录大小校正任务（首次立即统计）
+        self.reconcile_task = asyncio.create_task(self._reconcile_loop(self.reconcile_interval))
     
     async def stop(self):
         """停止存储管理服务"""
@@ -49,12 +117,152 @@ class StorageManager:
         self.is_running = False
         logger.info("🛑 停止存储空间管理服务")
         
-        if self.cleanup_task:
-            self.cleanup_task.cancel()
+        for task in (self.cleanup_task, self.reconcile_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        
+        if self._io_executor:
+            self._io_executor.shutdown(wait=False)
+            self._io_executor = None
+    
+    # ==================== 增量用量统计 ====================
+    
+    @staticmethod
+    def _normalize(path) -> str:
+        return os.path.abspath(os.fspath(path))
+    
+    def _apply_delta(self, path, size: int, count: int):
+        """把文件增减计入包含该路径的所有已统计目录"""
+        if not self._usage or not path:
+            return
+        path = self._normalize(path)
+        for root, usage in self._usage.items():
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                usage[0] = max(0, usage[0] + size)
+                usage[1] = max(0, usage[1] + count)
+                delta = self._scan_deltas.get(root)
+                if delta is not None:
+                    delta[0] += size
+                    delta[1] += count
+        self.stats["incremental_updates"] += 1
+    
+    def record_file_added(self, path, size: Optional[int] = None):
+        """
+        记录新增文件（下载完成、归档写入）
+        
+        Args:
+            path: 文件路径
+            size: 文件大小（字节），为空时读取文件
+        """
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+        self._apply_delta(path, size, 1)
+    
+    def record_file_removed(self, path, size: int):
+        """
+        记录删除的文件（需在删除前获取大小）
+        
+        Args:
+            path: 文件路径
+            size: 文件大小（字节）
+        """
+        self._apply_delta(path, -size, -1)
+    
+    def record_file_moved(self, source, target, size: int):
+        """记录文件移动（如从临时目录归档到整理目录）"""
+        self.record_file_removed(source, size)
+        self.record_file_added(target, size)
+    
+    async def _get_folder_size(self, folder) -> int:
+        """获取目录大小（未统计过的目录先在线程池中统计一次）"""
+        root = self._normalize(folder)
+        usage = self._usage.get(root)
+        if usage is None:
+            if not os.path.isdir(root):
+                return 0
+            await self._reconcile_root(root)
+            usage = self._usage.get(root, [0, 0])
+        return usage[0]
+    
+    async def _reconcile_root(self, root: str):
+        """在线程池中重新统计目录大小，校正增量计数的偏差"""
+        pending = self._scans.get(root)
+        if pending is not None:
+            await asyncio.shield(pending)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        self._scans[root] = future
+        self._scan_deltas[root] = [0, 0]
+        started = time.perf_counter()
+        try:
+            scanned_bytes, scanned_files = await asyncio.get_running_loop().run_in_executor(None, _scan_tree, root)
+            delta = self._scan_deltas.get(root, [0, 0])
+            previous = self._usage.get(root)
+            current = [scanned_bytes + delta[0], scanned_files + delta[1]]
+            if previous is not None:
+                self.stats["last_drift_bytes"] = current[0] - previous[0]
+            self._usage[root] = current
+            self.stats["reconcile_scans"] += 1
+            self.stats["last_scan_ms"] = int((time.perf_counter() - started) * 1000)
+            self.stats["last_reconciled_at"] = get_user_now().isoformat()
+            logger.debug(f"📏 目录统计: {root} {current[1]} 个文件, {current[0] / 1024**3:.2f}GB")
+        except Exception as e:
+            logger.warning(f"统计目录大小失败: {root}, {e}")
+        finally:
+            self._scan_deltas.pop(root, None)
+            self._scans.pop(root, None)
+            future.set_result(None)
+    
+    async def _reconcile_loop(self, interval: int):
+        """定期重新统计所有规则目录"""
+        while self.is_running:
             try:
-                await self.cleanup_task
+                roots = set(self._usage)
+                async for db in get_db():
+                    result = await db.execute(select(MediaMonitorRule))
+                    for rule in result.scalars().all():
+                        roots.update(self._normalize(folder) for folder in self._rule_folders(rule))
+                    break
+                
+                for root in roots:
+                    if not self.is_running:
+                        break
+                    if os.path.isdir(root):
+                        await self._reconcile_root(root)
+                    else:
+                        self._usage.pop(root, None)
+                
+                await asyncio.sleep(interval)
             except asyncio.CancelledError:
-                pass
+                break
+            except Exception as e:
+                logger.error(f"目录大小校正失败: {e}")
+                await asyncio.sleep(interval)
+    
+    @staticmethod
+    def _rule_folders(rule: MediaMonitorRule) -> List[str]:
+        folders = [rule.temp_folder or '/app/media/downloads']
+        if rule.organize_enabled and rule.organize_target_type == 'local' and rule.organize_local_path:
+            folders.append(rule.organize_local_path)
+        return folders
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取用量统计信息"""
+        return {
+            **self.stats,
+            "tracked_folders": {
+                root: {"bytes": usage[0], "files": usage[1]}
+                for root, usage in self._usage.items()
+            },
+        }
     
     async def _cleanup_loop(self, interval: int):
         """定时清理循环"""
@@ -103,66 +311,25 @@ class StorageManager:
         为单个规则执行清理
         
         Args:
-            db: 数据库会话
+            db: 数据库会话（仅用于读取规则，清理引擎按批次使用独立会话）
             rule: 监控规则
         """
         try:
             logger.info(f"🧹 清理规则: {rule.name} (ID: {rule.id})")
             
-            # 计算截止日期
-            cutoff_date = get_user_now() - timedelta(days=rule.auto_cleanup_days or 7)
-            
-            # 查询需要清理的文件
-            query = select(MediaFile).where(
-                and_(
-                    MediaFile.monitor_rule_id == rule.id,
-                    MediaFile.downloaded_at < cutoff_date
-                )
+            result = await self._run_cleanup(
+                rule_id=rule.id,
+                days=rule.auto_cleanup_days or 7,
+                only_organized=bool(rule.cleanup_only_organized),
+                # 自动清理只删除文件，已不存在的路径同样清空
+                clear_missing=True
             )
             
-            # 如果只清理已归档的文件
-            if rule.cleanup_only_organized:
-                query = query.where(MediaFile.is_organized == True)
-            
-            result = await db.execute(query)
-            files_to_cleanup = result.scalars().all()
-            
-            if not files_to_cleanup:
+            if not result['scanned_count']:
                 logger.info(f"  无需清理的文件")
                 return
             
-            cleaned_count = 0
-            cleaned_size_mb = 0
-            
-            for file in files_to_cleanup:
-                try:
-                    # 删除临时文件
-                    if file.temp_path and os.path.exists(file.temp_path):
-                        file_size = os.path.getsize(file.temp_path)
-                        os.remove(file.temp_path)
-                        cleaned_size_mb += file_size / (1024 * 1024)
-                        cleaned_count += 1
-                        logger.debug(f"  🗑️ 删除临时文件: {file.temp_path}")
-                    
-                    # 如果文件已上传到云端，也可以删除归档文件
-                    if file.is_uploaded_to_cloud and file.final_path and os.path.exists(file.final_path):
-                        file_size = os.path.getsize(file.final_path)
-                        os.remove(file.final_path)
-                        cleaned_size_mb += file_size / (1024 * 1024)
-                        logger.debug(f"  ☁️ 删除已上传文件: {file.final_path}")
-                    
-                    # 更新数据库记录（保留记录但清空路径）
-                    if file.temp_path and not os.path.exists(file.temp_path):
-                        file.temp_path = None
-                    if file.final_path and not os.path.exists(file.final_path):
-                        file.final_path = None
-                    
-                except Exception as e:
-                    logger.warning(f"  清理文件失败: {file.file_name}, {e}")
-            
-            await db.commit()
-            
-            logger.info(f"  ✅ 清理完成: {cleaned_count} 个文件, {cleaned_size_mb:.2f} MB")
+            logger.info(f"  ✅ 清理完成: {result['cleaned_count']} 个文件, {result['cleaned_size_mb']:.2f} MB")
             
         except Exception as e:
             logger.error(f"规则清理失败: {rule.name}, {e}")
@@ -174,7 +341,8 @@ class StorageManager:
         rule_id: int,
         days: int,
         only_organized: bool = True,
-        delete_db_records: bool = False
+        delete_db_records: bool = False,
+        dry_run: bool = False
     ) -> Dict[str, Any]:
         """
         手动清理
@@ -184,6 +352,7 @@ class StorageManager:
             days: 保留天数
             only_organized: 是否只清理已归档文件
             delete_db_records: 是否删除数据库记录
+            dry_run: 只估算可释放的空间，不删除文件
             
         Returns:
             清理结果
@@ -192,82 +361,41 @@ class StorageManager:
             async for db in get_db():
                 # 获取规则
                 result = await db.execute(
-                    select(MediaMonitorRule).where(MediaMonitorRule.id == rule_id)
-                )
-                rule = result.scalar_one_or_none()
-                
-                if not rule:
-                    return {
-                        'success': False,
-                        'message': '规则不存在'
-                    }
-                
-                # 计算截止日期
-                cutoff_date = get_user_now() - timedelta(days=days)
-                
-                # 查询需要清理的文件
-                query = select(MediaFile).where(
-                    and_(
-                        MediaFile.monitor_rule_id == rule_id,
-                        MediaFile.downloaded_at < cutoff_date
-                    )
+                    select(MediaMonitorRule.name).where(MediaMonitorRule.id == rule_id)
                 )
-                
-                if only_organized:
-                    query = query.where(MediaFile.is_organized == True)
-                
-                result = await db.execute(query)
-                files_to_cleanup = result.scalars().all()
-                
-                cleaned_files = []
-                cleaned_count = 0
-                cleaned_size_mb = 0
-                
-                for file in files_to_cleanup:
-                    try:
-                        file_info = {
-                            'name': file.file_name,
-                            'size_mb': file.file_size_mb,
-                            'paths_deleted': []
-                        }
-                        
-                        # 删除临时文件
-                        if file.temp_path and os.path.exists(file.temp_path):
-                            os.remove(file.temp_path)
-                            file_info['paths_deleted'].append(file.temp_path)
-                            cleaned_size_mb += file.file_size_mb or 0
-                            cleaned_count += 1
-                        
-                        # 删除归档文件（如果已上传到云端）
-                        if file.is_uploaded_to_cloud and file.final_path and os.path.exists(file.final_path):
-                            os.remove(file.final_path)
-                            file_info['paths_deleted'].append(file.final_path)
-                        
-                        cleaned_files.append(file_info)
-                        
-                        # 如果要删除数据库记录
-                        if delete_db_records:
-                            await db.delete(file)
-                        else:
-                            # 只清空路径
-                            file.temp_path = None
-                            if file.is_uploaded_to_cloud:
-                                file.final_path = None
-                        
-                    except Exception as e:
-                        logger.warning(f"清理文件失败: {file.file_name}, {e}")
-                
-                await db.commit()
-                
-                logger.info(f"🧹 手动清理完成: {rule.name}, {cleaned_count} 个文件, {cleaned_size_mb:.2f} MB")
-                
+                rule_name = result.scalar_one_or_none()
+                break
+            
+            if rule_name is None:
+                return {
+                    'success': False,
+                    'message': '规则不存在'
+                }
+            
+            result = await self._run_cleanup(
+                rule_id=rule_id,
+                days=days,
+                only_organized=only_organized,
+                delete_db_records=delete_db_records,
+                dry_run=dry_run
+            )
+            
+            if dry_run:
+                logger.info(f"🔍 清理预估: {rule_name}, {result['cleaned_count']} 个文件, {result['cleaned_size_mb']:.2f} MB")
                 return {
                     'success': True,
-                    'message': '清理成功',
-                    'cleaned_count': cleaned_count,
-                    'cleaned_size_mb': round(cleaned_size_mb, 2),
-                    'files': cleaned_files
+                    'message': '预估完成',
+                    'dry_run': True,
+                    **result
                 }
+            
+            logger.info(f"🧹 手动清理完成: {rule_name}, {result['cleaned_count']} 个文件, {result['cleaned_size_mb']:.2f} MB")
+            
+            return {
+                'success': True,
+                'message': '清理成功',
+                **result
+            }
                 
         except Exception as e:
             logger.error(f"手动清理失败: {e}")
@@ -278,6 +406,225 @@ class StorageManager:
                 'message': f'清理失败: {str(e)}'
             }
     
+    # ==================== 清理引擎 ====================
+    
+    def _get_io_executor(self) -> ThreadPoolExecutor:
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=self.cleanup_io_workers,
+                thread_name_prefix='storage-cleanup'
+            )
+        return self._io_executor
+    
+    @staticmethod
+    def _active_downloads() -> int:
+        """当前正在执行的下载数（用于清理限速）"""
+        try:
+            from services.media_monitor_service import get_media_monitor_service
+            return len(get_media_monitor_service().scheduler._active)
+        except Exception:
+            return 0
+    
+    async def _run_cleanup(
+        self,
+        rule_id: int,
+        days: int,
+        only_organized: bool = True,
+        delete_db_records: bool = False,
+        dry_run: bool = False,
+        clear_missing: bool = False
+    ) -> Dict[str, Any]:
+        """
+        按批次清理过期文件
+        
+        按 id 顺序分批读取候选记录（只取所需列），文件删除在线程池中执行，
+        每批用一条批量 UPDATE/DELETE 写回数据库；有下载正在进行时降低并发并在批次间让出 I/O。
+        
+        Args:
+            rule_id: 规则ID
+            days: 保留天数
+            only_organized: 是否只清理已归档文件
+            delete_db_records: 是否删除数据库记录
+            dry_run: 只统计将被删除的文件大小
+            clear_missing: 同时清空已不存在的文件路径
+            
+        Returns:
+            {'scanned_count', 'cleaned_count', 'cleaned_size_mb', 'batches', 'files'}
+        """
+        cutoff_date = get_user_now() - timedelta(days=days)
+        conditions = [
+            MediaFile.monitor_rule_id == rule_id,
+            MediaFile.downloaded_at < cutoff_date
+        ]
+        if only_organized:
+            conditions.append(MediaFile.is_organized == True)
+        if not delete_db_records:
+            # 路径已清空的记录无需再处理
+            conditions.append(or_(
+                MediaFile.temp_path.isnot(None),
+                MediaFile.final_path.isnot(None) if clear_missing
+                else and_(MediaFile.is_uploaded_to_cloud == True, MediaFile.final_path.isnot(None))
+            ))
+        
+        summary = {
+            'scanned_count': 0,
+            'cleaned_count': 0,
+            'cleaned_size_mb': 0.0,
+            'batches': 0,
+            'files': []
+        }
+        cleaned_bytes = 0
+        last_id = 0
+        
+        while True:
+            async for db in get_db():
+                result = await db.execute(
+                    select(
+                        MediaFile.id,
+                        MediaFile.file_name,
+                        MediaFile.temp_path,
+                        MediaFile.final_path,
+                        MediaFile.is_uploaded_to_cloud
+                    )
+                    .where(and_(*conditions), MediaFile.id > last_id)
+                    .order_by(MediaFile.id)
+                    .limit(self.cleanup_batch_size)
+                )
+                rows = result.all()
+                break
+            
+            if not rows:
+                break
+            last_id = rows[-1].id
+            summary['scanned_count'] += len(rows)
+            summary['batches'] += 1
+            
+            # 每个文件要处理的路径：临时文件；已上传到云端时还有归档文件；
+            # clear_missing 时未上传的归档文件只检查是否还存在
+            targets = []
+            for row in rows:
+                paths = [(row.temp_path, True)] if row.temp_path else []
+                if row.final_path and (row.is_uploaded_to_cloud or clear_missing):
+                    paths.append((row.final_path, bool(row.is_uploaded_to_cloud)))
+                targets.append(paths)
+            
+            active = self._active_downloads()
+            outcomes = await self._remove_files(targets, dry_run=dry_run, workers=1 if active else None)
+            
+            clear_temp_ids = []
+            clear_final_ids = []
+            for row, removed in zip(rows, outcomes):
+                deleted = {path: size for path, size in removed if size is not None}
+                if deleted:
+                    if row.temp_path in deleted:
+                        summary['cleaned_count'] += 1
+                    cleaned_bytes += sum(deleted.values())
+                    if len(summary['files']) < self.cleanup_report_limit:
+                        summary['files'].append({
+                            'name': row.file_name,
+                            'size_mb': round(sum(deleted.values()) / (1024 * 1024), 2),
+                            'paths_deleted': list(deleted)
+                        })
+                
+                # 已删除或原本就不存在的路径从记录中清空
+                gone = {path for path, _ in removed}
+                if row.temp_path in gone:
+                    clear_temp_ids.append(row.id)
+                if row.final_path in gone:
+                    clear_final_ids.append(row.id)
+            
+            if not dry_run:
+                await self._apply_cleanup_batch(
+                    [row.id for row in rows], clear_temp_ids, clear_final_ids, delete_db_records
+                )
+            
+            if len(rows) < self.cleanup_batch_size:
+                break
+            
+            # 下载进行中时在批次之间让出磁盘 I/O
+            await asyncio.sleep(min(self.cleanup_throttle_delay * active, 2.0) if active else 0)
+        
+        summary['cleaned_size_mb'] = round(cleaned_bytes / (1024 * 1024), 2)
+        return summary
+    
+    async def _remove_files(
+        self,
+        targets: List[List[Tuple[str, bool]]],
+        dry_run: bool = False,
+        workers: Optional[int] = None
+    ) -> List[List[Tuple[str, Optional[int]]]]:
+        """
+        在线程池中删除一批文件
+        
+        Args:
+            targets: 每条记录的 [(路径, 是否删除)]；不删除的路径只检查是否存在
+            dry_run: 只读取大小，不删除
+            workers: 并行线程数（默认 cleanup_io_workers）
+            
+        Returns:
+            与 targets 对应的 [(路径, 删除的字节数)]；文件原本不存在时字节数为 None，
+            保留或删除失败的路径不返回
+        """
+        def remove(paths: List[Tuple[str, bool]]) -> List[Tuple[str, Optional[int]]]:
+            removed = []
+            for path, should_remove in paths:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    removed.append((path, None))
+                    continue
+                if not should_remove:
+                    continue
+                try:
+                    if not dry_run:
+                        os.remove(path)
+                    removed.append((path, size))
+                except OSError as e:
+                    logger.warning(f"  清理文件失败: {path}, {e}")
+            return removed
+        
+        workers = workers or self.cleanup_io_workers
+        chunk_size = max(1, -(-len(targets) // workers))
+        chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+        
+        loop = asyncio.get_running_loop()
+        executor = self._get_io_executor()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, lambda chunk=chunk: [remove(paths) for paths in chunk])
+            for chunk in chunks
+        ])
+        
+        outcomes = [removed for chunk_result in results for removed in chunk_result]
+        if not dry_run:
+            for removed in outcomes:
+                for path, size in removed:
+                    if size is not None:
+                        self.record_file_removed(path, size)
+        return outcomes
+    
+    async def _apply_cleanup_batch(
+        self,
+        ids: List[int],
+        clear_temp_ids: List[int],
+        clear_final_ids: List[int],
+        delete_db_records: bool
+    ):
+        """把一批清理结果用批量语句写回数据库"""
+        async for db in get_db():
+            if delete_db_records:
+                await db.execute(delete(MediaFile).where(MediaFile.id.in_(ids)))
+            else:
+                if clear_temp_ids:
+                    await db.execute(
+                        update(MediaFile).where(MediaFile.id.in_(clear_temp_ids)).values(temp_path=None)
+                    )
+                if clear_final_ids:
+                    await db.execute(
+                        update(MediaFile).where(MediaFile.id.in_(clear_final_ids)).values(final_path=None)
+                    )
+            await db.commit()
+            break
+    
     async def get_storage_usage(self, rule_id: Optional[int] = None) -> Dict[str, Any]:
         """
         获取存储使用情况
@@ -357,7 +704,7 @@ class StorageManager:
     
     async def _calculate_folder_sizes(self, rule: MediaMonitorRule) -> tuple:
         """
-        计算文件夹大小
+        计算文件夹大小（读取增量计数）
         
         Returns:
             (临时文件夹大小, 归档文件夹大小) 单位：字节
@@ -366,17 +713,13 @@ class StorageManager:
         organized_size = 0
         
         try:
-            # 计算临时文件夹大小
-            temp_folder = Path(rule.temp_folder or '/app/media/downloads')
-            if temp_folder.exists():
-                temp_size = sum(f.stat().st_size for f in temp_folder.rglob('*') if f.is_file())
+            # 临时文件夹大小
+            temp_size = await self._get_folder_size(rule.temp_folder or '/app/media/downloads')
             
-            # 计算归档文件夹大小
+            # 归档文件夹大小
             if rule.organize_enabled:
                 if rule.organize_target_type == 'local' and rule.organize_local_path:
-                    organized_folder = Path(rule.organize_local_path)
-                    if organized_folder.exists():
-                        organized_size = sum(f.stat().st_size for f in organized_folder.rglob('*') if f.is_file())
+                    organized_size = await self._get_folder_size(rule.organize_local_path)
         
         except Exception as e:
             logger.warning(f"计算文件夹大小失败: {e}")
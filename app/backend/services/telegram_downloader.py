@@ -0,0 +1,225 @@
+"""
+Telegram 分片并行下载
+
+基于 Telethon 的 iter_download（upload.GetFileRequest）：
+1. 文件按固定大小分片，多个分片段并行请求（文件位于其他 DC 时由 Telethon 借用该 DC 的 sender）
+2. 数据按偏移写入预分配的 .part 文件，完成后原子重命名为目标文件
+3. 已完成分片记录在位图中，由调用方持久化到 DownloadTask；中断后只下载缺失的分片
+4. 文件引用过期时重新获取消息，继续下载
+"""
+import asyncio
+import os
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Optional, Tuple
+
+from telethon import errors, types
+
+from log_manager import get_logger
+
+logger = get_logger('media_monitor')
+
+KB = 1024
+MB = 1024 * 1024
+
+# Telethon 单次 GetFileRequest 的上限，也是分片大小（偏移需按 4KB 对齐）
+PART_SIZE = 512 * KB
+# 每个分片段包含的分片数：一个段内顺序请求，段之间并行
+SEGMENT_PARTS = 16
+# 小于该大小的文件仍使用 download_media 单流下载
+MIN_PARALLEL_SIZE = 8 * MB
+
+
+def part_file_path(file_path) -> Path:
+    """分片下载期间写入的临时文件（<文件名>.part）"""
+    file_path = Path(file_path)
+    return file_path.with_name(file_path.name + '.part')
+
+
+class PartBitmap:
+    """分片完成位图（第 n 个分片对应第 n 位，从 0 开始）"""
+
+    def __init__(self, total_parts: int, data: Optional[bytes] = None):
+        self.total_parts = total_parts
+        size = (total_parts + 7) // 8
+        self._bits = bytearray(data[:size]) if data else bytearray()
+        self._bits.extend(bytes(size - len(self._bits)))
+        self.count = sum(bin(b).count('1') for b in self._bits)
+
+    def __contains__(self, index: int) -> bool:
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def add(self, index: int):
+        if index not in self:
+            self._bits[index >> 3] |= 1 << (index & 7)
+            self.count += 1
+
+    @property
+    def complete(self) -> bool:
+        return self.count >= self.total_parts
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+
+def parallel_download_size(message) -> int:
+    """
+    可分片并行下载的文件大小；不支持时返回 0
+
+    只处理文档类媒体（视频、音频、文件），照片等小文件仍走 download_media
+    """
+    media = getattr(message, 'media', None)
+    if not isinstance(media, types.MessageMediaDocument) or media.document is None:
+        return 0
+    size = getattr(media.document, 'size', 0) or 0
+    return size if size >= MIN_PARALLEL_SIZE else 0
+
+
+class ParallelDownload:
+    """
+    单个文件的分片并行下载
+
+    run() 必须在 Telethon 客户端所在的事件循环中执行；
+    bitmap / downloaded_bytes 可在其他线程读取（用于持久化检查点）
+    """
+
+    def __init__(
+        self,
+        client,
+        message,
+        file_path: Path,
+        file_size: int,
+        workers: int = 4,
+        part_size: int = PART_SIZE,
+        bitmap: Optional[bytes] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        """
+        Args:
+            client: Telethon 客户端
+            message: 包含媒体的消息
+            file_path: 最终文件路径（下载期间写入同名 .part 文件）
+            file_size: 文件大小
+            workers: 并行请求的分片段数
+            part_size: 分片大小
+            bitmap: 上次中断时已完成分片的位图（.part 文件不存在时忽略）
+            progress_callback: 进度回调 (已下载字节, 总字节)
+        """
+        self.client = client
+        self.message = message
+        self.file_path = Path(file_path)
+        self.part_path = part_file_path(self.file_path)
+        self.file_size = file_size
+        self.workers = max(1, workers)
+        self.part_size = part_size
+        self.total_parts = (file_size + part_size - 1) // part_size
+        self.progress_callback = progress_callback
+
+        resumable = bitmap is not None and self.part_path.exists() and self.part_path.stat().st_size == file_size
+        self.bitmap = PartBitmap(self.total_parts, bitmap if resumable else None)
+        self.resumed_bytes = self.downloaded_bytes
+
+    @property
+    def downloaded_bytes(self) -> int:
+        """已完成分片的字节数"""
+        done = self.bitmap.count * self.part_size
+        if self.total_parts and (self.total_parts - 1) in self.bitmap:
+            done -= self.total_parts * self.part_size - self.file_size
+        return done
+
+    def _segments(self) -> Deque[Tuple[int, int]]:
+        """把未完成的分片按连续区间切分为 (起始分片, 分片数) 的段"""
+        segments: Deque[Tuple[int, int]] = deque()
+        start = None
+        for index in range(self.total_parts + 1):
+            pending = index < self.total_parts and index not in self.bitmap
+            if pending and start is None:
+                start = index
+            if start is not None and (not pending or index - start == SEGMENT_PARTS):
+                segments.append((start, index - start))
+                start = index if pending else None
+        return segments
+
+    async def run(self) -> Path:
+        """下载缺失的分片，完成后重命名为目标文件并返回路径"""
+        self.part_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.bitmap.count == 0 and self.part_path.exists():
+            self.part_path.unlink()
+
+        segments = self._segments()
+        if self.resumed_bytes:
+            logger.info(
+                f"♻️ 断点续传: {self.file_path.name} 已完成 {self.bitmap.count}/{self.total_parts} 个分片，"
+                f"剩余 {len(segments)} 段"
+            )
+
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # 预分配（稀疏文件），分片可按任意顺序写入
+            os.ftruncate(fd, self.file_size)
+            workers = [
+                asyncio.create_task(self._worker(segments, fd))
+                for _ in range(min(self.workers, len(segments)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+        finally:
+            os.close(fd)
+
+        if not self.bitmap.complete:
+            raise Exception(f"分片下载不完整: {self.bitmap.count}/{self.total_parts}")
+        os.replace(self.part_path, self.file_path)
+        return self.file_path
+
+    async def _worker(self, segments: Deque[Tuple[int, int]], fd: int):
+        while segments:
+            first, count = segments.popleft()
+            await self._fetch_segment(first, count, fd)
+
+    async def _fetch_segment(self, first: int, count: int, fd: int):
+        """顺序下载一个分片段；文件引用过期时重新获取消息后从未完成的分片继续"""
+        loop = asyncio.get_running_loop()
+        refreshed = False
+        while True:
+            index = first
+            while index < first + count and index in self.bitmap:
+                index += 1
+            remaining = first + count - index
+            if remaining <= 0:
+                return
+            try:
+                async for chunk in self.client.iter_download(
+                    self.message.media,
+                    offset=index * self.part_size,
+                    limit=remaining,
+                    request_size=self.part_size,
+                    file_size=self.file_size
+                ):
+                    expected = min(self.part_size, self.file_size - index * self.part_size)
+                    if len(chunk) != expected:
+                        raise Exception(f"分片 {index} 长度异常: {len(chunk)}/{expected}")
+                    await loop.run_in_executor(None, os.pwrite, fd, chunk, index * self.part_size)
+                    self.bitmap.add(index)
+                    index += 1
+                    if self.progress_callback:
+                        self.progress_callback(self.downloaded_bytes, self.file_size)
+                return
+            except (errors.FileReferenceExpiredError, errors.FilerefUpgradeNeededError):
+                if refreshed:
+                    raise
+                refreshed = True
+                await self._refresh_message()
+
+    async def _refresh_message(self):
+        """重新获取消息以刷新文件引用"""
+        logger.info(f"🔄 文件引用已过期，重新获取消息: {self.file_path.name}")
+        message = await self.client.get_messages(self.message.chat_id, ids=self.message.id)
+        document = getattr(message, 'document', None) if message else None
+        if document is None or document.id != self.message.document.id:
+            raise Exception("消息媒体已变化或被删除，无法继续下载")
+        self.message = message
@@ -4,7 +4,7 @@
 支持实时进度更新和WebSocket推送
 """
 import asyncio
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
 from enum import Enum
 
@@ -120,6 +120,7 @@ class UploadProgress:
     def to_dict(self) -> dict:
         """转换为字典"""
         return {
+            'file_path': self.file_path,
             'file_name': self.file_name,
             'file_size': self.file_size,
             'status': self.status.value,
@@ -150,6 +151,9 @@ class UploadProgressManager:
     def __init__(self):
         self._progresses: Dict[str, UploadProgress] = {}
         self._callbacks: Dict[str, list] = {}  # file_path -> [callback]
+        # 全局监听器：任意文件进度变化时调用 listener(file_path, progress)，
+        # progress 为 None 表示该进度已被移除
+        self._listeners: List[Callable[[str, Optional[UploadProgress]], None]] = []
         self._lock = asyncio.Lock()
     
     async def create_progress(
@@ -163,7 +167,8 @@ class UploadProgressManager:
         async with self._lock:
             progress = UploadProgress(file_path, file_name, file_size, target_dir_id)
             self._progresses[file_path] = progress
-            return progress
+        self._notify_listeners(file_path, progress)
+        return progress
     
     async def get_progress(self, file_path: str) -> Optional[UploadProgress]:
         """获取进度"""
@@ -205,14 +210,40 @@ class UploadProgressManager:
     async def remove_progress(self, file_path: str):
         """移除进度"""
         async with self._lock:
-            self._progresses.pop(file_path, None)
+            removed = self._progresses.pop(file_path, None)
             self._callbacks.pop(file_path, None)
+        if removed is not None:
+            self._notify_listeners(file_path, None)
     
     async def list_progresses(self) -> Dict[str, UploadProgress]:
         """列出所有进度"""
         async with self._lock:
             return dict(self._progresses)
     
+    def snapshot(self) -> Dict[str, UploadProgress]:
+        """同步获取所有进度的浅拷贝（供事件循环内的推送器使用）"""
+        return dict(self._progresses)
+    
+    def add_listener(self, listener: Callable[[str, Optional[UploadProgress]], None]):
+        """注册全局进度监听器（同步函数，应只做轻量的标记工作）"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[str, Optional[UploadProgress]], None]):
+        """注销全局进度监听器"""
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+    
+    def _notify_listeners(self, file_path: str, progress: Optional[UploadProgress]):
+        """通知全局监听器"""
+        for listener in list(self._listeners):
+            try:
+                listener(file_path, progress)
+            except Exception as e:
+                print(f"进度监听器异常: {e}")
+    
     def register_callback(
         self,
         file_path: str,
@@ -237,6 +268,7 @@ class UploadProgressManager:
     
     async def _trigger_callbacks(self, file_path: str, progress: UploadProgress):
         """触发所有回调"""
+        self._notify_listeners(file_path, progress)
         if file_path in self._callbacks:
             for callback in self._callbacks[file_path]:
                 try:
@@ -248,6 +280,26 @@ class UploadProgressManager:
                     print(f"进度回调异常: {e}")
 
 
+def _publish_to_progress_bus(file_path: str, progress: Optional[UploadProgress]):
+    """将上传进度转发到统一进度总线"""
+    from services.common.progress_bus import get_progress_bus, KIND_UPLOAD
+    
+    bus = get_progress_bus()
+    if progress is None:
+        bus.remove(KIND_UPLOAD, file_path)
+        return
+    bus.publish(
+        KIND_UPLOAD, file_path,
+        status=progress.status.value,
+        current_bytes=progress.uploaded_bytes,
+        total_bytes=progress.total_bytes,
+        percent=progress.percentage,
+        name=progress.file_name,
+        error=progress.error_message,
+        is_quick_upload=progress.is_quick_upload
+    )
+
+
 # 全局管理器实例
 _progress_manager: Optional[UploadProgressManager] = None
 
@@ -257,5 +309,6 @@ def get_progress_manager() -> UploadProgressManager:
     global _progress_manager
     if _progress_manager is None:
         _progress_manager = UploadProgressManager()
+        _progress_manager.add_listener(_publish_to_progress_bus)
     return _progress_manager
 
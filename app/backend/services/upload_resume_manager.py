@@ -2,14 +2,46 @@
 115上传断点续传管理器
 
 参考fake115uploader的断点续传设计
+
+会话保存在单个 SQLite 文件中（每个会话一行，已上传分片用位图表示）：
+1. 分片进度先记录在内存中，按分片数或时间间隔批量写入（检查点），不再每个分片重写一次文件
+2. 列出会话只需一次查询，过期清理按 updated_at 索引删除
+3. 旧版本每个会话一个 JSON 文件的目录会在首次打开时导入
 """
-import json
-import os
-import hashlib
-from typing import Dict, Any, Optional, List
-from datetime import datetime
 import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, Any, Iterable, Optional, List
+
+from log_manager import get_logger
+
+logger = get_logger(__name__)
+
+
+def encode_parts(parts: Iterable[int], total_parts: int = 0) -> bytes:
+    """把分片编号（从1开始）编码为位图，第 n 个分片对应第 n-1 位"""
+    parts = [p for p in parts if p >= 1]
+    size = max(total_parts, max(parts, default=0))
+    bitmap = bytearray((size + 7) // 8)
+    for p in parts:
+        bitmap[(p - 1) >> 3] |= 1 << ((p - 1) & 7)
+    return bytes(bitmap)
+
+
+def decode_parts(bitmap: bytes) -> List[int]:
+    """把位图解码为升序的分片编号列表"""
+    parts = []
+    for i, byte in enumerate(bitmap):
+        while byte:
+            low = byte & -byte
+            parts.append(i * 8 + low.bit_length())
+            byte ^= low
+    return parts
 
 
 class UploadSession:
@@ -30,11 +62,44 @@ class UploadSession:
         self.file_sha1 = file_sha1
         self.target_dir_id = target_dir_id
         self.total_parts = total_parts
-        self.uploaded_parts: List[int] = []  # 已上传的分片编号
+        self._bitmap = bytearray()  # 已上传的分片位图
+        self._uploaded_count = 0
         self.upload_id: str = ""  # OSS multipart upload ID
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
     
+    @property
+    def uploaded_parts(self) -> List[int]:
+        """已上传的分片编号（升序）"""
+        return decode_parts(self._bitmap)
+    
+    @uploaded_parts.setter
+    def uploaded_parts(self, parts: Iterable[int]):
+        self._bitmap = bytearray(encode_parts(parts))
+        self._uploaded_count = sum(bin(b).count('1') for b in self._bitmap)
+    
+    def mark_uploaded(self, part_number: int) -> bool:
+        """标记分片已上传，返回是否为新完成的分片"""
+        if part_number < 1:
+            return False
+        index, bit = (part_number - 1) >> 3, 1 << ((part_number - 1) & 7)
+        if index >= len(self._bitmap):
+            self._bitmap.extend(bytes(index + 1 - len(self._bitmap)))
+        if self._bitmap[index] & bit:
+            return False
+        self._bitmap[index] |= bit
+        self._uploaded_count += 1
+        return True
+    
+    def is_uploaded(self, part_number: int) -> bool:
+        """分片是否已上传"""
+        index = (part_number - 1) >> 3
+        return (
+            part_number >= 1
+            and index < len(self._bitmap)
+            and bool(self._bitmap[index] & (1 << ((part_number - 1) & 7)))
+        )
+    
     def to_dict(self) -> dict:
         """序列化为字典"""
         return {
@@ -73,19 +138,54 @@ class UploadSession:
         """获取上传进度（0-100）"""
         if self.total_parts == 0:
             return 0.0
-        return (len(self.uploaded_parts) / self.total_parts) * 100
+        return (self._uploaded_count / self.total_parts) * 100
     
     def is_complete(self) -> bool:
         """是否已完成"""
-        return self.total_parts > 0 and len(self.uploaded_parts) == self.total_parts
+        return self.total_parts > 0 and self._uploaded_count == self.total_parts
     
     def get_pending_parts(self) -> List[int]:
         """获取待上传的分片列表"""
         if self.total_parts == 0:
             return []
-        all_parts = set(range(1, self.total_parts + 1))
-        uploaded = set(self.uploaded_parts)
-        return sorted(list(all_parts - uploaded))
+        return [p for p in range(1, self.total_parts + 1) if not self.is_uploaded(p)]
+
+
+_COLUMNS = (
+    "session_id, file_path, file_size, file_sha1, target_dir_id, "
+    "total_parts, parts_bitmap, upload_id, created_at, updated_at"
+)
+
+
+def _to_row(session: UploadSession) -> tuple:
+    return (
+        session.session_id,
+        session.file_path,
+        session.file_size,
+        session.file_sha1,
+        session.target_dir_id,
+        session.total_parts,
+        bytes(session._bitmap),
+        session.upload_id,
+        session.created_at.timestamp(),
+        session.updated_at.timestamp(),
+    )
+
+
+def _from_row(row: tuple) -> UploadSession:
+    session = UploadSession(
+        session_id=row[0],
+        file_path=row[1],
+        file_size=row[2],
+        file_sha1=row[3],
+        target_dir_id=row[4],
+        total_parts=row[5]
+    )
+    session.uploaded_parts = decode_parts(row[6] or b'')
+    session.upload_id = row[7] or ''
+    session.created_at = datetime.fromtimestamp(row[8])
+    session.updated_at = datetime.fromtimestamp(row[9])
+    return session
 
 
 class UploadResumeManager:
@@ -93,20 +193,196 @@ class UploadResumeManager:
     上传断点续传管理器
     
     功能：
-    1. 保存上传会话到本地文件
+    1. 保存上传会话到本地 SQLite 文件
     2. 恢复未完成的上传
-    3. 跟踪分片上传进度
+    3. 跟踪分片上传进度（批量检查点）
     4. 清理过期会话
     """
     
-    def __init__(self, storage_dir: str = "./data/upload_sessions"):
+    def __init__(
+        self,
+        storage_dir: str = "./data/upload_sessions",
+        checkpoint_parts: int = 16,
+        checkpoint_interval: float = 5.0
+    ):
+        """
+        Args:
+            storage_dir: 旧版会话目录；数据库保存在同名的 .db 文件中，目录中遗留的 JSON 会话会被导入
+            checkpoint_parts: 累计多少个分片进度后写入一次
+            checkpoint_interval: 进度最长多久写入一次（秒）
+        """
         self.storage_dir = Path(storage_dir)
-        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.storage_dir.with_name(self.storage_dir.name + '.db')
+        self.checkpoint_parts = max(1, checkpoint_parts)
+        self.checkpoint_interval = checkpoint_interval
+        
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-sessions')
         self._lock = asyncio.Lock()
+        # 尚未写入的进度：session_id -> 会话 / 未写入的分片数
+        self._dirty: Dict[str, UploadSession] = {}
+        self._pending_parts: Dict[str, int] = {}
+        self._last_checkpoint = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        self.stats = {
+            'progress_updates': 0,
+            'checkpoints': 0,
+            'rows_written': 0,
+        }
+    
+    # ==================== 存储（在单线程执行器中执行） ====================
+    
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _open(self):
+        if self._conn is not None:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                session_id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_sha1 TEXT,
+                target_dir_id TEXT,
+                total_parts INTEGER NOT NULL DEFAULT 0,
+                parts_bitmap BLOB,
+                upload_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_upload_sessions_updated_at ON upload_sessions (updated_at)")
+        conn.commit()
+        self._conn = conn
+        self._import_legacy()
+    
+    def _import_legacy(self):
+        """
+        导入旧版目录中每个会话一个的 JSON 文件
+        
+        导入成功的文件在提交后删除；无法读取的文件改名为 .bad 保留，不再重复尝试，便于手动排查
+        """
+        if not self.storage_dir.is_dir():
+            return
+        imported = []
+        for session_file in list(self.storage_dir.glob("*.json")):
+            try:
+                with open(session_file, 'r', encoding='utf-8') as f:
+                    session = UploadSession.from_dict(json.load(f))
+                self._conn.execute(
+                    f"INSERT OR IGNORE INTO upload_sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    _to_row(session)
+                )
+                imported.append(session_file)
+            except Exception as e:
+                logger.warning(f"⚠️ 无法读取旧会话文件 {session_file.name}，已改名为 .bad 保留: {e}")
+                try:
+                    session_file.rename(session_file.with_name(session_file.name + '.bad'))
+                except OSError:
+                    pass
+        self._conn.commit()
+        for session_file in imported:
+            session_file.unlink(missing_ok=True)
+        try:
+            self.storage_dir.rmdir()
+        except OSError:
+            pass
+        if imported:
+            logger.info(f"📦 已导入 {len(imported)} 个旧版断点续传会话到 {self.db_path}")
+    
+    def _get(self, session_id: str) -> Optional[tuple]:
+        self._open()
+        return self._conn.execute(
+            f"SELECT {_COLUMNS} FROM upload_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+    
+    def _put_many(self, rows: List[tuple]):
+        self._open()
+        self._conn.executemany(
+            f"""
+            INSERT INTO upload_sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET
+                file_path = excluded.file_path,
+                file_size = excluded.file_size,
+                file_sha1 = excluded.file_sha1,
+                target_dir_id = excluded.target_dir_id,
+                total_parts = excluded.total_parts,
+                parts_bitmap = excluded.parts_bitmap,
+                upload_id = excluded.upload_id,
+                updated_at = excluded.updated_at
+            """,
+            rows
+        )
+        self._conn.commit()
+    
+    def _delete(self, session_id: str):
+        self._open()
+        self._conn.execute("DELETE FROM upload_sessions WHERE session_id = ?", (session_id,))
+        self._conn.commit()
+    
+    def _list(self) -> List[tuple]:
+        self._open()
+        return self._conn.execute(
+            f"SELECT {_COLUMNS} FROM upload_sessions ORDER BY updated_at DESC"
+        ).fetchall()
+    
+    def _delete_expired(self, cutoff: float) -> int:
+        self._open()
+        cursor = self._conn.execute("DELETE FROM upload_sessions WHERE updated_at < ?", (cutoff,))
+        self._conn.commit()
+        return cursor.rowcount
+    
+    def _close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+    
+    # ==================== 检查点 ====================
+    
+    async def flush(self):
+        """把内存中尚未写入的进度写入数据库"""
+        async with self._lock:
+            await self._flush_locked()
+    
+    async def _flush_locked(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        self._pending_parts.clear()
+        self._last_checkpoint = time.monotonic()
+        try:
+            await self._run(self._put_many, [_to_row(s) for s in dirty.values()])
+        except Exception:
+            # 写入失败时保留进度，下次检查点重试
+            for session_id, session in dirty.items():
+                self._dirty.setdefault(session_id, session)
+            raise
+        self.stats['checkpoints'] += 1
+        self.stats['rows_written'] += len(dirty)
+    
+    def _schedule_flush(self):
+        """确保有一个延迟写入任务，保证进度最迟在 checkpoint_interval 后落盘"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+    
+    async def _delayed_flush(self):
+        try:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"写入断点续传进度失败: {e}")
     
-    def _get_session_file(self, session_id: str) -> Path:
-        """获取会话文件路径"""
-        return self.storage_dir / f"{session_id}.json"
+    # ==================== 对外接口 ====================
     
     def _generate_session_id(self, file_path: str, target_dir_id: str) -> str:
         """
@@ -147,69 +423,96 @@ class UploadResumeManager:
     ) -> Optional[UploadSession]:
         """获取现有会话（用于断点续传）"""
         session_id = self._generate_session_id(file_path, target_dir_id)
-        session_file = self._get_session_file(session_id)
-        
-        if not session_file.exists():
-            return None
         
         try:
             async with self._lock:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                return UploadSession.from_dict(data)
+                if session_id in self._dirty:
+                    return self._dirty[session_id]
+                row = await self._run(self._get, session_id)
+            return _from_row(row) if row else None
         except Exception as e:
-            print(f"读取会话失败: {e}")
+            logger.error(f"读取会话失败: {e}")
             return None
     
     async def save_session(self, session: UploadSession):
-        """保存会话"""
+        """保存会话（立即写入）"""
         session.updated_at = datetime.now()
-        session_file = self._get_session_file(session.session_id)
         
         async with self._lock:
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session.to_dict(), f, indent=2, ensure_ascii=False)
+            self._dirty.pop(session.session_id, None)
+            self._pending_parts.pop(session.session_id, None)
+            await self._run(self._put_many, [_to_row(session)])
+        self.stats['rows_written'] += 1
     
     async def update_progress(
         self,
         session: UploadSession,
         part_number: int
     ):
-        """更新上传进度"""
-        if part_number not in session.uploaded_parts:
-            session.uploaded_parts.append(part_number)
-            session.uploaded_parts.sort()
-        await self.save_session(session)
+        """
+        更新上传进度
+        
+        进度先记录在内存中，累计 checkpoint_parts 个分片或距上次写入超过
+        checkpoint_interval 秒时批量写入；会话完成时立即写入
+        """
+        if not session.mark_uploaded(part_number):
+            return
+        session.updated_at = datetime.now()
+        self.stats['progress_updates'] += 1
+        
+        async with self._lock:
+            self._dirty[session.session_id] = session
+            pending = self._pending_parts.get(session.session_id, 0) + 1
+            self._pending_parts[session.session_id] = pending
+            
+            if (
+                pending >= self.checkpoint_parts
+                or session.is_complete()
+                or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+            ):
+                await self._flush_locked()
+            else:
+                self._schedule_flush()
     
     async def delete_session(self, session_id: str):
         """删除会话"""
-        session_file = self._get_session_file(session_id)
-        if session_file.exists():
-            async with self._lock:
-                session_file.unlink()
+        async with self._lock:
+            self._dirty.pop(session_id, None)
+            self._pending_parts.pop(session_id, None)
+            await self._run(self._delete, session_id)
     
     async def list_sessions(self) -> List[UploadSession]:
         """列出所有会话"""
-        sessions = []
-        for session_file in self.storage_dir.glob("*.json"):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                sessions.append(UploadSession.from_dict(data))
-            except Exception:
-                continue
-        return sessions
-    
-    async def clean_expired_sessions(self, days: int = 7):
-        """清理过期会话（超过N天未更新）"""
-        from datetime import timedelta
-        
-        cutoff = datetime.now() - timedelta(days=days)
-        sessions = await self.list_sessions()
-        
-        for session in sessions:
-            if session.updated_at < cutoff:
-                await self.delete_session(session.session_id)
+        await self.flush()
+        rows = await self._run(self._list)
+        return [_from_row(row) for row in rows]
+    
+    async def clean_expired_sessions(self, days: int = 7) -> int:
+        """清理过期会话（超过N天未更新），返回删除的数量"""
+        await self.flush()
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        removed = await self._run(self._delete_expired, cutoff)
+        if removed:
+            logger.info(f"🧹 已清理 {removed} 个过期的断点续传会话")
+        return removed
+    
+    async def close(self):
+        """写入剩余进度并关闭数据库"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        try:
+            await self.flush()
+        finally:
+            await self._run(self._close)
+            self._executor.shutdown(wait=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            'dirty_sessions': len(self._dirty),
+            'db_path': str(self.db_path),
+        }
 
 
 # 全局管理器实例
@@ -222,4 +525,3 @@ def get_resume_manager() -> UploadResumeManager:
     if _resume_manager is None:
         _resume_manager = UploadResumeManager()
     return _resume_manager
-
@@ -0,0 +1,730 @@
+"""
+云盘上传调度器
+
+功能：
+1. 持久化队列：上传任务写入 upload_tasks 表，重启后按 (status, priority, created_at) 索引恢复
+2. 规则间公平：各监控规则轮流出队，单个规则的大批量上传不会独占上传通道
+3. 规则内按优先级 + 文件大小排序（小文件优先，等待过久的任务提前）
+4. 同一目标目录首次上传成功前串行执行，避免并发创建同一远程目录
+5. 全局令牌桶限速（按 WriteToFileStream 数据块计费），支持按时段设置不同限速
+6. 暂停/恢复：暂停后不再启动新任务，进行中的上传在发送下一个数据块前等待
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, desc, update
+
+from log_manager import get_logger
+from timezone_utils import get_user_now
+
+logger = get_logger("upload_scheduler", "enhanced_bot.log")
+
+MB = 1024 * 1024
+
+
+@dataclass
+class ScheduledUpload:
+    """排队中的上传任务"""
+    task_id: int
+    rule_id: Optional[int] = None
+    remote_dir: str = ""
+    priority: int = 0
+    size_bytes: int = 0
+    seq: int = 0
+    not_before: float = 0.0  # 失败重试的最早开始时间（monotonic）
+    enqueued_at: float = field(default_factory=time.monotonic)
+    ticket: int = 0  # 就绪堆中条目的版本，暂缓/放回时递增使旧条目失效
+
+
+@dataclass
+class _RuleQueue:
+    """单个规则的就绪任务：按 (优先级, 大小) 与按等待时间各一个堆"""
+    by_priority: List[tuple] = field(default_factory=list)  # (-priority, size, seq, task_id, ticket)
+    by_age: List[tuple] = field(default_factory=list)       # (enqueued_at, seq, task_id, ticket)
+
+
+class TokenBucket:
+    """
+    字节令牌桶
+    
+    允许透支：发送方先扣除整个数据块，再按欠额休眠，
+    多个上传并发扣除时总速率仍不超过设定值
+    """
+    
+    def __init__(self, rate: float = 0, burst_seconds: float = 1.0):
+        """
+        Args:
+            rate: 速率（字节/秒），0 表示不限制
+            burst_seconds: 桶容量（按速率计的秒数）
+        """
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+    
+    @property
+    def capacity(self) -> float:
+        return self.rate * self.burst_seconds
+    
+    def set_rate(self, rate: float):
+        if rate == self.rate:
+            return
+        self._refill()
+        self.rate = max(0.0, rate)
+        self._tokens = min(self._tokens, self.capacity)
+    
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def consume(self, nbytes: int) -> float:
+        """扣除令牌，返回调用方需要等待的秒数"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        self._tokens -= nbytes
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+def _parse_clock(value: str) -> int:
+    hours, minutes = str(value).strip().split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"无效时间: {value}")
+    return hours * 60 + minutes
+
+
+def parse_bandwidth_schedule(raw: Any) -> List[Tuple[int, int, float]]:
+    """
+    解析分时段限速配置
+    
+    格式：[{"start": "08:00", "end": "23:00", "limit_mbps": 2}, ...]，
+    end 早于 start 表示跨越午夜，limit_mbps 为 0 表示该时段不限速；
+    多个时段重叠时取第一个匹配的
+    
+    Returns:
+        [(起始分钟, 结束分钟, 限速字节/秒)]
+    
+    Raises:
+        ValueError: 配置格式错误
+    """
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"分时段限速不是有效的 JSON: {e}")
+    if not isinstance(raw, list):
+        raise ValueError("分时段限速应为数组")
+    
+    windows = []
+    for item in raw:
+        if not isinstance(item, dict):
+            raise ValueError("分时段限速的每一项应为对象")
+        try:
+            start = _parse_clock(item['start'])
+            end = _parse_clock(item['end'])
+            limit = float(item.get('limit_mbps', 0) or 0)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"分时段限速配置错误: {item} ({e})")
+        if limit < 0:
+            raise ValueError(f"限速不能为负数: {item}")
+        windows.append((start, end, limit * MB))
+    return windows
+
+
+class UploadScheduler:
+    """
+    云盘上传调度器
+    
+    调度循环在以下条件都满足时启动新任务：未暂停、当前并发 < 上限、
+    目标目录未被其他首次上传占用、未处于重试退避期。
+    各规则轮流出队，规则内按 (-priority, size, seq) 排序
+    """
+    
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        bandwidth_limit: int = 0,
+        schedule: Optional[List[Tuple[int, int, float]]] = None,
+        starvation_seconds: float = 600,
+        retry_delay: float = 30,
+        poll_interval: float = 5.0
+    ):
+        """
+        Args:
+            max_concurrent: 最大并发上传数
+            bandwidth_limit: 全局上传限速（字节/秒），0 表示不限制
+            schedule: 分时段限速（见 parse_bandwidth_schedule），时段内覆盖全局限速
+            starvation_seconds: 排队超过该时间的任务不再让位给更小的文件
+            retry_delay: 失败重试的基础退避时间（秒），按尝试次数指数增长
+            poll_interval: 无事件时重新评估队列（退避到期、时段切换）的间隔（秒）
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.bandwidth_limit = bandwidth_limit
+        self.schedule = schedule or []
+        self.starvation_seconds = starvation_seconds
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        
+        # 每个规则的就绪任务堆，通过 seq/ticket 惰性删除过期条目
+        self._queues: Dict[Optional[int], _RuleQueue] = {}
+        self._rotation: Deque[Optional[int]] = deque()
+        # 暂缓的任务：退避中的按到期时间排序，等待目录的按目录分组，到期/目录空闲时才放回就绪堆
+        self._delayed: List[tuple] = []  # (not_before, seq, task_id)
+        self._dir_waiting: Dict[str, List[tuple]] = {}  # remote_dir -> [(seq, task_id)]
+        self._entries: Dict[int, ScheduledUpload] = {}
+        self._seq = itertools.count()
+        
+        self._active: Dict[int, ScheduledUpload] = {}
+        self._active_tasks: Dict[int, asyncio.Task] = {}
+        self._confirmed_dirs: Set[str] = set()
+        
+        self._bucket = TokenBucket()
+        self._limit_checked_at = 0.0
+        self._resume_event: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self.is_paused = False
+        
+        self.stats = {
+            "submitted": 0,
+            "started": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "restored": 0,
+            "bytes_uploaded": 0,
+            "throttle_wait_seconds": 0.0,
+        }
+    
+    # ==================== 生命周期 ====================
+    
+    async def start(self):
+        """启动调度循环"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._resume_event = asyncio.Event()
+        if not self.is_paused:
+            self._resume_event.set()
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        logger.info(
+            f"✅ 上传调度器已启动（并发 {self.max_concurrent}，限速 {self._format_bandwidth(self.current_limit())}）"
+        )
+    
+    async def stop(self):
+        """停止调度循环并取消正在执行的上传（数据库中的任务下次启动时恢复）"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try:
+                await self._dispatch_task
+            except asyncio.CancelledError:
+                pass
+        
+        for task in list(self._active_tasks.values()):
+            task.cancel()
+        self._active_tasks.clear()
+        self._active.clear()
+        logger.info("✅ 上传调度器已停止")
+    
+    def configure(
+        self,
+        max_concurrent: Optional[int] = None,
+        bandwidth_limit: Optional[int] = None,
+        schedule: Optional[List[Tuple[int, int, float]]] = None
+    ):
+        """更新并发数与限速（配置变更后调用）"""
+        if max_concurrent is not None:
+            self.max_concurrent = max(1, max_concurrent)
+        if bandwidth_limit is not None:
+            self.bandwidth_limit = max(0, bandwidth_limit)
+        if schedule is not None:
+            self.schedule = schedule
+        self._limit_checked_at = 0.0
+        self._wake()
+    
+    def pause(self):
+        """暂停上传：不再启动新任务，进行中的上传在下一个数据块前等待"""
+        if self.is_paused:
+            return
+        self.is_paused = True
+        if self._resume_event:
+            self._resume_event.clear()
+        logger.info("⏸️ 上传调度器已暂停")
+    
+    def resume(self):
+        """恢复上传"""
+        if not self.is_paused:
+            return
+        self.is_paused = False
+        if self._resume_event:
+            self._resume_event.set()
+        self._wake()
+        logger.info("▶️ 上传调度器已恢复")
+    
+    # ==================== 排队 ====================
+    
+    def submit(
+        self,
+        task_id: int,
+        rule_id: Optional[int] = None,
+        remote_dir: str = "",
+        priority: int = 0,
+        size_bytes: int = 0,
+        delay: float = 0
+    ) -> bool:
+        """
+        提交上传任务（任务须已写入 upload_tasks 表）
+        
+        Args:
+            task_id: 上传任务ID
+            rule_id: 监控规则ID（公平调度的分组）
+            remote_dir: 目标目录
+            priority: 优先级（-10 到 10，越大越先执行）
+            size_bytes: 文件大小，同优先级时小文件先上传
+            delay: 延迟多少秒后才可执行（重试退避）
+        
+        Returns:
+            bool: 是否加入队列（正在上传的任务不会重复加入）
+        """
+        if task_id in self._active:
+            return False
+        entry = ScheduledUpload(
+            task_id=task_id,
+            rule_id=rule_id,
+            remote_dir=remote_dir or "",
+            priority=priority or 0,
+            size_bytes=size_bytes or 0,
+            seq=next(self._seq),
+            not_before=time.monotonic() + delay if delay else 0.0
+        )
+        self._push(entry)
+        self.stats["submitted"] += 1
+        self._wake()
+        return True
+    
+    def cancel(self, task_id: int) -> bool:
+        """从队列中移除任务（不影响已经开始的上传）"""
+        return self._entries.pop(task_id, None) is not None
+    
+    def is_queued(self, task_id: int) -> bool:
+        return task_id in self._entries or task_id in self._active
+    
+    async def restore(self, session_factory) -> int:
+        """
+        从数据库恢复上传任务
+        
+        上次运行中断的 uploading 任务重置为 pending，再按 (status, priority, created_at)
+        索引顺序加载排队任务
+        
+        Args:
+            session_factory: 异步会话生成器（如 database.get_db）
+        
+        Returns:
+            int: 恢复的任务数
+        """
+        from models import UploadTask
+        
+        restored = 0
+        async for db in session_factory():
+            await db.execute(
+                update(UploadTask)
+                .where(UploadTask.status == 'uploading')
+                .values(status='pending')
+            )
+            await db.commit()
+            
+            result = await db.execute(
+                select(
+                    UploadTask.id,
+                    UploadTask.monitor_rule_id,
+                    UploadTask.remote_dir,
+                    UploadTask.priority,
+                    UploadTask.file_size
+                )
+                .where(UploadTask.status == 'pending')
+                .order_by(desc(UploadTask.priority), UploadTask.created_at)
+            )
+            for task_id, rule_id, remote_dir, priority, file_size in result.all():
+                if self.is_queued(task_id):
+                    continue
+                self._push(ScheduledUpload(
+                    task_id=task_id,
+                    rule_id=rule_id,
+                    remote_dir=remote_dir or "",
+                    priority=priority or 0,
+                    size_bytes=file_size or 0,
+                    seq=next(self._seq)
+                ))
+                restored += 1
+            break
+        
+        self.stats["restored"] += restored
+        if restored:
+            logger.info(f"🔄 已从数据库恢复 {restored} 个排队中的上传任务")
+            self._wake()
+        return restored
+    
+    def _push(self, entry: ScheduledUpload):
+        self._entries[entry.task_id] = entry
+        if entry.not_before > time.monotonic():
+            heapq.heappush(self._delayed, (entry.not_before, entry.seq, entry.task_id))
+        else:
+            self._make_ready(entry)
+    
+    def _make_ready(self, entry: ScheduledUpload):
+        """把任务放入所属规则的就绪堆"""
+        entry.ticket += 1
+        queue = self._queues.get(entry.rule_id)
+        if queue is None:
+            queue = self._queues[entry.rule_id] = _RuleQueue()
+            self._rotation.append(entry.rule_id)
+        heapq.heappush(queue.by_priority, (-entry.priority, entry.size_bytes, entry.seq, entry.task_id, entry.ticket))
+        heapq.heappush(queue.by_age, (entry.enqueued_at, entry.seq, entry.task_id, entry.ticket))
+    
+    def _park(self, entry: ScheduledUpload, now: float):
+        """暂缓暂不可执行的任务（就绪堆中的条目随 ticket 递增失效）"""
+        entry.ticket += 1
+        if entry.not_before > now:
+            heapq.heappush(self._delayed, (entry.not_before, entry.seq, entry.task_id))
+        else:
+            self._dir_waiting.setdefault(entry.remote_dir, []).append((entry.seq, entry.task_id))
+    
+    def _queued_entry(self, seq: int, task_id: int) -> Optional[ScheduledUpload]:
+        entry = self._entries.get(task_id)
+        return entry if entry is not None and entry.seq == seq else None
+    
+    def _release_delayed(self, now: float):
+        """退避到期的任务放回就绪堆"""
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, task_id = heapq.heappop(self._delayed)
+            entry = self._queued_entry(seq, task_id)
+            if entry is not None:
+                self._make_ready(entry)
+    
+    def _release_dir(self, remote_dir: str):
+        """目录的上传结束后，等待该目录的任务放回就绪堆"""
+        for seq, task_id in self._dir_waiting.pop(remote_dir, []):
+            entry = self._queued_entry(seq, task_id)
+            if entry is not None:
+                self._make_ready(entry)
+    
+    # ==================== 调度 ====================
+    
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+    
+    async def _dispatch_loop(self):
+        """调度循环：有事件时立即调度，否则定期检查退避到期与时段切换"""
+        while self.is_running:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                
+                self._refresh_limit()
+                self._dispatch()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ 上传调度失败: {e}", exc_info=True)
+                await asyncio.sleep(1)
+    
+    def _dispatch(self):
+        while not self.is_paused and len(self._active) < self.max_concurrent and self._entries:
+            entry = self._pick_next()
+            if entry is None:
+                break
+            self._launch(entry)
+    
+    def _pick_next(self) -> Optional[ScheduledUpload]:
+        """按规则轮转选出下一个可执行的任务，选中的规则移到队尾"""
+        now = time.monotonic()
+        self._release_delayed(now)
+        for _ in range(len(self._rotation)):
+            rule_id = self._rotation[0]
+            self._rotation.rotate(-1)
+            
+            entry = self._peek_eligible(self._queues[rule_id], now)
+            if entry is None:
+                # 就绪堆已空：移出轮转，暂缓的任务放回时重新加入
+                self._rotation.pop()
+                del self._queues[rule_id]
+                continue
+            
+            # 另一个堆中的副本随任务出队失效
+            return self._entries.pop(entry.task_id)
+        return None
+    
+    def _peek_eligible(self, queue: _RuleQueue, now: float) -> Optional[ScheduledUpload]:
+        """
+        返回规则队列中下一个可执行的任务
+        
+        正常按堆顺序（优先级、大小）选取；等待最久的任务排队超过 starvation_seconds 时
+        优先执行它，避免大文件被持续到来的小文件饿死
+        """
+        oldest = self._ready_top(queue.by_age, 2, now)
+        if oldest is not None and now - oldest.enqueued_at >= self.starvation_seconds:
+            return oldest
+        return self._ready_top(queue.by_priority, 3, now)
+    
+    def _ready_top(self, heap: List[tuple], id_index: int, now: float) -> Optional[ScheduledUpload]:
+        """清理堆顶的过期条目、暂缓不可执行的任务，返回第一个可执行的任务"""
+        while heap:
+            item = heap[0]
+            entry = self._queued_entry(item[id_index - 1], item[id_index])
+            if entry is None or entry.ticket != item[-1]:
+                heapq.heappop(heap)
+                continue
+            if entry.not_before > now or self._dir_busy(entry.remote_dir):
+                heapq.heappop(heap)
+                self._park(entry, now)
+                continue
+            return entry
+        return None
+    
+    def _dir_busy(self, remote_dir: str) -> bool:
+        """目录尚未确认存在且已有任务在向其上传（首个上传负责创建目录）"""
+        if not remote_dir or remote_dir in self._confirmed_dirs:
+            return False
+        return any(e.remote_dir == remote_dir for e in self._active.values())
+    
+    def _launch(self, entry: ScheduledUpload):
+        self._active[entry.task_id] = entry
+        self._active_tasks[entry.task_id] = asyncio.create_task(self._run(entry))
+        self.stats["started"] += 1
+    
+    async def _run(self, entry: ScheduledUpload):
+        job = None
+        try:
+            job = await self._begin(entry.task_id)
+            if job is None:
+                return
+            
+            from services.clouddrive2_uploader import get_clouddrive2_uploader
+            
+            logger.info(f"⬆️ 调度上传: {job['file_name']} (ID: {entry.task_id}, 第 {job['attempts']} 次)")
+            try:
+                result = await get_clouddrive2_uploader().upload_file(
+                    file_path=job['local_path'],
+                    target_dir=job['remote_dir'],
+                    enable_quick_upload=True,
+                    enable_resume=True,
+                    throttle=self.throttle
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = {'success': False, 'message': str(e)}
+            await self._finish(entry, job, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ 上传任务执行异常 (ID: {entry.task_id}): {e}", exc_info=True)
+        finally:
+            if self._active.get(entry.task_id) is entry:
+                self._active.pop(entry.task_id, None)
+                self._active_tasks.pop(entry.task_id, None)
+            if entry.remote_dir:
+                self._release_dir(entry.remote_dir)
+            self._wake()
+    
+    async def _begin(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """标记任务开始，返回执行所需的字段（任务已不存在或不是 pending 时返回 None）"""
+        from database import get_db
+        from models import UploadTask
+        
+        async for db in get_db():
+            task = await db.get(UploadTask, task_id)
+            if task is None or task.status != 'pending':
+                return None
+            task.status = 'uploading'
+            task.started_at = get_user_now()
+            task.attempts = (task.attempts or 0) + 1
+            job = {
+                'media_file_id': task.media_file_id,
+                'local_path': task.local_path,
+                'remote_dir': task.remote_dir,
+                'file_name': task.file_name,
+                'file_size': task.file_size or 0,
+                'attempts': task.attempts,
+                'max_attempts': task.max_attempts or 1,
+            }
+            await db.commit()
+            return job
+        return None
+    
+    async def _finish(self, entry: ScheduledUpload, job: Dict[str, Any], result: Dict[str, Any]):
+        """写回上传结果：成功/最终失败同步更新媒体文件记录，可重试的失败按退避重新排队"""
+        from database import get_db
+        from models import UploadTask, MediaFile
+        
+        success = bool(result.get('success'))
+        error = None if success else (result.get('message') or '未知错误')
+        retry = not success and job['attempts'] < job['max_attempts']
+        
+        async for db in get_db():
+            task = await db.get(UploadTask, entry.task_id)
+            if task is None:
+                return
+            now = get_user_now()
+            task.last_error = error
+            if success:
+                task.status = 'success'
+                task.completed_at = now
+            elif retry:
+                task.status = 'pending'
+            else:
+                task.status = 'failed'
+                task.completed_at = now
+            
+            media_file = await db.get(MediaFile, job['media_file_id']) if job['media_file_id'] else None
+            if media_file is not None and not retry:
+                if success:
+                    media_file.is_uploaded_to_cloud = True
+                    media_file.uploaded_at = now
+                    media_file.is_organized = True
+                    media_file.organized_at = now
+                    media_file.organize_failed = False
+                    media_file.organize_error = None
+                else:
+                    media_file.organize_failed = True
+                    media_file.organize_error = f"CloudDrive2上传失败: {error}"
+            await db.commit()
+            break
+        
+        if success:
+            self._confirmed_dirs.add(job['remote_dir'])
+            self.stats["succeeded"] += 1
+            self.stats["bytes_uploaded"] += job['file_size']
+            logger.info(f"✅ 上传完成: {job['file_name']} → {job['remote_dir']}")
+        elif retry:
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+            self.stats["retried"] += 1
+            # 任务此时仍在执行列表中，直接重新入队（执行结束后唤醒调度）
+            self._push(ScheduledUpload(
+                task_id=entry.task_id,
+                rule_id=entry.rule_id,
+                remote_dir=entry.remote_dir,
+                priority=entry.priority,
+                size_bytes=entry.size_bytes,
+                seq=next(self._seq),
+                not_before=time.monotonic() + delay,
+                enqueued_at=entry.enqueued_at
+            ))
+            logger.warning(
+                f"⚠️ 上传失败，{delay:.0f} 秒后重试 ({job['attempts']}/{job['max_attempts']}): "
+                f"{job['file_name']} - {error}"
+            )
+        else:
+            self.stats["failed"] += 1
+            logger.error(f"❌ 上传失败: {job['file_name']} - {error}")
+    
+    # ==================== 限速 ====================
+    
+    async def throttle(self, nbytes: int):
+        """调度任务的数据块回调：暂停时等待恢复，然后按令牌桶限速"""
+        if self._resume_event and not self._resume_event.is_set():
+            await self._resume_event.wait()
+        await self.limit_bandwidth(nbytes)
+    
+    async def limit_bandwidth(self, nbytes: int):
+        """按全局令牌桶限速（非调度的上传也计入同一带宽预算）"""
+        self._refresh_limit()
+        wait = self._bucket.consume(nbytes)
+        if wait > 0:
+            self.stats["throttle_wait_seconds"] += wait
+            await asyncio.sleep(wait)
+    
+    def current_limit(self) -> float:
+        """当前时段生效的限速（字节/秒），0 表示不限制"""
+        if self.schedule:
+            now = get_user_now()
+            minute = now.hour * 60 + now.minute
+            for start, end, limit in self.schedule:
+                if start == end:
+                    return limit
+                if start < end and start <= minute < end:
+                    return limit
+                if start > end and (minute >= start or minute < end):
+                    return limit
+        return self.bandwidth_limit
+    
+    def _refresh_limit(self):
+        """按时段更新令牌桶速率（每秒最多计算一次）"""
+        now = time.monotonic()
+        if now - self._limit_checked_at < 1.0:
+            return
+        self._limit_checked_at = now
+        self._bucket.set_rate(self.current_limit())
+    
+    @staticmethod
+    def _format_bandwidth(limit: float) -> str:
+        if not limit:
+            return "不限"
+        return f"{limit / MB:.1f}MB/s"
+    
+    # ==================== 统计 ====================
+    
+    def get_queue_status(self) -> Dict[str, int]:
+        """获取各规则排队数量"""
+        status: Dict[str, int] = {}
+        for entry in self._entries.values():
+            key = str(entry.rule_id) if entry.rule_id is not None else "manual"
+            status[key] = status.get(key, 0) + 1
+        return status
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "throttle_wait_seconds": round(self.stats["throttle_wait_seconds"], 1),
+            "queued": len(self._entries),
+            "queued_bytes": sum(e.size_bytes for e in self._entries.values()),
+            "backing_off": sum(1 for e in self._entries.values() if e.not_before > now),
+            "rules": self.get_queue_status(),
+            "active": len(self._active),
+            "max_concurrent": self.max_concurrent,
+            "bandwidth_limit_mbps": round(self.bandwidth_limit / MB, 2),
+            "current_limit_mbps": round(self.current_limit() / MB, 2),
+            "schedule": [
+                {"start": f"{s // 60:02d}:{s % 60:02d}", "end": f"{e // 60:02d}:{e % 60:02d}",
+                 "limit_mbps": round(limit / MB, 2)}
+                for s, e, limit in self.schedule
+            ],
+            "is_running": self.is_running,
+            "is_paused": self.is_paused,
+        }
+
+
+# 全局单例
+_upload_scheduler: Optional[UploadScheduler] = None
+
+
+def get_upload_scheduler() -> UploadScheduler:
+    """获取上传调度器单例"""
+    global _upload_scheduler
+    if _upload_scheduler is None:
+        _upload_scheduler = UploadScheduler()
+    return _upload_scheduler
@@ -6,7 +6,7 @@ import asyncio
 import threading
 import logging
 import time
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, FrozenSet
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
@@ -23,9 +23,15 @@ from log_manager import get_logger
 from services.message_context import MessageContext
 from services.message_dispatcher import get_message_dispatcher
 from services.resource_monitor_service import ResourceMonitorProcessor
+from services.common.rule_events import (
+    get_rule_event_bus, RuleChangeEvent, KIND_FORWARD, KIND_MEDIA_MONITOR, KIND_RESOURCE_MONITOR
+)
 
 logger = logging.getLogger(__name__)
 
+# 客户端需要索引的规则类型（决定监听哪些聊天）
+RULE_INDEX_KINDS = (KIND_FORWARD, KIND_MEDIA_MONITOR, KIND_RESOURCE_MONITOR)
+
 
 class LoginErrorHandler:
     """统一处理 Telegram 登录错误"""
@@ -225,6 +231,13 @@ class TelegramClientManager:
         self.regex_replacer = RegexReplacer()
         self.monitored_chats = set()
         
+        # 规则索引（在客户端事件循环中由规则变更总线增量维护）
+        # 类型 -> {规则ID: 源聊天ID集合}，以及按聊天ID反查的规则ID列表
+        self._rule_chats: Dict[str, Dict[int, FrozenSet[int]]] = {kind: {} for kind in RULE_INDEX_KINDS}
+        self._chat_rules: Dict[str, Dict[int, List[int]]] = {kind: {} for kind in RULE_INDEX_KINDS}
+        self._forward_rules: Dict[int, ForwardRule] = {}  # 已加载关键词和替换规则
+        self._rule_subscription = None
+        
         # 状态回调
         self.status_callbacks: List[Callable] = []
         
@@ -512,7 +525,10 @@ class TelegramClientManager:
             # 注册消息处理器（资源监控等）
             await self._register_message_processors()
             
-            # 更新监听聊天列表
+            # 先订阅规则变更再全量加载规则索引（加载期间发生的变更会在之后重新应用）
+            self._rule_subscription = get_rule_event_bus().subscribe(
+                f"client.{self.client_id}", self._on_rule_change, kinds=set(RULE_INDEX_KINDS)
+            )
             await self._update_monitored_chats()
             
             # 关键修复：直接使用run_until_disconnected，不包装在任务中
@@ -529,6 +545,14 @@ class TelegramClientManager:
             self._notify_status_change("error", {"error": error_msg})
             raise
         finally:
+            if self._rule_subscription:
+                self._rule_subscription.close()
+                self._rule_subscription = None
+            # 等待本客户端事件循环中的后台任务（转存、离线任务）完成
+            try:
+                await get_message_dispatcher().drain_background(timeout=30)
+            except Exception as e:
+                self.logger.warning(f"等待后台任务完成失败: {e}")
             self.running = False
             self.connected = False
             self._notify_status_change("disconnected", {})
@@ -756,7 +780,7 @@ class TelegramClientManager:
             # 获取消息分发器
             dispatcher = get_message_dispatcher()
             
-            # 注册资源监控处理器（不需要传入数据库会话）
+            # 注册资源监控处理器（不需要传入数据库会话；分发器全局共享，多个客户端只注册一次）
             resource_processor = ResourceMonitorProcessor()
             dispatcher.register(resource_processor)
             self.logger.info("✅ 资源监控处理器已注册")
@@ -811,26 +835,14 @@ class TelegramClientManager:
                 self.logger.debug(f"⏭️ 跳过服务消息: {message.id} (类型: {type(message.action).__name__})")
                 return
                 
-            # 修复聊天ID转换问题 - 更准确的转换逻辑
-            from telethon.tl.types import PeerChannel, PeerChat, PeerUser
-            
-            if isinstance(message.peer_id, PeerChannel):
-                # 超级群组/频道：转换为 -100xxxxxxxxx 格式
-                raw_chat_id = message.peer_id.channel_id
-                chat_id = -1000000000000 - raw_chat_id
-            elif isinstance(message.peer_id, PeerChat):
-                # 普通群组：转换为负数
-                raw_chat_id = message.peer_id.chat_id
-                chat_id = -raw_chat_id
-            else:
-                # 私聊用户：保持正数
-                raw_chat_id = message.peer_id.user_id
-                chat_id = raw_chat_id
+            # 消息上下文只创建一次，后续转发、去重、日志和监控共用其中缓存的派生值
+            context = MessageContext.from_message(message, self, is_edited)
+            chat_id = context.chat_id
             
             # 先检查是否需要监听此聊天，只有监听的才记录INFO级别日志
             if chat_id not in self.monitored_chats:
                 # 不在监听列表，使用DEBUG级别
-                self.logger.debug(f"收到消息但不在监听列表: 原始ID={raw_chat_id}, 转换ID={chat_id}, 消息ID={message.id}")
+                self.logger.debug(f"收到消息但不在监听列表: 转换ID={chat_id}, 消息ID={message.id}")
                 return
             
             # 在监听列表中，记录INFO级别日志
@@ -845,17 +857,17 @@ class TelegramClientManager:
                 if len(rules) > 1:
                     tasks = []
                     for rule in rules:
-                        task = asyncio.create_task(self._process_rule_safe(rule, message, event))
+                        task = asyncio.create_task(self._process_rule_safe(rule, context, event))
                         tasks.append(task)
                     await asyncio.gather(*tasks, return_exceptions=True)
                 else:
                     # 单个规则直接处理
-                    await self._process_rule_safe(rules[0], message, event)
+                    await self._process_rule_safe(rules[0], context, event)
             else:
                 self.logger.debug(f"聊天ID {chat_id} 没有适用的转发规则")
             
             # 2. 统一处理资源监控和媒体监控（带优先级）
-            await self._process_monitors_with_priority(chat_id, message, is_edited)
+            await self._process_monitors_with_priority(context)
                 
             # 性能监控
             processing_time = (time.time() - start_time) * 1000
@@ -865,7 +877,7 @@ class TelegramClientManager:
         except Exception as e:
             self.logger.error(f"消息处理失败: {e}")
     
-    async def _process_monitors_with_priority(self, chat_id: int, message, is_edited: bool = False):
+    async def _process_monitors_with_priority(self, context: MessageContext):
         """
         统一处理资源监控和媒体监控，按优先级执行
         
@@ -873,97 +885,62 @@ class TelegramClientManager:
         1. 先检查是否有资源监控规则，如果有且消息包含链接 → 只处理资源监控
         2. 如果没有链接或没有资源监控规则 → 检查媒体监控规则
         """
+        chat_id = context.chat_id
+        message = context.message
+        
+        # 规则索引中没有监听此聊天的监控规则时无需查询数据库
+        resource_rule_ids = self._chat_rules[KIND_RESOURCE_MONITOR].get(chat_id)
+        media_rule_ids = self._chat_rules[KIND_MEDIA_MONITOR].get(chat_id)
+        if not resource_rule_ids and not media_rule_ids:
+            return
+        
         try:
-            from models import ResourceMonitorRule, MediaMonitorRule
+            from models import MediaMonitorRule
             from sqlalchemy import select
             from services.message_dispatcher import get_message_dispatcher
-            from services.message_context import MessageContext
-            import re
             
-            # 1. 先检查是否有资源监控规则监听此频道
-            has_resource_monitor = False
-            has_links = False
+            # 1. 有资源监控规则监听此频道时，检查消息是否包含链接（提取结果缓存在上下文中，资源监控处理时直接复用）
+            has_links = bool(resource_rule_ids) and bool(context.links)
+            
+            # 2. 根据优先级决定处理方式
+            if has_links:
+                # 优先级1: 有资源监控规则且消息包含链接 → 只处理资源监控
+                self.logger.info(f"📋 检测到资源链接，分发给资源监控处理")
+                dispatcher = get_message_dispatcher()
+                await dispatcher.dispatch(context)
+                # 不再处理媒体监控
+                return
+            
+            # 优先级2: 没有链接或没有资源监控 → 检查媒体监控
+            self.logger.debug(f"📋 未检测到资源链接，检查媒体监控")
+            if not media_rule_ids:
+                return
+            
+            # 检查消息是否包含媒体
+            if not context.has_media:
+                self.logger.debug(f"⏭️ 跳过媒体监控规则 {media_rule_ids}：消息不包含媒体")
+                return
             
             async for db in get_db():
-                # 检查资源监控规则
-                resource_rules_result = await db.execute(
-                    select(ResourceMonitorRule).where(
-                        ResourceMonitorRule.is_active == True
-                    )
-                )
-                resource_rules = resource_rules_result.scalars().all()
-                
-                # 检查是否有规则监听此频道
-                import json
-                for rule in resource_rules:
-                    source_chats = json.loads(rule.source_chats) if rule.source_chats else []
-                    if str(chat_id) in source_chats:
-                        has_resource_monitor = True
-                        
-                        # 检查消息是否包含链接
-                        if hasattr(message, 'text') and message.text:
-                            # 检测各类资源链接
-                            magnet_pattern = r'magnet:\?xt=urn:btih:[a-zA-Z0-9]+'
-                            pan115_pattern = r'https?://(?:115\.com|115cdn\.com)/s/[a-zA-Z0-9]+(?:\?password=[a-zA-Z0-9]+)?'
-                            ed2k_pattern = r'ed2k://\|file\|[^|]+\|[0-9]+\|[a-fA-F0-9]+\|'
-                            
-                            if (re.search(magnet_pattern, message.text) or 
-                                re.search(pan115_pattern, message.text) or 
-                                re.search(ed2k_pattern, message.text)):
-                                has_links = True
-                                break
-                        break
-                
-                # 2. 根据优先级决定处理方式
-                if has_resource_monitor and has_links:
-                    # 优先级1: 有资源监控规则且消息包含链接 → 只处理资源监控
-                    self.logger.info(f"📋 检测到资源链接，分发给资源监控处理")
-                    context = MessageContext(
-                        message=message,
-                        client_manager=self,
-                        chat_id=chat_id,
-                        is_edited=is_edited
-                    )
-                    dispatcher = get_message_dispatcher()
-                    await dispatcher.dispatch(context)
-                    # 不再处理媒体监控
-                    return
-                
-                # 优先级2: 没有链接或没有资源监控 → 检查媒体监控
-                self.logger.debug(f"📋 未检测到资源链接，检查媒体监控")
-                
-                # 查找适用的媒体监控规则
+                # 只按ID读取索引中匹配的媒体监控规则
                 media_rules_result = await db.execute(
                     select(MediaMonitorRule).where(
-                        MediaMonitorRule.is_active == True,
-                        MediaMonitorRule.client_id == self.client_id
-                    )
+                        MediaMonitorRule.id.in_(media_rule_ids),
+                        MediaMonitorRule.is_active == True
+                    ).order_by(MediaMonitorRule.id)
                 )
                 media_rules = media_rules_result.scalars().all()
-                
-                for rule in media_rules:
-                    source_chats = json.loads(rule.source_chats) if rule.source_chats else []
-                    
-                    if str(chat_id) in source_chats:
-                        # 检查消息是否包含媒体
-                        has_media = (
-                            hasattr(message, 'media') and message.media is not None and
-                            not (hasattr(message.media, '__class__') and 
-                                 message.media.__class__.__name__ == 'MessageMediaWebPage')
-                        )
-                        
-                        if not has_media:
-                            self.logger.debug(f"⏭️ 跳过媒体监控规则 {rule.name}：消息不包含媒体")
-                            continue
-                        
-                        self.logger.info(f"📹 触发媒体监控规则: {rule.name} (ID: {rule.id})")
-                        
-                        # 处理媒体消息
-                        from services.media_monitor_service import get_media_monitor_service
-                        media_monitor = get_media_monitor_service()
-                        await media_monitor.process_message(self.client, message, rule.id, client_wrapper=self)
-                
                 break
+            
+            from services.media_monitor_service import get_media_monitor_service
+            media_monitor = get_media_monitor_service()
+            for rule in media_rules:
+                self.logger.info(f"📹 触发媒体监控规则: {rule.name} (ID: {rule.id})")
+                
+                # 处理媒体消息
+                await media_monitor.process_message(
+                    self.client, message, rule.id, client_wrapper=self, context=context
+                )
                 
         except Exception as e:
             self.logger.error(f"监控处理失败: {e}", exc_info=True)
@@ -1019,42 +996,25 @@ class TelegramClientManager:
             traceback.print_exc()
     
     async def _get_applicable_rules(self, chat_id: int) -> List[ForwardRule]:
-        """获取适用的转发规则"""
-        try:
-            async for db in get_db():
-                from sqlalchemy import select
-                from sqlalchemy.orm import selectinload
-                
-                stmt = select(ForwardRule).options(
-                    selectinload(ForwardRule.keywords),
-                    selectinload(ForwardRule.replace_rules)
-                ).where(
-                    ForwardRule.source_chat_id == chat_id,
-                    ForwardRule.is_active == True
-                )
-                
-                result = await db.execute(stmt)
-                rules = result.scalars().all()
-                return list(rules)
-                
-        except Exception as e:
-            self.logger.error(f"获取转发规则失败: {e}")
-            return []
+        """获取适用的转发规则（来自规则索引，规则变更时由总线增量刷新）"""
+        rule_ids = self._chat_rules[KIND_FORWARD].get(chat_id, ())
+        return [self._forward_rules[rule_id] for rule_id in rule_ids if rule_id in self._forward_rules]
     
-    async def _process_rule_safe(self, rule: ForwardRule, message, event):
+    async def _process_rule_safe(self, rule: ForwardRule, context: MessageContext, event):
         """安全的规则处理包装器"""
         try:
-            await self._process_rule(rule, message, event)
+            await self._process_rule(rule, context, event)
         except Exception as e:
             self.logger.error(f"处理规则 {rule.id}({rule.name}) 失败: {e}")
             # 记录错误日志
             try:
-                await self._log_message(rule.id, message, "failed", str(e), rule.name)
+                await self._log_message(rule.id, context, "failed", str(e), rule.name)
             except Exception as log_error:
                 self.logger.error(f"记录错误日志失败: {log_error}")
     
-    async def _process_rule(self, rule: ForwardRule, message, event):
+    async def _process_rule(self, rule: ForwardRule, context: MessageContext, event):
         """处理单个转发规则"""
+        message = context.message
         try:
             # 消息类型检查
             if not self._check_message_type(rule, message):
@@ -1067,7 +1027,7 @@ class TelegramClientManager:
             # 【新功能】发送者过滤检查
             if getattr(rule, 'enable_sender_filter', False):
                 from utils.message_deduplicator import SenderFilter
-                sender_info = SenderFilter.get_sender_info(message)
+                sender_info = context.sender_info
                 is_allowed = SenderFilter.is_sender_allowed(
                     sender_info['id'],
                     sender_info['username'],
@@ -1080,26 +1040,17 @@ class TelegramClientManager:
                     return
             
             # 获取消息文本（对于媒体消息使用caption）
-            message_text = message.text or message.message or ""
+            message_text = context.text
             
             # 【新功能】消息去重检查
             if getattr(rule, 'enable_deduplication', False):
                 from utils.message_deduplicator import MessageDeduplicator
                 
-                # 计算消息指纹
-                content_hash = MessageDeduplicator.calculate_content_hash(message_text)
-                media_hash = None
-                if message.media and hasattr(message.media, 'id'):
-                    media_type = type(message.media).__name__
-                    media_hash = MessageDeduplicator.calculate_media_hash(
-                        str(message.media.id), media_type
-                    )
-                
-                # 检查是否重复
+                # 检查是否重复（消息指纹在上下文中只计算一次，日志记录时复用）
                 is_duplicate = await MessageDeduplicator.is_duplicate(
                     rule.id,
-                    content_hash,
-                    media_hash,
+                    context.content_hash,
+                    context.media_hash,
                     getattr(rule, 'dedup_time_window', 3600),
                     getattr(rule, 'dedup_check_content', True),
                     getattr(rule, 'dedup_check_media', True)
@@ -1131,11 +1082,11 @@ class TelegramClientManager:
             await self._forward_message(rule, message, text_to_forward)
             
             # 记录日志（使用重试机制，包含新的指纹字段）
-            await self._log_message_with_retry(rule.id, message, "success", None, rule.name, rule.target_chat_id)
+            await self._log_message_with_retry(rule.id, context, "success", None, rule.name, rule.target_chat_id)
             
         except Exception as e:
             self.logger.error(f"规则处理失败: {e}")
-            await self._log_message_with_retry(rule.id, message, "failed", str(e), rule.name)
+            await self._log_message_with_retry(rule.id, context, "failed", str(e), rule.name)
     
     def _check_message_type(self, rule: ForwardRule, message) -> bool:
         """检查消息类型是否符合规则"""
@@ -1380,19 +1331,15 @@ class TelegramClientManager:
                     await self._save_to_log_queue(rule_id, message, status, error_message, rule_name, target_chat_id)
     
     async def _log_message(self, rule_id: int, message, status: str, error_message: str = None, rule_name: str = None, target_chat_id: str = None):
-        """记录消息日志"""
+        """
+        记录消息日志
+        
+        message 可以是原始消息或 MessageContext；传入上下文时直接复用其中已计算的聊天ID、指纹和发送者
+        """
         try:
+            context = MessageContext.ensure(message, self)
+            message = context.message
             async for db in get_db():
-                # 获取聊天ID
-                from telethon.tl.types import PeerChannel, PeerChat, PeerUser
-                
-                if isinstance(message.peer_id, PeerChannel):
-                    source_chat_id = str(-1000000000000 - message.peer_id.channel_id)
-                elif isinstance(message.peer_id, PeerChat):
-                    source_chat_id = str(-message.peer_id.chat_id)
-                else:
-                    source_chat_id = str(message.peer_id.user_id)
-                
                 # 获取规则信息（包括聊天名称）
                 source_chat_name = None
                 target_chat_name = None
@@ -1413,31 +1360,21 @@ class TelegramClientManager:
                     except Exception as e:
                         self.logger.warning(f"获取规则信息失败: {e}")
                 
-                # 【新功能】计算消息指纹
-                from utils.message_deduplicator import MessageDeduplicator, SenderFilter
-                message_text = message.text or message.message or ""
-                content_hash = MessageDeduplicator.calculate_content_hash(message_text)
-                media_hash = None
-                if message.media and hasattr(message.media, 'id'):
-                    media_type = type(message.media).__name__
-                    media_hash = MessageDeduplicator.calculate_media_hash(
-                        str(message.media.id), media_type
-                    )
-                
-                # 提取发送者信息
-                sender_info = SenderFilter.get_sender_info(message)
+                # 【新功能】消息指纹与发送者信息
+                message_text = context.text
+                sender_info = context.sender_info
                 
                 log_entry = MessageLog(
                     rule_id=rule_id,
                     rule_name=rule_name,
-                    source_chat_id=source_chat_id,
+                    source_chat_id=context.source_chat_id,
                     source_chat_name=source_chat_name,
                     source_message_id=message.id,
                     target_chat_id=target_chat_id or "",
                     target_chat_name=target_chat_name,
                     original_text=message_text[:500] if message_text else "",
-                    content_hash=content_hash,
-                    media_hash=media_hash,
+                    content_hash=context.content_hash,
+                    media_hash=context.media_hash,
                     sender_id=sender_info['id'],
                     sender_username=sender_info['username'],
                     status=status,
@@ -1538,78 +1475,124 @@ class TelegramClientManager:
         
         self.logger.info("🛑 日志队列处理任务已停止")
     
+    @staticmethod
+    def _parse_source_chats(raw) -> FrozenSet[int]:
+        """解析监控规则的 source_chats（JSON 字符串、双重编码的 JSON 字符串或列表）"""
+        import json
+        
+        chats = raw
+        for _ in range(2):
+            if isinstance(chats, str):
+                chats = json.loads(chats) if chats else []
+        return frozenset(int(chat_id) for chat_id in chats or [])
+    
+    async def _load_rule_index(self, db, kind: str, rule_id: Optional[int] = None):
+        """
+        从数据库加载一类规则的索引
+        
+        rule_id 为 None 时重新加载该类型的全部活跃规则；否则只查询这一条规则，
+        规则已删除、停用或不属于本客户端时从索引中移除
+        """
+        from sqlalchemy import select
+        from sqlalchemy.orm import selectinload
+        from models import MediaMonitorRule, ResourceMonitorRule
+        
+        if kind == KIND_FORWARD:
+            model = ForwardRule
+            stmt = select(ForwardRule).options(
+                selectinload(ForwardRule.keywords),
+                selectinload(ForwardRule.replace_rules)
+            ).where(ForwardRule.is_active == True)
+        elif kind == KIND_MEDIA_MONITOR:
+            model = MediaMonitorRule
+            stmt = select(MediaMonitorRule).where(
+                MediaMonitorRule.is_active == True,
+                MediaMonitorRule.client_id == self.client_id
+            )
+        else:
+            model = ResourceMonitorRule
+            stmt = select(ResourceMonitorRule).where(ResourceMonitorRule.is_active == True)
+        
+        if rule_id is not None:
+            stmt = stmt.where(model.id == rule_id)
+        result = await db.execute(stmt)
+        rules = result.scalars().all()
+        
+        # 复制后替换，消息处理中读取到的始终是完整的索引
+        entries = {} if rule_id is None else dict(self._rule_chats[kind])
+        forward_rules = {} if rule_id is None else dict(self._forward_rules)
+        if rule_id is not None:
+            entries.pop(rule_id, None)
+            if kind == KIND_FORWARD:
+                forward_rules.pop(rule_id, None)
+        
+        for rule in rules:
+            try:
+                if kind == KIND_FORWARD:
+                    chats = frozenset([int(rule.source_chat_id)])
+                else:
+                    chats = self._parse_source_chats(rule.source_chats)
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"❌ 解析规则 {kind}#{rule.id} 的源聊天失败: {e}")
+                continue
+            entries[rule.id] = chats
+            if kind == KIND_FORWARD:
+                forward_rules[rule.id] = rule
+        
+        self._rule_chats[kind] = entries
+        if kind == KIND_FORWARD:
+            self._forward_rules = forward_rules
+    
+    def _rebuild_monitored_chats(self):
+        """根据规则索引重建按聊天反查的索引和监听聊天列表"""
+        chat_rules: Dict[str, Dict[int, List[int]]] = {}
+        monitored_set = set()
+        for kind, entries in self._rule_chats.items():
+            by_chat: Dict[int, List[int]] = {}
+            for rule_id in sorted(entries):
+                for chat_id in entries[rule_id]:
+                    by_chat.setdefault(chat_id, []).append(rule_id)
+            chat_rules[kind] = by_chat
+            monitored_set.update(by_chat)
+        self._chat_rules = chat_rules
+        self.monitored_chats = monitored_set
+    
     async def _update_monitored_chats(self):
-        """更新监听的聊天列表（包含转发规则、媒体监控规则、资源监控规则）"""
+        """全量加载规则索引并更新监听的聊天列表（包含转发规则、媒体监控规则、资源监控规则）"""
         try:
             async for db in get_db():
-                from sqlalchemy import select, distinct
-                import json
-                
-                monitored_set = set()
-                
-                # 1. 获取所有活跃转发规则的源聊天ID
-                stmt = select(distinct(ForwardRule.source_chat_id)).where(
-                    ForwardRule.is_active == True
-                )
-                result = await db.execute(stmt)
-                forward_chat_ids = result.scalars().all()
-                monitored_set.update(int(chat_id) for chat_id in forward_chat_ids)
-                
-                # 2. 获取所有活跃媒体监控规则的源聊天ID
-                from models import MediaMonitorRule
-                stmt = select(MediaMonitorRule).where(
-                    MediaMonitorRule.is_active == True,
-                    MediaMonitorRule.client_id == self.client_id
-                )
-                result = await db.execute(stmt)
-                media_rules = result.scalars().all()
-                
-                for rule in media_rules:
-                    # 解析 source_chats（可能是JSON字符串或已解析的列表）
-                    if rule.source_chats:
-                        self.logger.info(f"🔍 规则 {rule.id} 的 source_chats 类型: {type(rule.source_chats)}, 值: {repr(rule.source_chats)}")
-                        # 如果是字符串，解析为JSON
-                        if isinstance(rule.source_chats, str):
-                            try:
-                                source_chats = json.loads(rule.source_chats)
-                                self.logger.info(f"✅ JSON第一次解析: {repr(source_chats)}, 类型: {type(source_chats)}")
-                                
-                                # 如果解析结果仍是字符串（双重编码），再解析一次
-                                if isinstance(source_chats, str):
-                                    source_chats = json.loads(source_chats)
-                                    self.logger.info(f"✅ JSON第二次解析: {source_chats}")
-                            except json.JSONDecodeError as e:
-                                self.logger.error(f"❌ JSON解析失败: {e}")
-                                continue
-                        else:
-                            source_chats = rule.source_chats
-                        # 将字符串格式的聊天ID转换为整数
-                        monitored_set.update(int(chat_id) for chat_id in source_chats)
-
-                # 3. 获取所有活跃资源监控规则的源聊天ID
-                from models import ResourceMonitorRule as _RMRule
-                rm_stmt = select(_RMRule).where(_RMRule.is_active == True)
-                rm_result = await db.execute(rm_stmt)
-                rm_rules = rm_result.scalars().all()
-                for rm in rm_rules:
-                    if rm.source_chats:
-                        try:
-                            rm_chats = json.loads(rm.source_chats) if isinstance(rm.source_chats, str) else rm.source_chats
-                            if isinstance(rm_chats, str):
-                                rm_chats = json.loads(rm_chats)
-                        except Exception:
-                            continue
-                        monitored_set.update(int(chat_id) for chat_id in rm_chats)
-                
-                self.monitored_chats = monitored_set
-                self.logger.info(f"🎯 更新监听聊天列表 (转发: {len(forward_chat_ids)}, 媒体监控: {len(media_rules)}, 资源监控: {len(rm_rules)}): {list(self.monitored_chats)}")
+                for kind in RULE_INDEX_KINDS:
+                    await self._load_rule_index(db, kind)
                 break
+            
+            self._rebuild_monitored_chats()
+            self.logger.info(
+                f"🎯 更新监听聊天列表 (转发: {len(self._rule_chats[KIND_FORWARD])}, "
+                f"媒体监控: {len(self._rule_chats[KIND_MEDIA_MONITOR])}, "
+                f"资源监控: {len(self._rule_chats[KIND_RESOURCE_MONITOR])}): {sorted(self.monitored_chats)}"
+            )
                 
         except Exception as e:
             self.logger.error(f"更新监听聊天列表失败: {e}")
             import traceback
             traceback.print_exc()
     
+    async def _on_rule_change(self, event: RuleChangeEvent):
+        """规则变更（在客户端事件循环中执行）：只重新查询变更的规则并更新索引"""
+        async for db in get_db():
+            await self._load_rule_index(db, event.kind, event.rule_id)
+            break
+        
+        before = self.monitored_chats
+        self._rebuild_monitored_chats()
+        added = self.monitored_chats - before
+        removed = before - self.monitored_chats
+        self.logger.info(
+            f"🔄 规则变更 v{event.version}: {event.kind} #{event.rule_id} {event.op}"
+            + (f"，新增监听 {sorted(added)}" if added else "")
+            + (f"，移除监听 {sorted(removed)}" if removed else "")
+        )
+    
     async def send_verification_code(self) -> Dict[str, Any]:
         """发送验证码"""
         try:
@@ -2,7 +2,7 @@
 Utils package for TMC backend
 """
 # 导入日志解析器
-from .log_parser import LogParser, LogAggregator, parse_log_line, parse_log_lines
+from .log_parser import LogParser, LogAggregator, LogColumns, parse_log_line, parse_log_lines
 
 # 导入媒体相关工具
 from .media_metadata import MediaMetadataExtractor
@@ -31,7 +31,7 @@ if os.path.exists(utils_py_path):
     clean_old_files = getattr(_utils_module, 'clean_old_files', None)
 
 __all__ = [
-    'LogParser', 'LogAggregator', 'parse_log_line', 'parse_log_lines', 
+    'LogParser', 'LogAggregator', 'LogColumns', 'parse_log_line', 'parse_log_lines', 
     'setup_logging',
     'MediaMetadataExtractor', 'MediaFilter', 'MessageDeduplicator'
 ]
@@ -3,8 +3,12 @@
 
 提供结构化的日志解析、分类和实体提取功能
 """
+import os
 import re
-from typing import Dict, Any, Optional, List, Set
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, List, Set, Tuple
 from datetime import datetime
 from enum import Enum
 
@@ -345,13 +349,255 @@ class LogParser:
         
         # 关键词检测
         critical_keywords = ['失败', 'failed', '错误', 'error', '异常', 'exception', '崩溃', 'crash']
-        if any(keyword in message.lower() for keyword in critical_keywords):
+        message_lower = message.lower()
+        if any(keyword in message_lower for keyword in critical_keywords):
             score += 15
         
         # 限制在 0-100 范围
         return min(max(score, 0), 100)
 
 
+# 列式存储使用的编码表（数组中只存下标）
+LEVEL_CODES: List[LogLevel] = list(LogLevel)
+ACTION_CODES: List[ActionType] = list(ActionType)
+_LEVEL_INDEX = {level.value: idx for idx, level in enumerate(LEVEL_CODES)}
+_ACTION_INDEX = {action: idx for idx, action in enumerate(ACTION_CODES)}
+
+
+class LogVocabulary:
+    """字符串驻留表 - 将模块名、实体键值映射为整数编码，供多个分段共享"""
+
+    __slots__ = ('modules', 'module_index', 'entities', 'entity_index')
+
+    def __init__(self):
+        self.modules: List[str] = []
+        self.module_index: Dict[str, int] = {}
+        self.entities: List[Tuple[str, Any]] = []
+        self.entity_index: Dict[Tuple[str, Any], int] = {}
+
+    def module_code(self, module: str) -> int:
+        code = self.module_index.get(module)
+        if code is None:
+            code = len(self.modules)
+            self.modules.append(module)
+            self.module_index[module] = code
+        return code
+
+    def entity_code(self, name: str, value: Any) -> int:
+        key = (name, value)
+        code = self.entity_index.get(key)
+        if code is None:
+            code = len(self.entities)
+            self.entities.append(key)
+            self.entity_index[key] = code
+        return code
+
+
+class LogColumns:
+    """
+    列式日志批次
+
+    一次解析，结果保存为紧凑数组：
+    - timestamps: 时间戳（epoch 秒，float64）
+    - levels / actions / severities: 级别、操作类型编码与严重性分数（int8）
+    - modules: 模块编码（int32）
+    - entity_offsets / entity_codes: CSR 格式的实体编码（第 i 行实体为
+      entity_codes[entity_offsets[i]:entity_offsets[i+1]]）
+    - raw: 原始日志行，仅在需要返回完整结构时按行重新解析
+    """
+
+    __slots__ = (
+        'vocab', 'timestamps', 'levels', 'actions', 'severities', 'modules',
+        'entity_offsets', 'entity_codes', 'raw', '_postings'
+    )
+
+    def __init__(self, vocab: Optional[LogVocabulary] = None):
+        self.vocab = vocab or LogVocabulary()
+        self.timestamps = array('d')
+        self.levels = array('b')
+        self.actions = array('b')
+        self.severities = array('b')
+        self.modules = array('i')
+        self.entity_offsets = array('I', [0])
+        self.entity_codes = array('I')
+        self.raw: List[str] = []
+        self._postings: Optional[Dict[int, array]] = None
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def append_lines(self, lines) -> None:
+        """解析并追加日志行（跳过空行）"""
+        parse_ts = _TimestampCache()
+        vocab = self.vocab
+        pattern = LogParser.LOG_PATTERN
+        timestamps, levels, actions = self.timestamps, self.levels, self.actions
+        severities, modules, raw = self.severities, self.modules, self.raw
+        offsets, codes = self.entity_offsets, self.entity_codes
+        unknown_module = vocab.module_code('unknown')
+        info_level = LogLevel.INFO
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            match = pattern.match(line)
+            if match is None:
+                timestamps.append(parse_ts.now())
+                levels.append(_LEVEL_INDEX[info_level.value])
+                actions.append(_ACTION_INDEX[ActionType.UNKNOWN])
+                severities.append(0)
+                modules.append(unknown_module)
+            else:
+                timestamp, level, module, _function, _line_no, message = match.groups()
+                level_code = _LEVEL_INDEX.get(level.upper(), _LEVEL_INDEX[info_level.value])
+                log_level = LEVEL_CODES[level_code]
+                action_type = LogParser._classify_action(message, log_level)
+                timestamps.append(parse_ts(timestamp))
+                levels.append(level_code)
+                actions.append(_ACTION_INDEX[action_type])
+                severities.append(LogParser._calculate_severity(log_level, action_type, message))
+                modules.append(vocab.module_code(module))
+                # 沿用单行解析器的实体规则，保证与 parse() 结果一致
+                for entity_name, value in LogParser._extract_entities(message).items():
+                    codes.append(vocab.entity_code(entity_name, value))
+            offsets.append(len(codes))
+            raw.append(line)
+
+        self._postings = None
+
+    def extend(self, other: 'LogColumns') -> None:
+        """拼接另一个共享同一驻留表的批次"""
+        if other.vocab is not self.vocab:
+            raise ValueError("只能拼接共享同一 LogVocabulary 的批次")
+        base = len(self.entity_codes)
+        self.timestamps.extend(other.timestamps)
+        self.levels.extend(other.levels)
+        self.actions.extend(other.actions)
+        self.severities.extend(other.severities)
+        self.modules.extend(other.modules)
+        self.entity_offsets.extend(offset + base for offset in other.entity_offsets[1:])
+        self.entity_codes.extend(other.entity_codes)
+        self.raw.extend(other.raw)
+        self._postings = None
+
+    def row_entities(self, row: int) -> array:
+        return self.entity_codes[self.entity_offsets[row]:self.entity_offsets[row + 1]]
+
+    def postings(self) -> Dict[int, array]:
+        """实体编码 -> 行号数组 的倒排索引（惰性构建）"""
+        if self._postings is None:
+            postings: Dict[int, array] = {}
+            offsets, codes = self.entity_offsets, self.entity_codes
+            for row in range(len(self.raw)):
+                start, end = offsets[row], offsets[row + 1]
+                for pos in range(start, end):
+                    code = codes[pos]
+                    rows = postings.get(code)
+                    if rows is None:
+                        rows = postings[code] = array('I')
+                    rows.append(row)
+            self._postings = postings
+        return self._postings
+
+    def materialize(self, row: int) -> Dict[str, Any]:
+        """将某一行还原为完整的结构化日志"""
+        return LogParser.parse(self.raw[row])
+
+
+class _TimestampCache:
+    """时间戳解析缓存 - 同一秒内的日志行共享解析结果"""
+
+    __slots__ = ('_last_key', '_last_value', '_now')
+
+    def __init__(self):
+        self._last_key = None
+        self._last_value = 0.0
+        self._now = None
+
+    def __call__(self, timestamp: str) -> float:
+        key = timestamp[:19]
+        if key != self._last_key:
+            try:
+                self._last_value = datetime.strptime(key, '%Y-%m-%d %H:%M:%S').timestamp()
+            except ValueError:
+                self._last_value = self.now()
+            self._last_key = key
+        fraction = timestamp[20:]
+        return self._last_value + float(f"0.{fraction}") if fraction.isdigit() else self._last_value
+
+    def now(self) -> float:
+        if self._now is None:
+            self._now = datetime.now().timestamp()
+        return self._now
+
+
+class LogSegmentCache:
+    """
+    日志文件分段缓存
+
+    按字节分段（对齐到行尾）解析文件并缓存 LogColumns。文件追加写入时只解析
+    新增部分；文件被截断或轮转（inode 变化 / 尺寸变小）时丢弃该文件的缓存。
+    """
+
+    def __init__(self, segment_bytes: int = 4 * 1024 * 1024, max_files: int = 16):
+        self.segment_bytes = segment_bytes
+        self.max_files = max_files
+        self._files: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path: str) -> LogColumns:
+        """返回文件全部已完成行的列式数据（增量解析新增分段）"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None or entry['inode'] != st.st_ino or st.st_size < entry['end']:
+                entry = {
+                    'inode': st.st_ino,
+                    'end': 0,
+                    'columns': LogColumns(),
+                }
+                self._files[path] = entry
+            self._files.move_to_end(path)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+
+            if st.st_size > entry['end']:
+                self._parse_tail(path, entry, st.st_size)
+            return entry['columns']
+
+    def _parse_tail(self, path: str, entry: Dict[str, Any], size: int) -> None:
+        columns: LogColumns = entry['columns']
+        with open(path, 'rb') as f:
+            f.seek(entry['end'])
+            while entry['end'] < size:
+                chunk = f.read(self.segment_bytes)
+                if not chunk:
+                    break
+                cut = chunk.rfind(b'\n')
+                if cut < 0:
+                    # 单行超过分段大小：继续读到行尾
+                    rest = f.readline()
+                    if not rest.endswith(b'\n'):
+                        break
+                    chunk += rest
+                    cut = len(chunk) - 1
+                elif cut < len(chunk) - 1:
+                    f.seek(entry['end'] + cut + 1)
+                segment = LogColumns(columns.vocab)
+                segment.append_lines(chunk[:cut + 1].decode('utf-8', errors='ignore').splitlines())
+                columns.extend(segment)
+                entry['end'] += cut + 1
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._files.clear()
+            else:
+                self._files.pop(os.path.abspath(path), None)
+
+
 class LogAggregator:
     """日志聚合器 - 提供批量解析和统计功能"""
     
@@ -470,6 +716,92 @@ class LogAggregator:
         unique_related = {log['raw']: log for log in related}.values()
         return sorted(unique_related, key=lambda x: x['timestamp'])
 
+    # ==================== 列式批处理模式 ====================
+
+    @staticmethod
+    def parse_columnar(lines: List[str], vocab: Optional[LogVocabulary] = None) -> LogColumns:
+        """批量解析日志行为列式数据（不生成逐行字典）"""
+        columns = LogColumns(vocab)
+        columns.append_lines(lines)
+        return columns
+
+    @staticmethod
+    def load_file(path: str) -> LogColumns:
+        """读取日志文件的列式数据（按文件分段缓存，追加内容增量解析）"""
+        return _segment_cache.load(path)
+
+    @staticmethod
+    def aggregate_columns(columns: LogColumns) -> Dict[str, Any]:
+        """
+        基于列式数据聚合统计信息
+
+        返回结构与 aggregate_stats 相同；计数在 C 层通过 Counter 完成
+        """
+        total = len(columns)
+        if not total:
+            return {
+                'total': 0,
+                'by_level': {},
+                'by_action': {},
+                'by_module': {},
+                'avg_severity': 0,
+                'top_entities': {}
+            }
+
+        vocab = columns.vocab
+        by_level = {LEVEL_CODES[code].value: count for code, count in Counter(columns.levels).items()}
+        by_action = {ACTION_CODES[code].value: count for code, count in Counter(columns.actions).items()}
+        by_module = {vocab.modules[code]: count for code, count in Counter(columns.modules).items()}
+        avg_severity = sum(columns.severities) / total
+
+        grouped: Dict[str, List[Tuple[Any, int]]] = {}
+        for code, count in Counter(columns.entity_codes).items():
+            name, value = vocab.entities[code]
+            grouped.setdefault(name, []).append((value, count))
+        top_entities = {
+            name: sorted(counts, key=lambda x: x[1], reverse=True)[:5]
+            for name, counts in grouped.items()
+        }
+
+        return {
+            'total': total,
+            'by_level': by_level,
+            'by_action': by_action,
+            'by_module': by_module,
+            'avg_severity': round(avg_severity, 2),
+            'top_entities': top_entities
+        }
+
+    @staticmethod
+    def find_related_rows(
+        columns: LogColumns,
+        target_row: int,
+        context_size: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        基于列式数据查找相关日志
+
+        与 find_related_logs 语义一致：前后各 context_size 条，加上共享任一实体的日志。
+        实体关联通过倒排索引完成，只对命中的行还原完整结构。
+        """
+        total = len(columns)
+        if not 0 <= target_row < total:
+            return []
+
+        rows: Set[int] = set(range(max(0, target_row - context_size), min(total, target_row + context_size + 1)))
+        postings = columns.postings()
+        for code in columns.row_entities(target_row):
+            rows.update(postings.get(code, ()))
+
+        # 去重（按原始行）并按时间排序
+        timestamps, raw = columns.timestamps, columns.raw
+        unique_rows = {raw[row]: row for row in sorted(rows)}.values()
+        ordered = sorted(unique_rows, key=lambda row: (timestamps[row], row))
+        return [columns.materialize(row) for row in ordered]
+
+
+_segment_cache = LogSegmentCache()
+
 
 # 便捷函数
 def parse_log_line(line: str) -> Dict[str, Any]:
@@ -214,12 +214,14 @@ class MediaFilter:
         Returns:
             包含类型、大小、文件名等信息的字典
         """
+        size = MediaFilter.get_file_size(message)
+        filename = MediaFilter.get_filename(message)
         return {
             'type': MediaFilter.get_file_type(message),
-            'size': MediaFilter.get_file_size(message),
-            'size_mb': round(MediaFilter.get_file_size(message) / (1024 * 1024), 2) if MediaFilter.get_file_size(message) else 0,
-            'filename': MediaFilter.get_filename(message),
-            'extension': Path(MediaFilter.get_filename(message)).suffix if MediaFilter.get_filename(message) else None,
+            'size': size,
+            'size_mb': round(size / (1024 * 1024), 2) if size else 0,
+            'filename': filename,
+            'extension': Path(filename).suffix if filename else None,
             'message_id': message.id,
             'date': message.date
         }
@@ -0,0 +1,190 @@
+"""
+媒体文件流式响应
+
+功能：
+1. HTTP Range（单区间，含 bytes=-N 后缀区间）与 If-Range，支持大视频拖动进度条
+2. ETag / Last-Modified / If-None-Match / If-Modified-Since 条件请求（304）
+3. 服务器提供 ASGI `http.response.zerocopysend` 扩展时把文件描述符交给服务器用 os.sendfile 零拷贝发送，
+   否则在线程池中用 os.pread 分块读取，不阻塞事件循环
+"""
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析 Range 请求头
+
+    Returns:
+        (start, end) 闭区间；多区间或格式错误返回 None（按整个文件响应）
+
+    Raises:
+        ValueError: 区间不可满足（416）
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_str:
+            # 后缀区间：最后 N 个字节
+            length = int(end_str)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, file_size - length), file_size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+    except ValueError:
+        if start_str.isdigit() or end_str.isdigit():
+            raise
+        return None
+
+    if start >= file_size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, min(end, file_size - 1)
+
+
+class MediaStreamResponse(Response):
+    """支持 Range 与条件请求的文件响应"""
+
+    def __init__(
+        self,
+        path: str,
+        request: Request,
+        filename: Optional[str] = None,
+        media_type: Optional[str] = None,
+        etag: Optional[str] = None,
+        inline: bool = True,
+        max_age: int = 3600
+    ):
+        """
+        Args:
+            path: 文件路径
+            request: 当前请求（读取 Range / If-* 请求头）
+            filename: Content-Disposition 中的文件名
+            media_type: MIME 类型（默认按扩展名推断）
+            etag: 强 ETag（不含引号，如文件哈希）；默认由文件大小与修改时间生成
+            inline: True 为页面内播放/预览，False 为附件下载
+            max_age: Cache-Control max-age（秒）
+        """
+        self.path = path
+        self.status_code = 200
+        self.background = None
+        self.media_type = media_type or mimetypes.guess_type(filename or path)[0] or "application/octet-stream"
+
+        st = os.stat(path)
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(path)
+        self.file_size = st.st_size
+        self.etag = f'"{etag}"' if etag else f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.range: Optional[Tuple[int, int]] = None
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": self.etag,
+            "last-modified": self.last_modified,
+            "cache-control": f"private, max-age={max_age}",
+        }
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            headers["content-disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+        if self._not_modified(request, st.st_mtime):
+            self.status_code = 304
+            self.init_headers(headers)
+            return
+
+        range_header = request.headers.get("range")
+        if range_header and self._if_range_matches(request):
+            try:
+                self.range = parse_range_header(range_header, self.file_size)
+            except ValueError:
+                self.status_code = 416
+                headers["content-range"] = f"bytes */{self.file_size}"
+                self.init_headers(headers)
+                self.headers["content-length"] = "0"
+                return
+
+        if self.range:
+            start, end = self.range
+            self.status_code = 206
+            headers["content-range"] = f"bytes {start}-{end}/{self.file_size}"
+            length = end - start + 1
+        else:
+            length = self.file_size
+
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    def _not_modified(self, request: Request, mtime: float) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _if_range_matches(self, request: Request) -> bool:
+        """If-Range 与当前版本不一致时忽略 Range，返回完整文件"""
+        if_range = request.headers.get("if-range")
+        return not if_range or if_range in (self.etag, self.last_modified)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if self.status_code in (304, 416) or scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        start, end = self.range or (0, self.file_size - 1)
+        count = end - start + 1
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": fd,
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+                return
+
+            offset = start
+            remaining = count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0 or count <= 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
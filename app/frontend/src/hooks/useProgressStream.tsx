@@ -0,0 +1,88 @@
+/**
+ * 实时进度Hook
+ *
+ * 通过SSE订阅统一进度总线（下载 / 上传 / 离线任务）
+ */
+import { useEffect, useRef, useState } from 'react';
+
+export interface LiveProgress {
+  key: string;
+  kind: 'download' | 'upload' | 'offline';
+  task_id: string;
+  status: string;
+  name: string | null;
+  current_bytes: number;
+  total_bytes: number;
+  percent: number;
+  speed_mbps: number;
+  error: string | null;
+  extra: Record<string, unknown>;
+  version: number;
+  updated_at: number;
+}
+
+interface RemovedProgress {
+  key: string;
+  removed: true;
+}
+
+export const useProgressStream = (kinds?: string[]) => {
+  const [progress, setProgress] = useState<Record<string, LiveProgress>>({});
+  const [connected, setConnected] = useState(false);
+  const stateRef = useRef<Record<string, LiveProgress>>({});
+  const kindsParam = kinds?.join(',') || '';
+
+  useEffect(() => {
+    const params = new URLSearchParams();
+    // EventSource不支持自定义请求头，通过查询参数传递token
+    const token = localStorage.getItem('access_token');
+    if (token) {
+      params.set('token', token);
+    }
+    if (kindsParam) {
+      params.set('kinds', kindsParam);
+    }
+
+    const eventSource = new EventSource(`/api/progress/stream?${params.toString()}`);
+
+    eventSource.onopen = () => setConnected(true);
+    eventSource.onerror = () => setConnected(false);
+
+    eventSource.onmessage = (event) => {
+      try {
+        const message = JSON.parse(event.data);
+        if (message.type === 'snapshot') {
+          const snapshot: Record<string, LiveProgress> = {};
+          for (const item of message.tasks as LiveProgress[]) {
+            snapshot[item.key] = item;
+          }
+          stateRef.current = snapshot;
+        } else if (message.type === 'progress') {
+          const next = { ...stateRef.current };
+          for (const item of message.tasks as Array<LiveProgress | RemovedProgress>) {
+            if ('removed' in item) {
+              delete next[item.key];
+            } else {
+              next[item.key] = item;
+            }
+          }
+          stateRef.current = next;
+        } else {
+          return;
+        }
+        setProgress(stateRef.current);
+      } catch (error) {
+        console.error('解析进度消息失败:', error);
+      }
+    };
+
+    return () => {
+      eventSource.close();
+      setConnected(false);
+    };
+  }, [kindsParam]);
+
+  return { progress, connected };
+};
+
+export default useProgressStream;
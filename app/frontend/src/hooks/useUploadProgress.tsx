@@ -6,6 +6,7 @@
 import { useEffect, useState, useCallback, useRef } from 'react';
 
 export interface UploadProgress {
+  file_path: string;
   file_name: string;
   file_size: number;
   status: 'pending' | 'hashing' | 'checking' | 'quick_success' | 'uploading' | 'success' | 'failed' | 'cancelled';
@@ -26,9 +27,15 @@ export interface UploadProgressData {
   uploads: UploadProgress[];
 }
 
+export interface UploadProgressDelta {
+  updated: Array<Partial<UploadProgress> & { file_path: string }>;
+  removed: string[];
+}
+
 export const useUploadProgress = () => {
   const [uploads, setUploads] = useState<UploadProgress[]>([]);
   const [connected, setConnected] = useState(false);
+  const uploadsRef = useRef<Map<string, UploadProgress>>(new Map());
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimerRef = useRef<number | null>(null);
 
@@ -70,7 +77,25 @@ export const useUploadProgress = () => {
         const message = JSON.parse(event.data);
 
         if (message.type === 'upload_progress' && message.data) {
-          setUploads(message.data.uploads || []);
+          // 完整快照：重建本地状态
+          const snapshot = new Map<string, UploadProgress>();
+          for (const upload of (message.data.uploads || []) as UploadProgress[]) {
+            snapshot.set(upload.file_path, upload);
+          }
+          uploadsRef.current = snapshot;
+          setUploads(Array.from(snapshot.values()));
+        } else if (message.type === 'upload_progress_delta' && message.data) {
+          // 增量：按 file_path 合并变化的字段
+          const delta = message.data as UploadProgressDelta;
+          const current = uploadsRef.current;
+          for (const change of delta.updated || []) {
+            const previous = current.get(change.file_path);
+            current.set(change.file_path, { ...previous, ...change } as UploadProgress);
+          }
+          for (const filePath of delta.removed || []) {
+            current.delete(filePath);
+          }
+          setUploads(Array.from(current.values()));
         } else if (message.type === 'pong') {
           // 心跳响应
           console.log('WebSocket心跳正常');
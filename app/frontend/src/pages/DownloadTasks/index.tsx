@@ -35,6 +35,7 @@ import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { mediaFilesApi } from '../../services/mediaFiles';
 import { mediaMonitorApi } from '../../services/mediaMonitor';
 import type { DownloadTask } from '../../types/media';
+import { useProgressStream } from '../../hooks/useProgressStream';
 
 const { Title, Text } = Typography;
 const { Option } = Select;
@@ -55,10 +56,25 @@ const DownloadTasksPage: React.FC = () => {
       monitor_rule: ruleFilter === 'all' ? undefined : ruleFilter,
       page_size: 100,
     }),
-    refetchInterval: 3000, // 每3秒自动刷新
+    // 实时进度通过进度流推送，列表只需低频刷新以获取状态变化
+    refetchInterval: 15000,
   });
 
-  const tasks = tasksData?.tasks || [];
+  const { progress: liveProgress } = useProgressStream(['download']);
+
+  const tasks = (tasksData?.tasks || []).map((task: DownloadTask) => {
+    const live = liveProgress[`download:${task.id}`];
+    if (!live) {
+      return task;
+    }
+    return {
+      ...task,
+      downloaded_bytes: live.current_bytes,
+      total_bytes: live.total_bytes || task.total_bytes,
+      progress_percent: Math.floor(live.percent),
+      download_speed_mbps: live.speed_mbps,
+    };
+  });
 
   // 获取监控规则列表（用于筛选）
   const { data: rulesData } = useQuery({
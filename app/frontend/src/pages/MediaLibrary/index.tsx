@@ -60,6 +60,7 @@ const MediaLibraryPage: React.FC = () => {
   
   // 视图模式
   const [viewMode, setViewMode] = useState<'grid' | 'list'>('list');
+  const [failedThumbnails, setFailedThumbnails] = useState<Set<number>>(new Set());
   
   // 筛选条件
   const [keyword, setKeyword] = useState('');
@@ -307,6 +308,24 @@ const MediaLibraryPage: React.FC = () => {
     return <span style={{ color: config.color, fontSize: 18 }}>{config.icon}</span>;
   };
 
+  // 缩略图（图片/视频），生成失败时显示类型图标
+  const renderThumbnail = (record: MediaFile) => {
+    const type = record.file_type || 'document';
+    if ((type !== 'image' && type !== 'video') || failedThumbnails.has(record.id)) {
+      return getFileTypeIcon(type);
+    }
+    return (
+      <Image
+        width={40}
+        height={40}
+        style={{ objectFit: 'cover', borderRadius: 4 }}
+        src={mediaFilesApi.getThumbnailUrl(record.id, 160)}
+        preview={type === 'image' ? { src: mediaFilesApi.getStreamUrl(record.id) } : false}
+        onError={() => setFailedThumbnails(prev => new Set(prev).add(record.id))}
+      />
+    );
+  };
+
   // 表格列定义
   const columns = [
     {
@@ -315,7 +334,7 @@ const MediaLibraryPage: React.FC = () => {
       width: 300,
       render: (_: any, record: MediaFile) => (
         <Space>
-          {getFileTypeIcon(record.file_type || 'document')}
+          {renderThumbnail(record)}
           <div>
             <div style={{ fontWeight: 500, marginBottom: 4 }}>
               {record.file_name}
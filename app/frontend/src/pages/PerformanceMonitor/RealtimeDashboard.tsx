@@ -107,10 +107,16 @@ const RealtimeDashboard: React.FC<RealtimeDashboardProps> = ({ stats, loading })
                         <Tag color="blue">处理: {processor.processed}</Tag>
                         <Tag color="success">成功: {processor.success}</Tag>
                         <Tag color="error">失败: {processor.failed}</Tag>
+                        {processor.timeouts > 0 && <Tag color="warning">超时: {processor.timeouts}</Tag>}
                       </Space>
                       <Text type="secondary" style={{ fontSize: 12 }}>
                         ⚡ 平均耗时: {processor.avg_time.toFixed(2)}ms
                       </Text>
+                      {processor.latency && (
+                        <Text type="secondary" style={{ fontSize: 12 }}>
+                          📊 P50 {processor.latency.p50.toFixed(0)}ms / P95 {processor.latency.p95.toFixed(0)}ms / P99 {processor.latency.p99.toFixed(0)}ms
+                        </Text>
+                      )}
                       <Progress
                         percent={processor.processed > 0 ? (processor.success / processor.processed) * 100 : 0}
                         size="small"
@@ -97,12 +97,17 @@ const MediaSettingsPage: React.FC = () => {
           initialValues={{
             temp_folder: '/app/media/downloads',
             concurrent_downloads: 3,
+            download_bandwidth_limit_mbps: 0,
+            download_part_workers: 4,
             retry_on_failure: true,
             max_retries: 3,
             extract_metadata: true,
             metadata_mode: 'lightweight',
             metadata_timeout: 10,
             async_metadata_extraction: true,
+            metadata_workers: 2,
+            upload_concurrency: 2,
+            upload_bandwidth_limit_mbps: 0,
             auto_cleanup_enabled: true,
             auto_cleanup_days: 7,
             cleanup_only_organized: true,
@@ -134,6 +139,23 @@ const MediaSettingsPage: React.FC = () => {
             <InputNumber min={1} max={10} style={{ width: '100%' }} />
           </Form.Item>
 
+          <Form.Item
+            label="下载带宽预算 (MB/s)"
+            name="download_bandwidth_limit_mbps"
+            tooltip="所有下载任务的总带宽上限，超出时暂停启动新任务并降低并发；0 表示不限制"
+          >
+            <InputNumber min={0} step={0.5} style={{ width: '100%' }} />
+          </Form.Item>
+
+          <Form.Item
+            label="单文件并行分片数"
+            name="download_part_workers"
+            tooltip="大文件（8MB 以上）同时请求的分片段数，中断后可从已完成的分片继续；1 表示单流下载"
+            rules={[{ type: 'number', min: 1, max: 16, message: '范围: 1-16' }]}
+          >
+            <InputNumber min={1} max={16} style={{ width: '100%' }} />
+          </Form.Item>
+
           <Form.Item
             label="失败时重试"
             name="retry_on_failure"
@@ -201,6 +223,53 @@ const MediaSettingsPage: React.FC = () => {
             <Switch />
           </Form.Item>
 
+          <Form.Item
+            label="元数据提取进程数"
+            name="metadata_workers"
+            tooltip="并行运行 ffprobe 的进程数，同一文件（按哈希）只提取一次"
+            rules={[
+              { required: true, message: '请输入进程数' },
+              { type: 'number', min: 1, max: 8, message: '范围: 1-8' },
+            ]}
+          >
+            <InputNumber min={1} max={8} style={{ width: '100%' }} />
+          </Form.Item>
+
+          {/* 云盘上传 */}
+          <Title level={5} style={{ marginTop: 32 }}>云盘上传</Title>
+          <Divider />
+
+          <Form.Item
+            label="并发上传数"
+            name="upload_concurrency"
+            tooltip="同时上传到 CloudDrive2 的文件数，各监控规则轮流使用上传通道"
+            rules={[
+              { required: true, message: '请输入并发上传数' },
+              { type: 'number', min: 1, max: 10, message: '范围: 1-10' },
+            ]}
+          >
+            <InputNumber min={1} max={10} style={{ width: '100%' }} />
+          </Form.Item>
+
+          <Form.Item
+            label="上传限速 (MB/s)"
+            name="upload_bandwidth_limit_mbps"
+            tooltip="所有上传任务的总带宽上限；0 表示不限制"
+          >
+            <InputNumber min={0} step={0.5} style={{ width: '100%' }} />
+          </Form.Item>
+
+          <Form.Item
+            label="分时段上传限速"
+            name="upload_bandwidth_schedule"
+            tooltip="JSON 数组，时段内覆盖上面的限速；结束时间早于开始时间表示跨越午夜，limit_mbps 为 0 表示不限制"
+          >
+            <Input.TextArea
+              rows={3}
+              placeholder='[{"start": "08:00", "end": "23:00", "limit_mbps": 2}]'
+            />
+          </Form.Item>
+
           {/* 存储清理 */}
           <Title level={5} style={{ marginTop: 32 }}>存储清理</Title>
           <Divider />
@@ -6,6 +6,17 @@ import type { MediaFile, DownloadTask, StorageUsage } from '../types/media';
 
 const API_BASE = '/api/media';
 
+// <img>/<video> 无法携带请求头，通过查询参数传递token
+const withToken = (url: string, params: Record<string, string> = {}) => {
+  const search = new URLSearchParams(params);
+  const token = localStorage.getItem('access_token');
+  if (token) {
+    search.set('token', token);
+  }
+  const query = search.toString();
+  return query ? `${url}?${query}` : url;
+};
+
 export const mediaFilesApi = {
   // ==================== 下载任务 ====================
   
@@ -103,6 +114,17 @@ export const mediaFilesApi = {
     return response;
   },
 
+  /**
+   * 缩略图地址（首次请求时由后端生成并缓存）
+   */
+  getThumbnailUrl: (fileId: number, size: number = 160) =>
+    withToken(`${API_BASE}/thumbnail/${fileId}`, { size: String(size) }),
+
+  /**
+   * 在线播放/预览地址（支持 Range 拖动）
+   */
+  getStreamUrl: (fileId: number) => withToken(`${API_BASE}/stream/${fileId}`),
+
   /**
    * 收藏/取消收藏文件
    */
@@ -162,6 +184,7 @@ export const mediaFilesApi = {
     days?: number;
     only_organized?: boolean;
     delete_db_records?: boolean;
+    dry_run?: boolean;
   }) => {
     const { data } = await apiClient.post(`${API_BASE}/storage/cleanup`, null, { params });
     return data;
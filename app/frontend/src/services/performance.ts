@@ -25,6 +25,11 @@ export interface MessageCacheStats {
   hit_rate: string;
   evictions: number;
   expirations: number;
+  memory_mb?: number;
+  max_memory_mb?: number;
+  shards?: number;
+  segments?: { probation: number; protected: number };
+  namespaces?: Record<string, { hits: number; misses: number; hit_rate: string }>;
 }
 
 /**
@@ -47,6 +52,8 @@ export interface RetryQueueStats {
   total_success: number;
   total_failed: number;
   last_persistence?: string;
+  last_compaction?: string;
+  journal_writes?: number;
   persistence_errors: number;
   success_rate: string;
 }
@@ -66,15 +73,44 @@ export interface BatchWriterStats {
 /**
  * 消息分发器统计
  */
+export interface LatencyStats {
+  count: number;
+  avg: number;
+  p50: number;
+  p95: number;
+  p99: number;
+  max: number;
+  buckets: Record<string, number>;
+}
+
 export interface MessageDispatcherStats {
   total_messages: number;
   avg_processing_time: number;
+  latency: LatencyStats;
   processors: Record<string, {
     processed: number;
     success: number;
     failed: number;
+    timeouts: number;
+    predicate_timeouts: number;
+    predicate_errors: number;
     avg_time: number;
+    in_flight: number;
+    timeout: number;
+    max_concurrency: number;
+    latency: LatencyStats;
   }>;
+  background: {
+    pending: number;
+    jobs: Record<string, {
+      submitted: number;
+      inline: number;
+      completed: number;
+      failed: number;
+      timeouts: number;
+      latency: LatencyStats;
+    }>;
+  };
 }
 
 /**
@@ -7,6 +7,8 @@ export interface MediaSettings {
   // 下载设置
   temp_folder: string;
   concurrent_downloads: number;
+  download_bandwidth_limit_mbps?: number;
+  download_part_workers?: number;
   retry_on_failure: boolean;
   max_retries: number;
   
@@ -15,6 +17,12 @@ export interface MediaSettings {
   metadata_mode: 'disabled' | 'lightweight' | 'full';
   metadata_timeout: number;
   async_metadata_extraction: boolean;
+  metadata_workers: number;
+  
+  // 云盘上传
+  upload_concurrency?: number;
+  upload_bandwidth_limit_mbps?: number;
+  upload_bandwidth_schedule?: string | null;
   
   // 存储清理
   auto_cleanup_enabled: boolean;
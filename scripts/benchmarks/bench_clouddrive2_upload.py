@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+CloudDrive2 gRPC 上传数据通路基准测试
+
+在子进程中启动一个本地假 CloudDrive2 gRPC 服务（只实现 CreateFile / WriteToFileStream /
+WriteToFile / CloseFile，收到的数据直接丢弃，可模拟单条消息延迟和带宽上限），
+用 CloudDrive2Client._upload_via_grpc 上传临时文件，对比：
+- 固定 4MB 块（CD2_GRPC_CHUNK_BYTES，等同旧实现的块大小）
+- 自适应块大小
+输出吞吐（MB/s）、客户端进程每 GB 的 CPU 时间，以及上传期间事件循环的最大阻塞时间
+
+用法:
+    python scripts/benchmarks/bench_clouddrive2_upload.py [--size-mb 512] [--latency-ms 0] [--server-mbps 0]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'backend'))
+
+import grpc  # noqa: E402
+
+from protos import clouddrive_pb2, clouddrive_pb2_grpc  # noqa: E402
+
+MB = 1024 * 1024
+MAX_MESSAGE = 64 * MB
+
+
+class FakeFileService(clouddrive_pb2_grpc.CloudDriveFileSrvServicer):
+    """丢弃写入数据的假文件服务"""
+
+    def __init__(self, latency: float, bandwidth: float):
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    async def _simulate(self, nbytes: int):
+        delay = self.latency + (nbytes / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def CreateFile(self, request, context):
+        return clouddrive_pb2.CreateFileResult(fileHandle=1)
+
+    async def WriteToFileStream(self, request_iterator, context):
+        written = 0
+        async for req in request_iterator:
+            await self._simulate(len(req.buffer))
+            written += len(req.buffer)
+        return clouddrive_pb2.WriteFileResult(bytesWritten=written)
+
+    async def WriteToFile(self, request, context):
+        await self._simulate(len(request.buffer))
+        return clouddrive_pb2.WriteFileResult(bytesWritten=len(request.buffer))
+
+    async def CloseFile(self, request, context):
+        return clouddrive_pb2.FileOperationResult(success=True)
+
+
+def serve(port: int, latency: float, bandwidth: float):
+    async def run():
+        server = grpc.aio.server(options=[
+            ('grpc.max_receive_message_length', MAX_MESSAGE),
+            ('grpc.max_send_message_length', MAX_MESSAGE),
+        ])
+        clouddrive_pb2_grpc.add_CloudDriveFileSrvServicer_to_server(FakeFileService(latency, bandwidth), server)
+        server.add_insecure_port(f'127.0.0.1:{port}')
+        await server.start()
+        await server.wait_for_termination()
+
+    asyncio.run(run())
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def upload_once(port: int, path: str, size: int, env: dict) -> dict:
+    from services.clouddrive2_client import CloudDrive2Client, CloudDrive2Config
+    from services.clouddrive2_pool import DEFAULT_CHANNEL_OPTIONS
+    from services.clouddrive2_stub import create_stub
+
+    os.environ.pop('CD2_GRPC_CHUNK_BYTES', None)
+    os.environ.update(env)
+
+    client = CloudDrive2Client(CloudDrive2Config(
+        host='127.0.0.1', port=port, channel_options=DEFAULT_CHANNEL_OPTIONS
+    ))
+    client.channel = grpc.aio.insecure_channel(f'127.0.0.1:{port}', options=DEFAULT_CHANNEL_OPTIONS)
+    client.stub = create_stub(client.channel, 'bench')
+    client._connected = True
+    await client.channel.channel_ready()
+
+    max_lag = 0.0
+
+    async def probe():
+        nonlocal max_lag
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - before - 0.001)
+
+    probe_task = asyncio.create_task(probe())
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    result = await client._upload_via_grpc(path, '/bench/file.bin', size)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    probe_task.cancel()
+    await client.disconnect()
+
+    if not result.get('success') or result.get('uploaded_bytes') != size:
+        raise RuntimeError(f"上传失败: {result}")
+    return {'mbps': size / MB / wall, 'cpu_per_gb': cpu / (size / 1024 / MB), 'max_lag_ms': max_lag * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=512, help='上传文件大小（MB）')
+    parser.add_argument('--latency-ms', type=float, default=0, help='服务端每条消息的模拟延迟（毫秒）')
+    parser.add_argument('--server-mbps', type=float, default=0, help='服务端模拟带宽上限（MB/s），0 表示不限')
+    parser.add_argument('--repeat', type=int, default=3, help='每种配置重复次数（取最好成绩）')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    port = free_port()
+    server = multiprocessing.Process(
+        target=serve, args=(port, args.latency_ms / 1000, args.server_mbps * MB), daemon=True
+    )
+    server.start()
+
+    size = args.size_mb * MB
+    fd, path = tempfile.mkstemp(prefix='cd2-bench-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            block = os.urandom(MB)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        print(f"文件 {args.size_mb}MB，模拟延迟 {args.latency_ms}ms/消息，"
+              f"服务端带宽 {'不限' if not args.server_mbps else f'{args.server_mbps}MB/s'}")
+        configs = [
+            ('固定 4MB 块', {'CD2_GRPC_CHUNK_BYTES': str(4 * MB - 16 * 1024)}),
+            ('自适应块大小', {}),
+        ]
+        for label, env in configs:
+            runs = [asyncio.run(upload_once(port, path, size, env)) for _ in range(args.repeat)]
+            best = max(runs, key=lambda r: r['mbps'])
+            print(
+                f"  {label:<12} {best['mbps']:10.1f} MB/s {best['cpu_per_gb']:10.2f} CPU 秒/GB "
+                f"{max(r['max_lag_ms'] for r in runs):10.1f}ms 最大循环阻塞"
+            )
+    finally:
+        os.unlink(path)
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
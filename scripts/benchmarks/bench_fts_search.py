@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+全文搜索索引基准测试
+
+在临时 SQLite 数据库中生成 N 行（默认 100 万行）媒体文件和消息日志，对比：
+- LIKE '%kw%' 全表扫描 + COUNT(*)
+- FTS5 trigram 索引 MATCH + bm25 排序 + COUNT(*)
+以及带触发器时的写入开销
+
+用法:
+    python scripts/benchmarks/bench_fts_search.py [--rows 1000000]
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2] / 'app' / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.search_index import build_match_expression, MEDIA_FILES_WEIGHTS  # noqa: E402
+
+FTS_MIGRATION = BACKEND_DIR / 'alembic' / 'versions' / '20251024_add_fts_search_index.py'
+
+WORDS = [
+    "Avatar", "Interstellar", "Inception", "Matrix", "Dune", "Tenet", "Arrival",
+    "流浪地球", "让子弹飞", "霸王别姬", "千与千寻", "鬼灭之刃", "进击的巨人", "海贼王",
+    "S01E01", "S02E05", "1080p", "2160p", "WEB-DL", "BluRay", "HDR", "x265",
+]
+CHATS = [f"频道_{i}" for i in range(200)] + [f"channel_{i}" for i in range(200)]
+SENDERS = [f"user_{i}" for i in range(5000)]
+EXTS = [".mp4", ".mkv", ".jpg", ".png", ".zip"]
+
+SCHEMA = [
+    """
+    CREATE TABLE media_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_name VARCHAR(255), original_name VARCHAR(255),
+        source_chat VARCHAR(100), sender_username VARCHAR(100), downloaded_at DATETIME
+    )
+    """,
+    "CREATE TABLE message_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, original_text TEXT)",
+]
+
+QUERIES = ["Interstellar", "流浪地球", "S02E05 2160p", "频道_42", "不存在的关键词"]
+
+
+def generate(conn: sqlite3.Connection, rows: int, start: int = 0) -> None:
+    rnd = random.Random(start)
+    media, logs = [], []
+    for i in range(start, start + rows):
+        title = ".".join(rnd.sample(WORDS, 3))
+        media.append((
+            f"{title}{rnd.choice(EXTS)}", f"{title}.{i}{rnd.choice(EXTS)}",
+            rnd.choice(CHATS), rnd.choice(SENDERS), "2025-10-01 00:00:00",
+        ))
+        logs.append((f"转发消息 {' '.join(rnd.sample(WORDS, 4))} 来自 {rnd.choice(CHATS)} #{i}",))
+        if len(media) >= 50_000:
+            _flush(conn, media, logs)
+    _flush(conn, media, logs)
+    conn.commit()
+
+
+def _flush(conn, media, logs) -> None:
+    conn.executemany(
+        "INSERT INTO media_files (file_name, original_name, source_chat, sender_username, downloaded_at) "
+        "VALUES (?, ?, ?, ?, ?)", media)
+    conn.executemany("INSERT INTO message_logs (original_text) VALUES (?)", logs)
+    media.clear()
+    logs.clear()
+
+
+def create_search_index(conn: sqlite3.Connection) -> None:
+    """执行 FTS 迁移中的建表、触发器与重建语句（与生产数据库一致）"""
+    spec = importlib.util.spec_from_file_location('fts_migration', FTS_MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    for statement in migration.UPGRADE_SQL:
+        conn.execute(statement)
+
+
+def timed(label: str, fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"  {label:<44} {(time.perf_counter() - start) / repeat * 1000:10.1f}ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+        print(f"生成 {args.rows:,} 行数据 ...")
+        timed("插入（无索引）", lambda: generate(conn, args.rows))
+        timed("建立 FTS5 索引（rebuild）", lambda: (create_search_index(conn), conn.commit()))
+        print(f"  数据库大小: {os.path.getsize(os.path.join(tmp, 'bench.db')) / 1024 / 1024:.1f}MB")
+        timed("插入 10,000 行（触发器维护索引）", lambda: generate(conn, 10_000, start=args.rows))
+
+        weights = ", ".join(str(w) for w in MEDIA_FILES_WEIGHTS)
+        for keyword in QUERIES:
+            expression = build_match_expression(keyword)
+            like = f"%{keyword.split()[0]}%"
+            print(f"\n关键词: {keyword!r}")
+
+            timed("media_files LIKE 分页", lambda: conn.execute(
+                "SELECT id FROM media_files WHERE file_name LIKE ? OR original_name LIKE ? "
+                "OR source_chat LIKE ? OR sender_username LIKE ? ORDER BY downloaded_at DESC LIMIT ?",
+                (like, like, like, like, args.page_size)).fetchall())
+            like_total = timed("media_files LIKE COUNT(*)", lambda: conn.execute(
+                "SELECT count(*) FROM media_files WHERE file_name LIKE ? OR original_name LIKE ? "
+                "OR source_chat LIKE ? OR sender_username LIKE ?",
+                (like, like, like, like)).fetchone()[0])
+            timed("media_files FTS5 bm25 分页", lambda: conn.execute(
+                f"SELECT rowid, bm25(media_files_fts, {weights}) AS score FROM media_files_fts "
+                "WHERE media_files_fts MATCH ? ORDER BY score LIMIT ?",
+                (expression, args.page_size)).fetchall())
+            fts_total = timed("media_files FTS5 COUNT(*)", lambda: conn.execute(
+                "SELECT count(*) FROM media_files_fts WHERE media_files_fts MATCH ?",
+                (expression,)).fetchone()[0])
+            timed("message_logs LIKE 分页", lambda: conn.execute(
+                "SELECT id FROM message_logs WHERE original_text LIKE ? ORDER BY id DESC LIMIT ?",
+                (like, args.page_size)).fetchall())
+            timed("message_logs FTS5 bm25 + snippet 分页", lambda: conn.execute(
+                "SELECT rowid, bm25(message_logs_fts) AS score, "
+                "snippet(message_logs_fts, 0, '<mark>', '</mark>', '…', 16) FROM message_logs_fts "
+                "WHERE message_logs_fts MATCH ? ORDER BY score LIMIT ?",
+                (expression, args.page_size)).fetchall())
+            print(f"  匹配数: LIKE(首词)={like_total:,} FTS5={fts_total:,}")
+
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+LogAggregator 基准测试
+
+生成 N 行（默认 100 万行）模拟日志，对比逐行字典模式与列式批处理模式：
+- 解析 + 聚合统计
+- 文件追加后的增量重新加载（分段缓存）
+- 相关日志查找
+
+用法:
+    python scripts/benchmarks/bench_log_aggregator.py [--lines 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'backend'))
+
+from utils.log_parser import LogAggregator  # noqa: E402
+
+TEMPLATES = [
+    "INFO | services.forward:forward_message:{line} - 📤 转发消息 消息ID: {msg} 规则ID: {rule} 聊天ID: -100{chat}",
+    "INFO | api.logs:list_logs:{line} - 📊 查询结果: 返回 {count} 条, 总计 {count} 条",
+    "DEBUG | telegram.client:fetch:{line} - 拉取更新 chat_id={chat}",
+    "WARNING | services.media:download:{line} - ⚠️ 下载重试 message_id={msg} 耗时: {ms}ms",
+    "ERROR | services.pan115:upload:{line} - ❌ 上传失败 rule_id={rule} 用户ID: {user}",
+    "INFO | api.rules:update_rule:{line} - ✅ 更新规则 规则ID: {rule}",
+]
+
+
+def generate(path: str, lines: int, start: int = 0) -> None:
+    rnd = random.Random(start)
+    with open(path, 'a', encoding='utf-8') as f:
+        for i in range(start, start + lines):
+            seconds = i // 20
+            ts = f"2025-10-{1 + seconds // 86400 % 28:02d} {seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+            body = rnd.choice(TEMPLATES).format(
+                line=rnd.randint(1, 900), msg=rnd.randint(1, 50000), rule=rnd.randint(1, 40),
+                chat=rnd.randint(1, 200), count=rnd.randint(0, 100), ms=rnd.randint(1, 5000),
+                user=rnd.randint(1, 20),
+            )
+            f.write(f"{ts} | {body}\n")
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<32} {time.perf_counter() - start:8.2f}s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过逐行字典模式（较慢）')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.log')
+    os.close(fd)
+    try:
+        print(f"生成 {args.lines} 行日志: {path}")
+        generate(path, args.lines)
+        print(f"文件大小: {os.path.getsize(path) / 1024 / 1024:.1f} MB\n")
+
+        if not args.skip_legacy:
+            print("逐行字典模式:")
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            parsed = timed("parse_batch", lambda: LogAggregator.parse_batch(lines))
+            timed("aggregate_stats", lambda: LogAggregator.aggregate_stats(parsed))
+            target = parsed[len(parsed) // 2]
+            timed("find_related_logs", lambda: LogAggregator.find_related_logs(parsed, target))
+            del lines, parsed
+
+        print("列式批处理模式:")
+        columns = timed("load_file (冷启动)", lambda: LogAggregator.load_file(path))
+        timed("aggregate_columns", lambda: LogAggregator.aggregate_columns(columns))
+        timed("load_file (缓存命中)", lambda: LogAggregator.load_file(path))
+        generate(path, 10_000, start=args.lines)
+        timed("load_file (追加 1 万行)", lambda: LogAggregator.load_file(path))
+        timed("find_related_rows (建索引)", lambda: LogAggregator.find_related_rows(columns, len(columns) // 2))
+        related = timed("find_related_rows", lambda: LogAggregator.find_related_rows(columns, len(columns) // 3))
+        print(f"\n共 {len(columns)} 行，相关日志 {len(related)} 条")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()